@@ -0,0 +1,209 @@
+# Copyright Contributors to the Pyro project.
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Representative models for the benchmark suite.
+
+The models follow the ones in the `examples/` folder, but they are fitted to
+synthetic data of a fixed size, so that the benchmarks neither download datasets
+nor depend on the optional requirements of the examples.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+import jax.numpy as jnp
+
+import numpyro
+from numpyro.contrib.control_flow import scan
+from numpyro.contrib.hsgp.approximation import hsgp_squared_exponential
+import numpyro.distributions as dist
+from numpyro.handlers import mask
+from numpyro.infer.autoguide import AutoNormal
+
+BenchmarkModel = namedtuple(
+    "BenchmarkModel", ["name", "model", "guide", "args", "kwargs"]
+)
+"""
+A :func:`~collections.namedtuple` consisting of the following fields:
+ - **name** - the name of the benchmark model.
+ - **model** - the model function.
+ - **guide** - a guide for SVI benchmarks, or `None` if the model is only
+   benchmarked with MCMC.
+ - **args** - the positional arguments of the model.
+ - **kwargs** - the keyword arguments of the model.
+"""
+
+
+def covtype_model(data, labels):
+    # see examples/covtype.py
+    dim = data.shape[1]
+    coefs = numpyro.sample("coefs", dist.Normal(jnp.zeros(dim), jnp.ones(dim)))
+    with numpyro.plate("N", data.shape[0]):
+        logits = jnp.dot(data, coefs)
+        return numpyro.sample("obs", dist.Bernoulli(logits=logits), obs=labels)
+
+
+def covtype(rng):
+    num_data, dim = 5000, 54
+    data = rng.normal(size=(num_data, dim)).astype(np.float32)
+    coefs = rng.normal(size=dim).astype(np.float32)
+    labels = (rng.uniform(size=num_data) < 1 / (1 + np.exp(-data @ coefs))).astype(
+        np.float32
+    )
+    return BenchmarkModel(
+        "covtype", covtype_model, AutoNormal(covtype_model), (data, labels), {}
+    )
+
+
+def baseball_model(at_bats, hits=None):
+    # see `partially_pooled_with_logit` in examples/baseball.py
+    loc = numpyro.sample("loc", dist.Normal(-1, 1))
+    scale = numpyro.sample("scale", dist.HalfCauchy(1))
+    num_players = at_bats.shape[0]
+    with numpyro.plate("num_players", num_players):
+        alpha = numpyro.sample("alpha", dist.Normal(loc, scale))
+        return numpyro.sample("obs", dist.Binomial(at_bats, logits=alpha), obs=hits)
+
+
+def baseball(rng):
+    num_players = 18
+    at_bats = np.full(num_players, 45, dtype=np.int32)
+    logits = rng.normal(-1.0, 0.3, size=num_players)
+    hits = rng.binomial(at_bats, 1 / (1 + np.exp(-logits))).astype(np.int32)
+    return BenchmarkModel(
+        "baseball",
+        baseball_model,
+        AutoNormal(baseball_model),
+        (at_bats, hits),
+        {},
+    )
+
+
+def hmm_model(sequences, lengths, hidden_dim):
+    # see `model_1` in examples/hmm_enum.py
+    num_sequences, max_length, data_dim = sequences.shape
+    probs_x = numpyro.sample(
+        "probs_x", dist.Dirichlet(0.9 * jnp.eye(hidden_dim) + 0.1).to_event(1)
+    )
+    probs_y = numpyro.sample(
+        "probs_y", dist.Beta(0.1, 0.9).expand([hidden_dim, data_dim]).to_event(2)
+    )
+
+    def transition_fn(carry, y):
+        x_prev, t = carry
+        with numpyro.plate("sequences", num_sequences, dim=-2):
+            with mask(mask=(t < lengths)[..., None]):
+                x = numpyro.sample(
+                    "x",
+                    dist.Categorical(probs_x[x_prev]),
+                    infer={"enumerate": "parallel"},
+                )
+                with numpyro.plate("tones", data_dim, dim=-1):
+                    numpyro.sample("y", dist.Bernoulli(probs_y[x.squeeze(-1)]), obs=y)
+        return (x, t + 1), None
+
+    x_init = jnp.zeros((num_sequences, 1), dtype=jnp.int32)
+    scan(transition_fn, (x_init, 0), jnp.swapaxes(sequences, 0, 1))
+
+
+def hmm(rng):
+    num_sequences, max_length, data_dim = 10, 30, 20
+    sequences = (rng.uniform(size=(num_sequences, max_length, data_dim)) < 0.1).astype(
+        np.float32
+    )
+    lengths = rng.integers(max_length // 2, max_length + 1, size=num_sequences)
+    return BenchmarkModel(
+        "hmm",
+        hmm_model,
+        None,
+        (sequences, lengths.astype(np.int32)),
+        {"hidden_dim": 4},
+    )
+
+
+def sparse_regression_model(X, Y, hypers):
+    # see examples/sparse_regression.py
+    S, P, N = hypers["expected_sparsity"], X.shape[1], X.shape[0]
+
+    sigma = numpyro.sample("sigma", dist.HalfNormal(hypers["alpha3"]))
+    phi = sigma * (S / jnp.sqrt(N)) / (P - S)
+    eta1 = numpyro.sample("eta1", dist.HalfCauchy(phi))
+
+    msq = numpyro.sample("msq", dist.InverseGamma(hypers["alpha1"], hypers["beta1"]))
+    xisq = numpyro.sample("xisq", dist.InverseGamma(hypers["alpha2"], hypers["beta2"]))
+
+    eta2 = jnp.square(eta1) * jnp.sqrt(xisq) / msq
+
+    lam = numpyro.sample("lambda", dist.HalfCauchy(jnp.ones(P)))
+    kappa = jnp.sqrt(msq) * lam / jnp.sqrt(msq + jnp.square(eta1 * lam))
+
+    kX = kappa * X
+    k1 = (1.0 + jnp.dot(kX, kX.T)) ** 2 * 0.5 * eta2
+    k2 = -0.5 * eta2 * jnp.dot(jnp.square(kX), jnp.square(kX).T)
+    k3 = (eta1**2 - eta2) * jnp.dot(kX, kX.T)
+    k4 = jnp.square(hypers["c"]) - 0.5 * eta2
+    k = k1 + k2 + k3 + k4 + (sigma**2 + 1.0e-4) * jnp.eye(N)
+
+    numpyro.sample(
+        "Y",
+        dist.MultivariateNormal(loc=jnp.zeros(X.shape[0]), covariance_matrix=k),
+        obs=Y,
+    )
+
+
+def sparse_regression(rng):
+    num_data, num_dimensions, num_active = 100, 20, 3
+    X = rng.normal(size=(num_data, num_dimensions)).astype(np.float32)
+    W = np.zeros(num_dimensions, dtype=np.float32)
+    W[:num_active] = rng.normal(0.0, 2.0, size=num_active)
+    Y = (X @ W + 0.05 * rng.normal(size=num_data)).astype(np.float32)
+    hypers = {
+        "expected_sparsity": num_active,
+        "alpha1": 3.0,
+        "beta1": 1.0,
+        "alpha2": 3.0,
+        "beta2": 1.0,
+        "alpha3": 1.0,
+        "c": 1.0,
+    }
+    return BenchmarkModel(
+        "sparse_regression",
+        sparse_regression_model,
+        AutoNormal(sparse_regression_model),
+        (X, Y),
+        {"hypers": hypers},
+    )
+
+
+def hsgp_model(x, y, ell, m):
+    # a one-dimensional version of the trend component in examples/hsgp.py
+    alpha = numpyro.sample("alpha", dist.HalfNormal(1.0))
+    length = numpyro.sample("length", dist.InverseGamma(5.0, 5.0))
+    f = hsgp_squared_exponential(x=x, alpha=alpha, length=length, ell=ell, m=m)
+    sigma = numpyro.sample("sigma", dist.HalfNormal(1.0))
+    with numpyro.plate("data", x.shape[0]):
+        numpyro.sample("obs", dist.Normal(f, sigma), obs=y)
+
+
+def hsgp(rng):
+    num_data = 1000
+    x = np.linspace(-1, 1, num_data, dtype=np.float32)
+    y = (np.sin(4 * x) + 0.3 * rng.normal(size=num_data)).astype(np.float32)
+    return BenchmarkModel(
+        "hsgp",
+        hsgp_model,
+        AutoNormal(hsgp_model),
+        (x, y),
+        {"ell": 1.5, "m": 30},
+    )
+
+
+BENCHMARK_MODELS = {
+    "covtype": covtype,
+    "baseball": baseball,
+    "hmm": hmm,
+    "sparse_regression": sparse_regression,
+    "hsgp": hsgp,
+}
@@ -0,0 +1,234 @@
+# Copyright Contributors to the Pyro project.
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Benchmark suite for the inference hot paths of NumPyro.
+
+For each model in :mod:`models`, this script measures on CPU:
+
+    - the compilation time and the wall time of the warmup phase of NUTS,
+    - the steady-state latency of a NUTS step, the throughput of gradient
+      evaluations, the effective sample size per second and the number of
+      leapfrog steps per effective sample,
+    - the compilation time and the steady-state number of SVI steps per second,
+    - the throughput of :class:`~numpyro.infer.util.Predictive`.
+
+The results are written as JSON, together with the versions of the packages, so
+that they can be compared with the results of another revision::
+
+    python benchmarks/run_benchmarks.py --output base.json
+    # ... apply some changes ...
+    python benchmarks/run_benchmarks.py --output new.json --compare base.json
+
+With `--compare`, the script exits with a non-zero status if a metric regresses by
+more than `--tolerance`.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+import jax
+from jax import random
+
+import numpyro
+from numpyro.infer import MCMC, NUTS, SVI, Predictive, Trace_ELBO
+from numpyro.optim import Adam
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from models import BENCHMARK_MODELS  # noqa: E402
+
+# metrics for which smaller values are better; larger values are better for others
+SMALLER_IS_BETTER = {
+    "mcmc_compile_time",
+    "warmup_time",
+    "nuts_step_latency",
+    "leapfrog_steps_per_ess",
+    "svi_compile_time",
+}
+
+
+def timeit(fn, repeat=1):
+    # the minimum wall time of `repeat` calls, waiting for the results to be ready
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        jax.block_until_ready(fn())
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def _format_metric(value):
+    return "n/a" if value is None else "{:.6g}".format(value)
+
+
+def benchmark_mcmc(bm, args):
+    mcmc = MCMC(
+        NUTS(bm.model),
+        num_warmup=args.num_warmup,
+        num_samples=args.num_samples,
+        progress_bar=False,
+        profile=True,
+    )
+    mcmc.run(random.PRNGKey(args.seed), *bm.args, **bm.kwargs)
+    profile = mcmc.get_profile()
+    warmup, sample = profile["warmup"], profile["sample"]
+    sample_time = sample["wall_time"] - sample["compile_time"]
+    # the profile reports None for metrics which are undefined, e.g. the effective
+    # sample size of less than 2 draws, and so do the metrics derived from them
+    ess_per_second = None
+    if sample["n_eff"] is not None and sample_time > 0:
+        ess_per_second = sample["n_eff"] / sample_time
+    results = {
+        "mcmc_compile_time": warmup["compile_time"] + sample["compile_time"],
+        "warmup_time": warmup["wall_time"],
+        "nuts_step_latency": sample_time / args.num_samples
+        if args.num_samples > 0
+        else None,
+        "grad_evals_per_second": sample["grad_evals_per_second"],
+        "ess_per_second": ess_per_second,
+        "leapfrog_steps_per_ess": sample["leapfrog_steps_per_ess"],
+    }
+    return results, mcmc.get_samples()
+
+
+def benchmark_svi(bm, args):
+    svi = SVI(bm.model, bm.guide, Adam(0.01), Trace_ELBO())
+    rng_key = random.PRNGKey(args.seed)
+    compile_time = timeit(
+        lambda: svi.compile(rng_key, *bm.args, num_steps=args.num_steps, **bm.kwargs)
+    )
+    run_time = timeit(
+        lambda: (
+            svi.run(
+                rng_key, args.num_steps, *bm.args, progress_bar=False, **bm.kwargs
+            ).losses
+        ),
+        repeat=args.repeat,
+    )
+    return {
+        "svi_compile_time": compile_time,
+        "svi_steps_per_second": args.num_steps / run_time,
+    }
+
+
+def benchmark_predictive(bm, samples, args):
+    predictive = Predictive(bm.model, posterior_samples=samples)
+    rng_key = random.PRNGKey(args.seed)
+    # compile before timing
+    timeit(lambda: predictive(rng_key, *bm.args, **bm.kwargs))
+    run_time = timeit(
+        lambda: predictive(rng_key, *bm.args, **bm.kwargs), repeat=args.repeat
+    )
+    return {"predictive_samples_per_second": args.num_samples / run_time}
+
+
+def run(args):
+    results = {}
+    for name in args.models:
+        bm = BENCHMARK_MODELS[name](np.random.default_rng(args.seed))
+        print("Benchmarking {}...".format(name))
+        try:
+            results[name], samples = benchmark_mcmc(bm, args)
+        # e.g. funsor is required for models with enumerated discrete latent sites
+        except ImportError as e:
+            print("    skipped: {}".format(e))
+            continue
+        if bm.guide is not None:
+            results[name].update(benchmark_svi(bm, args))
+        results[name].update(benchmark_predictive(bm, samples, args))
+        for metric, value in results[name].items():
+            print("    {}: {}".format(metric, _format_metric(value)))
+    return {
+        "metadata": {
+            "numpyro": numpyro.__version__,
+            "jax": jax.__version__,
+            "jaxlib": jax.lib.__version__,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "device": str(jax.devices()[0]),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "config": {
+                k: getattr(args, k)
+                for k in ["num_warmup", "num_samples", "num_steps", "repeat", "seed"]
+            },
+        },
+        "results": results,
+    }
+
+
+def compare(results, baseline, tolerance):
+    # return a list of (model, metric, baseline value, new value) of regressions
+    regressions = []
+    for name, metrics in results["results"].items():
+        for metric, value in metrics.items():
+            base_value = baseline["results"].get(name, {}).get(metric)
+            if base_value is None or value is None:
+                continue
+            if metric in SMALLER_IS_BETTER:
+                regressed = value > base_value * (1 + tolerance)
+            else:
+                regressed = value < base_value * (1 - tolerance)
+            if regressed:
+                regressions.append((name, metric, base_value, value))
+    return regressions
+
+
+def main(args):
+    results = run(args)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for name, metric, base_value, value in regressions:
+            print(
+                "Regression in {} {}: {:.6g} -> {:.6g}".format(
+                    name, metric, base_value, value
+                )
+            )
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="NumPyro benchmark suite")
+    parser.add_argument(
+        "--models",
+        nargs="+",
+        default=list(BENCHMARK_MODELS),
+        choices=list(BENCHMARK_MODELS),
+    )
+    parser.add_argument("--num-warmup", nargs="?", default=500, type=int)
+    parser.add_argument("--num-samples", nargs="?", default=500, type=int)
+    parser.add_argument("--num-steps", nargs="?", default=1000, type=int)
+    parser.add_argument(
+        "--repeat",
+        default=3,
+        type=int,
+        help="number of repetitions of steady-state measurements",
+    )
+    parser.add_argument("--seed", default=0, type=int)
+    parser.add_argument("--output", default=None, type=str, help="path of JSON results")
+    parser.add_argument(
+        "--compare", default=None, type=str, help="path of baseline JSON results"
+    )
+    parser.add_argument(
+        "--tolerance",
+        default=0.2,
+        type=float,
+        help="relative change of a metric that is reported as a regression",
+    )
+    parser.add_argument("--device", default="cpu", type=str, help='use "cpu" or "gpu".')
+    args = parser.parse_args()
+
+    numpyro.set_platform(args.device)
+    main(args)
@@ -11,6 +11,7 @@ warnings.filterwarnings(
 # ruff: noqa: E402
 
 from numpyro import compat, diagnostics, distributions, handlers, infer, ops, optim
+from numpyro.contrib.control_flow.checkpoint import checkpoint
 from numpyro.distributions.distribution import enable_validation, validation_enabled
 from numpyro.infer.inspect import render_model
 import numpyro.patch  # noqa: F401
@@ -26,7 +27,12 @@ from numpyro.primitives import (
     sample,
     subsample,
 )
-from numpyro.util import enable_x64, set_host_device_count, set_platform
+from numpyro.util import (
+    enable_compilation_cache,
+    enable_x64,
+    set_host_device_count,
+    set_platform,
+)
 from numpyro.version import __version__
 
 
@@ -40,10 +46,12 @@ logging.getLogger("absl").addFilter(_filter_absl_cpu_warning)
 
 __all__ = [
     "__version__",
+    "checkpoint",
     "compat",
     "deterministic",
     "diagnostics",
     "distributions",
+    "enable_compilation_cache",
     "enable_x64",
     "enable_validation",
     "factor",
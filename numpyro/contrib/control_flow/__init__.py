@@ -1,7 +1,8 @@
 # Copyright Contributors to the Pyro project.
 # SPDX-License-Identifier: Apache-2.0
 
+from numpyro.contrib.control_flow.checkpoint import checkpoint
 from numpyro.contrib.control_flow.cond import cond
 from numpyro.contrib.control_flow.scan import scan
 
-__all__ = ["cond", "scan"]
+__all__ = ["checkpoint", "cond", "scan"]
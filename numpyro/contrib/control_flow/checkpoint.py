@@ -0,0 +1,124 @@
+# Copyright Contributors to the Pyro project.
+# SPDX-License-Identifier: Apache-2.0
+
+import functools
+from typing import Any, Callable, Optional
+
+from numpyro.contrib.control_flow.cond import wrap_fn
+from numpyro.primitives import _PYRO_STACK, apply_stack
+from numpyro.util import maybe_remat
+
+
+def checkpoint_wrapper(
+    fn,
+    args,
+    kwargs,
+    policy=True,
+    prevent_cse=True,
+    rng_key=None,
+    substitute_stack=None,
+    enum=False,
+    first_available_dim=None,
+):
+    if enum:
+        raise RuntimeError(
+            "The checkpoint primitive does not currently support enumeration"
+        )
+
+    if substitute_stack is None:
+        substitute_stack = []
+
+    # arguments are closed over, so that they can be arbitrary Python objects
+    wrapped_fn = wrap_fn(lambda _: fn(*args, **kwargs), substitute_stack)
+    wrapped_fn = maybe_remat(wrapped_fn, policy, prevent_cse=prevent_cse)
+    return wrapped_fn((rng_key, None))
+
+
+def checkpoint(
+    fn: Optional[Callable] = None,
+    *,
+    policy: Any = True,
+    prevent_cse: bool = True,
+) -> Callable:
+    """
+    Marks a block of a model for rematerialization: the intermediate values of
+    ``fn`` are recomputed, rather than stored, when the model is differentiated in
+    reverse mode, e.g. when computing the gradient of an ELBO or of the potential
+    energy. See :func:`jax.checkpoint` for more information.
+
+    **Usage**:
+
+    .. doctest::
+
+       >>> import jax.numpy as jnp
+       >>> import numpyro
+       >>> import numpyro.distributions as dist
+       >>> from numpyro.contrib.control_flow import checkpoint
+       >>>
+       >>> def model(x, y=None):
+       ...     @checkpoint
+       ...     def block(h):
+       ...         w = numpyro.sample("w", dist.Normal(0, 1).expand([3, 3]).to_event(2))
+       ...         for _ in range(10):
+       ...             h = jnp.tanh(h @ w)
+       ...         return h
+       ...
+       ...     h = block(x)
+       ...     numpyro.sample("y", dist.Normal(h.sum(-1), 1), obs=y)
+       >>>
+       >>> with numpyro.handlers.seed(rng_seed=0):
+       ...     model(jnp.ones((5, 3)))
+
+    .. warning:: This is an experimental utility function that allows users to use
+        :func:`jax.checkpoint` with NumPyro's effect handlers. Currently, `sample`,
+        `deterministic` and `param` sites within ``fn`` are supported.
+
+    .. warning:: The ``checkpoint`` primitive does not currently support enumeration
+        and can not be used inside a ``numpyro.plate`` context. All ``plate``
+        statements should be put inside ``fn``.
+
+    :param callable fn: the block of the model to be rematerialized. If None, a
+        decorator is returned.
+    :param policy: either True, a checkpoint policy such as
+        ``jax.checkpoint_policies.dots_saveable``, which selects the intermediate
+        values that are stored, or the name of a policy in
+        ``jax.checkpoint_policies``. Defaults to True, which stores no intermediate
+        values.
+    :param bool prevent_cse: passed to :func:`jax.checkpoint`.
+    :return: a callable with the same signature as ``fn``.
+    """
+    if fn is None:
+        return functools.partial(checkpoint, policy=policy, prevent_cse=prevent_cse)
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not _PYRO_STACK:
+            value, _ = checkpoint_wrapper(
+                fn, args, kwargs, policy=policy, prevent_cse=prevent_cse
+            )
+            return value
+
+        initial_msg = {
+            "type": "control_flow",
+            "fn": checkpoint_wrapper,
+            "args": (fn, args, kwargs),
+            "kwargs": {
+                "policy": policy,
+                "prevent_cse": prevent_cse,
+                "rng_key": None,
+                "substitute_stack": [],
+            },
+            "value": None,
+        }
+
+        msg = apply_stack(initial_msg)
+        value, pytree_trace = msg["value"]
+
+        for msg in pytree_trace.trace.values():
+            if msg["type"] == "plate":
+                continue
+            apply_stack(msg)
+
+        return value
+
+    return wrapper
@@ -13,7 +13,7 @@ from numpyro import handlers
 from numpyro.distributions.batch_util import promote_batch_shape
 from numpyro.ops.pytree import PytreeTrace
 from numpyro.primitives import _PYRO_STACK, Messenger, apply_stack
-from numpyro.util import not_jax_tracer
+from numpyro.util import maybe_remat, not_jax_tracer
 
 
 def _replay_wrapper(replay_trace, trace, i, length):
@@ -129,6 +129,7 @@ def scan_enum(
     substitute_stack=None,
     history=1,
     first_available_dim=None,
+    remat=None,
 ):
     from numpyro.contrib.funsor import (
         config_enumerate,
@@ -231,7 +232,11 @@ def scan_enum(
                 if length == unroll_steps:
                     return wrapped_carry, (PytreeTrace({}), y0s)
                 wrapped_carry, (pytree_trace, ys) = lax.scan(
-                    body_fn, wrapped_carry, xs_, length - unroll_steps, reverse
+                    maybe_remat(body_fn, remat),
+                    wrapped_carry,
+                    xs_,
+                    length - unroll_steps,
+                    reverse,
                 )
 
     first_var = None
@@ -285,6 +290,7 @@ def scan_wrapper(
     enum=False,
     history=1,
     first_available_dim=None,
+    remat=None,
 ):
     if length is None:
         length = jnp.shape(jax.tree.flatten(xs)[0][0])[0]
@@ -303,6 +309,7 @@ def scan_wrapper(
             substitute_stack,
             history,
             first_available_dim,
+            remat,
         )
 
     def body_fn(wrapped_carry, x):
@@ -334,7 +341,7 @@ def scan_wrapper(
 
     wrapped_carry = (jnp.asarray(0), rng_key, init)
     last_carry, (pytree_trace, ys) = lax.scan(
-        body_fn, wrapped_carry, xs, length=length, reverse=reverse
+        maybe_remat(body_fn, remat), wrapped_carry, xs, length=length, reverse=reverse
     )
     for name, site in pytree_trace.trace.items():
         if site["type"] != "sample":
@@ -352,6 +359,7 @@ def scan(
     length: Optional[int] = None,
     reverse: bool = False,
     history: int = 1,
+    remat=None,
 ):
     """
     This primitive scans a function over the leading array axes of
@@ -452,6 +460,16 @@ def scan(
         forward (the default) or in reverse
     :param int history: The number of previous contexts visible from the current context.
         Defaults to 1. If zero, this is similar to :class:`numpyro.plate`.
+    :param remat: whether to rematerialize `f` at each step, i.e. to recompute its
+        intermediate values, rather than to store them for all steps, when the scan is
+        differentiated in reverse mode. This reduces the memory of long scans at the
+        cost of an additional evaluation of `f` per step. Either a boolean, a
+        checkpoint policy such as ``jax.checkpoint_policies.dots_saveable``, which
+        selects the intermediate values that are stored, or the name of a policy in
+        ``jax.checkpoint_policies``. Defaults to None, which does not rematerialize
+        `f` unless requested by the inference algorithm, e.g. with the `remat`
+        argument of :class:`~numpyro.infer.elbo.Trace_ELBO` or
+        :class:`~numpyro.infer.hmc.NUTS`.
     :return: output of scan, quoted from :func:`jax.lax.scan` docs:
         "pair of type (c, [b]) where the first element represents the final loop
         carry value and the second element represents the stacked outputs of the
@@ -460,7 +478,7 @@ def scan(
     # if there are no active Messengers, we just run and return it as expected:
     if not _PYRO_STACK:
         (length, rng_key, carry), (pytree_trace, ys) = scan_wrapper(
-            f, init, xs, length=length, reverse=reverse
+            f, init, xs, length=length, reverse=reverse, remat=remat
         )
         return carry, ys
     else:
@@ -469,7 +487,12 @@ def scan(
             "type": "control_flow",
             "fn": scan_wrapper,
             "args": (f, init, xs, length, reverse),
-            "kwargs": {"rng_key": None, "substitute_stack": [], "history": history},
+            "kwargs": {
+                "rng_key": None,
+                "substitute_stack": [],
+                "history": history,
+                "remat": remat,
+            },
             "value": None,
         }
 
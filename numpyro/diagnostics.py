@@ -3,17 +3,22 @@
 
 """
 This provides a small set of utilities in NumPyro that are used to diagnose posterior samples.
+Each utility computes with :mod:`jax.numpy` on device when its input is a JAX array, so that
+it can be jitted or vmapped, and with :mod:`numpy` on host otherwise.
 """
 
 from collections import OrderedDict
+from functools import partial
 from itertools import product
-from typing import Union
+from types import ModuleType
+from typing import Any, Callable, Union
 
 import numpy as np
 from numpy.typing import NDArray
 
 import jax
-from jax import device_get
+from jax import device_get, lax
+import jax.numpy as jnp
 
 __all__ = [
     "autocorrelation",
@@ -22,11 +27,20 @@ __all__ = [
     "gelman_rubin",
     "hpdi",
     "split_gelman_rubin",
+    "streaming_diagnostics",
     "print_summary",
 ]
 
+_PyTree = Any
+_Array = Union[NDArray, jax.Array]
 
-def _compute_chain_variance_stats(x: NDArray) -> tuple[NDArray, NDArray]:
+
+def _array_module(x: _Array) -> ModuleType:
+    # JAX arrays (including tracers) are processed on device by jax.numpy
+    return jnp if isinstance(x, jax.Array) else np
+
+
+def _compute_chain_variance_stats(x: _Array) -> tuple[_Array, _Array]:
     # compute within-chain variance and variance estimator
     # input has shape C x N x sample_shape
     C, N = x.shape[:2]
@@ -42,40 +56,43 @@ def _compute_chain_variance_stats(x: NDArray) -> tuple[NDArray, NDArray]:
     return var_within, var_estimator
 
 
-def gelman_rubin(x: NDArray) -> NDArray:
+def gelman_rubin(x: _Array) -> _Array:
     """
     Computes R-hat over chains of samples ``x``, where the first dimension of
     ``x`` is chain dimension and the second dimension of ``x`` is draw dimension.
     It is required that ``x.shape[0] >= 2`` and ``x.shape[1] >= 2``.
 
-    :param numpy.ndarray x: the input array.
+    :param x: the input array.
+    :type x: numpy.ndarray or jax.Array
     :return: R-hat of ``x``.
-    :rtype: numpy.ndarray
+    :rtype: numpy.ndarray or jax.Array
     """
     assert x.ndim >= 2
     assert x.shape[0] >= 2
     assert x.shape[1] >= 2
+    xp = _array_module(x)
     var_within, var_estimator = _compute_chain_variance_stats(x)
     with np.errstate(invalid="ignore", divide="ignore"):
-        rhat = np.sqrt(var_estimator / var_within)
+        rhat = xp.sqrt(var_estimator / var_within)
     return rhat
 
 
-def split_gelman_rubin(x: NDArray) -> NDArray:
+def split_gelman_rubin(x: _Array) -> _Array:
     """
     Computes split R-hat over chains of samples ``x``, where the first dimension
     of ``x`` is chain dimension and the second dimension of ``x`` is draw dimension.
     It is required that ``x.shape[1] >= 4``.
 
-    :param numpy.ndarray x: the input array.
+    :param x: the input array.
+    :type x: numpy.ndarray or jax.Array
     :return: split R-hat of ``x``.
-    :rtype: numpy.ndarray
+    :rtype: numpy.ndarray or jax.Array
     """
     assert x.ndim >= 2
     assert x.shape[1] >= 4
 
     N_half = x.shape[1] // 2
-    new_input = np.concatenate([x[:, :N_half], x[:, -N_half:]], axis=0)
+    new_input = _array_module(x).concatenate([x[:, :N_half], x[:, -N_half:]], axis=0)
     split_rhat = gelman_rubin(new_input)
     return split_rhat
 
@@ -98,35 +115,37 @@ def _fft_next_fast_len(target: int) -> int:
         target += 1
 
 
-def autocorrelation(x: NDArray, axis: int = 0, bias: bool = True) -> NDArray:
+def autocorrelation(x: _Array, axis: int = 0, bias: bool = True) -> _Array:
     """
     Computes the autocorrelation of samples at dimension ``axis``.
 
-    :param numpy.ndarray x: the input array.
+    :param x: the input array.
+    :type x: numpy.ndarray or jax.Array
     :param int axis: the dimension to calculate autocorrelation.
     :param bias: whether to use a biased estimator.
     :return: autocorrelation of ``x``.
-    :rtype: numpy.ndarray
+    :rtype: numpy.ndarray or jax.Array
     """
     # Ref: https://en.wikipedia.org/wiki/Autocorrelation#Efficient_computation
     # Adapted from Stan implementation
     # https://github.com/stan-dev/math/blob/develop/stan/math/prim/mat/fun/autocorrelation.hpp
+    xp = _array_module(x)
     N = x.shape[axis]
     M = _fft_next_fast_len(N)
     M2 = 2 * M
 
     # transpose axis with -1 for Fourier transform
-    x = np.swapaxes(x, axis, -1)
+    x = xp.swapaxes(x, axis, -1)
 
     # centering x
     centered_signal = x - x.mean(axis=-1, keepdims=True)
 
     # Fourier transform
-    freqvec = np.fft.rfft(centered_signal, n=M2, axis=-1)
+    freqvec = xp.fft.rfft(centered_signal, n=M2, axis=-1)
     # take square of magnitude of freqvec (or freqvec x freqvec*)
-    freqvec_gram = freqvec * np.conjugate(freqvec)
+    freqvec_gram = freqvec * xp.conjugate(freqvec)
     # inverse Fourier transform
-    autocorr = np.fft.irfft(freqvec_gram, n=M2, axis=-1)
+    autocorr = xp.fft.irfft(freqvec_gram, n=M2, axis=-1)
 
     # truncate and normalize the result, then transpose back to original shape
     autocorr = autocorr[..., :N]
@@ -135,27 +154,30 @@ def autocorrelation(x: NDArray, axis: int = 0, bias: bool = True) -> NDArray:
     # see Geyer (1992) and Priestley (1981) for a discussion. also note that it is only strictly
     # unbiased when the mean is known, whereas we it estimate from samples here.
     if not bias:
-        autocorr = autocorr / np.arange(N, 0.0, -1)
+        autocorr = autocorr / xp.arange(N, 0.0, -1)
 
     with np.errstate(invalid="ignore", divide="ignore"):
-        autocorr = (autocorr / autocorr[..., :1]).astype(np.float64)
-    return np.swapaxes(autocorr, axis, -1)
+        autocorr = autocorr / autocorr[..., :1]
+    if xp is np:
+        autocorr = autocorr.astype(np.float64)
+    return xp.swapaxes(autocorr, axis, -1)
 
 
-def autocovariance(x: NDArray, axis: int = 0, bias: bool = True) -> NDArray:
+def autocovariance(x: _Array, axis: int = 0, bias: bool = True) -> _Array:
     """
     Computes the autocovariance of samples at dimension ``axis``.
 
-    :param numpy.ndarray x: the input array.
+    :param x: the input array.
+    :type x: numpy.ndarray or jax.Array
     :param int axis: the dimension to calculate autocovariance.
     :param bias: whether to use a biased estimator.
     :return: autocovariance of ``x``.
-    :rtype: numpy.ndarray
+    :rtype: numpy.ndarray or jax.Array
     """
     return autocorrelation(x, axis, bias) * x.var(axis=axis, keepdims=True)
 
 
-def effective_sample_size(x: NDArray, bias: bool = True) -> NDArray:
+def effective_sample_size(x: _Array, bias: bool = True) -> _Array:
     """
     Computes effective sample size of input ``x``, where the first dimension of
     ``x`` is chain dimension and the second dimension of ``x`` is draw dimension.
@@ -167,12 +189,13 @@ def effective_sample_size(x: NDArray, bias: bool = True) -> NDArray:
     2. *Stan Reference Manual version 2.18*,
        Stan Development Team
 
-    :param numpy.ndarray x: the input array.
+    :param x: the input array.
+    :type x: numpy.ndarray or jax.Array
     :param bias: whether to use a biased estimator of the autocovariance.
     :return: effective sample size of ``x``.
-    :rtype: numpy.ndarray
+    :rtype: numpy.ndarray or jax.Array
     """
-    x = device_get(x)
+    xp = _array_module(x)
     assert x.ndim >= 2
     assert x.shape[1] >= 2
 
@@ -183,40 +206,41 @@ def effective_sample_size(x: NDArray, bias: bool = True) -> NDArray:
     var_within, var_estimator = _compute_chain_variance_stats(x)
     rho_k = 1.0 - (var_within - gamma_k_c.mean(axis=0)) / var_estimator
     # correlation at lag 0 is always 1
-    rho_k[0] = 1.0
+    rho_k = xp.concatenate([xp.ones_like(rho_k[:1]), rho_k[1:]], axis=0)
 
     # initial positive sequence (formula 1.18 in [1]) applied for autocorrelation
     Rho_k = rho_k[:-1:2, ...] + rho_k[1::2, ...]
 
     # initial monotone (decreasing) sequence
     Rho_init = Rho_k[:1]
-    Rho_k = np.concatenate(
-        [
-            Rho_init,
-            np.minimum.accumulate(np.clip(Rho_k[1:, ...], 0, None), axis=0),
-        ],
-        axis=0,
-    )
+    Rho_k = xp.clip(Rho_k[1:, ...], 0, None)
+    if xp is np:
+        Rho_k = np.minimum.accumulate(Rho_k, axis=0)
+    else:
+        Rho_k = lax.cummin(Rho_k, axis=0)
+    Rho_k = xp.concatenate([Rho_init, Rho_k], axis=0)
 
     tau = -1.0 + 2.0 * Rho_k.sum(axis=0)
     n_eff = np.prod(x.shape[:2]) / tau
     return n_eff
 
 
-def hpdi(x: NDArray, prob: float = 0.90, axis: int = 0) -> NDArray:
+def hpdi(x: _Array, prob: float = 0.90, axis: int = 0) -> _Array:
     """
     Computes "highest posterior density interval" (HPDI) which is the narrowest
     interval with probability mass ``prob``.
 
-    :param numpy.ndarray x: the input array.
+    :param x: the input array.
+    :type x: numpy.ndarray or jax.Array
     :param float prob: the probability mass of samples within the interval.
     :param int axis: the dimension to calculate hpdi.
     :return: quantiles of ``x`` at ``(1 - prob) / 2`` and
         ``(1 + prob) / 2``.
-    :rtype: numpy.ndarray
+    :rtype: numpy.ndarray or jax.Array
     """
-    x = np.swapaxes(x, axis, 0)
-    sorted_x = np.sort(x, axis=0)
+    xp = _array_module(x)
+    x = xp.swapaxes(x, axis, 0)
+    sorted_x = xp.sort(x, axis=0)
     mass = x.shape[0]
     index_length = int(prob * mass)
     intervals_left = sorted_x[: (mass - index_length)]
@@ -224,15 +248,209 @@ def hpdi(x: NDArray, prob: float = 0.90, axis: int = 0) -> NDArray:
     intervals_length = intervals_right - intervals_left
     index_start = intervals_length.argmin(axis=0)
     index_end = index_start + index_length
-    hpd_left = np.take_along_axis(sorted_x, index_start[None, ...], axis=0)
-    hpd_left = np.swapaxes(hpd_left, axis, 0)
-    hpd_right = np.take_along_axis(sorted_x, index_end[None, ...], axis=0)
-    hpd_right = np.swapaxes(hpd_right, axis, 0)
-    return np.concatenate([hpd_left, hpd_right], axis=axis)
+    hpd_left = xp.take_along_axis(sorted_x, index_start[None, ...], axis=0)
+    hpd_left = xp.swapaxes(hpd_left, axis, 0)
+    hpd_right = xp.take_along_axis(sorted_x, index_end[None, ...], axis=0)
+    hpd_right = xp.swapaxes(hpd_right, axis, 0)
+    return xp.concatenate([hpd_left, hpd_right], axis=axis)
+
+
+def _merge_moments(
+    counts: jax.Array, means: jax.Array, m2s: jax.Array, mask: jax.Array
+) -> tuple[jax.Array, jax.Array, jax.Array]:
+    # Merges Welford moments of the masked groups along the second to last axis
+    # using the parallel algorithm of Chan et al. `counts` and `mask` have shape
+    # `... x K` while `means` and `m2s` have shape `... x K x D`.
+    counts = jnp.where(mask, counts, 0)
+    count = counts.sum(-1)
+    mean = (counts[..., None] * means).sum(-2) / jnp.maximum(count, 1)[..., None]
+    m2 = (
+        jnp.where(mask[..., None], m2s, 0)
+        + counts[..., None] * (means - mean[..., None, :]) ** 2
+    )
+    return count, mean, m2.sum(-2)
+
+
+def _streaming_final(
+    n: jax.Array,
+    batch_size: jax.Array,
+    counts: jax.Array,
+    means: jax.Array,
+    m2s: jax.Array,
+) -> dict:
+    # `means` and `m2s` have shape `num_chains x num_batches x sample_shape`
+    num_chains, num_batches = counts.shape
+    sample_shape = means.shape[2:]
+    means = jnp.reshape(means, (num_chains, num_batches, -1))
+    m2s = jnp.reshape(m2s, (num_chains, num_batches, -1))
+
+    index = jnp.arange(num_batches)
+    num_complete = (n // batch_size)[:, None]
+    complete = index < num_complete
+    half = num_complete // 2
+    first_half = index < half
+    second_half = complete & (index >= num_complete - half)
+
+    count, chain_mean, chain_m2 = _merge_moments(counts, means, m2s, complete)
+    _, mean, m2 = _merge_moments(count, chain_mean, chain_m2, count > 0)
+    num_draws = count.sum()
+    std = jnp.sqrt(m2 / (num_draws - 1))
+
+    # batch means estimate of the asymptotic variance
+    chain_var = chain_m2 / (count - 1)[:, None]
+    batch_var = jnp.where(
+        complete[..., None], (means - chain_mean[:, None, :]) ** 2, 0
+    ).sum(1) / (num_complete - 1)
+    asymptotic_var = (batch_size[:, None] * batch_var).mean(0)
+    n_eff = num_draws * chain_var.mean(0) / asymptotic_var
+
+    # split R-hat over the first and the second halves of each chain
+    split_count, split_mean, split_m2 = (
+        jnp.concatenate(stats)
+        for stats in zip(
+            _merge_moments(counts, means, m2s, first_half),
+            _merge_moments(counts, means, m2s, second_half),
+        )
+    )
+    N = split_count[:, None]
+    var_within = (split_m2 / (N - 1)).mean(0)
+    var_estimator = ((N - 1) / N).mean(0) * var_within + split_mean.var(0, ddof=1)
+    r_hat = jnp.sqrt(var_estimator / var_within)
+
+    return {
+        "mean": jnp.reshape(mean, sample_shape),
+        "std": jnp.reshape(std, sample_shape),
+        "n_eff": jnp.reshape(n_eff, sample_shape),
+        "r_hat": jnp.reshape(r_hat, sample_shape),
+    }
+
+
+def streaming_diagnostics(
+    num_batches: int = 32,
+) -> tuple[Callable, Callable, Callable]:
+    """
+    Implements streaming estimators of mean, standard deviation, effective sample
+    size and split R-hat, which can be updated inside a jitted sampling loop
+    without keeping the samples.
+
+    Each chain keeps Welford moments of `num_batches` consecutive batches of draws.
+    When all batches are filled, adjacent batches are merged, doubling the batch
+    size. Only complete batches are used in the estimates: effective sample size
+    is computed by the batch means method and split R-hat treats the first and the
+    last halves of the complete batches of each chain as separate chains. When the
+    number of draws is `num_batches` times a power of 2, split R-hat is the same
+    as :func:`split_gelman_rubin`.
+
+    **References:**
+
+    1. *Batch means and spectral variance estimators in Markov chain Monte Carlo*,
+       James M. Flegal, Galin L. Jones
+    2. *Algorithms for computing the sample variance: analysis and recommendations*,
+       Tony F. Chan, Gene H. Golub, Randall J. LeVeque
+
+    :param int num_batches: number of batches kept for each chain. It must be a
+        positive even number.
+    :return: a (`init_fn`, `update_fn`, `final_fn`) triple.
+    """
+    assert num_batches > 0 and num_batches % 2 == 0
+
+    def init_fn(sample: _PyTree) -> tuple:
+        """
+        :param sample: a prototype sample of a chain. It can be any pytree of arrays.
+        :return: initial state for the scheme.
+        """
+        moments = jax.tree.map(
+            lambda x: jnp.zeros((num_batches,) + jnp.shape(x), jnp.result_type(float)),
+            sample,
+        )
+        n = jnp.array(0, dtype=jnp.result_type(int))
+        batch_size = jnp.array(1, dtype=jnp.result_type(int))
+        return n, batch_size, jnp.zeros(num_batches), moments, moments
+
+    def merge_batches(state: tuple) -> tuple:
+        n, batch_size, counts, means, m2s = state
+        pair_counts = jnp.reshape(counts, (-1, 2))
+        mask = jnp.ones(pair_counts.shape, dtype=bool)
+
+        def merge(m: jax.Array, m2: jax.Array, i: int) -> jax.Array:
+            shape = (num_batches // 2, 2, -1)
+            merged = _merge_moments(
+                pair_counts, jnp.reshape(m, shape), jnp.reshape(m2, shape), mask
+            )[i]
+            merged = jnp.reshape(merged, (num_batches // 2,) + jnp.shape(m)[1:])
+            return jnp.concatenate([merged, jnp.zeros_like(merged)])
+
+        means, m2s = (
+            jax.tree.map(lambda m, m2: merge(m, m2, 1), means, m2s),
+            jax.tree.map(lambda m, m2: merge(m, m2, 2), means, m2s),
+        )
+        counts = jnp.concatenate([pair_counts.sum(-1), jnp.zeros(num_batches // 2)])
+        return n, 2 * batch_size, counts, means, m2s
+
+    def update_fn(sample: _PyTree, state: tuple) -> tuple:
+        """
+        :param sample: a new sample of the chain.
+        :param state: current state of the scheme.
+        :return: new state for the scheme.
+        """
+        n, batch_size = state[:2]
+        state = lax.cond(
+            n == batch_size * num_batches, merge_batches, lambda x: x, state
+        )
+        n, batch_size, counts, means, m2s = state
+        j = n // batch_size
+        count = counts[j] + 1
+        new_means = jax.tree.map(
+            lambda x, m: m.at[j].add((x - m[j]) / count), sample, means
+        )
+        m2s = jax.tree.map(
+            lambda x, m, new_m, m2: m2.at[j].add((x - m[j]) * (x - new_m[j])),
+            sample,
+            means,
+            new_means,
+            m2s,
+        )
+        return n + 1, batch_size, counts.at[j].set(count), new_means, m2s
+
+    def final_fn(state: tuple) -> _PyTree:
+        """
+        :param state: current state of the scheme, where each array has the chain
+            dimension as its leading dimension.
+        :return: a pytree with the same structure as the samples where each leaf
+            is a dictionary of `mean`, `std`, `n_eff`, and `r_hat` estimates.
+        """
+        n, batch_size, counts, means, m2s = state
+        return jax.tree.map(
+            lambda m, m2: _streaming_final(n, batch_size, counts, m, m2), means, m2s
+        )
+
+    return init_fn, update_fn, final_fn
+
+
+def _site_summary(value: _Array, prob: float) -> OrderedDict:
+    xp = _array_module(value)
+    value_flat = xp.reshape(value, (-1,) + value.shape[2:])
+    hpd = hpdi(value_flat, prob=prob)
+    return OrderedDict(
+        [
+            ("mean", value_flat.mean(axis=0)),
+            ("std", value_flat.std(axis=0, ddof=1)),
+            ("median", xp.median(value_flat, axis=0)),
+            ("{:.1f}%".format(50 * (1 - prob)), hpd[0]),
+            ("{:.1f}%".format(50 * (1 + prob)), hpd[1]),
+            ("n_eff", effective_sample_size(value)),
+            ("r_hat", split_gelman_rubin(value)),
+        ]
+    )
+
+
+@partial(jax.jit, static_argnames="prob")
+def _device_summary(samples: dict, prob: float) -> dict:
+    return {name: _site_summary(value, prob) for name, value in samples.items()}
 
 
 def summary(
-    samples: Union[dict, np.ndarray], prob: float = 0.90, group_by_chain: bool = True
+    samples: Union[dict, _Array], prob: float = 0.90, group_by_chain: bool = True
 ) -> dict:
     """
     Returns a summary table displaying diagnostics of ``samples`` from the
@@ -241,9 +459,12 @@ def summary(
     :func:`~numpyro.diagnostics.effective_sample_size`, and
     :func:`~numpyro.diagnostics.split_gelman_rubin`.
 
+    Diagnostics of all sites stored as JAX arrays are computed on device by a
+    single jitted program, while other sites are processed on host by NumPy.
+
     :param samples: a collection of input samples with left most dimension is chain
         dimension and second to left most dimension is draw dimension.
-    :type samples: dict or numpy.ndarray
+    :type samples: dict, numpy.ndarray or jax.Array
     :param float prob: the probability mass of samples within the HPDI interval.
     :param bool group_by_chain: If True, each variable in `samples` will be treated
         as having shape `num_chains x num_samples x sample_shape`. Otherwise, the
@@ -257,36 +478,21 @@ def summary(
             "Param:{}".format(i): v for i, v in enumerate(jax.tree.flatten(samples)[0])
         }
 
+    samples = {name: value for name, value in samples.items() if len(value) > 0}
+    device_summary = _device_summary(
+        {k: v for k, v in samples.items() if isinstance(v, jax.Array)}, prob
+    )
     summary_dict = {}
     for name, value in samples.items():
-        if len(value) == 0:
-            continue
-        value = device_get(value)
-        value_flat = np.reshape(value, (-1,) + value.shape[2:])
-        mean = value_flat.mean(axis=0)
-        std = value_flat.std(axis=0, ddof=1)
-        median = np.median(value_flat, axis=0)
-        hpd = hpdi(value_flat, prob=prob)
-        n_eff = effective_sample_size(value)
-        r_hat = split_gelman_rubin(value)
-        hpd_lower = "{:.1f}%".format(50 * (1 - prob))
-        hpd_upper = "{:.1f}%".format(50 * (1 + prob))
-        summary_dict[name] = OrderedDict(
-            [
-                ("mean", mean),
-                ("std", std),
-                ("median", median),
-                (hpd_lower, hpd[0]),
-                (hpd_upper, hpd[1]),
-                ("n_eff", n_eff),
-                ("r_hat", r_hat),
-            ]
-        )
+        if name in device_summary:
+            summary_dict[name] = device_summary[name]
+        else:
+            summary_dict[name] = _site_summary(value, prob)
     return summary_dict
 
 
 def print_summary(
-    samples: Union[dict, NDArray], prob: float = 0.90, group_by_chain: bool = True
+    samples: Union[dict, _Array], prob: float = 0.90, group_by_chain: bool = True
 ) -> None:
     """
     Prints a summary table displaying diagnostics of ``samples`` from the
@@ -310,7 +516,8 @@ def print_summary(
         samples = {
             "Param:{}".format(i): v for i, v in enumerate(jax.tree.flatten(samples)[0])
         }
-    summary_dict = summary(samples, prob, group_by_chain=True)
+    # transfer the (small) summary statistics to host for printing
+    summary_dict = device_get(summary(samples, prob, group_by_chain=True))
     if not summary_dict:
         return
 
@@ -3,6 +3,7 @@
 
 
 from numpyro.infer.barker import BarkerMH
+from numpyro.infer.chees import ChEESHMC
 from numpyro.infer.elbo import (
     ELBO,
     RenyiELBO,
@@ -22,11 +23,16 @@ from numpyro.infer.initialization import (
     init_to_uniform,
     init_to_value,
 )
+from numpyro.infer.mclmc import MCLMC
 from numpyro.infer.mcmc import MCMC
 from numpyro.infer.mixed_hmc import MixedHMC
+from numpyro.infer.pathfinder import Pathfinder
+from numpyro.infer.replica_exchange import ReplicaExchange
+from numpyro.infer.rmhmc import RMHMC
 from numpyro.infer.sa import SA
-from numpyro.infer.svi import SVI
+from numpyro.infer.svi import SVI, DataParallelSVI
 from numpyro.infer.util import Predictive, log_likelihood
+from numpyro.infer.vectorized_nuts import VectorizedNUTS
 
 from . import autoguide, reparam
 
@@ -42,21 +48,28 @@ __all__ = [
     "log_likelihood",
     "reparam",
     "BarkerMH",
+    "ChEESHMC",
+    "DataParallelSVI",
     "DiscreteHMCGibbs",
     "ELBO",
     "ESS",
     "HMC",
     "HMCECS",
     "HMCGibbs",
+    "MCLMC",
     "MCMC",
     "MixedHMC",
     "NUTS",
+    "Pathfinder",
     "Predictive",
     "RenyiELBO",
+    "ReplicaExchange",
+    "RMHMC",
     "SA",
     "SVI",
     "Trace_ELBO",
     "TraceEnum_ELBO",
     "TraceGraph_ELBO",
     "TraceMeanField_ELBO",
+    "VectorizedNUTS",
 ]
@@ -0,0 +1,470 @@
+# Copyright Contributors to the Pyro project.
+# SPDX-License-Identifier: Apache-2.0
+
+from collections import namedtuple
+from functools import partial
+
+import jax
+from jax import lax, random, value_and_grad, vmap
+from jax.flatten_util import ravel_pytree
+import jax.numpy as jnp
+
+from numpyro.infer.ensemble_util import batch_ravel_pytree
+from numpyro.infer.hmc_util import (
+    dual_averaging,
+    euclidean_kinetic_energy,
+    find_reasonable_step_size,
+)
+from numpyro.infer.initialization import init_to_uniform
+from numpyro.infer.mcmc import MCMCKernel
+from numpyro.infer.util import initialize_model
+from numpyro.util import identity, is_prng_key
+
+ChEESState = namedtuple(
+    "ChEESState",
+    [
+        "i",
+        "z",
+        "z_grad",
+        "potential_energy",
+        "num_steps",
+        "accept_prob",
+        "mean_accept_prob",
+        "diverging",
+        "adapt_state",
+        "rng_key",
+    ],
+)
+"""
+A :func:`~collections.namedtuple` consisting of the following fields. Fields
+``z``, ``z_grad``, ``potential_energy``, ``num_steps``, ``accept_prob`` and
+``diverging`` have a leading dimension of size `num_chains`.
+
+ - **i** - iteration.
+ - **z** - Python collection representing values (unconstrained samples from
+   the posterior) at latent sites.
+ - **z_grad** - Gradient of potential energy w.r.t. latent sample sites.
+ - **potential_energy** - Potential energy computed at the given value of ``z``.
+ - **num_steps** - Number of leapfrog steps of the current trajectory, which is
+   shared by all chains.
+ - **accept_prob** - Acceptance probability of the proposal. Note that ``z``
+   does not correspond to the proposal if it is rejected.
+ - **mean_accept_prob** - Mean acceptance probability over chains until current
+   iteration during warmup adaptation or sampling (for diagnostics).
+ - **diverging** - A boolean value to indicate whether the current trajectory is diverging.
+ - **adapt_state** - A ``ChEESAdaptState`` namedtuple which contains adaptation information
+   during warmup:
+
+   + **step_size** - Step size to be used by the integrator in the next iteration.
+   + **trajectory_length** - The (maximal) trajectory length of the next iteration.
+   + **inverse_mass_matrix** - The diagonal inverse mass matrix to be used for the
+     next iteration.
+   + **ss_state** - Dual averaging state of the log step size.
+   + **log_trajectory_length** - Logarithm of the unjittered trajectory length.
+   + **adam_state** - A pair of the first and second moment estimates of the
+     Adam optimizer of the log trajectory length.
+
+ - **rng_key** - random number generator seed used for the iteration.
+"""
+
+ChEESAdaptState = namedtuple(
+    "ChEESAdaptState",
+    [
+        "step_size",
+        "trajectory_length",
+        "inverse_mass_matrix",
+        "ss_state",
+        "log_trajectory_length",
+        "adam_state",
+    ],
+)
+
+
+def _halton(i, num_bits=32):
+    # base-2 van der Corput sequence, used to jitter the trajectory length
+    i = jnp.asarray(i, dtype=jnp.uint32)
+    bits = (i >> jnp.arange(num_bits, dtype=jnp.uint32)) & 1
+    return jnp.sum(bits * 0.5 ** jnp.arange(1, num_bits + 1))
+
+
+class ChEESHMC(MCMCKernel):
+    """
+    Ensemble-adaptive Hamiltonian Monte Carlo, where all chains share a step size,
+    a diagonal mass matrix and a jittered trajectory length that are adapted
+    during warmup using the statistics of the whole ensemble of chains [1].
+    The trajectory length is tuned to maximize the ChEES criterion (the change
+    in the estimate of the squared distance of the chains to their mean) with
+    the Adam optimizer, while the step size is tuned by dual averaging of the
+    harmonic mean of the acceptance probabilities of the chains.
+
+    Because all chains take the same number of leapfrog steps, the chains
+    advance in lockstep and no work is wasted when many chains are vectorized,
+    unlike :class:`~numpyro.infer.hmc.NUTS` where every iteration of the
+    vectorized chains waits for the longest trajectory. This is most useful
+    with hundreds of chains and a short warmup phase.
+
+    .. note:: This kernel must be used with `num_chains` > 1 and
+        `chain_method="vectorized"` in :class:`~numpyro.infer.mcmc.MCMC`.
+
+    **References:**
+
+    1. *An Adaptive-MCMC Scheme for Setting Trajectory Lengths in Hamiltonian Monte Carlo*,
+       Matthew D. Hoffman, Alexey Radul, Pavel Sountsov
+
+    :param model: Python callable containing Pyro :mod:`~numpyro.primitives`.
+        If model is provided, `potential_fn` will be inferred using the model.
+    :param potential_fn: Python callable that computes the potential energy
+        given input parameters. The input parameters to `potential_fn` can be
+        any python collection type, provided that `init_params` argument to
+        :meth:`init` has the same type.
+    :param float step_size: Initial step size, which is refined at the start of
+        the warmup phase. Defaults to 1.
+    :param float trajectory_length: Initial trajectory length. If not specified,
+        it is set to 10 times the initial step size.
+    :param float target_accept_prob: Target harmonic mean of the acceptance
+        probabilities of the chains for step size adaptation. Defaults to 0.651.
+    :param float learning_rate: Learning rate of the Adam optimizer of the log
+        trajectory length. Defaults to 0.025.
+    :param float mass_matrix_decay: Decay rate of the exponential moving average
+        of the cross-chain variances which define the diagonal inverse mass matrix.
+        Defaults to 0.95.
+    :param int max_num_steps: Maximum number of leapfrog steps per iteration.
+        Defaults to 1000.
+    :param bool adapt_step_size: Whether to adapt the step size during warmup.
+        Defaults to True.
+    :param bool adapt_trajectory_length: Whether to adapt the trajectory length
+        during warmup. Defaults to True.
+    :param bool adapt_mass_matrix: Whether to adapt the mass matrix during warmup.
+        Defaults to True.
+    :param callable init_strategy: a per-site initialization function.
+        See :ref:`init_strategy` section for available functions.
+
+    **Example**
+
+    .. doctest::
+
+        >>> import jax
+        >>> import jax.numpy as jnp
+        >>> import numpyro
+        >>> import numpyro.distributions as dist
+        >>> from numpyro.infer import MCMC, ChEESHMC
+
+        >>> def model():
+        ...    x = numpyro.sample("x", dist.Normal().expand([10]))
+        ...    numpyro.sample("obs", dist.Normal(x, 1.0), obs=jnp.ones(10))
+        >>>
+        >>> kernel = ChEESHMC(model)
+        >>> mcmc = MCMC(kernel, num_warmup=200, num_samples=100, num_chains=64,
+        ...             chain_method="vectorized", progress_bar=False)
+        >>> mcmc.run(jax.random.PRNGKey(0))
+    """
+
+    def __init__(
+        self,
+        model=None,
+        potential_fn=None,
+        *,
+        step_size=1.0,
+        trajectory_length=None,
+        target_accept_prob=0.651,
+        learning_rate=0.025,
+        mass_matrix_decay=0.95,
+        max_num_steps=1000,
+        adapt_step_size=True,
+        adapt_trajectory_length=True,
+        adapt_mass_matrix=True,
+        init_strategy=init_to_uniform,
+    ):
+        if not (model is None) ^ (potential_fn is None):
+            raise ValueError("Only one of `model` or `potential_fn` must be specified.")
+        self._model = model
+        self._potential_fn = potential_fn
+        self._step_size = float(step_size)
+        self._trajectory_length = trajectory_length
+        self._target_accept_prob = target_accept_prob
+        self._learning_rate = learning_rate
+        self._mass_matrix_decay = mass_matrix_decay
+        self._max_num_steps = max_num_steps
+        self._adapt_step_size = adapt_step_size
+        self._adapt_trajectory_length = adapt_trajectory_length
+        self._adapt_mass_matrix = adapt_mass_matrix
+        self._init_strategy = init_strategy
+        self._postprocess_fn = None
+        self._num_warmup = 0
+        self._unravel_fn = None
+
+    @property
+    def model(self):
+        return self._model
+
+    @property
+    def sample_field(self):
+        return "z"
+
+    @property
+    def default_fields(self):
+        return ("z", "diverging")
+
+    @property
+    def is_ensemble_kernel(self):
+        return True
+
+    def get_diagnostics_str(self, state):
+        return "{} steps of size {:.2e}. acc. prob={:.2f}".format(
+            state.num_steps[0], state.adapt_state.step_size, state.mean_accept_prob
+        )
+
+    def postprocess_fn(self, args, kwargs):
+        if self._postprocess_fn is None:
+            return identity
+        return self._postprocess_fn(*args, **kwargs)
+
+    def _init_state(self, rng_key, model_args, model_kwargs, init_params):
+        if self._model is not None:
+            (
+                new_params_info,
+                potential_fn_gen,
+                self._postprocess_fn,
+                _,
+            ) = initialize_model(
+                rng_key,
+                self._model,
+                dynamic_args=True,
+                init_strategy=self._init_strategy,
+                model_args=model_args,
+                model_kwargs=model_kwargs,
+            )
+            self._potential_fn = potential_fn_gen(*model_args, **model_kwargs)
+            if init_params is None:
+                init_params = new_params_info.z
+        return init_params
+
+    def _flat_potential_fn(self, x):
+        return self._potential_fn(self._unravel_fn(x))
+
+    def _leapfrog(self, step_size, inverse_mass_matrix, num_steps, x, r, grad):
+        value_and_grad_fn = vmap(value_and_grad(self._flat_potential_fn))
+
+        def body_fn(i, val):
+            x, r, _, grad = val
+            r = r - 0.5 * step_size * grad
+            x = x + step_size * inverse_mass_matrix * r
+            potential_energy, grad = value_and_grad_fn(x)
+            r = r - 0.5 * step_size * grad
+            return x, r, potential_energy, grad
+
+        potential_energy = jnp.zeros(x.shape[:1], dtype=x.dtype)
+        return lax.fori_loop(0, num_steps, body_fn, (x, r, potential_energy, grad))
+
+    def init(
+        self, rng_key, num_warmup, init_params=None, model_args=(), model_kwargs={}
+    ):
+        assert not is_prng_key(rng_key), (
+            "ChEESHMC only supports chain_method='vectorized' with num_chains > 1."
+        )
+        num_chains = rng_key.shape[0]
+        if init_params is not None:
+            assert all(
+                [param.shape[0] == num_chains for param in jax.tree.leaves(init_params)]
+            ), "The batch dimension of each param must match n_chains"
+        rng_key, rng_key_ss, rng_key_init_model = random.split(rng_key[0], 3)
+        init_params = self._init_state(
+            random.split(rng_key_init_model, num_chains),
+            model_args,
+            model_kwargs,
+            init_params,
+        )
+        if self._potential_fn and init_params is None:
+            raise ValueError(
+                "Valid value of `init_params` must be provided with `potential_fn`."
+            )
+        self._num_warmup = num_warmup
+
+        x, _ = batch_ravel_pytree(init_params)
+        self._unravel_fn = ravel_pytree(jax.tree.map(lambda z: z[0], init_params))[1]
+        potential_energy, grad = vmap(value_and_grad(self._flat_potential_fn))(x)
+        inverse_mass_matrix = jnp.ones(x.shape[-1], dtype=x.dtype)
+
+        step_size = self._step_size
+        if self._adapt_step_size:
+            # use the median over chains of the step sizes found by the heuristic of NUTS
+            step_size = jnp.median(
+                vmap(
+                    partial(
+                        find_reasonable_step_size,
+                        self._flat_potential_fn,
+                        euclidean_kinetic_energy,
+                        lambda z, m_inv, key: (
+                            random.normal(key, jnp.shape(z)) / jnp.sqrt(m_inv)
+                        ),
+                        jnp.asarray(step_size, dtype=x.dtype),
+                        inverse_mass_matrix,
+                    )
+                )(
+                    (x, None, potential_energy, grad),
+                    random.split(rng_key_ss, num_chains),
+                )
+            )
+        step_size = jnp.asarray(step_size, dtype=x.dtype)
+        trajectory_length = (
+            10 * step_size
+            if self._trajectory_length is None
+            else jnp.asarray(self._trajectory_length, dtype=x.dtype)
+        )
+        ss_init, _ = dual_averaging()
+        adapt_state = ChEESAdaptState(
+            step_size,
+            trajectory_length,
+            inverse_mass_matrix,
+            ss_init(jnp.log(10) + jnp.log(step_size)),
+            jnp.log(trajectory_length),
+            (jnp.zeros(()), jnp.zeros(())),
+        )
+        return ChEESState(
+            jnp.array(0),
+            init_params,
+            vmap(self._unravel_fn)(grad),
+            potential_energy,
+            jnp.zeros(num_chains, dtype=jnp.result_type(int)),
+            jnp.zeros(num_chains),
+            jnp.zeros(()),
+            jnp.zeros(num_chains, dtype=bool),
+            adapt_state,
+            rng_key,
+        )
+
+    def _adapt(self, i, x, x_new, r_new, x_accepted, accept_prob, jitter, adapt_state):
+        (
+            step_size,
+            trajectory_length,
+            inverse_mass_matrix,
+            ss_state,
+            log_trajectory_length,
+            (adam_m, adam_v),
+        ) = adapt_state
+        t = i + 1
+        if self._adapt_step_size:
+            _, ss_update = dual_averaging()
+            harmonic_mean = 1 / jnp.mean(1 / jnp.clip(accept_prob, 1e-20))
+            ss_state = ss_update(self._target_accept_prob - harmonic_mean, ss_state)
+            log_step_size, log_step_size_avg, *_ = ss_state
+            step_size = jnp.where(
+                t == self._num_warmup,
+                jnp.exp(log_step_size_avg),
+                jnp.exp(log_step_size),
+            )
+            finfo = jnp.finfo(jnp.result_type(step_size))
+            step_size = jnp.clip(step_size, finfo.tiny, finfo.max)
+
+        if self._adapt_trajectory_length:
+            # gradient of the ChEES criterion w.r.t. the log trajectory length,
+            # where the proposals are weighted by their acceptance probabilities
+            weights = accept_prob / jnp.clip(jnp.sum(accept_prob), 1e-20)
+            x_centered = x - jnp.mean(x, 0)
+            x_new_mean = jnp.sum(
+                jnp.where(weights[:, None] > 0, weights[:, None] * x_new, 0.0), 0
+            )
+            x_new_centered = x_new - x_new_mean
+            chees_diff = jnp.sum(x_new_centered**2, -1) - jnp.sum(x_centered**2, -1)
+            velocity = inverse_mass_matrix * r_new
+            grads = (
+                trajectory_length
+                * jitter
+                * chees_diff
+                * jnp.sum(x_new_centered * velocity, -1)
+            )
+            grad = jnp.sum(jnp.where(jnp.isfinite(grads), weights * grads, 0.0))
+            # Adam ascent step with beta1 = 0, beta2 = 0.95 as in reference [1]
+            adam_m = grad
+            adam_v = 0.95 * adam_v + 0.05 * grad**2
+            adam_v_hat = adam_v / (1 - 0.95**t)
+            log_trajectory_length = (
+                log_trajectory_length
+                + self._learning_rate * adam_m / (jnp.sqrt(adam_v_hat) + 1e-8)
+            )
+            log_trajectory_length = jnp.clip(
+                log_trajectory_length,
+                jnp.log(step_size),
+                jnp.log(self._max_num_steps * step_size),
+            )
+            trajectory_length = jnp.exp(log_trajectory_length)
+
+        if self._adapt_mass_matrix:
+            # regularize the cross-chain variances as in the Welford scheme of HMC
+            n = x_accepted.shape[0]
+            var = jnp.var(x_accepted, 0, ddof=1)
+            var = (n / (n + 5.0)) * var + 1e-3 * (5.0 / (n + 5.0))
+            var = jnp.where(jnp.isfinite(var), var, inverse_mass_matrix)
+            inverse_mass_matrix = (
+                self._mass_matrix_decay * inverse_mass_matrix
+                + (1 - self._mass_matrix_decay) * var
+            )
+
+        return ChEESAdaptState(
+            step_size,
+            trajectory_length,
+            inverse_mass_matrix,
+            ss_state,
+            log_trajectory_length,
+            (adam_m, adam_v),
+        )
+
+    def sample(self, state, model_args, model_kwargs):
+        i, z, z_grad, potential_energy, _, _, mean_accept_prob, _, adapt_state, key = (
+            state
+        )
+        rng_key, rng_key_momentum, rng_key_accept = random.split(key, 3)
+        x, _ = batch_ravel_pytree(z)
+        grad, _ = batch_ravel_pytree(z_grad)
+        num_chains = x.shape[0]
+        step_size = adapt_state.step_size
+        inverse_mass_matrix = adapt_state.inverse_mass_matrix
+
+        # all chains share the same jittered number of leapfrog steps
+        jitter = _halton(i + 1)
+        num_steps = jnp.clip(
+            jnp.ceil(jitter * adapt_state.trajectory_length / step_size),
+            1,
+            self._max_num_steps,
+        ).astype(jnp.result_type(int))
+        r = random.normal(rng_key_momentum, x.shape) / jnp.sqrt(inverse_mass_matrix)
+        x_new, r_new, potential_energy_new, grad_new = self._leapfrog(
+            step_size, inverse_mass_matrix, num_steps, x, r, grad
+        )
+        kinetic_fn = vmap(euclidean_kinetic_energy, (None, 0))
+        energy = potential_energy + kinetic_fn(inverse_mass_matrix, r)
+        energy_new = potential_energy_new + kinetic_fn(inverse_mass_matrix, r_new)
+        delta_energy = jnp.where(
+            jnp.isnan(energy_new - energy), jnp.inf, energy_new - energy
+        )
+        diverging = delta_energy > 1000
+        accept_prob = jnp.clip(jnp.exp(-delta_energy), None, 1.0)
+        accepted = random.uniform(rng_key_accept, (num_chains,)) < accept_prob
+        x_accepted = jnp.where(accepted[:, None], x_new, x)
+        grad_accepted = jnp.where(accepted[:, None], grad_new, grad)
+        potential_energy = jnp.where(accepted, potential_energy_new, potential_energy)
+
+        if self._num_warmup > 0:
+            adapt_state = lax.cond(
+                i < self._num_warmup,
+                lambda args: self._adapt(*args),
+                lambda args: args[-1],
+                (i, x, x_new, r_new, x_accepted, accept_prob, jitter, adapt_state),
+            )
+        itr = i + 1
+        n = jnp.where(i < self._num_warmup, itr, itr - self._num_warmup)
+        mean_accept_prob = (
+            mean_accept_prob + (jnp.mean(accept_prob) - mean_accept_prob) / n
+        )
+        return ChEESState(
+            itr,
+            vmap(self._unravel_fn)(x_accepted),
+            vmap(self._unravel_fn)(grad_accepted),
+            potential_energy,
+            jnp.full(num_chains, num_steps),
+            accept_prob,
+            mean_accept_prob,
+            diverging,
+            adapt_state,
+            rng_key,
+        )
@@ -6,6 +6,7 @@ from __future__ import annotations
 from collections import OrderedDict, defaultdict
 from collections.abc import Callable
 from functools import partial
+import math
 from typing import TYPE_CHECKING, Any, TypedDict, TypeVar
 import warnings
 
@@ -16,6 +17,11 @@ except ImportError:
 
 import jax
 from jax import eval_shape, random, vmap
+
+try:
+    from jax.extend.core import ClosedJaxpr, Jaxpr
+except ImportError:
+    from jax.core import ClosedJaxpr, Jaxpr
 from jax.lax import stop_gradient
 import jax.numpy as jnp
 from jax.scipy.special import logsumexp
@@ -32,13 +38,19 @@ from numpyro.handlers import (
     trace,
 )
 from numpyro.infer.util import (
+    _default_remat,
     _without_rsample_stop_gradient,
     compute_log_probs,
     get_importance_trace,
     is_identically_one,
 )
 from numpyro.ops.provenance import eval_provenance
-from numpyro.util import _validate_model, check_model_guide_match, find_stack_level
+from numpyro.util import (
+    _validate_model,
+    check_model_guide_match,
+    find_stack_level,
+    soft_vmap,
+)
 
 if TYPE_CHECKING:
     T = TypeVar("T")
@@ -56,6 +68,91 @@ def _apply_vmap(fn: Callable, keys: T) -> T:
     return vmap(fn)(keys)
 
 
+def _sub_jaxprs(params: dict) -> list[Jaxpr]:
+    jaxprs = []
+    for value in params.values():
+        for v in value if isinstance(value, (tuple, list)) else (value,):
+            if isinstance(v, ClosedJaxpr):
+                jaxprs.append(v.jaxpr)
+            elif isinstance(v, Jaxpr):
+                jaxprs.append(v)
+    return jaxprs
+
+
+def _jaxpr_nbytes(jaxpr: Jaxpr) -> int:
+    nbytes = 0
+    for eqn in jaxpr.eqns:
+        for var in eqn.outvars:
+            aval = var.aval
+            if hasattr(aval, "shape") and hasattr(aval, "dtype"):
+                nbytes += math.prod(aval.shape) * aval.dtype.itemsize
+        sub_nbytes = [_jaxpr_nbytes(sub_jaxpr) for sub_jaxpr in _sub_jaxprs(eqn.params)]
+        if not sub_nbytes:
+            continue
+        if eqn.primitive.name == "cond":
+            # only one branch is evaluated
+            nbytes += max(sub_nbytes)
+        elif eqn.primitive.name == "scan":
+            # the gradient stores the intermediate values of every step
+            nbytes += eqn.params["length"] * sum(sub_nbytes)
+        else:
+            nbytes += sum(sub_nbytes)
+    return nbytes
+
+
+def _estimate_nbytes(fn: Callable, x: T) -> int:
+    # Upper bound of the memory used by `fn` and its gradient, given by the total
+    # size of the values computed by its operations, including the operations in
+    # the bodies of control flow and jitted functions.
+    return _jaxpr_nbytes(jax.make_jaxpr(fn)(x).jaxpr)
+
+
+def chunked_vmap(
+    chunk_size: int | None = None, memory_budget: int | None = None
+) -> mapT:
+    """
+    Returns a vectorization strategy for the `vectorize_particles` argument of ELBO
+    objectives, which uses `jax.vmap` over chunks of `chunk_size` particles and
+    `jax.lax.map` over the chunks (see :func:`~numpyro.util.soft_vmap`). Each chunk
+    is rematerialized with `jax.checkpoint` when computing gradients, so that only
+    the intermediate values of a single chunk are stored at a time.
+
+    **Example:**
+
+    .. code-block:: python
+
+        # vmap over chunks of 8 particles
+        elbo = Trace_ELBO(num_particles=64, vectorize_particles=chunked_vmap(8))
+        # chunks whose intermediate values take at most 1GB
+        elbo = Trace_ELBO(
+            num_particles=64, vectorize_particles=chunked_vmap(memory_budget=2**30)
+        )
+
+    :param int chunk_size: the number of particles in a chunk.
+    :param int memory_budget: if `chunk_size` is None, the chunk size is chosen so
+        that the estimated size in bytes of the intermediate values of a chunk is at
+        most `memory_budget`. The estimate is an upper bound, given by the total size
+        of the values computed for a particle, where the values computed in the body
+        of a `scan` are counted for each step.
+    :return: a callable which maps a function over an array of random keys.
+    """
+    if (chunk_size is None) == (memory_budget is None):
+        raise ValueError(
+            "Exactly one of `chunk_size` and `memory_budget` should be provided."
+        )
+    if chunk_size is not None and chunk_size < 1:
+        raise ValueError("`chunk_size` should be a positive integer.")
+
+    def map_fn(fn: Callable, keys: T) -> T:
+        size = chunk_size
+        if size is None:
+            particle_nbytes = _estimate_nbytes(fn, keys[0])
+            size = max(1, memory_budget // max(particle_nbytes, 1))
+        return soft_vmap(jax.checkpoint(fn), keys, chunk_size=size)
+
+    return map_fn
+
+
 class ELBO:
     """
     Base class for all ELBO objectives.
@@ -67,7 +164,14 @@ class ELBO:
     :param vectorize_particles: Whether to use `jax.vmap` to compute ELBOs over the
         num_particles-many particles in parallel. If False use `jax.lax.map`.
         Defaults to True. You can also pass a callable to specify a custom vectorization
-        strategy, for example `jax.pmap`.
+        strategy, for example `jax.pmap`, or :func:`chunked_vmap` to bound the memory
+        used by the particles.
+    :param remat: Whether to rematerialize the steps of the
+        :func:`~numpyro.contrib.control_flow.scan` primitives in the model and the
+        guide which do not specify `remat`, i.e. to recompute their intermediate
+        values in the backward pass rather than to store them for all steps. Either a
+        boolean, a checkpoint policy such as ``jax.checkpoint_policies.dots_saveable``
+        or its name. Defaults to False.
     """
 
     """
@@ -77,9 +181,15 @@ class ELBO:
     """
     can_infer_discrete = False
 
-    def __init__(self, num_particles: int = 1, vectorize_particles: bool | mapT = True):
+    def __init__(
+        self,
+        num_particles: int = 1,
+        vectorize_particles: bool | mapT = True,
+        remat: bool | str | Callable = False,
+    ):
         self.num_particles = num_particles
         self.vectorize_particles = vectorize_particles
+        self.remat = remat
         self.vectorize_particles_fn = self._assign_vectorize_particles_fn(
             vectorize_particles
         )
@@ -97,6 +207,12 @@ class ELBO:
                 "`vectorize_particles` needs to be a boolean or a callable."
             )
 
+    def _remat_model(self, model: ModelT[P]) -> ModelT[P]:
+        """Sets the rematerialization policy of the `scan` primitives in `model`."""
+        if self.remat is None or self.remat is False:
+            return model
+        return _default_remat(model, remat=self.remat)
+
     def loss(
         self,
         rng_key: jax.Array,
@@ -150,6 +266,17 @@ class ELBO:
         """
         raise NotImplementedError("This ELBO objective does not support mutable state.")
 
+    def init_mutable_state(self, guide_trace: TraceT) -> MutableStateT:
+        """
+        Returns the initial values of the state of the objective itself (e.g. running
+        averages of baselines), which is stored with the values at
+        :func:`~numpyro.mutable` sites in the mutable state of SVI.
+
+        :param guide_trace: a trace of the guide.
+        :return: dictionary of initial values.
+        """
+        return {}
+
 
 class Trace_ELBO(ELBO):
     """
@@ -177,7 +304,14 @@ class Trace_ELBO(ELBO):
     :param vectorize_particles: Whether to use `jax.vmap` to compute ELBOs over the
         num_particles-many particles in parallel. If False use `jax.lax.map`.
         Defaults to True. You can also pass a callable to specify a custom vectorization
-        strategy, for example `jax.pmap`.
+        strategy, for example `jax.pmap`, or :func:`chunked_vmap` to bound the memory
+        used by the particles.
+    :param remat: Whether to rematerialize the steps of the
+        :func:`~numpyro.contrib.control_flow.scan` primitives in the model and the
+        guide which do not specify `remat`, i.e. to recompute their intermediate
+        values in the backward pass rather than to store them for all steps. Either a
+        boolean, a checkpoint policy such as ``jax.checkpoint_policies.dots_saveable``
+        or its name. Defaults to False.
     :param multi_sample_guide: Whether to make an assumption that the guide proposes
         multiple samples.
     :param sum_sites: Whether to sum the ELBO contributions from all sites or return the
@@ -190,11 +324,14 @@ class Trace_ELBO(ELBO):
         vectorize_particles: bool = True,
         multi_sample_guide: bool = False,
         sum_sites: bool = True,
+        remat: bool | str | Callable = False,
     ):
         self.multi_sample_guide = multi_sample_guide
         self.sum_sites = sum_sites
         super().__init__(
-            num_particles=num_particles, vectorize_particles=vectorize_particles
+            num_particles=num_particles,
+            vectorize_particles=vectorize_particles,
+            remat=remat,
         )
 
     def loss_with_mutable_state(
@@ -206,6 +343,8 @@ class Trace_ELBO(ELBO):
         *args: P.args,
         **kwargs: P.kwargs,
     ) -> LossWithMutableState:
+        model, guide = self._remat_model(model), self._remat_model(guide)
+
         def single_particle_elbo(
             rng_key: jax.Array,
         ) -> tuple[LossT, MutableStateT | None]:
@@ -363,9 +502,16 @@ class TraceMeanField_ELBO(ELBO):
     :param vectorize_particles: Whether to use `jax.vmap` to compute ELBOs over the
         num_particles-many particles in parallel. If False use `jax.lax.map`.
         Defaults to True. You can also pass a callable to specify a custom vectorization
-        strategy, for example `jax.pmap`.
+        strategy, for example `jax.pmap`, or :func:`chunked_vmap` to bound the memory
+        used by the particles.
     :param sum_sites: Whether to sum the ELBO contributions from all sites or return the
         contributions as a dictionary keyed by site.
+    :param remat: Whether to rematerialize the steps of the
+        :func:`~numpyro.contrib.control_flow.scan` primitives in the model and the
+        guide which do not specify `remat`, i.e. to recompute their intermediate
+        values in the backward pass rather than to store them for all steps. Either a
+        boolean, a checkpoint policy such as ``jax.checkpoint_policies.dots_saveable``
+        or its name. Defaults to False.
 
     .. warning:: This estimator may give incorrect results if the mean-field
         condition is not satisfied.
@@ -384,9 +530,10 @@ class TraceMeanField_ELBO(ELBO):
         num_particles: int = 1,
         vectorize_particles: bool = True,
         sum_sites: bool = True,
+        remat: bool | str | Callable = False,
     ) -> None:
         self.sum_sites = sum_sites
-        super().__init__(num_particles, vectorize_particles)
+        super().__init__(num_particles, vectorize_particles, remat)
 
     def loss_with_mutable_state(
         self,
@@ -397,6 +544,8 @@ class TraceMeanField_ELBO(ELBO):
         *args: P.args,
         **kwargs: P.kwargs,
     ) -> LossWithMutableState:
+        model, guide = self._remat_model(model), self._remat_model(guide)
+
         def single_particle_elbo(
             rng_key: jax.Array,
         ) -> tuple[LossT, MutableStateT | None]:
@@ -497,7 +646,14 @@ class RenyiELBO(ELBO):
     :param vectorize_particles: Whether to use `jax.vmap` to compute ELBOs over the
         num_particles-many particles in parallel. If False use `jax.lax.map`.
         Defaults to True. You can also pass a callable to specify a custom vectorization
-        strategy, for example `jax.pmap`.
+        strategy, for example `jax.pmap`, or :func:`chunked_vmap` to bound the memory
+        used by the particles.
+    :param remat: Whether to rematerialize the steps of the
+        :func:`~numpyro.contrib.control_flow.scan` primitives in the model and the
+        guide which do not specify `remat`, i.e. to recompute their intermediate
+        values in the backward pass rather than to store them for all steps. Either a
+        boolean, a checkpoint policy such as ``jax.checkpoint_policies.dots_saveable``
+        or its name. Defaults to False.
 
     Example::
 
@@ -526,14 +682,24 @@ class RenyiELBO(ELBO):
     2. *Importance Weighted Autoencoders*, Yuri Burda, Roger Grosse, Ruslan Salakhutdinov
     """
 
-    def __init__(self, alpha: float = 0, num_particles: int = 2) -> None:
+    def __init__(
+        self,
+        alpha: float = 0,
+        num_particles: int = 2,
+        vectorize_particles: bool | mapT = True,
+        remat: bool | str | Callable = False,
+    ) -> None:
         if alpha == 1:
             raise ValueError(
                 "The order alpha should not be equal to 1. Please use ELBO class"
                 "for the case alpha = 1."
             )
         self.alpha = alpha
-        super().__init__(num_particles=num_particles)
+        super().__init__(
+            num_particles=num_particles,
+            vectorize_particles=vectorize_particles,
+            remat=remat,
+        )
 
     def _single_particle_elbo(
         self,
@@ -618,6 +784,7 @@ class RenyiELBO(ELBO):
         *args: P.args,
         **kwargs: P.kwargs,
     ) -> jax.Array:
+        model, guide = self._remat_model(model), self._remat_model(guide)
         plate_key, rng_key = random.split(rng_key)
         model = seed(
             model, plate_key, hide_types=["sample", "prng_key", "control_flow"]
@@ -799,6 +966,37 @@ def get_nonreparam_deps(
     return model_deps, guide_deps
 
 
+def _get_baseline_options(site: Message) -> tuple[bool, float, Any]:
+    """
+    Extracts the baseline options from the ``infer`` dict of a guide sample site.
+    """
+    options = (site.get("infer") or {}).get("baseline", {})
+    unknown_options = set(options) - {
+        "use_decaying_avg_baseline",
+        "baseline_beta",
+        "baseline_value",
+    }
+    if unknown_options:
+        raise ValueError(
+            "Unknown baseline options {} at site `{}`.".format(
+                sorted(unknown_options), site["name"]
+            )
+        )
+    use_decaying_avg_baseline = options.get("use_decaying_avg_baseline", False)
+    baseline_beta = options.get("baseline_beta", 0.90)
+    baseline_value = options.get("baseline_value")
+    if use_decaying_avg_baseline and baseline_value is not None:
+        raise ValueError(
+            "At site `{}`, `use_decaying_avg_baseline` and `baseline_value` cannot be"
+            " used together.".format(site["name"])
+        )
+    return use_decaying_avg_baseline, baseline_beta, baseline_value
+
+
+def _baseline_avg_name(name: str) -> str:
+    return "{}_baseline_avg".format(name)
+
+
 class TraceGraph_ELBO(ELBO):
     """
     A TraceGraph implementation of ELBO-based SVI. The gradient estimator
@@ -810,6 +1008,26 @@ class TraceGraph_ELBO(ELBO):
     In particular provenance tracking [2] is used to find the ``cost`` terms
     that depend on each non-reparameterizable sample site.
 
+    The variance of the score function term of a non-reparameterizable sample site
+    can be further reduced by subtracting a baseline from its downstream cost [3].
+    Baselines are specified with the ``infer`` dict of the site in the guide::
+
+        # a decaying average of the downstream cost
+        numpyro.sample("z", dist.Bernoulli(p), infer={"baseline": {
+            "use_decaying_avg_baseline": True, "baseline_beta": 0.95}})
+
+        # a value computed by the guide, e.g. by a neural network
+        numpyro.sample("z", dist.Bernoulli(p), infer={"baseline": {
+            "baseline_value": baseline_net(x)}})
+
+    The decaying averages (with decay rate ``baseline_beta``, 0.90 by default) are
+    stored in the mutable state of :class:`~numpyro.infer.svi.SVI`. A
+    ``baseline_value`` is trained by minimizing its squared distance to the
+    downstream cost, which is added to the loss with a zero value, so its parameters
+    should not be shared with the rest of the guide. With `num_particles > 1` and
+    `leave_one_out_baseline=True`, the sites without a baseline use the average of
+    the downstream costs of the other particles as a baseline [4].
+
     References
 
     [1] `Gradient Estimation Using Stochastic Computation Graphs`,
@@ -817,18 +1035,55 @@ class TraceGraph_ELBO(ELBO):
 
     [2] `Nonstandard Interpretations of Probabilistic Programs for Efficient Inference`,
         David Wingate, Noah Goodman, Andreas Stuhlmüller, Jeffrey Siskind
+
+    [3] `Neural Variational Inference and Learning in Belief Networks`,
+        Andriy Mnih, Karol Gregor
+
+    [4] `Buy 4 REINFORCE Samples, Get a Baseline for Free!`,
+        Wouter Kool, Herke van Hoof, Max Welling
+
+    :param num_particles: The number of particles/samples used to form the ELBO
+        (gradient) estimators.
+    :param vectorize_particles: Whether to use `jax.vmap` to compute ELBOs over the
+        num_particles-many particles in parallel. If False use `jax.lax.map`.
+        Defaults to True. You can also pass a callable to specify a custom vectorization
+        strategy, for example :func:`chunked_vmap`.
+    :param remat: Whether to rematerialize the steps of the
+        :func:`~numpyro.contrib.control_flow.scan` primitives in the model and the
+        guide which do not specify `remat`, i.e. to recompute their intermediate
+        values in the backward pass rather than to store them for all steps. Either a
+        boolean, a checkpoint policy such as ``jax.checkpoint_policies.dots_saveable``
+        or its name. Defaults to False.
+    :param leave_one_out_baseline: Whether to use leave-one-out baselines for the
+        sites without a baseline when `num_particles > 1`. Defaults to False.
     """
 
     can_infer_discrete = True
 
     def __init__(
-        self, num_particles: int = 1, vectorize_particles: bool = True
+        self,
+        num_particles: int = 1,
+        vectorize_particles: bool = True,
+        leave_one_out_baseline: bool = False,
+        remat: bool | str | Callable = False,
     ) -> None:
+        self.leave_one_out_baseline = leave_one_out_baseline
         super().__init__(
-            num_particles=num_particles, vectorize_particles=vectorize_particles
+            num_particles=num_particles,
+            vectorize_particles=vectorize_particles,
+            remat=remat,
         )
 
-    def loss(
+    def init_mutable_state(self, guide_trace: TraceT) -> MutableStateT:
+        mutable_state = {}
+        for name, site in guide_trace.items():
+            if site["type"] == "sample" and not site.get("is_observed", False):
+                if _get_baseline_options(site)[0]:
+                    log_prob = site["fn"].log_prob(site["value"])
+                    mutable_state[_baseline_avg_name(name)] = jnp.zeros_like(log_prob)
+        return mutable_state
+
+    def loss_with_mutable_state(
         self,
         rng_key: jax.Array,
         param_map: dict[str, jax.Array],
@@ -836,23 +1091,11 @@ class TraceGraph_ELBO(ELBO):
         guide: ModelT[P],
         *args: P.args,
         **kwargs: P.kwargs,
-    ) -> jax.Array:
-        """
-        Evaluates the ELBO with an estimator that uses num_particles many samples/particles.
-
-        :param jax.random.PRNGKey rng_key: random number generator seed.
-        :param dict param_map: dictionary of current parameter values keyed by site
-            name.
-        :param model: Python callable with NumPyro primitives for the model.
-        :param guide: Python callable with NumPyro primitives for the guide.
-        :param args: arguments to the model / guide (these can possibly vary during
-            the course of fitting).
-        :param kwargs: keyword arguments to the model / guide (these can possibly vary
-            during the course of fitting).
-        :return: negative of the Evidence Lower Bound (ELBO) to be minimized.
-        """
+    ) -> LossWithMutableState:
+        model, guide = self._remat_model(model), self._remat_model(guide)
+        baseline_options = {}
 
-        def single_particle_elbo(rng_key: jax.Array) -> jax.Array:
+        def single_particle_elbo(rng_key: jax.Array) -> tuple[jax.Array, dict, dict]:
             model_seed, guide_seed = random.split(rng_key)
             seeded_model = seed(model, model_seed)
             seeded_guide = seed(guide, guide_seed)
@@ -895,25 +1138,79 @@ class TraceGraph_ELBO(ELBO):
                             (site["cond_indep_stack"], -site["log_prob"])
                         )
 
+            # the score function terms are formed after all particles are drawn, so
+            # that baselines can depend on the downstream costs of other particles
+            score_terms = {}
             for node, cost in downstream_costs.items():
                 guide_site = guide_trace[node]
                 downstream_cost = cost.sum_to(guide_site["cond_indep_stack"])
-                surrogate = jnp.sum(
-                    guide_site["log_prob"] * stop_gradient(downstream_cost)
+                options = _get_baseline_options(guide_site)
+                baseline_options[node] = options[:2]
+                score_terms[node] = (
+                    guide_site["log_prob"],
+                    stop_gradient(downstream_cost),
+                    options[2],
                 )
-                elbo = elbo + surrogate - stop_gradient(surrogate)
 
-            return elbo
+            mutable_state = {
+                name: site["value"]
+                for tr in (guide_trace, model_trace)
+                for name, site in tr.items()
+                if site["type"] == "mutable"
+            }
+            return elbo, score_terms, mutable_state
 
-        # Return (-elbo) since by convention we do gradient descent on a loss and
-        # the ELBO is a lower bound that needs to be maximized.
         if self.num_particles == 1:
-            return -single_particle_elbo(rng_key)
+            elbos, score_terms, mutable_state = jax.tree.map(
+                lambda x: x[None], single_particle_elbo(rng_key)
+            )
         else:
             rng_keys = random.split(rng_key, self.num_particles)
-            return -jnp.mean(
-                self.vectorize_particles_fn(single_particle_elbo, rng_keys)
+            elbos, score_terms, mutable_state = self.vectorize_particles_fn(
+                single_particle_elbo, rng_keys
+            )
+        # values at mutable sites are taken from the first particle
+        mutable_state = jax.tree.map(lambda x: x[0], mutable_state)
+
+        surrogate = jnp.array(0.0)
+        baseline_loss = jnp.array(0.0)
+        for node, (log_prob, downstream_cost, baseline_value) in score_terms.items():
+            use_decaying_avg_baseline, baseline_beta = baseline_options[node]
+            avg_name = _baseline_avg_name(node)
+            baseline = 0.0
+            if use_decaying_avg_baseline and avg_name in param_map:
+                avg_downstream_cost = param_map[avg_name]
+                baseline = avg_downstream_cost
+                new_avg_downstream_cost = baseline_beta * avg_downstream_cost + (
+                    1 - baseline_beta
+                ) * jnp.mean(downstream_cost, 0)
+                mutable_state[avg_name] = jnp.broadcast_to(
+                    new_avg_downstream_cost, jnp.shape(avg_downstream_cost)
+                )
+            elif baseline_value is not None:
+                baseline = baseline_value
+                baseline_loss = baseline_loss + jnp.sum(
+                    (downstream_cost - baseline_value) ** 2
+                )
+            elif self.leave_one_out_baseline and self.num_particles > 1:
+                baseline = (
+                    jnp.sum(downstream_cost, 0, keepdims=True) - downstream_cost
+                ) / (self.num_particles - 1)
+            surrogate = surrogate + jnp.sum(
+                log_prob * stop_gradient(downstream_cost - baseline)
             )
+        surrogate = surrogate / self.num_particles
+        baseline_loss = baseline_loss / self.num_particles
+
+        elbo = (
+            jnp.mean(elbos)
+            + surrogate
+            - stop_gradient(surrogate)
+            - (baseline_loss - stop_gradient(baseline_loss))
+        )
+        # Return (-elbo) since by convention we do gradient descent on a loss and
+        # the ELBO is a lower bound that needs to be maximized.
+        return {"loss": -elbo, "mutable_state": mutable_state or None}
 
 
 def get_importance_trace_enum(
@@ -1125,10 +1422,13 @@ class TraceEnum_ELBO(ELBO):
         # float("inf") serves as a sentinel to use guess_max_plate_nesting
         max_plate_nesting: int = float("inf"),  # type: ignore
         vectorize_particles: bool = True,
+        remat: bool | str | Callable = False,
     ) -> None:
         self.max_plate_nesting = max_plate_nesting
         super().__init__(
-            num_particles=num_particles, vectorize_particles=vectorize_particles
+            num_particles=num_particles,
+            vectorize_particles=vectorize_particles,
+            remat=remat,
         )
 
     def loss(
@@ -1140,6 +1440,8 @@ class TraceEnum_ELBO(ELBO):
         *args: P.args,
         **kwargs: P.kwargs,
     ) -> jax.Array:
+        model, guide = self._remat_model(model), self._remat_model(guide)
+
         def single_particle_elbo(rng_key: jax.Array) -> jax.Array:
             import funsor
             from numpyro.contrib.funsor import to_data
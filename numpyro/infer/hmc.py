@@ -13,6 +13,11 @@ import jax.numpy as jnp
 
 from numpyro.infer.hmc_util import (
     IntegratorState,
+    LowRankMatrix,
+    _batched_matvec,
+    _low_rank_sqrt_matvec,
+    _parse_low_rank,
+    _unstack_blocks,
     build_tree,
     euclidean_kinetic_energy,
     find_reasonable_step_size,
@@ -22,6 +27,7 @@ from numpyro.infer.hmc_util import (
 from numpyro.infer.mcmc import MCMCKernel
 from numpyro.infer.util import (
     ParamInfo,
+    _default_remat,
     find_stack_level,
     init_to_uniform,
     initialize_model,
@@ -44,7 +50,9 @@ HMCState = namedtuple(
         "diverging",
         "adapt_state",
         "rng_key",
+        "tree_depth_state",
     ],
+    defaults=(None,),
 )
 """
 A :func:`~collections.namedtuple` consisting of the following fields:
@@ -76,11 +84,30 @@ A :func:`~collections.namedtuple` consisting of the following fields:
      iteration.
    + **mass_matrix_sqrt** - The square root of mass matrix to be used for the next
      iteration. In case of dense mass, this is the Cholesky factorization of the
-     mass matrix.
+     mass matrix. In case of low-rank mass, this is the mass matrix itself as a
+     ``LowRankMatrix``.
 
  - **rng_key** - random number generator seed used for the iteration.
+ - **tree_depth_state** - A ``TreeDepthState`` namedtuple which contains statistics
+   of the tree depths of NUTS. This is None for HMC.
+
+   + **depth** - Depth of the tree built in the current iteration.
+   + **capped** - A boolean value to indicate whether the tree of the current
+     iteration stopped because it reached the maximum tree depth, rather than
+     because of a U-turn or a divergence.
+   + **max_tree_depth** - The maximum tree depth used after warmup, which can be
+     lowered from the observed tree depths at the end of warmup.
+   + **depth_counts** - The number of trees of each depth in the second half of
+     warmup.
+   + **num_steps_budget** - The number of steps which can still be spent after
+     warmup without exceeding the average step budget.
 """
 
+TreeDepthState = namedtuple(
+    "TreeDepthState",
+    ["depth", "capped", "max_tree_depth", "depth_counts", "num_steps_budget"],
+)
+
 
 def _get_num_steps(step_size, trajectory_length):
     num_steps = jnp.ceil(trajectory_length / step_size)
@@ -94,11 +121,22 @@ def momentum_generator(prototype_r, mass_matrix_sqrt, rng_key):
         rng_keys = random.split(rng_key, len(mass_matrix_sqrt))
         r = {}
         for (site_names, mm_sqrt), rng_key in zip(mass_matrix_sqrt.items(), rng_keys):
+            if site_names[-1] is Ellipsis:
+                # a batch of dense blocks with shape (num_blocks, block_size, block_size)
+                eps = random.normal(rng_key, jnp.shape(mm_sqrt)[:-1])
+                r_block = _batched_matvec(mm_sqrt, eps)
+                r.update(_unstack_blocks(r_block, site_names, prototype_r))
+                continue
             r_block = OrderedDict([(k, prototype_r[k]) for k in site_names])
             r.update(momentum_generator(r_block, mm_sqrt, rng_key))
         return r
 
     _, unpack_fn = ravel_pytree(prototype_r)
+    if isinstance(mass_matrix_sqrt, LowRankMatrix):
+        # here the mass matrix is stored in low-rank form
+        eps = random.normal(rng_key, jnp.shape(mass_matrix_sqrt.diagonal))
+        r = _low_rank_sqrt_matvec(mass_matrix_sqrt, eps)
+        return unpack_fn(r)
     eps = random.normal(rng_key, jnp.shape(mass_matrix_sqrt)[:1])
     if mass_matrix_sqrt.ndim == 1:
         r = jnp.multiply(mass_matrix_sqrt, eps)
@@ -110,7 +148,13 @@ def momentum_generator(prototype_r, mass_matrix_sqrt, rng_key):
         raise ValueError("Mass matrix has incorrect number of dims.")
 
 
-def hmc(potential_fn=None, potential_fn_gen=None, kinetic_fn=None, algo="NUTS"):
+def hmc(
+    potential_fn=None,
+    potential_fn_gen=None,
+    kinetic_fn=None,
+    algo="NUTS",
+    integrator=None,
+):
     r"""
     Hamiltonian Monte Carlo inference, using either fixed number of
     steps or the No U-Turn Sampler (NUTS) with adaptive path length.
@@ -138,6 +182,10 @@ def hmc(potential_fn=None, potential_fn_gen=None, kinetic_fn=None, algo="NUTS"):
         euclidean kinetic energy.
     :param str algo: Whether to run ``HMC`` with fixed number of steps or ``NUTS``
         with adaptive path length. Default is ``NUTS``.
+    :param callable integrator: Python callable with the same signature as
+        :func:`~numpyro.infer.hmc_util.velocity_verlet`, which returns a pair of
+        (`init_fn`, `update_fn`) of a symplectic integrator. If not provided, the
+        default is :func:`~numpyro.infer.hmc_util.velocity_verlet`.
     :return: a tuple of callables (`init_kernel`, `sample_kernel`), the first
         one to initialize the sampler, and the second one to generate samples
         given an existing one.
@@ -180,6 +228,8 @@ def hmc(potential_fn=None, potential_fn_gen=None, kinetic_fn=None, algo="NUTS"):
     """
     if kinetic_fn is None:
         kinetic_fn = euclidean_kinetic_energy
+    if integrator is None:
+        integrator = velocity_verlet
     vv_update = None
     max_treedepth = None
     wa_update = None
@@ -187,6 +237,8 @@ def hmc(potential_fn=None, potential_fn_gen=None, kinetic_fn=None, algo="NUTS"):
     forward_mode_ad = False
     max_delta_energy = 1000.0
     fixed_num_steps = None
+    depth_quantile = None
+    steps_budget = None
     if algo not in {"HMC", "NUTS"}:
         raise ValueError("`algo` must be one of `HMC` or `NUTS`.")
 
@@ -206,6 +258,8 @@ def hmc(potential_fn=None, potential_fn_gen=None, kinetic_fn=None, algo="NUTS"):
         find_heuristic_step_size=False,
         forward_mode_differentiation=False,
         regularize_mass_matrix=True,
+        tree_depth_quantile=None,
+        num_steps_budget=None,
         model_args=(),
         model_kwargs=None,
         rng_key=None,
@@ -251,8 +305,16 @@ def hmc(potential_fn=None, potential_fn_gen=None, kinetic_fn=None, algo="NUTS"):
                   use a dense mass matrix for the joint (x, y, z)
                 + dense_mass=[("x",), ("y",), ("z")]: use dense mass matrices for
                   each of x, y, and z (i.e. block-diagonal with 3 blocks)
-
-        :type dense_mass: bool or list
+                + dense_mass=[("x", "y", ...)]: if x and y have the same leading
+                  dimension, use a separate dense mass matrix for the joint (x[i], y[i])
+                  of each index i of that dimension; the blocks are stored as a single
+                  batched array and the resulting inverse mass matrix has key
+                  ``("x", "y", ...)``
+                + dense_mass="low_rank:k": use a diagonal plus rank k inverse mass
+                  matrix for the joint (x, y, z), whose cost is linear in the number of
+                  latent dimensions
+
+        :type dense_mass: bool, list or str
         :param float target_accept_prob: Target acceptance probability for step size
             adaptation using Dual Averaging. Increasing this value will lead to a smaller
             step size, hence the sampling will be slower but more robust. Defaults to 0.8.
@@ -275,6 +337,14 @@ def hmc(potential_fn=None, potential_fn_gen=None, kinetic_fn=None, algo="NUTS"):
         :param bool regularize_mass_matrix: whether or not to regularize the estimated mass
             matrix for numerical stability during warmup phase. Defaults to True. This flag
             does not take effect if ``adapt_mass_matrix == False``.
+        :param float tree_depth_quantile: If specified, the maximum tree depth of NUTS
+            after warmup is lowered to this quantile of the tree depths observed in
+            the second half of warmup. Defaults to None.
+        :param float num_steps_budget: If specified, the average number of steps per
+            iteration of NUTS after warmup is bounded by this value, which must be at
+            least 1. The steps that an iteration does not use are carried over to the
+            next iterations, and the tree depth of each iteration is capped so that its
+            trajectory does not exceed the steps available. Defaults to None.
         :param tuple model_args: Model arguments if `potential_fn_gen` is specified.
         :param dict model_kwargs: Model keyword arguments if `potential_fn_gen` is specified.
         :param jax.random.PRNGKey rng_key: random key to be used as the source of
@@ -293,7 +363,9 @@ def hmc(potential_fn=None, potential_fn_gen=None, kinetic_fn=None, algo="NUTS"):
             vv_update, \
             wa_steps, \
             forward_mode_ad, \
-            fixed_num_steps
+            fixed_num_steps, \
+            depth_quantile, \
+            steps_budget
         forward_mode_ad = forward_mode_differentiation
         wa_steps = num_warmup
         max_treedepth = (
@@ -302,6 +374,10 @@ def hmc(potential_fn=None, potential_fn_gen=None, kinetic_fn=None, algo="NUTS"):
             else (max_tree_depth, max_tree_depth)
         )
         fixed_num_steps = num_steps
+        depth_quantile = tree_depth_quantile
+        steps_budget = num_steps_budget
+        if (steps_budget is not None) and (steps_budget < 1):
+            raise ValueError("`num_steps_budget` must be at least 1.")
         if isinstance(init_params, ParamInfo):
             z, pe, z_grad = init_params
         else:
@@ -319,7 +395,11 @@ def hmc(potential_fn=None, potential_fn_gen=None, kinetic_fn=None, algo="NUTS"):
         find_reasonable_ss = None
         if find_heuristic_step_size:
             find_reasonable_ss = partial(
-                find_reasonable_step_size, pe_fn, kinetic_fn, momentum_generator
+                find_reasonable_step_size,
+                pe_fn,
+                kinetic_fn,
+                momentum_generator,
+                integrator=integrator,
             )
 
         wa_init, wa_update = warmup_adapter(
@@ -333,13 +413,15 @@ def hmc(potential_fn=None, potential_fn_gen=None, kinetic_fn=None, algo="NUTS"):
         )
 
         rng_key_hmc, rng_key_wa, rng_key_momentum = random.split(rng_key, 3)
-        z_info = IntegratorState(z=z, potential_energy=pe, z_grad=z_grad)
+        vv_init, vv_update = integrator(pe_fn, kinetic_fn, forward_mode_ad)
+        # evaluate the potential energy and its gradient (if not provided) once, so
+        # that the step size heuristic and the integrator share the result
+        vv_state = vv_init(z, None, potential_energy=pe, z_grad=z_grad)
         wa_state = wa_init(
-            z_info, rng_key_wa, step_size, inverse_mass_matrix=inverse_mass_matrix
+            vv_state, rng_key_wa, step_size, inverse_mass_matrix=inverse_mass_matrix
         )
         r = momentum_generator(z, wa_state.mass_matrix_sqrt, rng_key_momentum)
-        vv_init, vv_update = velocity_verlet(pe_fn, kinetic_fn, forward_mode_ad)
-        vv_state = vv_init(z, r, potential_energy=pe, z_grad=z_grad)
+        vv_state = vv_state._replace(r=r)
         energy = vv_state.potential_energy + kinetic_fn(
             wa_state.inverse_mass_matrix, vv_state.r
         )
@@ -359,6 +441,15 @@ def hmc(potential_fn=None, potential_fn_gen=None, kinetic_fn=None, algo="NUTS"):
             wa_state,
             rng_key_hmc,
         )
+        if algo == "NUTS":
+            tree_depth_state = TreeDepthState(
+                zero_int,
+                jnp.array(False),
+                jnp.array(max_treedepth[1], dtype=jnp.result_type(int)),
+                jnp.zeros(max(max_treedepth) + 1, dtype=jnp.result_type(int)),
+                jnp.zeros(()),
+            )
+            hmc_state = hmc_state._replace(tree_depth_state=tree_depth_state)
         return hmc_state
 
     def _hmc_next(
@@ -372,7 +463,7 @@ def hmc(potential_fn=None, potential_fn_gen=None, kinetic_fn=None, algo="NUTS"):
     ):
         if potential_fn_gen:
             pe_fn = potential_fn_gen(*model_args, **model_kwargs)
-            _, vv_update_fn = velocity_verlet(pe_fn, kinetic_fn, forward_mode_ad)
+            _, vv_update_fn = integrator(pe_fn, kinetic_fn, forward_mode_ad)
         else:
             vv_update_fn = vv_update
 
@@ -411,7 +502,7 @@ def hmc(potential_fn=None, potential_fn_gen=None, kinetic_fn=None, algo="NUTS"):
             (vv_state, energy_old),
             identity,
         )
-        return vv_state, energy, num_steps, accept_prob, diverging
+        return vv_state, energy, num_steps, accept_prob, diverging, None
 
     def _nuts_next(
         step_size,
@@ -424,7 +515,7 @@ def hmc(potential_fn=None, potential_fn_gen=None, kinetic_fn=None, algo="NUTS"):
     ):
         if potential_fn_gen:
             pe_fn = potential_fn_gen(*model_args, **model_kwargs)
-            _, vv_update_fn = velocity_verlet(pe_fn, kinetic_fn, forward_mode_ad)
+            _, vv_update_fn = integrator(pe_fn, kinetic_fn, forward_mode_ad)
         else:
             vv_update_fn = vv_update
 
@@ -452,10 +543,35 @@ def hmc(potential_fn=None, potential_fn_gen=None, kinetic_fn=None, algo="NUTS"):
             num_steps,
             accept_prob,
             binary_tree.diverging,
+            binary_tree,
         )
 
     _next = _nuts_next if algo == "NUTS" else _hmc_next
 
+    def _update_tree_depth_state(
+        i, tree, max_depth, num_steps, budget, tree_depth_state
+    ):
+        is_warmup = i < wa_steps
+        capped = (tree.depth >= max_depth) & ~tree.turning & ~tree.diverging
+        depth_counts = jnp.where(
+            is_warmup & (i >= wa_steps // 2),
+            tree_depth_state.depth_counts.at[tree.depth].add(1),
+            tree_depth_state.depth_counts,
+        )
+        max_tree_depth = tree_depth_state.max_tree_depth
+        if depth_quantile is not None:
+            cdf = jnp.cumsum(depth_counts) / jnp.sum(depth_counts)
+            quantile_depth = jnp.clip(
+                jnp.argmax(cdf >= depth_quantile), 1, max_treedepth[1]
+            )
+            max_tree_depth = jnp.where(
+                i == wa_steps - 1, quantile_depth, max_tree_depth
+            ).astype(max_tree_depth.dtype)
+        if steps_budget is not None:
+            budget = jnp.where(is_warmup, budget, budget - num_steps)
+        depth = tree.depth.astype(tree_depth_state.depth.dtype)
+        return TreeDepthState(depth, capped, max_tree_depth, depth_counts, budget)
+
     def sample_kernel(hmc_state, model_args=(), model_kwargs=None):
         """
         Given an existing :data:`~numpyro.infer.mcmc.HMCState`, run HMC with fixed (possibly adapted)
@@ -482,13 +598,21 @@ def hmc(potential_fn=None, potential_fn_gen=None, kinetic_fn=None, algo="NUTS"):
         vv_state = IntegratorState(
             hmc_state.z, r, hmc_state.potential_energy, hmc_state.z_grad
         )
+        is_warmup = hmc_state.i < wa_steps
         if algo == "HMC":
             hmc_length_args = (hmc_state.trajectory_length,)
         else:
-            hmc_length_args = (
-                jnp.where(hmc_state.i < wa_steps, max_treedepth[0], max_treedepth[1]),
-            )
-        vv_state, energy, num_steps, accept_prob, diverging = _next(
+            tree_depth_state = hmc_state.tree_depth_state
+            max_depth = tree_depth_state.max_tree_depth
+            budget = tree_depth_state.num_steps_budget
+            if steps_budget is not None:
+                budget = jnp.where(is_warmup, budget, budget + steps_budget)
+                # the largest tree whose 2^depth - 1 steps fit in the budget
+                budget_depth = jnp.floor(jnp.log2(budget + 1)).astype(max_depth.dtype)
+                max_depth = jnp.clip(budget_depth, 1, max_depth)
+            max_depth = jnp.where(is_warmup, max_treedepth[0], max_depth)
+            hmc_length_args = (max_depth,)
+        vv_state, energy, num_steps, accept_prob, diverging, tree = _next(
             hmc_state.adapt_state.step_size,
             hmc_state.adapt_state.inverse_mass_matrix,
             vv_state,
@@ -512,6 +636,13 @@ def hmc(potential_fn=None, potential_fn_gen=None, kinetic_fn=None, algo="NUTS"):
             hmc_state.mean_accept_prob + (accept_prob - hmc_state.mean_accept_prob) / n
         )
 
+        if algo == "NUTS":
+            tree_depth_state = _update_tree_depth_state(
+                hmc_state.i, tree, max_depth, num_steps, budget, tree_depth_state
+            )
+        else:
+            tree_depth_state = None
+
         r = vv_state.r if hmc_state.r is not None else None
         return HMCState(
             itr,
@@ -527,6 +658,7 @@ def hmc(potential_fn=None, potential_fn_gen=None, kinetic_fn=None, algo="NUTS"):
             diverging,
             adapt_state,
             rng_key,
+            tree_depth_state,
         )
 
     # Make `init_kernel` and `sample_kernel` visible from the global scope once
@@ -597,8 +729,16 @@ class HMC(MCMCKernel):
               use a dense mass matrix for the joint (x, y, z)
             + dense_mass=[("x",), ("y",), ("z")]: use dense mass matrices for
               each of x, y, and z (i.e. block-diagonal with 3 blocks)
-
-    :type dense_mass: bool or list
+            + dense_mass=[("x", "y", ...)]: if x and y have the same leading
+              dimension, use a separate dense mass matrix for the joint (x[i], y[i])
+              of each index i of that dimension; the blocks are stored as a single
+              batched array and the resulting inverse mass matrix has key
+              ``("x", "y", ...)``
+            + dense_mass="low_rank:k": use a diagonal plus rank k inverse mass
+              matrix for the joint (x, y, z), whose cost is linear in the number of
+              latent dimensions
+
+    :type dense_mass: bool, list or str
     :param float target_accept_prob: Target acceptance probability for step size
         adaptation using Dual Averaging. Increasing this value will lead to a smaller
         step size, hence the sampling will be slower but more robust. Defaults to 0.8.
@@ -620,6 +760,23 @@ class HMC(MCMCKernel):
     :param bool regularize_mass_matrix: whether or not to regularize the estimated mass
         matrix for numerical stability during warmup phase. Defaults to True. This flag
         does not take effect if ``adapt_mass_matrix == False``.
+    :param callable integrator: Python callable with the same signature as
+        :func:`~numpyro.infer.hmc_util.velocity_verlet`, which returns a pair of
+        (`init_fn`, `update_fn`) of a symplectic integrator. Available integrators are
+        :func:`~numpyro.infer.hmc_util.velocity_verlet` (the default),
+        :func:`~numpyro.infer.hmc_util.minimal_error_two_stage`,
+        :func:`~numpyro.infer.hmc_util.minimal_error_three_stage`,
+        :func:`~numpyro.infer.hmc_util.omelyan` and
+        :func:`~numpyro.infer.hmc_util.yoshida`. A multi-stage integrator takes one
+        gradient evaluation per stage in each step, which is counted as a single
+        step in `num_steps`, but usually allows a proportionally larger step size.
+    :param remat: whether to rematerialize the steps of the
+        :func:`~numpyro.contrib.control_flow.scan` primitives in `model` which do not
+        specify `remat`, i.e. to recompute their intermediate values when computing the
+        gradient of the potential energy rather than to store them for all steps. This
+        reduces the memory used by models with long scans at the cost of an additional
+        evaluation of each step. Either a boolean, a checkpoint policy such as
+        ``jax.checkpoint_policies.dots_saveable`` or its name. Defaults to False.
     """
 
     def __init__(
@@ -639,6 +796,8 @@ class HMC(MCMCKernel):
         find_heuristic_step_size=False,
         forward_mode_differentiation=False,
         regularize_mass_matrix=True,
+        integrator=None,
+        remat=False,
     ):
         if not (model is None) ^ (potential_fn is None):
             raise ValueError("Only one of `model` or `potential_fn` must be specified.")
@@ -666,6 +825,7 @@ class HMC(MCMCKernel):
         self._inverse_mass_matrix = inverse_mass_matrix
         self._adapt_step_size = adapt_step_size
         self._adapt_mass_matrix = adapt_mass_matrix
+        _parse_low_rank(dense_mass)
         self._dense_mass = dense_mass
         self._target_accept_prob = target_accept_prob
         self._trajectory_length = (
@@ -675,10 +835,14 @@ class HMC(MCMCKernel):
         )
         self._algo = "HMC"
         self._max_tree_depth = 10
+        self._tree_depth_quantile = None
+        self._num_steps_budget = None
         self._init_strategy = init_strategy
         self._find_heuristic_step_size = find_heuristic_step_size
         self._forward_mode_differentiation = forward_mode_differentiation
         self._regularize_mass_matrix = regularize_mass_matrix
+        self._integrator = integrator
+        self._remat = remat
         # Set on first call to init
         self._init_fn = None
         self._potential_fn_gen = None
@@ -687,6 +851,9 @@ class HMC(MCMCKernel):
 
     def _init_state(self, rng_key, model_args, model_kwargs, init_params):
         if self._model is not None:
+            model = self._model
+            if self._remat is not None and self._remat is not False:
+                model = _default_remat(model, remat=self._remat)
             (
                 new_init_params,
                 potential_fn,
@@ -694,7 +861,7 @@ class HMC(MCMCKernel):
                 model_trace,
             ) = initialize_model(
                 rng_key,
-                self._model,
+                model,
                 dynamic_args=True,
                 init_strategy=self._init_strategy,
                 model_args=model_args,
@@ -708,6 +875,7 @@ class HMC(MCMCKernel):
                     potential_fn_gen=potential_fn,
                     kinetic_fn=self._kinetic_fn,
                     algo=self._algo,
+                    integrator=self._integrator,
                 )
             self._potential_fn_gen = potential_fn
             self._postprocess_fn = postprocess_fn
@@ -716,6 +884,7 @@ class HMC(MCMCKernel):
                 potential_fn=self._potential_fn,
                 kinetic_fn=self._kinetic_fn,
                 algo=self._algo,
+                integrator=self._integrator,
             )
 
         return init_params
@@ -766,7 +935,7 @@ class HMC(MCMCKernel):
                 # this is to be compatible with older numpyro versions
                 # and to match autoguide scale parameter and jax flatten utils
                 dense_mass = [tuple(sorted(z))] if dense_mass else []
-            assert isinstance(dense_mass, list)
+            assert isinstance(dense_mass, (list, str))
 
         hmc_init_fn = lambda init_params, rng_key: self._init_fn(  # noqa: E731
             init_params,
@@ -783,6 +952,8 @@ class HMC(MCMCKernel):
             find_heuristic_step_size=self._find_heuristic_step_size,
             forward_mode_differentiation=self._forward_mode_differentiation,
             regularize_mass_matrix=self._regularize_mass_matrix,
+            tree_depth_quantile=self._tree_depth_quantile,
+            num_steps_budget=self._num_steps_budget,
             model_args=model_args,
             model_kwargs=model_kwargs,
             rng_key=rng_key,
@@ -885,8 +1056,16 @@ class NUTS(HMC):
               use a dense mass matrix for the joint (x, y, z)
             + dense_mass=[("x",), ("y",), ("z")]: use dense mass matrices for
               each of x, y, and z (i.e. block-diagonal with 3 blocks)
-
-    :type dense_mass: bool or list
+            + dense_mass=[("x", "y", ...)]: if x and y have the same leading
+              dimension, use a separate dense mass matrix for the joint (x[i], y[i])
+              of each index i of that dimension; the blocks are stored as a single
+              batched array and the resulting inverse mass matrix has key
+              ``("x", "y", ...)``
+            + dense_mass="low_rank:k": use a diagonal plus rank k inverse mass
+              matrix for the joint (x, y, z), whose cost is linear in the number of
+              latent dimensions
+
+    :type dense_mass: bool, list or str
     :param float target_accept_prob: Target acceptance probability for step size
         adaptation using Dual Averaging. Increasing this value will lead to a smaller
         step size, hence the sampling will be slower but more robust. Defaults to 0.8.
@@ -908,6 +1087,39 @@ class NUTS(HMC):
         only supports forward-mode differentiation. See
         `JAX's The Autodiff Cookbook <https://jax.readthedocs.io/en/latest/notebooks/autodiff_cookbook.html>`_
         for more information.
+    :param bool regularize_mass_matrix: whether or not to regularize the estimated mass
+        matrix for numerical stability during warmup phase. Defaults to True. This flag
+        does not take effect if ``adapt_mass_matrix == False``.
+    :param callable integrator: Python callable with the same signature as
+        :func:`~numpyro.infer.hmc_util.velocity_verlet`, which returns a pair of
+        (`init_fn`, `update_fn`) of a symplectic integrator. See :class:`HMC` for
+        the available integrators. Defaults to
+        :func:`~numpyro.infer.hmc_util.velocity_verlet`.
+    :param float tree_depth_quantile: If specified, the maximum tree depth after
+        warmup is lowered to this quantile (e.g. 0.99) of the tree depths observed in
+        the second half of warmup, which bounds the cost of the occasional very long
+        trajectories at the price of a less exact sampler. Defaults to None.
+    :param float num_steps_budget: If specified, the average number of steps (i.e.
+        gradient evaluations for :func:`~numpyro.infer.hmc_util.velocity_verlet`) per
+        iteration after warmup is bounded by this value, which must be at least 1.
+        The steps that an iteration does not use are carried over to the next
+        iterations, and the tree depth of each iteration is capped so that its
+        trajectory does not exceed the steps available. Hence, the number of
+        gradient evaluations of a run of `num_samples` iterations after warmup is at
+        most `num_steps_budget * num_samples`. Defaults to None.
+    :param remat: whether to rematerialize the steps of the
+        :func:`~numpyro.contrib.control_flow.scan` primitives in `model` which do not
+        specify `remat`, i.e. to recompute their intermediate values when computing the
+        gradient of the potential energy rather than to store them for all steps. This
+        reduces the memory used by models with long scans at the cost of an additional
+        evaluation of each step. Either a boolean, a checkpoint policy such as
+        ``jax.checkpoint_policies.dots_saveable`` or its name. Defaults to False.
+
+    .. note:: Whether the maximum tree depth bounds the trajectory of an iteration is
+        recorded in the ``tree_depth_state`` field of
+        :data:`~numpyro.infer.hmc.HMCState`, which can be collected with
+        ``extra_fields=("tree_depth_state.depth", "tree_depth_state.capped")`` in
+        :meth:`MCMC.run <numpyro.infer.mcmc.MCMC.run>`.
     """
 
     def __init__(
@@ -927,6 +1139,10 @@ class NUTS(HMC):
         find_heuristic_step_size=False,
         forward_mode_differentiation=False,
         regularize_mass_matrix=True,
+        integrator=None,
+        tree_depth_quantile=None,
+        num_steps_budget=None,
+        remat=False,
     ):
         super(NUTS, self).__init__(
             potential_fn=potential_fn,
@@ -943,6 +1159,12 @@ class NUTS(HMC):
             find_heuristic_step_size=find_heuristic_step_size,
             forward_mode_differentiation=forward_mode_differentiation,
             regularize_mass_matrix=regularize_mass_matrix,
+            integrator=integrator,
+            remat=remat,
         )
         self._max_tree_depth = max_tree_depth
+        self._tree_depth_quantile = tree_depth_quantile
+        self._num_steps_budget = num_steps_budget
+        if (num_steps_budget is not None) and (num_steps_budget < 1):
+            raise ValueError("`num_steps_budget` must be at least 1.")
         self._algo = "NUTS"
@@ -7,7 +7,7 @@ from functools import partial
 
 import numpy as np
 
-from jax import grad, jacfwd, random, value_and_grad
+from jax import grad, jacfwd, random, value_and_grad, vjp
 from jax.flatten_util import ravel_pytree
 import jax.numpy as jnp
 from jax.scipy.special import expit
@@ -466,17 +466,24 @@ class DiscreteHMCGibbs(HMCGibbs):
         gibbs_fn = _discrete_gibbs_fn(
             potential_fn, self._support_sizes, self._discrete_proposal_fn
         )
-        z_gibbs, pe = gibbs_fn(
+        z_gibbs_new, pe = gibbs_fn(
             rng_key=rng_gibbs,
             gibbs_sites=z_gibbs,
             hmc_sites=z_hmc,
             pe=state.hmc_state.potential_energy,
         )
 
-        if self.inner_kernel._forward_mode_differentiation:
-            z_grad = jacfwd(partial(potential_fn, z_gibbs))(state.hmc_state.z)
-        else:
-            z_grad = grad(partial(potential_fn, z_gibbs))(state.hmc_state.z)
+        # the cached gradient is still valid if no discrete site has moved
+        moved = jnp.any(ravel_pytree(z_gibbs_new)[0] != ravel_pytree(z_gibbs)[0])
+        z_gibbs = z_gibbs_new
+        grad_ = jacfwd if self.inner_kernel._forward_mode_differentiation else grad
+        z_grad = cond(
+            moved,
+            z_gibbs,
+            lambda z_gibbs: grad_(partial(potential_fn, z_gibbs))(state.hmc_state.z),
+            state.hmc_state.z_grad,
+            identity,
+        )
         hmc_state = state.hmc_state._replace(z_grad=z_grad, potential_energy=pe)
 
         model_kwargs_["_gibbs_sites"] = z_gibbs
@@ -656,15 +663,27 @@ class HMCECS(HMCGibbs):
 
         # given a fixed hmc_sites, pe_new - pe_curr = loglik_new - loglik_curr
         pe = state.hmc_state.potential_energy
-        pe_new = potential_fn(z_gibbs_new, gibbs_state_new, state.hmc_state.z)
+        proposal_potential_fn = partial(potential_fn, z_gibbs_new, gibbs_state_new)
+        if self.inner_kernel._forward_mode_differentiation:
+            pe_new = proposal_potential_fn(state.hmc_state.z)
+
+            def grad_fn():
+                return jacfwd(proposal_potential_fn)(state.hmc_state.z)
+
+        else:
+            # keep the residuals of the forward pass, so that the gradient of an
+            # accepted proposal only costs a backward pass
+            pe_new, vjp_fn = vjp(proposal_potential_fn, state.hmc_state.z)
+
+            def grad_fn():
+                return vjp_fn(jnp.ones_like(pe_new))[0]
+
         accept_prob = jnp.clip(jnp.exp(pe - pe_new), None, 1.0)
         transition = random.bernoulli(rng_key, accept_prob)
-        grad_ = jacfwd if self.inner_kernel._forward_mode_differentiation else grad
         z_gibbs, gibbs_state, pe, z_grad = cond(
             transition,
             (z_gibbs_new, gibbs_state_new, pe_new),
-            lambda vals: vals
-            + (grad_(partial(potential_fn, vals[0], vals[1]))(state.hmc_state.z),),
+            lambda vals: vals + (grad_fn(),),
             (z_gibbs, state.gibbs_state, pe, state.hmc_state.z_grad),
             identity,
         )
@@ -2,6 +2,7 @@
 # SPDX-License-Identifier: Apache-2.0
 
 from collections import OrderedDict, namedtuple
+import math
 
 import jax
 from jax import grad, jacfwd, random, value_and_grad, vmap
@@ -55,6 +56,11 @@ TreeInfo = namedtuple(
         "num_proposals",
     ],
 )
+# A symmetric positive definite matrix `D^(1/2) @ (I + U @ diag(λ - 1) @ U.T) @ D^(1/2)`,
+# where D is diagonal, U has orthonormal columns and λ are the eigenvalues of the
+# matrix in the directions U after rescaling by D. Its inverse is
+# `LowRankMatrix(1 / D, U, 1 / λ)`.
+LowRankMatrix = namedtuple("LowRankMatrix", ["diagonal", "eigenvectors", "eigenvalues"])
 
 
 def dual_averaging(t0=10, kappa=0.75, gamma=0.05):
@@ -130,6 +136,31 @@ def dual_averaging(t0=10, kappa=0.75, gamma=0.05):
     return init_fn, update_fn
 
 
+def _stack_blocks(x, site_names):
+    # For a key `(*site_names, ...)` of a structured mass matrix, stacks the values of
+    # the sites into an array of shape (num_blocks, block_size), where the blocks are
+    # indexed by the leading dimension of the sites.
+    return jnp.concatenate(
+        [jnp.reshape(x[k], (jnp.shape(x[k])[0], -1)) for k in site_names[:-1]], axis=-1
+    )
+
+
+def _unstack_blocks(v, site_names, prototype):
+    # the inverse of `_stack_blocks`
+    values = OrderedDict()
+    start = 0
+    for k in site_names[:-1]:
+        shape = jnp.shape(prototype[k])
+        size = math.prod(shape[1:])
+        values[k] = jnp.reshape(v[:, start : start + size], shape)
+        start = start + size
+    return values
+
+
+def _batched_matvec(matrix, v):
+    return jnp.matmul(matrix, v[..., None])[..., 0]
+
+
 def welford_covariance(diagonal=True):
     """
     Implements Welford's online method for estimating (co)variance. Useful for
@@ -164,7 +195,8 @@ def welford_covariance(diagonal=True):
         else:
             shape = size
 
-        mean = jnp.zeros(shape[-1])
+        # for a batch of dense blocks, shape is (num_blocks, block_size, block_size)
+        mean = jnp.zeros(shape[:-2] + shape[-1:])
         m2 = jnp.zeros(shape)
         n = jnp.array(0, dtype=jnp.result_type(int))
         return mean, m2, n
@@ -179,12 +211,16 @@ def welford_covariance(diagonal=True):
             assert isinstance(sample, dict)
             new_state = {}
             for site_names, state_block in state.items():
-                sample_block = tuple(sample[k] for k in site_names)
+                if site_names[-1] is Ellipsis:
+                    sample_block = _stack_blocks(sample, site_names)
+                else:
+                    sample_block = tuple(sample[k] for k in site_names)
                 new_state[site_names] = update_fn(sample_block, state_block)
             return new_state
 
-        sample, _ = ravel_pytree(sample)
         mean, m2, n = state
+        if jnp.ndim(m2) < 3:
+            sample, _ = ravel_pytree(sample)
         n = n + 1
         delta_pre = sample - mean
         mean = mean + delta_pre / n
@@ -192,7 +228,7 @@ def welford_covariance(diagonal=True):
         if jnp.ndim(m2) == 1:
             m2 = m2 + delta_pre * delta_post
         else:
-            m2 = m2 + jnp.outer(delta_post, delta_pre)
+            m2 = m2 + delta_post[..., :, None] * delta_pre[..., None, :]
         return mean, m2, n
 
     def final_fn(state, regularize=False):
@@ -223,13 +259,13 @@ def welford_covariance(diagonal=True):
             if jnp.ndim(scaled_cov) == 1:
                 cov = scaled_cov + shrinkage
             else:
-                cov = scaled_cov + shrinkage * jnp.identity(mean.shape[0])
-        if jnp.ndim(cov) == 2:
+                cov = scaled_cov + shrinkage * jnp.identity(mean.shape[-1])
+        if jnp.ndim(cov) >= 2:
             # copy the implementation of distributions.util.cholesky_of_inverse here
             tril_inv = jnp.swapaxes(
                 jnp.linalg.cholesky(cov[..., ::-1, ::-1])[..., ::-1, ::-1], -2, -1
             )
-            identity = jnp.identity(cov.shape[-1])
+            identity = jnp.broadcast_to(jnp.identity(cov.shape[-1]), cov.shape)
             cov_inv_sqrt = solve_triangular(tril_inv, identity, lower=True)
         else:
             tril_inv = jnp.sqrt(cov)
@@ -239,6 +275,162 @@ def welford_covariance(diagonal=True):
     return init_fn, update_fn, final_fn
 
 
+def _parse_low_rank(dense_mass):
+    # returns the rank k of `dense_mass="low_rank:k"` and None for other values
+    if not isinstance(dense_mass, str):
+        return None
+    prefix, _, rank = dense_mass.partition(":")
+    if prefix != "low_rank" or not rank.isdigit() or int(rank) < 1:
+        raise ValueError(
+            "`dense_mass` should be a bool, a list of tuples of site names or a"
+            " string 'low_rank:k' with a positive integer k, but got"
+            " '{}'.".format(dense_mass)
+        )
+    return int(rank)
+
+
+def _low_rank_matvec(matrix, v):
+    # computes `matrix @ v` in O(d * k)
+    scale = jnp.sqrt(matrix.diagonal)
+    u = scale * v
+    U = matrix.eigenvectors
+    u = u + jnp.matmul(U, (matrix.eigenvalues - 1) * jnp.matmul(u, U))
+    return scale * u
+
+
+def _low_rank_sqrt_matvec(matrix, v):
+    # computes `A @ v` where `A @ A.T = matrix`
+    U = matrix.eigenvectors
+    u = v + jnp.matmul(U, (jnp.sqrt(matrix.eigenvalues) - 1) * jnp.matmul(v, U))
+    return jnp.sqrt(matrix.diagonal) * u
+
+
+def _low_rank_inverse(matrix):
+    return LowRankMatrix(
+        jnp.reciprocal(matrix.diagonal),
+        matrix.eigenvectors,
+        jnp.reciprocal(matrix.eigenvalues),
+    )
+
+
+def _low_rank_from_dense(matrix, rank):
+    # keeps the `rank` eigenvalues of the rescaled matrix that are furthest from 1
+    diagonal = jnp.diagonal(matrix)
+    scale = jnp.sqrt(diagonal)
+    eigenvalues, eigenvectors = jnp.linalg.eigh(matrix / jnp.outer(scale, scale))
+    idx = jnp.argsort(-jnp.abs(jnp.log(eigenvalues)))[:rank]
+    return LowRankMatrix(diagonal, eigenvectors[:, idx], eigenvalues[idx])
+
+
+def low_rank_covariance(rank):
+    """
+    Estimates online a diagonal plus low-rank approximation of the covariance of
+    samples, which is useful for adapting the mass matrix of HMC in high
+    dimensions. The variances are estimated with Welford's method. The top `rank`
+    principal directions of the samples, rescaled by their standard deviations,
+    are tracked with an incremental SVD: the rescaled samples are appended to a
+    sketch of `2 * rank` rows, which is truncated to its top `rank` principal
+    directions whenever it is full. Hence, the memory and the amortized cost of
+    each update are `O(rank * size)`.
+
+    **References:**
+
+    1. *Incremental Singular Value Decomposition of Uncertain Data with Missing
+       Values*, Matthew Brand
+
+    :param int rank: rank of the approximation.
+    :return: a (`init_fn`, `update_fn`, `final_fn`) triple.
+    """
+    sketch_size = 2 * rank
+
+    def init_fn(size):
+        """
+        :param int size: size of each sample.
+        :return: initial state for the scheme.
+        """
+        mean = jnp.zeros(size)
+        m2 = jnp.zeros(size)
+        n = jnp.array(0, dtype=jnp.result_type(int))
+        sketch = jnp.zeros((sketch_size, size))
+        num_rows = jnp.array(0, dtype=jnp.result_type(int))
+        return mean, m2, n, sketch, num_rows
+
+    def _truncate(sketch):
+        # keep the top `rank` principal directions of the sketch
+        _, u = jnp.linalg.eigh(jnp.matmul(sketch, sketch.T))
+        u = u[:, ::-1][:, :rank]
+        return jnp.zeros_like(sketch).at[:rank].set(jnp.matmul(u.T, sketch))
+
+    def update_fn(sample, state):
+        """
+        :param sample: A new sample.
+        :param state: Current state of the scheme.
+        :return: new state for the scheme.
+        """
+        sample, _ = ravel_pytree(sample)
+        mean, m2, n, sketch, num_rows = state
+        n = n + 1
+        delta_pre = sample - mean
+        mean = mean + delta_pre / n
+        delta_post = sample - mean
+        m2 = m2 + delta_pre * delta_post
+        # the sum of outer products of these rows is the Welford estimate of the
+        # covariance scaled by the current estimate of the standard deviations
+        var = m2 / jnp.clip(n - 1, 1)
+        scale = jnp.where(var > 0, jnp.sqrt(var), 1.0)
+        row = jnp.sqrt((n - 1) / n) * delta_pre / scale
+        sketch = sketch.at[num_rows].set(row)
+        num_rows = num_rows + 1
+        sketch, num_rows = cond(
+            num_rows == sketch_size,
+            sketch,
+            lambda x: (_truncate(x), jnp.array(rank, dtype=num_rows.dtype)),
+            (sketch, num_rows),
+            identity,
+        )
+        return mean, m2, n, sketch, num_rows
+
+    def final_fn(state, regularize=False):
+        """
+        :param state: Current state of the scheme.
+        :param bool regularize: Whether to adjust the estimate for numerical stability.
+        :return: a triple of estimated covariance, its inverse and the estimated
+            covariance again, as `LowRankMatrix`. Their square roots, which are
+            used to sample momenta, are not formed explicitly.
+        """
+        mean, m2, n, sketch, _ = state
+        var = m2 / (n - 1)
+        eigenvalues, u = jnp.linalg.eigh(jnp.matmul(sketch, sketch.T))
+        eigenvalues = jnp.clip(eigenvalues[::-1][:rank], 0)
+        u = u[:, ::-1][:, :rank]
+        s = jnp.sqrt(eigenvalues)
+        eigenvectors = jnp.matmul(sketch.T, u) / jnp.where(s > 0, s, 1)
+        eigenvalues = eigenvalues / (n - 1)
+        # as in factor analysis, the rescaled covariance is approximated by
+        # `psi + U @ diag(λ) @ U.T`, where the diagonal `psi` is chosen so that the
+        # estimated variances are preserved, which we then write in the form of
+        # `LowRankMatrix` with the diagonal `var * psi`; `psi` is bounded below
+        # because its estimate is noisy when the top directions explain most of
+        # the variance
+        psi = jnp.clip(1 - jnp.matmul(eigenvectors**2, eigenvalues), 0.1, 1.0)
+        w = eigenvectors * jnp.sqrt(eigenvalues) / jnp.sqrt(psi)[:, None]
+        eigenvalues, q = jnp.linalg.eigh(jnp.matmul(w.T, w))
+        eigenvalues = jnp.clip(eigenvalues, 0)
+        s = jnp.sqrt(eigenvalues)
+        eigenvectors = jnp.matmul(w, q) / jnp.where(s > 0, s, 1)
+        eigenvalues = 1 + eigenvalues
+        var = var * psi
+        if regularize:
+            # Regularization from Stan, where the eigenvalues are shrunk towards 1,
+            # i.e. towards a diagonal covariance
+            var = (n / (n + 5)) * var + 1e-3 * (5 / (n + 5))
+            eigenvalues = (n / (n + 5)) * eigenvalues + 5 / (n + 5)
+        cov = LowRankMatrix(var, eigenvectors, eigenvalues)
+        return cov, _low_rank_inverse(cov), cov
+
+    return init_fn, update_fn, final_fn
+
+
 def _value_and_grad(f, x, forward_mode_differentiation=False):
     if forward_mode_differentiation:
 
@@ -311,6 +503,164 @@ def velocity_verlet(potential_fn, kinetic_fn, forward_mode_differentiation=False
     return init_fn, update_fn
 
 
+def _splitting_integrator(
+    potential_fn,
+    kinetic_fn,
+    forward_mode_differentiation,
+    momentum_coefficients,
+    position_coefficients,
+):
+    # A palindromic splitting method which alternates momentum updates (of sizes
+    # given by `momentum_coefficients`) and position updates (of sizes given by
+    # `position_coefficients`), relative to the step size. Each position update
+    # requires a new gradient of the potential energy.
+    assert len(momentum_coefficients) == len(position_coefficients) + 1
+    init_fn, _ = velocity_verlet(potential_fn, kinetic_fn, forward_mode_differentiation)
+
+    def update_fn(step_size, inverse_mass_matrix, state):
+        """
+        :param float step_size: Size of a single step.
+        :param inverse_mass_matrix: Inverse of mass matrix, which is used to
+            calculate kinetic energy.
+        :param state: Current state of the integrator.
+        :return: new state for the integrator.
+        """
+        z, r, potential_energy, z_grad = state
+        for b, a in zip(momentum_coefficients[:-1], position_coefficients):
+            r = jax.tree.map(lambda r, z_grad: r - b * step_size * z_grad, r, z_grad)
+            r_grad = _kinetic_grad(kinetic_fn, inverse_mass_matrix, r)
+            z = jax.tree.map(lambda z, r_grad: z + a * step_size * r_grad, z, r_grad)
+            potential_energy, z_grad = _value_and_grad(
+                potential_fn, z, forward_mode_differentiation
+            )
+        b = momentum_coefficients[-1]
+        r = jax.tree.map(lambda r, z_grad: r - b * step_size * z_grad, r, z_grad)
+        return IntegratorState(z, r, potential_energy, z_grad)
+
+    return init_fn, update_fn
+
+
+def minimal_error_two_stage(
+    potential_fn, kinetic_fn, forward_mode_differentiation=False
+):
+    r"""
+    Two-stage symplectic integrator whose coefficients minimize the expected
+    energy error for Gaussian targets [1]. Each step requires two gradient
+    evaluations, so its step size should be compared with twice the step size
+    of :func:`velocity_verlet`.
+
+    **References:**
+
+    1. *Numerical integrators for the Hybrid Monte Carlo method*,
+       Sergio Blanes, Fernando Casas, J. M. Sanz-Serna
+
+    :param potential_fn: Python callable that computes the potential energy
+        given input parameters. The input parameters to `potential_fn` can be
+        any python collection type.
+    :param kinetic_fn: Python callable that returns the kinetic energy given
+        inverse mass matrix and momentum.
+    :return: a pair of (`init_fn`, `update_fn`).
+    """
+    b = (3 - math.sqrt(3)) / 6
+    return _splitting_integrator(
+        potential_fn,
+        kinetic_fn,
+        forward_mode_differentiation,
+        (b, 1 - 2 * b, b),
+        (0.5, 0.5),
+    )
+
+
+def minimal_error_three_stage(
+    potential_fn, kinetic_fn, forward_mode_differentiation=False
+):
+    r"""
+    Three-stage symplectic integrator whose coefficients minimize the expected
+    energy error for Gaussian targets [1]. Each step requires three gradient
+    evaluations, so its step size should be compared with three times the step
+    size of :func:`velocity_verlet`.
+
+    **References:**
+
+    1. *Numerical integrators for the Hybrid Monte Carlo method*,
+       Sergio Blanes, Fernando Casas, J. M. Sanz-Serna
+
+    :param potential_fn: Python callable that computes the potential energy
+        given input parameters. The input parameters to `potential_fn` can be
+        any python collection type.
+    :param kinetic_fn: Python callable that returns the kinetic energy given
+        inverse mass matrix and momentum.
+    :return: a pair of (`init_fn`, `update_fn`).
+    """
+    b, a = 0.11888010966548, 0.29619504261126
+    return _splitting_integrator(
+        potential_fn,
+        kinetic_fn,
+        forward_mode_differentiation,
+        (b, 0.5 - b, 0.5 - b, b),
+        (a, 1 - 2 * a, a),
+    )
+
+
+def omelyan(potential_fn, kinetic_fn, forward_mode_differentiation=False):
+    r"""
+    Two-stage symplectic integrator of Omelyan et al. [1], whose coefficients
+    minimize the norm of the leading error term. Each step requires two gradient
+    evaluations.
+
+    **References:**
+
+    1. *Symplectic analytically integrable decomposition algorithms: classification,
+       derivation, and application to molecular dynamics, quantum and celestial
+       mechanics simulations*, I. P. Omelyan, I. M. Mryglod, R. Folk
+
+    :param potential_fn: Python callable that computes the potential energy
+        given input parameters. The input parameters to `potential_fn` can be
+        any python collection type.
+    :param kinetic_fn: Python callable that returns the kinetic energy given
+        inverse mass matrix and momentum.
+    :return: a pair of (`init_fn`, `update_fn`).
+    """
+    b = 0.1931833275037836
+    return _splitting_integrator(
+        potential_fn,
+        kinetic_fn,
+        forward_mode_differentiation,
+        (b, 1 - 2 * b, b),
+        (0.5, 0.5),
+    )
+
+
+def yoshida(potential_fn, kinetic_fn, forward_mode_differentiation=False):
+    r"""
+    Fourth order symplectic integrator of Yoshida [1], which composes three
+    velocity verlet steps. Each step requires three gradient evaluations. It is
+    more accurate than the other integrators for small step sizes, but has a
+    smaller stability limit.
+
+    **References:**
+
+    1. *Construction of higher order symplectic integrators*,
+       Haruo Yoshida
+
+    :param potential_fn: Python callable that computes the potential energy
+        given input parameters. The input parameters to `potential_fn` can be
+        any python collection type.
+    :param kinetic_fn: Python callable that returns the kinetic energy given
+        inverse mass matrix and momentum.
+    :return: a pair of (`init_fn`, `update_fn`).
+    """
+    w1 = 1 / (2 - 2 ** (1 / 3))
+    w0 = 1 - 2 * w1
+    return _splitting_integrator(
+        potential_fn,
+        kinetic_fn,
+        forward_mode_differentiation,
+        (w1 / 2, (w1 + w0) / 2, (w0 + w1) / 2, w1 / 2),
+        (w1, w0, w1),
+    )
+
+
 def find_reasonable_step_size(
     potential_fn,
     kinetic_fn,
@@ -319,6 +669,7 @@ def find_reasonable_step_size(
     inverse_mass_matrix,
     z_info,
     rng_key,
+    integrator=None,
 ):
     """
     Finds a reasonable step size by tuning `init_step_size`. This function is used
@@ -336,6 +687,8 @@ def find_reasonable_step_size(
     :param inverse_mass_matrix: Inverse of mass matrix.
     :param IntegratorState z_info: The current integrator state.
     :param jax.random.PRNGKey rng_key: Random key to be used as the source of randomness.
+    :param callable integrator: The integrator used to simulate the dynamics.
+        Defaults to :func:`velocity_verlet`.
     :return: a reasonable value for step size.
     :rtype: float
     """
@@ -344,7 +697,8 @@ def find_reasonable_step_size(
     # then we have to decrease step_size; otherwise, increase step_size.
     target_accept_prob = jnp.log(0.8)
 
-    _, vv_update = velocity_verlet(potential_fn, kinetic_fn)
+    integrator = velocity_verlet if integrator is None else integrator
+    _, vv_update = integrator(potential_fn, kinetic_fn)
     z, _, potential_energy, z_grad = z_info
     if potential_energy is None or z_grad is None:
         potential_energy, z_grad = value_and_grad(potential_fn)(z)
@@ -436,6 +790,45 @@ def build_adaptation_schedule(num_steps):
     return adaptation_schedule
 
 
+def _initialize_block_mass_matrix(z, site_names, inverse_mass_matrix):
+    # Initializes a batch of dense blocks for the key `(*site_names, ...)`: the sites
+    # share their leading dimension and each index of it gets its own dense block.
+    num_blocks = {
+        jnp.shape(z[k])[0] if jnp.ndim(z[k]) > 0 else None for k in site_names[:-1]
+    }
+    if len(num_blocks) != 1 or None in num_blocks:
+        raise ValueError(
+            "Sites {} of a block-structured mass matrix should have the same"
+            " leading dimension.".format(site_names[:-1])
+        )
+    block_size = jnp.shape(_stack_blocks(z, site_names))[-1]
+    (num_blocks,) = num_blocks
+    if inverse_mass_matrix is None:
+        inverse_mass_matrix = jnp.broadcast_to(
+            jnp.identity(block_size), (num_blocks, block_size, block_size)
+        )
+        return inverse_mass_matrix, inverse_mass_matrix, inverse_mass_matrix
+    if jnp.ndim(inverse_mass_matrix) == 2:
+        inverse_mass_matrix = inverse_mass_matrix[..., None] * jnp.identity(block_size)
+    if jnp.shape(inverse_mass_matrix) != (num_blocks, block_size, block_size):
+        raise ValueError(
+            "Expected the inverse mass matrix of sites {} to have shape {}, but got"
+            " {}.".format(
+                site_names[:-1],
+                (num_blocks, block_size, block_size),
+                jnp.shape(inverse_mass_matrix),
+            )
+        )
+    mass_matrix_sqrt_inv = jnp.swapaxes(
+        jnp.linalg.cholesky(inverse_mass_matrix[..., ::-1, ::-1])[..., ::-1, ::-1],
+        -2,
+        -1,
+    )
+    identity = jnp.broadcast_to(jnp.identity(block_size), inverse_mass_matrix.shape)
+    mass_matrix_sqrt = solve_triangular(mass_matrix_sqrt_inv, identity, lower=True)
+    return inverse_mass_matrix, mass_matrix_sqrt, mass_matrix_sqrt_inv
+
+
 def _initialize_mass_matrix(z, inverse_mass_matrix, dense_mass):
     if isinstance(dense_mass, list):
         if inverse_mass_matrix is None:
@@ -447,10 +840,15 @@ def _initialize_mass_matrix(z, inverse_mass_matrix, dense_mass):
         mass_matrix_sqrt_inv = {}
         for site_names in dense_mass:
             inverse_mm = inverse_mass_matrix.get(site_names)
-            z_block = tuple(z[k] for k in site_names)
-            inverse_mm, mm_sqrt, mm_sqrt_inv = _initialize_mass_matrix(
-                z_block, inverse_mm, True
-            )
+            if site_names[-1] is Ellipsis:
+                inverse_mm, mm_sqrt, mm_sqrt_inv = _initialize_block_mass_matrix(
+                    z, site_names, inverse_mm
+                )
+            else:
+                z_block = tuple(z[k] for k in site_names)
+                inverse_mm, mm_sqrt, mm_sqrt_inv = _initialize_mass_matrix(
+                    z_block, inverse_mm, True
+                )
             inverse_mass_matrix[site_names] = inverse_mm
             mass_matrix_sqrt[site_names] = mm_sqrt
             mass_matrix_sqrt_inv[site_names] = mm_sqrt_inv
@@ -459,14 +857,21 @@ def _initialize_mass_matrix(z, inverse_mass_matrix, dense_mass):
         for site_names, inverse_mm in inverse_mass_matrix.items():
             if site_names in dense_mass:
                 continue
-            z_block = tuple(z[k] for k in site_names)
-            inverse_mm, mm_sqrt, mm_sqrt_inv = _initialize_mass_matrix(
-                z_block, inverse_mm, False
-            )
+            if site_names[-1] is Ellipsis:
+                inverse_mm, mm_sqrt, mm_sqrt_inv = _initialize_block_mass_matrix(
+                    z, site_names, inverse_mm
+                )
+            else:
+                z_block = tuple(z[k] for k in site_names)
+                inverse_mm, mm_sqrt, mm_sqrt_inv = _initialize_mass_matrix(
+                    z_block, inverse_mm, False
+                )
             inverse_mass_matrix[site_names] = inverse_mm
             mass_matrix_sqrt[site_names] = mm_sqrt
             mass_matrix_sqrt_inv[site_names] = mm_sqrt_inv
-        remaining_sites = tuple(sorted(set(z) - set().union(*inverse_mass_matrix)))
+        remaining_sites = tuple(
+            sorted(set(z) - set().union(*inverse_mass_matrix) - {Ellipsis})
+        )
         if len(remaining_sites) > 0:
             z_block = tuple(z[k] for k in remaining_sites)
             inverse_mm, mm_sqrt, mm_sqrt_inv = _initialize_mass_matrix(
@@ -477,7 +882,12 @@ def _initialize_mass_matrix(z, inverse_mass_matrix, dense_mass):
             mass_matrix_sqrt_inv[remaining_sites] = mm_sqrt_inv
         expected_site_names = sorted(z)
         actual_site_names = sorted(
-            [k for site_names in inverse_mass_matrix for k in site_names]
+            [
+                k
+                for site_names in inverse_mass_matrix
+                for k in site_names
+                if k is not Ellipsis
+            ]
         )
         assert actual_site_names == expected_site_names, (
             "There seems to be a conflict of sites names specified in the initial"
@@ -486,6 +896,22 @@ def _initialize_mass_matrix(z, inverse_mass_matrix, dense_mass):
         return inverse_mass_matrix, mass_matrix_sqrt, mass_matrix_sqrt_inv
 
     mass_matrix_size = jnp.size(ravel_pytree(z)[0])
+    rank = _parse_low_rank(dense_mass)
+    if rank is not None:
+        if inverse_mass_matrix is None:
+            inverse_mass_matrix = jnp.ones(mass_matrix_size)
+        if not isinstance(inverse_mass_matrix, LowRankMatrix):
+            if jnp.ndim(inverse_mass_matrix) == 2:
+                inverse_mass_matrix = _low_rank_from_dense(inverse_mass_matrix, rank)
+            else:
+                inverse_mass_matrix = LowRankMatrix(
+                    inverse_mass_matrix,
+                    jnp.zeros((mass_matrix_size, rank)),
+                    jnp.ones(rank),
+                )
+        mass_matrix_sqrt = _low_rank_inverse(inverse_mass_matrix)
+        return inverse_mass_matrix, mass_matrix_sqrt, inverse_mass_matrix
+
     if inverse_mass_matrix is None:
         if dense_mass:
             inverse_mass_matrix = jnp.identity(mass_matrix_size)
@@ -536,7 +962,8 @@ def warmup_adapter(
     :param bool adapt_mass_matrix: A flag to decide if we want to adapt mass
         matrix during warm-up phase using Welford scheme (defaults to ``True``).
     :param bool dense_mass: A flag to decide if mass matrix is dense or
-        diagonal (defaults to ``False``).
+        diagonal (defaults to ``False``). A string ``"low_rank:k"`` means that the
+        inverse mass matrix is diagonal plus rank `k`, see :func:`low_rank_covariance`.
     :param float target_accept_prob: Target acceptance probability for step size
         adaptation using Dual Averaging. Increasing this value will lead to a smaller
         step size, hence the sampling will be slower but more robust. Default to 0.8.
@@ -545,7 +972,11 @@ def warmup_adapter(
     if find_reasonable_step_size is None:
         find_reasonable_step_size = identity
     ss_init, ss_update = dual_averaging()
-    mm_init, mm_update, mm_final = welford_covariance(diagonal=not dense_mass)
+    rank = _parse_low_rank(dense_mass)
+    if rank is not None:
+        mm_init, mm_update, mm_final = low_rank_covariance(rank)
+    else:
+        mm_init, mm_update, mm_final = welford_covariance(diagonal=not dense_mass)
     adaptation_schedule = build_adaptation_schedule(num_adapt_steps)
     num_windows = len(adaptation_schedule)
 
@@ -577,6 +1008,8 @@ def warmup_adapter(
 
         if isinstance(inverse_mass_matrix, dict):
             size = {k: v.shape for k, v in inverse_mass_matrix.items()}
+        elif isinstance(inverse_mass_matrix, LowRankMatrix):
+            size = inverse_mass_matrix.diagonal.shape[-1]
         else:
             size = inverse_mass_matrix.shape[-1]
         mm_state = mm_init(size)
@@ -611,6 +1044,8 @@ def warmup_adapter(
             )
             if isinstance(inverse_mass_matrix, dict):
                 size = {k: v.shape for k, v in inverse_mass_matrix.items()}
+            elif isinstance(inverse_mass_matrix, LowRankMatrix):
+                size = inverse_mass_matrix.diagonal.shape[-1]
             else:
                 size = inverse_mass_matrix.shape[-1]
             mm_state = mm_init(size)
@@ -711,6 +1146,16 @@ def _momentum_angle(inverse_mass_matrix, r_left, r_right, r_sum):
     if isinstance(inverse_mass_matrix, dict):
         left_angle, right_angle = jnp.zeros(()), jnp.zeros(())
         for site_names, inverse_mm in inverse_mass_matrix.items():
+            if site_names[-1] is Ellipsis:
+                r_left_b = _stack_blocks(r_left, site_names)
+                r_right_b = _stack_blocks(r_right, site_names)
+                r_sum_b = _stack_blocks(r_sum, site_names)
+                r_sum_b = r_sum_b - (r_left_b + r_right_b) / 2
+                v_left = _batched_matvec(inverse_mm, r_left_b)
+                v_right = _batched_matvec(inverse_mm, r_right_b)
+                left_angle = left_angle + jnp.sum(v_left * r_sum_b)
+                right_angle = right_angle + jnp.sum(v_right * r_sum_b)
+                continue
             r_left_b = tuple(r_left[k] for k in site_names)
             r_right_b = tuple(r_right[k] for k in site_names)
             r_sum_b = tuple(r_sum[k] for k in site_names)
@@ -723,7 +1168,10 @@ def _momentum_angle(inverse_mass_matrix, r_left, r_right, r_sum):
     r_right, _ = ravel_pytree(r_right)
     r_sum, _ = ravel_pytree(r_sum)
 
-    if inverse_mass_matrix.ndim == 2:
+    if isinstance(inverse_mass_matrix, LowRankMatrix):
+        v_left = _low_rank_matvec(inverse_mass_matrix, r_left)
+        v_right = _low_rank_matvec(inverse_mass_matrix, r_right)
+    elif inverse_mass_matrix.ndim == 2:
         v_left = jnp.matmul(inverse_mass_matrix, r_left)
         v_right = jnp.matmul(inverse_mass_matrix, r_right)
     elif inverse_mass_matrix.ndim == 1:
@@ -1184,13 +1632,20 @@ def euclidean_kinetic_energy(inverse_mass_matrix, r):
     if isinstance(inverse_mass_matrix, dict):
         ke = jnp.zeros(())
         for site_names, inverse_mm in inverse_mass_matrix.items():
+            if site_names[-1] is Ellipsis:
+                r_block = _stack_blocks(r, site_names)
+                v = _batched_matvec(inverse_mm, r_block)
+                ke = ke + 0.5 * jnp.sum(v * r_block)
+                continue
             r_block = tuple(r[k] for k in site_names)
             ke = ke + euclidean_kinetic_energy(inverse_mm, r_block)
         return ke
 
     r, _ = ravel_pytree(r)
 
-    if inverse_mass_matrix.ndim == 2:
+    if isinstance(inverse_mass_matrix, LowRankMatrix):
+        v = _low_rank_matvec(inverse_mass_matrix, r)
+    elif inverse_mass_matrix.ndim == 2:
         v = jnp.matmul(inverse_mass_matrix, r)
     elif inverse_mass_matrix.ndim == 1:
         v = jnp.multiply(inverse_mass_matrix, r)
@@ -1204,13 +1659,19 @@ def _euclidean_kinetic_energy_grad(inverse_mass_matrix, r):
     if isinstance(inverse_mass_matrix, dict):
         r_grad = {}
         for site_names, inverse_mm in inverse_mass_matrix.items():
+            if site_names[-1] is Ellipsis:
+                v = _batched_matvec(inverse_mm, _stack_blocks(r, site_names))
+                r_grad.update(_unstack_blocks(v, site_names, r))
+                continue
             r_block = OrderedDict([(k, r[k]) for k in site_names])
             r_grad.update(_euclidean_kinetic_energy_grad(inverse_mm, r_block))
         return r_grad
 
     r, unravel_fn = ravel_pytree(r)
 
-    if inverse_mass_matrix.ndim == 2:
+    if isinstance(inverse_mass_matrix, LowRankMatrix):
+        v = _low_rank_matvec(inverse_mass_matrix, r)
+    elif inverse_mass_matrix.ndim == 2:
         v = jnp.matmul(inverse_mass_matrix, r)
     elif inverse_mass_matrix.ndim == 1:
         v = jnp.multiply(inverse_mass_matrix, r)
@@ -0,0 +1,452 @@
+# Copyright Contributors to the Pyro project.
+# SPDX-License-Identifier: Apache-2.0
+
+from collections import namedtuple
+
+import jax
+from jax import random, vmap
+from jax.flatten_util import ravel_pytree
+import jax.numpy as jnp
+
+from numpyro.infer.hmc_util import welford_covariance
+from numpyro.infer.initialization import init_to_uniform
+from numpyro.infer.mcmc import MCMCKernel
+from numpyro.infer.util import initialize_model
+from numpyro.util import cond, identity, is_prng_key
+
+MCLMCState = namedtuple(
+    "MCLMCState",
+    [
+        "i",
+        "z",
+        "z_grad",
+        "potential_energy",
+        "u",
+        "energy_change",
+        "diverging",
+        "adapt_state",
+        "rng_key",
+    ],
+)
+"""
+A :func:`~collections.namedtuple` consisting of the following fields:
+
+ - **i** - iteration.
+ - **z** - Python collection representing values (unconstrained samples from
+   the posterior) at latent sites.
+ - **z_grad** - Gradient of potential energy w.r.t. latent sample sites.
+ - **potential_energy** - Potential energy computed at the given value of ``z``.
+ - **u** - The flattened velocity, which is a unit vector.
+ - **energy_change** - Change of the energy of the last step, whose variance per
+   dimension is used to tune the step size.
+ - **diverging** - A boolean value to indicate whether the last step produced a
+   non-finite state, in which case the step is discarded.
+ - **adapt_state** - A ``MCLMCAdaptState`` namedtuple which contains adaptation
+   information during warmup:
+
+   + **step_size** - Step size to be used by the integrator in the next iteration.
+   + **L** - The momentum decoherence length.
+   + **inverse_mass_matrix** - The diagonal preconditioner of the flattened
+     latent variables, whose square root scales the position update.
+   + **max_step_size** - Upper bound of the step size, which is decreased after
+     non-finite steps.
+   + **xi_average** - Weighted average of the normalized energy variance divided
+     by the sixth power of the step size.
+   + **weight_sum** - Sum of the (decayed) weights of that average.
+   + **variance_state** - Welford state of the variance of the flattened
+     samples, used to set ``L`` and ``inverse_mass_matrix`` during warmup.
+
+ - **rng_key** - random number generator seed used for the iteration.
+"""
+
+MCLMCAdaptState = namedtuple(
+    "MCLMCAdaptState",
+    [
+        "step_size",
+        "L",
+        "inverse_mass_matrix",
+        "max_step_size",
+        "xi_average",
+        "weight_sum",
+        "variance_state",
+    ],
+)
+
+
+def _esh_velocity_update(u, z_grad, step_size):
+    # Exact solution of the velocity update of the energy sampling Hamiltonian
+    # dynamics for a constant gradient over a time step (ref [1], eq. 16).
+    dim = u.shape[0]
+    g = -z_grad
+    g_norm = jnp.linalg.norm(g)
+    e = g / jnp.where(g_norm > 0, g_norm, 1.0)
+    ue = jnp.dot(u, e)
+    delta = step_size * g_norm / (dim - 1)
+    zeta = jnp.exp(-delta)
+    u_new = e * (1 - zeta) * (1 + zeta + ue * (1 - zeta)) + 2 * zeta * u
+    u_new = u_new / jnp.linalg.norm(u_new)
+    kinetic_change = delta - jnp.log(2.0) + jnp.log(1 + ue + (1 - ue) * zeta**2)
+    return u_new, kinetic_change * (dim - 1)
+
+
+class MCLMC(MCMCKernel):
+    """
+    Microcanonical Langevin Monte Carlo [1, 2].
+
+    The position moves with a velocity of unit norm under the energy sampling
+    Hamiltonian dynamics, whose velocity update has a closed form, and the velocity
+    is partially refreshed after each step with a noise which decorrelates it over
+    the distance `L`. Each iteration takes a single step of the leapfrog integrator,
+    so that it costs exactly one gradient evaluation, and there is no
+    Metropolis-Hastings correction. The bias of the samples is controlled by the
+    step size, which is tuned during warmup so that the variance of the energy
+    change per dimension is close to `desired_energy_var`. The posterior variances
+    of the latent variables are estimated in the third quarter of warmup and used
+    as a diagonal preconditioner, after which the step size is tuned again in the
+    last quarter. The momentum decoherence length `L` is set to the square root of
+    the sum of the preconditioned posterior variances.
+
+    Because every iteration costs the same, this kernel vectorizes without waste
+    across chains (`chain_method="vectorized"`) and is suited to high-dimensional
+    models, where it typically needs fewer gradient evaluations per effective sample
+    than :class:`~numpyro.infer.hmc.NUTS`. Successive samples are strongly
+    correlated, so consider using the `thinning` argument of
+    :class:`~numpyro.infer.mcmc.MCMC`.
+
+    .. note:: The velocity update needs the latent space to have at least two
+        dimensions.
+
+    **References:**
+
+    1. *Microcanonical Hamiltonian Monte Carlo*,
+       Jakob Robnik, G. Bruno De Luca, Eva Silverstein, Uroš Seljak
+    2. *Microcanonical Langevin Monte Carlo*,
+       Jakob Robnik, Uroš Seljak
+
+    :param model: Python callable containing Pyro :mod:`~numpyro.primitives`.
+        If model is provided, `potential_fn` will be inferred using the model.
+    :param potential_fn: Python callable that computes the potential energy
+        given input parameters. The input parameters to `potential_fn` can be
+        any python collection type, provided that `init_params` argument to
+        :meth:`init` has the same type.
+    :param float step_size: Initial step size. Defaults to
+        :math:`\\sqrt{d} / 4` where :math:`d` is the number of latent dimensions.
+    :param float L: Initial momentum decoherence length. Defaults to
+        :math:`\\sqrt{d}`.
+    :param bool adapt_step_size: A flag to decide if we want to adapt the step size
+        during warmup. Defaults to True.
+    :param bool adapt_L: A flag to decide if we want to adapt `L` during warmup.
+        Defaults to True.
+    :param bool adapt_mass_matrix: A flag to decide if we want to adapt the
+        diagonal preconditioner during warmup. Defaults to True.
+    :param float desired_energy_var: Target variance of the energy change per
+        dimension. Defaults to 5e-4.
+    :param int num_effective_samples: Number of recent steps which effectively
+        contribute to the step size estimate during warmup. Defaults to 150.
+    :param callable init_strategy: a per-site initialization function.
+        See :ref:`init_strategy` section for available functions.
+
+    **Example**
+
+    .. doctest::
+
+        >>> import jax
+        >>> import numpyro
+        >>> import numpyro.distributions as dist
+        >>> from numpyro.infer import MCMC, MCLMC
+
+        >>> def model():
+        ...     numpyro.sample("x", dist.Normal().expand([100]))
+        >>>
+        >>> mcmc = MCMC(MCLMC(model), num_warmup=1000, num_samples=1000, thinning=5,
+        ...             progress_bar=False)
+        >>> mcmc.run(jax.random.PRNGKey(0))
+    """
+
+    def __init__(
+        self,
+        model=None,
+        potential_fn=None,
+        *,
+        step_size=None,
+        L=None,
+        adapt_step_size=True,
+        adapt_L=True,
+        adapt_mass_matrix=True,
+        desired_energy_var=5e-4,
+        num_effective_samples=150,
+        init_strategy=init_to_uniform,
+    ):
+        if not (model is None) ^ (potential_fn is None):
+            raise ValueError("Only one of `model` or `potential_fn` must be specified.")
+        self._model = model
+        self._potential_fn = potential_fn
+        self._step_size = step_size
+        self._L = L
+        self._adapt_step_size = adapt_step_size
+        self._adapt_L = adapt_L
+        self._adapt_mass_matrix = adapt_mass_matrix
+        self._desired_energy_var = desired_energy_var
+        self._decay_rate = (num_effective_samples - 1.0) / (num_effective_samples + 1.0)
+        self._init_strategy = init_strategy
+        self._potential_fn_gen = None
+        self._postprocess_fn = None
+        self._num_warmup = 0
+        self._sample_fn = self._sample
+
+    @property
+    def model(self):
+        return self._model
+
+    @property
+    def sample_field(self):
+        return "z"
+
+    @property
+    def default_fields(self):
+        return ("z", "diverging")
+
+    def get_diagnostics_str(self, state):
+        return "step size {:.2e}. L {:.2e}. energy change {:.2e}".format(
+            state.adapt_state.step_size, state.adapt_state.L, state.energy_change
+        )
+
+    def postprocess_fn(self, args, kwargs):
+        if self._postprocess_fn is None:
+            return identity
+        return self._postprocess_fn(*args, **kwargs)
+
+    def _init_state(self, rng_key, model_args, model_kwargs, init_params):
+        if self._model is not None:
+            (
+                new_params_info,
+                self._potential_fn_gen,
+                self._postprocess_fn,
+                _,
+            ) = initialize_model(
+                rng_key,
+                self._model,
+                dynamic_args=True,
+                init_strategy=self._init_strategy,
+                model_args=model_args,
+                model_kwargs=model_kwargs,
+            )
+            if init_params is None:
+                init_params = new_params_info.z
+        return init_params
+
+    def _get_potential_fn(self, model_args, model_kwargs):
+        if self._potential_fn_gen is not None:
+            return self._potential_fn_gen(*model_args, **model_kwargs)
+        return self._potential_fn
+
+    def init(
+        self, rng_key, num_warmup, init_params=None, model_args=(), model_kwargs={}
+    ):
+        # non-vectorized
+        if is_prng_key(rng_key):
+            rng_key, rng_key_init_model = random.split(rng_key)
+        # vectorized
+        else:
+            rng_key, rng_key_init_model = jnp.swapaxes(
+                vmap(random.split)(rng_key), 0, 1
+            )
+        init_params = self._init_state(
+            rng_key_init_model, model_args, model_kwargs, init_params
+        )
+        if self._potential_fn and init_params is None:
+            raise ValueError(
+                "Valid value of `init_params` must be provided with `potential_fn`."
+            )
+        self._num_warmup = num_warmup
+        # the variances are estimated over the window [num_warmup // 2, window_end)
+        if self._adapt_mass_matrix:
+            self._window_end = 3 * num_warmup // 4
+        else:
+            self._window_end = num_warmup
+
+        def init_fn(init_params, rng_key):
+            z = getattr(init_params, "z", init_params)
+            x, _ = ravel_pytree(z)
+            dim = x.shape[0]
+            if dim < 2:
+                raise ValueError("MCLMC requires at least two latent dimensions.")
+            potential_fn = self._get_potential_fn(model_args, model_kwargs)
+            potential_energy, z_grad = jax.value_and_grad(potential_fn)(z)
+            rng_key, rng_key_u = random.split(rng_key)
+            u = random.normal(rng_key_u, x.shape, dtype=x.dtype)
+            u = u / jnp.linalg.norm(u)
+            step_size = self._step_size
+            if step_size is None:
+                step_size = jnp.sqrt(dim) / 4
+            L = self._L if self._L is not None else jnp.sqrt(dim)
+            wc_init, _, _ = welford_covariance(diagonal=True)
+            adapt_state = MCLMCAdaptState(
+                jnp.asarray(step_size, dtype=x.dtype),
+                jnp.asarray(L, dtype=x.dtype),
+                jnp.ones_like(x),
+                jnp.asarray(jnp.inf, dtype=x.dtype),
+                jnp.zeros((), dtype=x.dtype),
+                jnp.zeros((), dtype=x.dtype),
+                wc_init(dim),
+            )
+            return MCLMCState(
+                jnp.array(0),
+                z,
+                z_grad,
+                potential_energy,
+                u,
+                jnp.zeros((), dtype=x.dtype),
+                jnp.array(False),
+                adapt_state,
+                rng_key,
+            )
+
+        if is_prng_key(rng_key):
+            return init_fn(init_params, rng_key)
+        self._sample_fn = vmap(self._sample, in_axes=(0, None, None))
+        return vmap(init_fn)(init_params, rng_key)
+
+    def _adapt(self, i, x, energy_change, diverging, adapt_state):
+        (
+            step_size,
+            L,
+            inverse_mass_matrix,
+            max_step_size,
+            xi_average,
+            weight_sum,
+            variance_state,
+        ) = adapt_state
+        dim = x.shape[0]
+        if self._adapt_step_size:
+            max_step_size = jnp.where(diverging, 0.8 * step_size, max_step_size)
+            # weigh the estimates of the step size by how close they are to the target
+            xi = energy_change**2 / (dim * self._desired_energy_var) + 1e-8
+            weight = jnp.exp(-0.5 * (jnp.log(xi) / (6.0 * 1.5)) ** 2)
+            xi_average = self._decay_rate * xi_average + weight * xi / step_size**6
+            weight_sum = self._decay_rate * weight_sum + weight
+            step_size = (xi_average / weight_sum) ** (-1 / 6)
+            step_size = jnp.minimum(step_size, max_step_size)
+
+        window_start = self._num_warmup // 2
+        # at least two samples are needed to estimate the variances
+        if (self._adapt_L or self._adapt_mass_matrix) and (
+            self._window_end - window_start > 1
+        ):
+            _, wc_update, wc_final = welford_covariance(diagonal=True)
+            variance_state = cond(
+                (i >= window_start) & (i < self._window_end),
+                (x, variance_state),
+                lambda args: wc_update(*args),
+                variance_state,
+                identity,
+            )
+
+            def update_fn(args):
+                variance_state, L, inverse_mass_matrix = args
+                var, _, _ = wc_final(variance_state, regularize=True)
+                if self._adapt_mass_matrix:
+                    inverse_mass_matrix = var
+                if self._adapt_L:
+                    L = jnp.sqrt(jnp.sum(var / inverse_mass_matrix))
+                return L, inverse_mass_matrix
+
+            L, inverse_mass_matrix = cond(
+                i == self._window_end - 1,
+                (variance_state, L, inverse_mass_matrix),
+                update_fn,
+                (L, inverse_mass_matrix),
+                identity,
+            )
+            if self._adapt_mass_matrix and self._adapt_step_size:
+                # restart the step size estimate in the preconditioned space
+                restart = i == self._window_end - 1
+                max_step_size = jnp.where(restart, jnp.inf, max_step_size)
+                xi_average = jnp.where(restart, 0.0, xi_average)
+                weight_sum = jnp.where(restart, 0.0, weight_sum)
+        return MCLMCAdaptState(
+            step_size,
+            L,
+            inverse_mass_matrix,
+            max_step_size,
+            xi_average,
+            weight_sum,
+            variance_state,
+        )
+
+    def _sample(self, state, model_args, model_kwargs):
+        potential_fn = self._get_potential_fn(model_args, model_kwargs)
+        x, unravel_fn = ravel_pytree(state.z)
+        x_grad, _ = ravel_pytree(state.z_grad)
+        dim = x.shape[0]
+
+        def flat_potential_fn(x):
+            return potential_fn(unravel_fn(x))
+
+        step_size, L = state.adapt_state.step_size, state.adapt_state.L
+        scale = jnp.sqrt(state.adapt_state.inverse_mass_matrix)
+        # leapfrog step of the energy sampling Hamiltonian dynamics in the
+        # preconditioned space, where the gradient is scaled accordingly
+        u, kinetic_change1 = _esh_velocity_update(
+            state.u, x_grad * scale, step_size / 2
+        )
+        x_new = x + step_size * scale * u
+        potential_energy, x_grad_new = jax.value_and_grad(flat_potential_fn)(x_new)
+        u, kinetic_change2 = _esh_velocity_update(u, x_grad_new * scale, step_size / 2)
+        energy_change = (
+            kinetic_change1
+            + kinetic_change2
+            + potential_energy
+            - state.potential_energy
+        )
+
+        # partial refresh of the velocity
+        rng_key, rng_key_u = random.split(state.rng_key)
+        nu = jnp.sqrt((jnp.exp(2 * step_size / L) - 1) / dim)
+        u = u + nu * random.normal(rng_key_u, u.shape, dtype=u.dtype)
+        u = u / jnp.linalg.norm(u)
+
+        diverging = ~(
+            jnp.isfinite(potential_energy)
+            & jnp.all(jnp.isfinite(x_new))
+            & jnp.all(jnp.isfinite(u))
+        )
+        x, x_grad, potential_energy, u, energy_change = cond(
+            diverging,
+            (x, x_grad, state.potential_energy, state.u),
+            lambda args: args + (jnp.zeros_like(energy_change),),
+            (x_new, x_grad_new, potential_energy, u, energy_change),
+            identity,
+        )
+
+        # not update adapt_state after warmup phase
+        adapt_state = cond(
+            state.i < self._num_warmup,
+            (state.i, x, energy_change, diverging, state.adapt_state),
+            lambda args: self._adapt(*args),
+            state.adapt_state,
+            identity,
+        )
+        return MCLMCState(
+            state.i + 1,
+            unravel_fn(x),
+            unravel_fn(x_grad),
+            potential_energy,
+            u,
+            energy_change,
+            diverging,
+            adapt_state,
+            rng_key,
+        )
+
+    def sample(self, state, model_args, model_kwargs):
+        """
+        Run MCLMC from the given :data:`~numpyro.infer.mclmc.MCLMCState` and return
+        the resulting :data:`~numpyro.infer.mclmc.MCLMCState`.
+
+        :param MCLMCState state: Represents the current state.
+        :param model_args: Arguments provided to the model.
+        :param model_kwargs: Keyword arguments provided to the model.
+        :return: Next `state` after running MCLMC.
+        """
+        return self._sample_fn(state, model_args, model_kwargs)
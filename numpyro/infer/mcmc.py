@@ -2,9 +2,13 @@
 # SPDX-License-Identifier: Apache-2.0
 
 from abc import ABC, abstractmethod
+from collections import OrderedDict, namedtuple
 from functools import partial
+import hashlib
 from operator import attrgetter
 import os
+import pickle
+import time
 import warnings
 
 import numpy as np
@@ -13,14 +17,21 @@ import jax
 from jax import device_get, jit, lax, local_device_count, pmap, random, vmap
 import jax.numpy as jnp
 
-from numpyro.diagnostics import print_summary
+from numpyro.diagnostics import (
+    effective_sample_size,
+    print_summary,
+    streaming_diagnostics,
+)
+from numpyro.infer.sinks import SampleSink
 from numpyro.util import (
     cached_by,
+    cond,
     find_stack_level,
     fori_collect,
     identity,
     is_prng_key,
     nested_attrgetter,
+    not_jax_tracer,
 )
 
 __all__ = [
@@ -213,14 +224,181 @@ def _collect_and_postprocess(postprocess_fn, collect_fields, remove_sites):
     return collect_and_postprocess
 
 
+def _sink_writer(sink, collect_fields, num_vectorized_chains):
+    @cached_by(_sink_writer, sink, collect_fields, num_vectorized_chains)
+    def sink_writer(chunk, start, num_valid, chain):
+        start, num_valid = int(start), int(num_valid)
+        if len(collect_fields) == 1:
+            chunk = (chunk,)
+        chunk = dict(zip(collect_fields, chunk))
+        chunk = jax.tree.map(lambda x: np.asarray(x)[:num_valid], chunk)
+        if num_vectorized_chains > 1:
+            # vectorized chains are stored along the second axis of the chunk
+            for c in range(num_vectorized_chains):
+                sink.write(c, start, jax.tree.map(lambda x: x[:, c], chunk))
+        else:
+            sink.write(int(chain), start, chunk)
+
+    return sink_writer
+
+
+class _SegmentSink(SampleSink):
+    # Forwards the draws of a segment of `MCMC.run_chunked` to `sink`, which is
+    # opened once for all segments, at the offset of the segment.
+    def __init__(self, sink):
+        super().__init__(sink.chunk_size)
+        self.sink = sink
+        self.offset = 0
+
+    def write(self, chain, start, draws):
+        self.sink.write(chain, self.offset + start, draws)
+
+    def read(self):
+        return jax.tree.map(
+            lambda x: x[:, self.offset : self.offset + self.num_draws], self.sink.read()
+        )
+
+
+def _online_diagnostics_fns(
+    sample_fn, transform, sample_field, lower_idx, num_vectorized_chains
+):
+    # The last element of the loop value is `(i, diagnostics_state)`, where the
+    # diagnostics state is updated with the samples of iterations `i >= lower_idx`.
+    update_fn = streaming_diagnostics()[1]
+    if num_vectorized_chains > 1:
+        update_fn = vmap(update_fn)
+    keys = (sample_fn, transform, sample_field, lower_idx, num_vectorized_chains)
+
+    @cached_by(_online_diagnostics_fns, *keys)
+    def online_diagnostics_sample_fn(x):
+        i, diagnostics_state = x[-1]
+        x = sample_fn(x[:-1])
+        diagnostics_state = cond(
+            i >= lower_idx,
+            (attrgetter(sample_field)(x[0]), diagnostics_state),
+            lambda args: update_fn(*args),
+            diagnostics_state,
+            identity,
+        )
+        return (*x, (i + 1, diagnostics_state))
+
+    @cached_by(_online_diagnostics_fns, *keys)
+    def online_diagnostics_transform(x):
+        return transform(x[:-1])
+
+    return online_diagnostics_sample_fn, online_diagnostics_transform
+
+
+@jit
+def _online_diagnostics_str(diagnostics_state):
+    stats = jax.tree.leaves(
+        streaming_diagnostics()[2](diagnostics_state),
+        is_leaf=lambda x: isinstance(x, dict) and "r_hat" in x,
+    )
+    max_r_hat = max([jnp.max(x["r_hat"]) for x in stats], default=jnp.nan)
+    min_n_eff = min([jnp.min(x["n_eff"]) for x in stats], default=jnp.nan)
+    return max_r_hat, min_n_eff
+
+
+def _profiling_fns(sample_fn, transform, num_tree_depths):
+    # The last element of the loop value is `(num_steps, tree_depth_counts)`, which
+    # accumulates the number of leapfrog steps and, if `num_tree_depths` is not None,
+    # the histogram of tree depths of the trajectories.
+    keys = (sample_fn, transform, num_tree_depths)
+
+    @cached_by(_profiling_fns, *keys)
+    def profiling_sample_fn(x):
+        total_num_steps, tree_depth_counts = x[-1]
+        x = sample_fn(x[:-1])
+        num_steps = x[0].num_steps
+        total_num_steps = total_num_steps + num_steps
+        if num_tree_depths is not None:
+            # tree_depth = floor(log2(num_steps)) + 1, i.e. the bit length of num_steps
+            tree_depth = jnp.iinfo(num_steps.dtype).bits - lax.clz(num_steps)
+            tree_depth = jnp.minimum(tree_depth, num_tree_depths - 1)
+            tree_depth_counts = tree_depth_counts + jax.nn.one_hot(
+                tree_depth, num_tree_depths, dtype=tree_depth_counts.dtype
+            )
+        return (*x, (total_num_steps, tree_depth_counts))
+
+    @cached_by(_profiling_fns, *keys)
+    def profiling_transform(x):
+        return transform(x[:-1])
+
+    return profiling_sample_fn, profiling_transform
+
+
+# Total time spent by XLA compiling executables in this process, which is updated by
+# a `jax.monitoring` listener registered by the first MCMC instance with `profile=True`.
+_COMPILE_TIME = {"total": 0.0, "listening": False}
+
+
+def _compile_time_listener(event, duration_secs, **kwargs):
+    if event == "/jax/core/compile/backend_compile_duration":
+        _COMPILE_TIME["total"] += duration_secs
+
+
+def _total_compile_time():
+    if not _COMPILE_TIME["listening"]:
+        jax.monitoring.register_event_duration_secs_listener(_compile_time_listener)
+        _COMPILE_TIME["listening"] = True
+    return _COMPILE_TIME["total"]
+
+
 # XXX: Is there a better hash key that we can use?
-def _hashable(x):
+def _hashable(x, hash_arrays=False):
     # NOTE: When the arguments are JITed, ShapedArray is hashable.
     if isinstance(x, (np.ndarray, jnp.ndarray)):
-        return id(x)
+        if hash_arrays and not_jax_tracer(x):
+            if jnp.issubdtype(x.dtype, jax.dtypes.prng_key):
+                x = random.key_data(x)
+            data = np.ascontiguousarray(device_get(x))
+            digest = hashlib.blake2b(data, digest_size=16).digest()
+            return (x.shape, str(x.dtype), digest)
+        return (x.shape, str(x.dtype), id(x))
     return x
 
 
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+
+class _LRUCache(object):
+    # A dictionary which keeps at most `maxsize` entries (or unlimited entries if
+    # `maxsize` is None) by evicting the least recently used ones. Hits and misses
+    # are counted as in `functools.lru_cache`.
+    def __init__(self, maxsize=None):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        if key in self._data:
+            self.hits += 1
+            self._data.move_to_end(key)
+            return self._data[key]
+        self.misses += 1
+        return default
+
+    def __setitem__(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if self.maxsize is not None:
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        self._data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self):
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._data))
+
+
 class MCMC(object):
     """
     Provides access to Markov Chain Monte Carlo inference algorithms in NumPyro.
@@ -292,6 +470,32 @@ class MCMC(object):
         on a same sized but different dataset will not result in additional compilation cost.
         Note that currently, this does not take effect for the case ``num_chains > 1``
         and ``chain_method == 'parallel'``.
+    :param bool online_diagnostics: Whether to update streaming estimates of mean,
+        standard deviation, effective sample size and split R-hat of the (unconstrained)
+        samples at each post-warmup iteration, see
+        :func:`~numpyro.diagnostics.streaming_diagnostics`. The estimates are
+        available through :meth:`get_online_diagnostics` and they are displayed in the
+        progress bar. They also allow :meth:`run_chunked` to stop early.
+    :param ~numpyro.infer.sinks.SampleSink sink: An optional host-side writer which
+        receives the collected draws in chunks of `sink.chunk_size` draws during
+        sampling, so that device memory used for collection stays constant regardless
+        of `num_samples`. After :meth:`run`, :meth:`get_samples` and
+        :meth:`get_extra_fields` read the draws back from `sink`.
+    :param int cache_size: The maximum number of entries kept in each of the caches
+        of sampler functions and initial states, which are keyed on the model
+        arguments. Least recently used entries are evicted first, which releases
+        the arrays they hold on to. Use `None` for unbounded caches. Defaults to 8.
+        See :meth:`cache_info` and :meth:`clear_cache`.
+    :param bool hash_model_args: If set to `True`, array arguments of the model are
+        identified by their shape, dtype and a hash of their content instead of by
+        object identity. This allows calling :meth:`run` on fresh copies of the same
+        data without recompilation, at the cost of transferring the arrays to host
+        to hash them on each call.
+    :param bool profile: Whether to record the compilation time, the wall time and the
+        number of gradient evaluations of the warmup and sampling phases. When it is
+        set, :meth:`run` executes the two phases separately (with the same result) so
+        that they can be timed, and waits for the results to be ready before
+        returning. The report is available through :meth:`get_profile`.
 
     .. note:: It is possible to mix parallel and vectorized sampling, i.e., run vectorized chains
         on multiple devices using explicit `pmap`. Currently, doing so requires disabling the
@@ -332,6 +536,11 @@ class MCMC(object):
         chain_method="parallel",
         progress_bar=True,
         jit_model_args=False,
+        online_diagnostics=False,
+        sink=None,
+        cache_size=8,
+        hash_model_args=False,
+        profile=False,
     ):
         self.sampler = sampler
         self._sample_field = sampler.sample_field
@@ -375,27 +584,39 @@ class MCMC(object):
         if "CI" in os.environ or "PYTEST_XDIST_WORKER" in os.environ:
             self.progress_bar = False
         self._jit_model_args = jit_model_args
+        self.online_diagnostics = online_diagnostics
+        self.sink = sink
+        self._segment_sink = None
+        self.profile = profile
+        self._profile = {}
         self._states = None
         self._states_flat = None
+        self._online_diagnostics_state = None
+        self._online_diagnostics_init_state = None
         # HMCState returned by last run
         self._last_state = None
         # HMCState returned by last warmup
         self._warmup_state = None
         # HMCState returned by hmc.init_kernel
-        self._init_state_cache = {}
-        self._cache = {}
+        self._hash_model_args = hash_model_args
+        self._init_state_cache = _LRUCache(cache_size)
+        self._cache = _LRUCache(cache_size)
         self._collection_params = {}
         self._set_collection_params()
 
+    def _cache_key(self, args, kwargs):
+        def hashable(x):
+            return _hashable(x, self._hash_model_args)
+
+        args = jax.tree.map(hashable, args)
+        kwargs = jax.tree.map(hashable, tuple(sorted(kwargs.items())))
+        return args + kwargs
+
     def _get_cached_fns(self):
         if self._jit_model_args:
-            args, kwargs = (None,), (None,)
+            key = (None, None)
         else:
-            args = jax.tree.map(lambda x: _hashable(x), self._args)
-            kwargs = jax.tree.map(
-                lambda x: _hashable(x), tuple(sorted(self._kwargs.items()))
-            )
-        key = args + kwargs
+            key = self._cache_key(self._args, self._kwargs)
         try:
             fns = self._cache.get(key, None)
         # If unhashable arguments are provided, proceed normally
@@ -448,10 +669,7 @@ class MCMC(object):
         return fns
 
     def _get_cached_init_state(self, rng_key, args, kwargs):
-        rng_key = (_hashable(rng_key),)
-        args = jax.tree.map(lambda x: _hashable(x), args)
-        kwargs = jax.tree.map(lambda x: _hashable(x), tuple(sorted(kwargs.items())))
-        key = rng_key + args + kwargs
+        key = self._cache_key((rng_key,) + tuple(args), kwargs)
         try:
             return self._init_state_cache.get(key, None)
         # If unhashable arguments are provided, return None
@@ -459,7 +677,7 @@ class MCMC(object):
             return None
 
     def _single_chain_mcmc(self, init, args, kwargs, collect_fields, remove_sites):
-        rng_key, init_state, init_params = init
+        rng_key, init_state, init_params, chain_id, diagnostics_state = init
         # Check if _sample_fn is None, then we need to initialize the sampler.
         if init_state is None or (getattr(self.sampler, "_sample_fn", None) is None):
             new_init_state = self.sampler.init(
@@ -472,11 +690,19 @@ class MCMC(object):
             init_state = new_init_state if init_state is None else init_state
         sample_fn, postprocess_fn = self._get_cached_fns()
         diagnostics = (  # noqa: E731
-            lambda x: self.sampler.get_diagnostics_str(x[0])
-            if is_prng_key(rng_key) or self.sampler.is_ensemble_kernel
-            else ""
+            lambda x: (
+                self.sampler.get_diagnostics_str(x[0])
+                if is_prng_key(rng_key) or self.sampler.is_ensemble_kernel
+                else ""
+            )
         )
         init_val = (init_state, args, kwargs) if self._jit_model_args else (init_state,)
+        transform = _collect_and_postprocess(
+            postprocess_fn, collect_fields, remove_sites
+        )
+        num_vectorized_chains = (
+            self.num_chains if self.chain_method == "vectorized" else 1
+        )
         lower_idx = self._collection_params["lower"]
         upper_idx = self._collection_params["upper"]
         phase = self._collection_params["phase"]
@@ -486,18 +712,63 @@ class MCMC(object):
             if collection_size is None
             else collection_size // self.thinning
         )
+        if self.profile and "num_steps" in getattr(init_state, "_fields", ()):
+            num_tree_depths = None
+            if getattr(self.sampler, "_algo", None) == "NUTS":
+                num_tree_depths = int(np.max(self.sampler._max_tree_depth)) + 1
+            num_steps = jnp.zeros_like(init_state.num_steps)
+            tree_depth_counts = jnp.zeros(
+                jnp.shape(num_steps) + (num_tree_depths or 0,), dtype=num_steps.dtype
+            )
+            init_val = (*init_val, (num_steps, tree_depth_counts))
+            sample_fn, transform = _profiling_fns(sample_fn, transform, num_tree_depths)
+            profiling = True
+        else:
+            profiling = False
+        if self.online_diagnostics:
+            if diagnostics_state is None:
+                init_fn = streaming_diagnostics()[0]
+                if num_vectorized_chains > 1:
+                    init_fn = vmap(init_fn)
+                diagnostics_state = init_fn(attrgetter(self._sample_field)(init_state))
+            init_val = (*init_val, (jnp.array(0), diagnostics_state))
+            sample_fn, transform = _online_diagnostics_fns(
+                sample_fn,
+                transform,
+                self._sample_field,
+                lower_idx,
+                num_vectorized_chains,
+            )
+
+            def diagnostics(x, diagnostics=diagnostics):
+                i, diagnostics_state = x[-1]
+                if i <= lower_idx:
+                    return diagnostics(x)
+                if num_vectorized_chains == 1:
+                    diagnostics_state = jax.tree.map(
+                        lambda x: x[None], diagnostics_state
+                    )
+                max_r_hat, min_n_eff = _online_diagnostics_str(diagnostics_state)
+                return "{} max r_hat={:.2f}, min n_eff={:.0f}".format(
+                    diagnostics(x), max_r_hat, min_n_eff
+                ).strip()
+
+        sink = None
+        if self.sink is not None and (upper_idx - lower_idx) // self.thinning > 0:
+            sink = _sink_writer(self.sink, collect_fields, num_vectorized_chains)
         collect_vals = fori_collect(
             lower_idx,
             upper_idx,
             sample_fn,
             init_val,
-            transform=_collect_and_postprocess(
-                postprocess_fn, collect_fields, remove_sites
-            ),
+            transform=transform,
             progbar=self.progress_bar,
             return_last_val=True,
             thinning=self.thinning,
             collection_size=collection_size,
+            sink=sink,
+            sink_chunk_size=None if sink is None else self.sink.chunk_size,
+            sink_args=(chain_id,),
             progbar_desc=partial(_get_progbar_desc_str, lower_idx, phase),
             diagnostics_fn=diagnostics,
             num_chains=self.num_chains
@@ -507,10 +778,15 @@ class MCMC(object):
         states, last_val = collect_vals
         # Get first argument of type `HMCState`
         last_state = last_val[0]
+        if self.online_diagnostics:
+            diagnostics_state = last_val[-1][1]
+        profile_state = None
+        if profiling:
+            profile_state = last_val[-2] if self.online_diagnostics else last_val[-1]
         if len(collect_fields) == 1:
             states = (states,)
         states = dict(zip(collect_fields, states))
-        return states, last_state
+        return states, last_state, diagnostics_state, profile_state
 
     def _set_collection_params(
         self, lower=None, upper=None, collection_size=None, phase=None
@@ -522,15 +798,39 @@ class MCMC(object):
         self._collection_params["collection_size"] = collection_size
         self._collection_params["phase"] = phase
 
-    def _compile(self, rng_key, *args, extra_fields=(), init_params=None, **kwargs):
+    def compile(self, rng_key, *args, extra_fields=(), init_params=None, **kwargs):
+        """
+        Trace and compile the sampler functions ahead of time without drawing any
+        sample, so that subsequent calls of :meth:`warmup` or :meth:`run` with the
+        same arguments start sampling without compilation delay. The initial state
+        of the sampler is cached as well.
+
+        To also avoid the compilation cost in a new process (e.g. after a worker
+        restart), enable JAX's persistent compilation cache with
+        :func:`numpyro.util.enable_compilation_cache`: executables compiled by this
+        method are then saved to and loaded from disk.
+
+        .. note:: When `progress_bar=False`, the whole sampling loop is compiled as
+            a single program whose length depends on `num_warmup` and
+            `num_samples`, so this method only compiles the sampler initialization.
+            The persistent compilation cache is recommended for this case.
+
+        :param random.PRNGKey rng_key: Random number generator key to be used for the sampling.
+        :param args: Arguments to be provided to the :meth:`numpyro.infer.mcmc.MCMCKernel.init` method.
+            These are typically the arguments needed by the `model`.
+        :param extra_fields: Extra fields from the state object to be collected during
+            the MCMC run. See :meth:`run` for more details.
+        :type extra_fields: tuple or list of str
+        :param init_params: Initial parameters to begin sampling. See :meth:`run` for
+            more details.
+        :param kwargs: Keyword arguments to be provided to the :meth:`numpyro.infer.mcmc.MCMCKernel.init`
+            method. These are typically the keyword arguments needed by the `model`.
+        """
         self._set_collection_params(0, 0, self.num_samples)
         self.run(
             rng_key, *args, extra_fields=extra_fields, init_params=init_params, **kwargs
         )
-        rng_key = (_hashable(rng_key),)
-        args = jax.tree.map(lambda x: _hashable(x), args)
-        kwargs = jax.tree.map(lambda x: _hashable(x), tuple(sorted(kwargs.items())))
-        key = rng_key + args + kwargs
+        key = self._cache_key((rng_key,) + tuple(args), kwargs)
         try:
             self._init_state_cache[key] = self._last_state
         # If unhashable arguments are provided, return None
@@ -541,7 +841,10 @@ class MCMC(object):
         if self._states_flat is None:
             self._states_flat = jax.tree.map(
                 # need to calculate first dimension manually; see issue #1328
-                lambda x: jnp.reshape(x, (x.shape[0] * x.shape[1],) + x.shape[2:]),
+                # host arrays (e.g. memory-mapped draws) are reshaped without copying
+                lambda x: (np if isinstance(x, np.ndarray) else jnp).reshape(
+                    x, (x.shape[0] * x.shape[1],) + x.shape[2:]
+                ),
                 self._states,
             )
         return self._states_flat
@@ -652,6 +955,36 @@ class MCMC(object):
             See https://jax.readthedocs.io/en/latest/async_dispatch.html and
             https://jax.readthedocs.io/en/latest/profiling.html for pointers on profiling jax programs.
         """
+        if (
+            self.profile
+            and self._warmup_state is None
+            and self._collection_params["phase"] is None
+            and self.num_warmup > 0
+            and self._collection_params["lower"] == self.num_warmup
+            and not self.sampler.is_ensemble_kernel
+        ):
+            # run the warmup and sampling phases separately to time them
+            self.warmup(
+                rng_key,
+                *args,
+                extra_fields=extra_fields,
+                init_params=init_params,
+                **kwargs,
+            )
+            try:
+                self.run(
+                    self._warmup_state.rng_key,
+                    *args,
+                    extra_fields=extra_fields,
+                    **kwargs,
+                )
+            finally:
+                self._warmup_state = None
+            return
+
+        if self.profile:
+            start_time = time.perf_counter()
+            start_compile_time = _total_compile_time()
         init_params = jax.tree.map(
             lambda x: lax.convert_element_type(x, jnp.result_type(x)), init_params
         )
@@ -677,6 +1010,12 @@ class MCMC(object):
                     " as `num_chains`."
                 )
         assert isinstance(extra_fields, (tuple, list))
+        num_draws = (
+            self._collection_params["upper"] - self._collection_params["lower"]
+        ) // self.thinning
+        use_sink = self.sink is not None and num_draws > 0
+        if use_sink:
+            self.sink.open(self.num_chains, num_draws)
 
         collect_fields = {}
         remove_sites = {}
@@ -697,28 +1036,299 @@ class MCMC(object):
             collect_fields=collect_fields,
             remove_sites=remove_sites,
         )
-        map_args = (rng_key, init_state, init_params)
+        chain_ids = jnp.arange(self.num_chains) if self.num_chains > 1 else 0
+        # continue the online diagnostics of the previous chunk in `run_chunked`
+        diagnostics_state = self._online_diagnostics_init_state
+        map_args = (rng_key, init_state, init_params, chain_ids, diagnostics_state)
         if self.num_chains == 1:
-            states_flat, last_state = partial_map_fn(map_args)
+            states_flat, last_state, diagnostics_state, profile_state = partial_map_fn(
+                map_args
+            )
             states = jax.tree.map(lambda x: x[jnp.newaxis, ...], states_flat)
         else:
             if self.chain_method == "sequential":
-                states, last_state = _laxmap(partial_map_fn, map_args)
+                states, last_state, diagnostics_state, profile_state = _laxmap(
+                    partial_map_fn, map_args
+                )
             elif self.chain_method == "parallel":
-                states, last_state = pmap(partial_map_fn)(map_args)
+                states, last_state, diagnostics_state, profile_state = pmap(
+                    partial_map_fn
+                )(map_args)
             elif callable(self.chain_method):
-                states, last_state = self.chain_method(partial_map_fn)(map_args)
+                states, last_state, diagnostics_state, profile_state = (
+                    self.chain_method(partial_map_fn)(map_args)
+                )
             else:
                 assert self.chain_method == "vectorized"
-                states, last_state = partial_map_fn(map_args)
+                states, last_state, diagnostics_state, profile_state = partial_map_fn(
+                    map_args
+                )
                 # swap num_samples x num_chains to num_chains x num_samples
                 states = jax.tree.map(lambda x: jnp.swapaxes(x, 0, 1), states)
 
+        if use_sink:
+            # wait for all chunks to be flushed to the sink
+            jax.effects_barrier()
+            states = self.sink.read()
+
         self._last_state = last_state
         self._states = states
         self._states_flat = None
+        self._online_diagnostics_state = diagnostics_state
+        if self.profile:
+            jax.block_until_ready((states, last_state))
+            self._record_profile(
+                time.perf_counter() - start_time,
+                _total_compile_time() - start_compile_time,
+                profile_state,
+            )
         self._set_collection_params()
 
+    def _record_profile(self, wall_time, compile_time, profile_state):
+        lower = self._collection_params["lower"]
+        upper = self._collection_params["upper"]
+        phase = self._collection_params["phase"]
+        if upper == 0:
+            phase = "compile"
+        elif phase is None:
+            # warmup iterations are included if they were not run separately
+            phase = "sample" if lower == 0 else "run"
+        stats = {
+            "num_iterations": upper,
+            "compile_time": compile_time,
+            "wall_time": wall_time,
+            "num_grad_evals": None,
+            "grad_evals_per_second": None,
+            "tree_depth_histogram": None,
+        }
+        if profile_state is not None:
+            num_steps, tree_depth_counts = device_get(profile_state)
+            stats["num_grad_evals"] = num_grad_evals = int(np.sum(num_steps))
+            run_time = wall_time - compile_time
+            if run_time > 0:
+                stats["grad_evals_per_second"] = num_grad_evals / run_time
+            if tree_depth_counts.shape[-1] > 0:
+                stats["tree_depth_histogram"] = tree_depth_counts.reshape(
+                    -1, tree_depth_counts.shape[-1]
+                ).sum(0)
+        if phase == "sample":
+            samples = device_get(self._states[self._sample_field])
+            state_sample_field = attrgetter(self._sample_field)(self._last_state)
+            if isinstance(samples, dict) and isinstance(state_sample_field, dict):
+                # exclude deterministic sites as in `print_summary`
+                samples = {k: v for k, v in samples.items() if k in state_sample_field}
+            n_eff = None
+            if (upper - lower) // self.thinning > 1:
+                n_eff = min(
+                    (
+                        float(np.min(effective_sample_size(x)))
+                        for x in jax.tree.leaves(samples)
+                    ),
+                    default=None,
+                )
+            stats["n_eff"] = n_eff
+            stats["leapfrog_steps_per_ess"] = None
+            if n_eff and stats["num_grad_evals"] is not None:
+                stats["leapfrog_steps_per_ess"] = stats["num_grad_evals"] / n_eff
+        self._profile[phase] = stats
+
+    def run_chunked(
+        self,
+        rng_key,
+        *args,
+        num_chunks,
+        checkpoint_dir=None,
+        target_r_hat=None,
+        target_n_eff=None,
+        extra_fields=(),
+        init_params=None,
+        **kwargs,
+    ):
+        """
+        Run the MCMC samplers and collect samples in `num_chunks` consecutive
+        segments of `num_samples // num_chunks` draws. Each segment starts from the
+        last state of the previous one, so the collected samples are the same as
+        the ones obtained by :meth:`run` when the segment size is divisible by
+        `thinning`. Compiled sample functions are reused across segments.
+
+        If `checkpoint_dir` is provided, the post-warmup state and, after each
+        segment, the last state together with the draws of that segment are saved
+        to this directory. Calling :meth:`run_chunked` again with the same
+        `checkpoint_dir` (e.g. after a crash or preemption) skips the warmup phase
+        and the completed segments, then resumes sampling from the last saved
+        state. Because the state includes the adaptation state and the random
+        number generator key, the resumed run is reproducible.
+
+        If `target_r_hat` or `target_n_eff` is provided, sampling stops after the
+        first segment at which the online split R-hat of every (unconstrained) sample
+        site is at most `target_r_hat` and its online effective sample size is at
+        least `target_n_eff`. This requires `online_diagnostics=True`.
+
+        If a `sink` is provided to :class:`MCMC`, it is opened once for all segments
+        and each segment writes its draws at its offset, so that the draws are not
+        held in host memory and :meth:`get_samples` reads them back from `sink`.
+
+        **Example:**
+
+        .. code-block:: python
+
+            mcmc = MCMC(NUTS(model), num_warmup=1000, num_samples=10000)
+            mcmc.run_chunked(random.PRNGKey(0), num_chunks=10, checkpoint_dir="ckpt")
+            samples = mcmc.get_samples()
+
+        :param random.PRNGKey rng_key: Random number generator key to be used for the
+            warmup phase. It is ignored if the warmup state is restored from
+            `checkpoint_dir` or if :attr:`post_warmup_state` is set.
+        :param args: Arguments to be provided to the :meth:`numpyro.infer.mcmc.MCMCKernel.init` method.
+            These are typically the arguments needed by the `model`.
+        :param int num_chunks: Number of segments. It must divide `num_samples`.
+        :param str checkpoint_dir: An optional directory to save and restore checkpoints.
+        :param float target_r_hat: An optional upper bound of split R-hat for early stopping.
+        :param float target_n_eff: An optional lower bound of effective sample size for
+            early stopping.
+        :param extra_fields: Extra fields from the state object to be collected during
+            the MCMC run. See :meth:`run` for more details.
+        :type extra_fields: tuple or list of str
+        :param init_params: Initial parameters to begin sampling. See :meth:`run` for
+            more details.
+        :param kwargs: Keyword arguments to be provided to the :meth:`numpyro.infer.mcmc.MCMCKernel.init`
+            method. These are typically the keyword arguments needed by the `model`.
+        """
+        if num_chunks < 1 or self.num_samples % num_chunks != 0:
+            raise ValueError(
+                "`num_chunks` must be a positive divisor of `num_samples`."
+            )
+        chunk_size = self.num_samples // num_chunks
+        early_stopping = target_r_hat is not None or target_n_eff is not None
+        if early_stopping and not self.online_diagnostics:
+            raise ValueError(
+                "Early stopping requires `online_diagnostics=True` in MCMC."
+            )
+
+        def converged():
+            for stats in jax.tree.leaves(
+                self.get_online_diagnostics(),
+                is_leaf=lambda x: isinstance(x, dict) and "r_hat" in x,
+            ):
+                if target_r_hat is not None and not np.all(
+                    stats["r_hat"] <= target_r_hat
+                ):
+                    return False
+                if target_n_eff is not None and not np.all(
+                    stats["n_eff"] >= target_n_eff
+                ):
+                    return False
+            return True
+
+        def checkpoint_file(name):
+            return os.path.join(checkpoint_dir, "{}.pkl".format(name))
+
+        def load_checkpoint(name):
+            if checkpoint_dir is None or not os.path.exists(checkpoint_file(name)):
+                return None
+            with open(checkpoint_file(name), "rb") as f:
+                checkpoint = pickle.load(f)
+            if checkpoint["chunk_size"] != chunk_size:
+                raise ValueError(
+                    "The checkpoint at {} was saved with `num_samples // num_chunks = {}`,"
+                    " but got {}.".format(
+                        checkpoint_file(name), checkpoint["chunk_size"], chunk_size
+                    )
+                )
+            return checkpoint
+
+        def save_checkpoint(name, **checkpoint):
+            if checkpoint_dir is None:
+                return
+            checkpoint["chunk_size"] = chunk_size
+            # write to a temporary file first so that a crash does not leave
+            # a partially written checkpoint
+            tmp_file = checkpoint_file(name) + ".tmp"
+            with open(tmp_file, "wb") as f:
+                pickle.dump(device_get(checkpoint), f)
+            os.replace(tmp_file, checkpoint_file(name))
+
+        if checkpoint_dir is not None:
+            os.makedirs(checkpoint_dir, exist_ok=True)
+        user_warmup_state = self._warmup_state
+        if self._warmup_state is None:
+            checkpoint = load_checkpoint("warmup")
+            if checkpoint is None:
+                self.warmup(
+                    rng_key,
+                    *args,
+                    extra_fields=extra_fields,
+                    init_params=init_params,
+                    **kwargs,
+                )
+                save_checkpoint("warmup", state=self._warmup_state)
+            else:
+                self._warmup_state = checkpoint["state"]
+
+        num_samples = self.num_samples
+        state = self._warmup_state
+        chunk_states = []
+        self._online_diagnostics_state = None
+        # the sink is opened once for all segments, each segment writing its draws
+        # at its own offset
+        sink = self.sink
+        chunk_draws = chunk_size // self.thinning
+        use_sink = sink is not None and chunk_draws > 0
+        if use_sink:
+            sink.open(self.num_chains, num_chunks * chunk_draws)
+            if self._segment_sink is None or self._segment_sink.sink is not sink:
+                # reuse the wrapper so that the compiled sample functions are reused
+                self._segment_sink = _SegmentSink(sink)
+            self.sink = self._segment_sink
+        try:
+            self.num_samples = chunk_size
+            for i in range(num_chunks):
+                if use_sink:
+                    self._segment_sink.offset = i * chunk_draws
+                checkpoint = load_checkpoint("chunk_{}".format(i))
+                if checkpoint is None:
+                    self._warmup_state = state
+                    self._online_diagnostics_init_state = self._online_diagnostics_state
+                    self.run(state.rng_key, *args, extra_fields=extra_fields, **kwargs)
+                    state = self._last_state
+                    states = device_get(self._states)
+                    save_checkpoint(
+                        "chunk_{}".format(i),
+                        state=state,
+                        states=states,
+                        diagnostics_state=self._online_diagnostics_state,
+                    )
+                else:
+                    state, states = checkpoint["state"], checkpoint["states"]
+                    self._online_diagnostics_state = checkpoint["diagnostics_state"]
+                    if use_sink:
+                        for chain in range(self.num_chains):
+                            self._segment_sink.write(
+                                chain, 0, jax.tree.map(lambda x: x[chain], states)
+                            )
+                if use_sink:
+                    # the draws are kept in the sink rather than in host memory
+                    chunk_states.append(None)
+                else:
+                    chunk_states.append(states)
+                if early_stopping and converged():
+                    break
+        finally:
+            self.num_samples = num_samples
+            self.sink = sink
+            self._warmup_state = user_warmup_state
+            self._online_diagnostics_init_state = None
+
+        self._last_state = state
+        if use_sink:
+            num_draws = len(chunk_states) * chunk_draws
+            self._states = jax.tree.map(lambda x: x[:, :num_draws], sink.read())
+        else:
+            self._states = jax.tree.map(
+                lambda *xs: np.concatenate(xs, axis=1), *chunk_states
+            )
+        self._states_flat = None
+
     def get_samples(self, group_by_chain=False):
         """
         Get samples from the MCMC run.
@@ -757,6 +1367,60 @@ class MCMC(object):
         states = self._states if group_by_chain else self._get_states_flat()
         return {k: v for k, v in states.items() if k != self._sample_field}
 
+    def get_online_diagnostics(self):
+        """
+        Get the streaming estimates of mean, standard deviation, effective sample size
+        and split R-hat computed during the last run when `online_diagnostics=True`.
+        See :func:`~numpyro.diagnostics.streaming_diagnostics` for more details.
+
+        :return: a pytree with the same structure as the (unconstrained) samples of
+            the sampler, where each leaf is a dictionary of `mean`, `std`, `n_eff`,
+            and `r_hat` estimates.
+        """
+        if self._online_diagnostics_state is None:
+            raise ValueError(
+                "Online diagnostics are not available. Please set"
+                " `online_diagnostics=True` and run MCMC."
+            )
+        diagnostics_state = self._online_diagnostics_state
+        if self.num_chains == 1:
+            diagnostics_state = jax.tree.map(lambda x: x[None], diagnostics_state)
+        return device_get(streaming_diagnostics()[2](diagnostics_state))
+
+    def get_profile(self):
+        """
+        Get the profiling report of the last runs of each phase when `profile=True`.
+
+        The report is a dictionary keyed by phase: `"warmup"` and `"sample"` for the
+        warmup and sampling phases, `"compile"` for :meth:`compile`, and `"run"` for
+        runs of ensemble kernels, whose phases are not run separately. Each phase
+        maps to a dictionary with the following keys:
+
+        - **num_iterations** - the number of iterations of each chain.
+        - **compile_time** - the time spent by XLA compiling executables, in seconds.
+        - **wall_time** - the wall time of the phase including compilation, in seconds.
+        - **num_grad_evals** - the total number of leapfrog steps, i.e. gradient
+          evaluations, of all chains. This is `None` for kernels whose state does not
+          have a `num_steps` field.
+        - **grad_evals_per_second** - the throughput of gradient evaluations,
+          excluding the compilation time.
+        - **tree_depth_histogram** - for NUTS, the number of trajectories of each
+          tree depth `tree_depth = np.log2(num_steps).astype(int) + 1`.
+
+        The `"sample"` phase also has keys **n_eff**, the minimum effective sample
+        size over all components of the latent sites, and **leapfrog_steps_per_ess**,
+        the number of gradient evaluations per effective sample.
+
+        :return: the profiling report.
+        :rtype: dict
+        """
+        if not self._profile:
+            raise ValueError(
+                "Profiling report is not available. Please set"
+                " `profile=True` and run MCMC."
+            )
+        return {phase: stats.copy() for phase, stats in self._profile.items()}
+
     def print_summary(self, prob=0.9, exclude_deterministic=True):
         """
         Print the statistics of posterior samples collected during running this MCMC instance.
@@ -792,9 +1456,32 @@ class MCMC(object):
         Reduce the memory footprint of collected samples by transferring them to the host device.
         """
         self._states = device_get(self._states)
-        self._states_flat = device_get(self._get_states_flat())
+        # flattened states are views of the grouped host states
+        self._states_flat = None
+
+    def cache_info(self):
+        """
+        Return the statistics of the caches of sampler functions and initial states.
+
+        :return: a dictionary with keys `"fns"` and `"init_state"`, each maps to a
+            named tuple of `hits`, `misses`, `maxsize` and `currsize` like
+            :func:`functools.lru_cache`.
+        :rtype: dict
+        """
+        return {
+            "fns": self._cache.info(),
+            "init_state": self._init_state_cache.info(),
+        }
+
+    def clear_cache(self):
+        """
+        Clear the caches of sampler functions and initial states, and reset their
+        statistics. This releases the model arguments held by the cached entries.
+        """
+        self._cache.clear()
+        self._init_state_cache.clear()
 
     def __getstate__(self):
         state = self.__dict__.copy()
-        state["_cache"] = {}
+        state["_cache"] = _LRUCache(self._cache.maxsize)
         return state
@@ -0,0 +1,452 @@
+# Copyright Contributors to the Pyro project.
+# SPDX-License-Identifier: Apache-2.0
+
+from collections import namedtuple
+import math
+
+from jax import jit, lax, random, value_and_grad, vmap
+from jax.flatten_util import ravel_pytree
+import jax.numpy as jnp
+from jax.scipy.linalg import solve_triangular
+
+from numpyro.infer.initialization import init_to_uniform, init_to_value
+from numpyro.infer.util import initialize_model
+
+PathfinderResult = namedtuple(
+    "PathfinderResult", ["z", "log_density", "log_q", "elbo", "num_iterations"]
+)
+"""
+A :func:`~collections.namedtuple` consisting of the following fields:
+
+ - **z** - Python collection representing the approximate posterior draws in the
+   unconstrained space, with a leading dimension of size `num_draws`.
+ - **log_density** - Log joint density of the model at ``z``.
+ - **log_q** - Log density of the Pathfinder approximation at ``z``.
+ - **elbo** - The ELBO of the selected normal approximation of each path.
+ - **num_iterations** - The number of L-BFGS iterations of each path.
+"""
+
+_LBFGSState = namedtuple(
+    "_LBFGSState", ["i", "x", "f", "g", "alpha", "S", "Y", "mask", "done"]
+)
+
+
+def _inverse_hessian_factors(alpha, S, Y, mask):
+    # Compact representation of the L-BFGS inverse Hessian (Byrd et al., 1994)
+    #   H = diag(alpha) + beta @ gamma @ beta.T,
+    # where the rows of S, Y are the last J position and gradient differences.
+    # Unused rows of the history are zero and masked out.
+    J = mask.shape[0]
+    SY = S @ Y.T
+    R = jnp.triu(SY) + jnp.diag(~mask)
+    R_inv = solve_triangular(R, jnp.identity(J), lower=False)
+    D = jnp.diag(jnp.diag(SY))
+    beta = jnp.concatenate([alpha[:, None] * Y.T, S.T], axis=1)
+    gamma = jnp.block(
+        [
+            [jnp.zeros((J, J)), -R_inv],
+            [-R_inv.T, R_inv.T @ (D + (Y * alpha) @ Y.T) @ R_inv],
+        ]
+    )
+    return beta, gamma
+
+
+def _update_diagonal(alpha, s, y):
+    # diagonal of the BFGS update of the Hessian diag(1 / alpha), see
+    # Gilbert and Lemarechal (1989)
+    a = jnp.dot(y * alpha, y)
+    b = jnp.dot(y, s)
+    c = jnp.dot(s / alpha, s)
+    return 1 / (a / (b * alpha) + y**2 / b - a * (s / alpha) ** 2 / (b * c))
+
+
+def _bfgs_sample(rng_key, num_draws, x, g, alpha, beta, gamma):
+    # draws from the normal approximation N(x - H @ g, H) using a thin QR
+    # decomposition of the low-rank factor, see Zhang et al. (2022)
+    dim = x.shape[0]
+    sqrt_alpha = jnp.sqrt(alpha)
+    Q, R = jnp.linalg.qr(beta / sqrt_alpha[:, None])
+    L = jnp.linalg.cholesky(jnp.identity(R.shape[0]) + R @ gamma @ R.T)
+    logdet = jnp.sum(jnp.log(alpha)) + 2 * jnp.sum(jnp.log(jnp.diag(L)))
+    loc = x - (alpha * g + beta @ (gamma @ (beta.T @ g)))
+    u = random.normal(rng_key, (num_draws, dim))
+    uQ = u @ Q
+    z = loc + sqrt_alpha * (uQ @ L.T @ Q.T + u - uQ @ Q.T)
+    log_q = -0.5 * (logdet + jnp.sum(u**2, axis=-1) + dim * math.log(2 * math.pi))
+    return z, log_q
+
+
+def _log_density_and_elbo(potential_fn, z, log_q):
+    log_density = -vmap(potential_fn)(z)
+    log_density = jnp.where(jnp.isnan(log_density), -jnp.inf, log_density)
+    elbo = jnp.mean(log_density - log_q)
+    return log_density, jnp.where(jnp.isnan(elbo), -jnp.inf, elbo)
+
+
+def _single_path(
+    rng_key,
+    x,
+    potential_fn,
+    *,
+    num_draws,
+    num_elbo_draws,
+    maxiter,
+    history_size,
+    max_line_search_steps,
+    ftol,
+    gtol,
+):
+    """
+    Runs L-BFGS from `x`, evaluates the ELBO of the normal approximation at each
+    iterate and returns draws from the approximation with the highest ELBO.
+    """
+    dim = x.shape[0]
+    eps = jnp.finfo(x.dtype).eps
+    value_and_grad_fn = value_and_grad(potential_fn)
+    f, g = value_and_grad_fn(x)
+    state = _LBFGSState(
+        0,
+        x,
+        f,
+        g,
+        jnp.ones(dim),
+        jnp.zeros((history_size, dim)),
+        jnp.zeros((history_size, dim)),
+        jnp.zeros(history_size, dtype=bool),
+        ~jnp.isfinite(f),
+    )
+
+    def approx_elbo(rng_key, state):
+        beta, gamma = _inverse_hessian_factors(
+            state.alpha, state.S, state.Y, state.mask
+        )
+        z, log_q = _bfgs_sample(
+            rng_key, num_elbo_draws, state.x, state.g, state.alpha, beta, gamma
+        )
+        return _log_density_and_elbo(potential_fn, z, log_q)[1]
+
+    def line_search(x, f, g, p):
+        # backtracking line search with the Armijo condition
+        slope = jnp.dot(g, p)
+
+        def cond_fn(val):
+            k, step_size, f_new = val
+            sufficient_decrease = f_new <= f + 1e-4 * step_size * slope
+            return (k < max_line_search_steps) & ~sufficient_decrease
+
+        def body_fn(val):
+            k, step_size, _ = val
+            step_size = 0.5 * step_size
+            f_new = potential_fn(x + step_size * p)
+            return k + 1, step_size, jnp.where(jnp.isnan(f_new), jnp.inf, f_new)
+
+        f_new = potential_fn(x + p)
+        init_val = (0, jnp.ones(()), jnp.where(jnp.isnan(f_new), jnp.inf, f_new))
+        k, step_size, f_new = lax.while_loop(cond_fn, body_fn, init_val)
+        success = f_new <= f + 1e-4 * step_size * slope
+        return step_size, success
+
+    def lbfgs_step(state):
+        beta, gamma = _inverse_hessian_factors(
+            state.alpha, state.S, state.Y, state.mask
+        )
+        p = -(state.alpha * state.g + beta @ (gamma @ (beta.T @ state.g)))
+        # fall back to a scaled steepest descent if p is not a descent direction
+        is_descent = jnp.dot(p, state.g) < 0
+        p = jnp.where(is_descent, p, -state.alpha * state.g)
+        step_size, success = line_search(state.x, state.f, state.g, p)
+        x_new = state.x + step_size * p
+        f_new, g_new = value_and_grad_fn(x_new)
+        success = success & jnp.all(jnp.isfinite(g_new))
+        s, y = x_new - state.x, g_new - state.g
+        # only keep the pairs satisfying the curvature condition in the history
+        update = success & (jnp.dot(s, y) > eps * jnp.dot(y, y))
+        alpha = jnp.where(update, _update_diagonal(state.alpha, s, y), state.alpha)
+        S = jnp.where(update, jnp.roll(state.S, -1, 0).at[-1].set(s), state.S)
+        Y = jnp.where(update, jnp.roll(state.Y, -1, 0).at[-1].set(y), state.Y)
+        mask = jnp.where(update, jnp.roll(state.mask, -1).at[-1].set(True), state.mask)
+        converged = (
+            jnp.abs(state.f - f_new)
+            <= ftol * jnp.maximum(jnp.maximum(jnp.abs(state.f), jnp.abs(f_new)), 1)
+        ) | (jnp.max(jnp.abs(g_new)) <= gtol)
+        new_state = _LBFGSState(
+            state.i + 1, x_new, f_new, g_new, alpha, S, Y, mask, converged
+        )
+        new_state = _LBFGSState(
+            *[
+                jnp.where(success, new, old) if i > 0 else new
+                for i, (new, old) in enumerate(zip(new_state, state))
+            ]
+        )
+        return new_state._replace(done=~success | new_state.done), success
+
+    def cond_fn(val):
+        state = val[0]
+        return (state.i < maxiter) & ~state.done
+
+    def body_fn(val):
+        state, best_state, best_elbo, num_iterations = val
+        state, success = lbfgs_step(state)
+        elbo = approx_elbo(random.fold_in(rng_key, state.i), state)
+        elbo = jnp.where(success, elbo, -jnp.inf)
+        is_better = elbo > best_elbo
+        best_state = _LBFGSState(
+            *[jnp.where(is_better, new, old) for new, old in zip(state, best_state)]
+        )
+        best_elbo = jnp.where(is_better, elbo, best_elbo)
+        num_iterations = num_iterations + success
+        return state, best_state, best_elbo, num_iterations
+
+    rng_key, rng_key_init, rng_key_draws = random.split(rng_key, 3)
+    init_elbo = approx_elbo(rng_key_init, state)
+    _, best_state, best_elbo, num_iterations = lax.while_loop(
+        cond_fn, body_fn, (state, state, init_elbo, 0)
+    )
+    beta, gamma = _inverse_hessian_factors(
+        best_state.alpha, best_state.S, best_state.Y, best_state.mask
+    )
+    z, log_q = _bfgs_sample(
+        rng_key_draws,
+        num_draws,
+        best_state.x,
+        best_state.g,
+        best_state.alpha,
+        beta,
+        gamma,
+    )
+    log_density, _ = _log_density_and_elbo(potential_fn, z, log_q)
+    return z, log_density, log_q, best_elbo, num_iterations
+
+
+class Pathfinder:
+    """
+    Pathfinder variational inference [1], which runs L-BFGS on the log joint
+    density of a model and picks, along the optimization path, the normal
+    approximation (with a diagonal plus low-rank covariance matrix given by the
+    L-BFGS inverse Hessian) that has the highest ELBO. Multi-path Pathfinder runs
+    several independent paths in parallel and combines their draws by
+    importance resampling.
+
+    Pathfinder is cheap compared to the warmup phase of HMC/NUTS, so its draws are
+    useful to initialize the chains and the mass matrix of NUTS, which allows to
+    reduce the number of warmup steps.
+
+    **References:**
+
+    1. *Pathfinder: Parallel quasi-Newton variational inference*,
+       Lu Zhang, Bob Carpenter, Andrew Gelman, Aki Vehtari
+
+    **Example**
+
+    .. doctest::
+
+        >>> import jax.numpy as jnp
+        >>> from jax import random
+        >>> import numpyro
+        >>> import numpyro.distributions as dist
+        >>> from numpyro.infer import MCMC, NUTS, Pathfinder
+
+        >>> def model(data):
+        ...     loc = numpyro.sample("loc", dist.Normal(0., 10.))
+        ...     scale = numpyro.sample("scale", dist.LogNormal(0., 1.))
+        ...     with numpyro.plate("N", data.shape[0]):
+        ...         numpyro.sample("obs", dist.Normal(loc, scale), obs=data)
+
+        >>> data = 3. + random.normal(random.PRNGKey(0), (100,))
+        >>> pathfinder = Pathfinder(model, num_paths=4)
+        >>> result = pathfinder.run(random.PRNGKey(1), data)
+        >>> kernel = NUTS(
+        ...     model,
+        ...     init_strategy=pathfinder.get_init_strategy(),
+        ...     inverse_mass_matrix=pathfinder.get_inverse_mass_matrix(),
+        ... )
+        >>> mcmc = MCMC(kernel, num_warmup=200, num_samples=1000)
+        >>> mcmc.run(random.PRNGKey(2), data)
+
+    :param model: Python callable containing Pyro primitives.
+    :param int num_paths: Number of independent L-BFGS paths. Defaults to 4.
+    :param int num_draws: Number of approximate posterior draws. If `num_paths > 1`
+        and `importance_resampling=True`, `num_draws` draws are taken from each
+        path and `num_draws` of them are resampled. Defaults to 1000.
+    :param int num_elbo_draws: Number of draws used to estimate the ELBO of the
+        normal approximation at each iteration of L-BFGS. Defaults to 10.
+    :param int maxiter: Maximum number of L-BFGS iterations. Defaults to 1000.
+    :param int history_size: Number of position and gradient differences kept by
+        L-BFGS, i.e. the rank of the low-rank part of the approximation is at most
+        `2 * history_size`. Defaults to 6.
+    :param int max_line_search_steps: Maximum number of halvings of the step size
+        in the backtracking line search. Defaults to 30.
+    :param float ftol: L-BFGS stops when the relative decrease of the potential
+        energy is smaller than `ftol`. Defaults to 1e-6.
+    :param float gtol: L-BFGS stops when the largest absolute value of the
+        gradient is smaller than `gtol`. Defaults to 1e-8.
+    :param bool importance_resampling: Whether to combine the draws of multiple
+        paths by importance resampling. If `False`, the draws of all paths are
+        concatenated. Defaults to True.
+    :param callable init_strategy: a per-site initialization function to draw
+        the initial positions of the paths.
+        See :ref:`init_strategy` section for available functions.
+    :param bool forward_mode_differentiation: whether to use forward-mode differentiation
+        or reverse-mode differentiation. See :func:`~numpyro.infer.util.initialize_model`.
+    """
+
+    def __init__(
+        self,
+        model,
+        *,
+        num_paths=4,
+        num_draws=1000,
+        num_elbo_draws=10,
+        maxiter=1000,
+        history_size=6,
+        max_line_search_steps=30,
+        ftol=1e-6,
+        gtol=1e-8,
+        importance_resampling=True,
+        init_strategy=init_to_uniform,
+        forward_mode_differentiation=False,
+    ):
+        self.model = model
+        self.num_paths = num_paths
+        self.num_draws = num_draws
+        self.num_elbo_draws = num_elbo_draws
+        self.maxiter = maxiter
+        self.history_size = history_size
+        self.max_line_search_steps = max_line_search_steps
+        self.ftol = ftol
+        self.gtol = gtol
+        self.importance_resampling = importance_resampling
+        self.init_strategy = init_strategy
+        self.forward_mode_differentiation = forward_mode_differentiation
+        self._postprocess_fn = None
+        self._result = None
+
+    def run(self, rng_key, *args, init_params=None, **kwargs):
+        """
+        Run Pathfinder to get approximate draws from the posterior.
+
+        :param jax.random.PRNGKey rng_key: Random number generator key.
+        :param args: Arguments to the model.
+        :param init_params: Initial positions of the paths in the unconstrained
+            space, with a leading dimension of size `num_paths`. If not specified,
+            they are drawn with `init_strategy`.
+        :param kwargs: Keyword arguments to the model.
+        :return: a :data:`PathfinderResult` of the draws.
+        """
+        rng_key_init, rng_key_paths, rng_key_resample = random.split(rng_key, 3)
+        model_info = initialize_model(
+            random.split(rng_key_init, self.num_paths),
+            self.model,
+            init_strategy=self.init_strategy,
+            model_args=args,
+            model_kwargs=kwargs,
+            forward_mode_differentiation=self.forward_mode_differentiation,
+        )
+        if init_params is None:
+            init_params = model_info.param_info.z
+        _, unravel_fn = ravel_pytree({k: v[0] for k, v in init_params.items()})
+        x = vmap(lambda z: ravel_pytree(z)[0])(init_params)
+
+        def potential_fn(x):
+            return model_info.potential_fn(unravel_fn(x))
+
+        def single_path(rng_key, x):
+            return _single_path(
+                rng_key,
+                x,
+                potential_fn,
+                num_draws=self.num_draws,
+                num_elbo_draws=self.num_elbo_draws,
+                maxiter=self.maxiter,
+                history_size=self.history_size,
+                max_line_search_steps=self.max_line_search_steps,
+                ftol=self.ftol,
+                gtol=self.gtol,
+            )
+
+        z, log_density, log_q, elbo, num_iterations = jit(vmap(single_path))(
+            random.split(rng_key_paths, self.num_paths), x
+        )
+        z = z.reshape((-1, z.shape[-1]))
+        log_density, log_q = log_density.reshape(-1), log_q.reshape(-1)
+        if self.num_paths > 1 and self.importance_resampling:
+            log_weights = jnp.where(
+                jnp.isnan(log_density - log_q), -jnp.inf, log_density - log_q
+            )
+            idx = random.categorical(
+                rng_key_resample, log_weights, shape=(self.num_draws,)
+            )
+            z, log_density, log_q = z[idx], log_density[idx], log_q[idx]
+        self._postprocess_fn = model_info.postprocess_fn
+        self._result = PathfinderResult(
+            vmap(unravel_fn)(z), log_density, log_q, elbo, num_iterations
+        )
+        return self._result
+
+    def _get_result(self):
+        if self._result is None:
+            raise ValueError("Please run Pathfinder first.")
+        return self._result
+
+    def get_samples(self):
+        """
+        Get the approximate posterior draws in the constrained space, together
+        with the values of deterministic sites.
+
+        :return: dictionary of draws keyed by site name, with a leading dimension
+            of size `num_draws`.
+        """
+        z = self._get_result().z
+        return vmap(self._postprocess_fn)(z)
+
+    def get_init_params(self, num_chains=None):
+        """
+        Get initial positions in the unconstrained space for
+        :meth:`MCMC.run <numpyro.infer.mcmc.MCMC.run>`.
+
+        :param int num_chains: Number of chains. If `None`, the positions of a
+            single chain are returned. Otherwise, `num_chains` draws evenly spaced
+            in the draws are returned, stacked along the leading dimension.
+        :return: dictionary of unconstrained values keyed by site name.
+        """
+        z = self._get_result().z
+        num_draws = jnp.shape(next(iter(z.values())))[0]
+        if num_chains is None:
+            return {k: v[0] for k, v in z.items()}
+        idx = jnp.linspace(0, num_draws - 1, num_chains).astype(jnp.int32)
+        return {k: v[idx] for k, v in z.items()}
+
+    def get_init_strategy(self):
+        """
+        Get an :func:`~numpyro.infer.initialization.init_to_value` strategy to
+        initialize HMC/NUTS at a Pathfinder draw. Use :meth:`get_init_params` to
+        initialize multiple chains at different draws.
+        """
+        z = self._get_result().z
+        return init_to_value(
+            values=self._postprocess_fn({k: v[0] for k, v in z.items()})
+        )
+
+    def get_inverse_mass_matrix(self, dense_mass=False):
+        """
+        Get the (regularized) covariance of the draws in the unconstrained space,
+        to be used as the initial `inverse_mass_matrix` of HMC/NUTS. Entries are
+        ordered as the flattened unconstrained latent sites, which is the order
+        used by HMC/NUTS with `dense_mass=False` or `dense_mass=True`.
+
+        :param bool dense_mass: Whether to return the full covariance matrix
+            rather than its diagonal. Defaults to False.
+        :return: an array of the variances, or the covariance matrix if
+            `dense_mass=True`.
+        """
+        x = vmap(lambda z: ravel_pytree(z)[0])(self._get_result().z)
+        n = x.shape[0]
+        x = x - jnp.mean(x, axis=0)
+        # shrink towards a small multiple of identity as in the Welford adaptation
+        if dense_mass:
+            cov = x.T @ x / (n - 1)
+            return (n / (n + 5.0)) * cov + 1e-3 * (5.0 / (n + 5.0)) * jnp.identity(
+                cov.shape[0]
+            )
+        var = jnp.sum(x**2, axis=0) / (n - 1)
+        return (n / (n + 5.0)) * var + 1e-3 * (5.0 / (n + 5.0))
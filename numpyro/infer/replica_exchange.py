@@ -0,0 +1,389 @@
+# Copyright Contributors to the Pyro project.
+# SPDX-License-Identifier: Apache-2.0
+
+from collections import namedtuple
+import copy
+from functools import partial
+
+import numpy as np
+
+import jax
+from jax import random, vmap
+from jax.experimental.shard_map import shard_map
+import jax.numpy as jnp
+from jax.sharding import Mesh, PartitionSpec
+
+from numpyro.handlers import scale
+from numpyro.infer.mcmc import MCMCKernel
+from numpyro.util import cond, is_prng_key
+
+ReplicaExchangeState = namedtuple(
+    "ReplicaExchangeState",
+    [
+        "i",
+        "z",
+        "replica_states",
+        "inverse_temperatures",
+        "swap_accept_prob",
+        "swap_accept_prob_sum",
+        "num_swap_proposals",
+        "rng_key",
+    ],
+)
+"""
+A :func:`~collections.namedtuple` consisting of the following fields:
+
+ - **i** - iteration.
+ - **z** - Python collection representing values (unconstrained samples from
+   the posterior) at latent sites of the cold replica, i.e. the replica with
+   inverse temperature 1.
+ - **replica_states** - the states of the inner kernel for all replicas, stacked
+   along a leading dimension of size `num_replicas` and ordered from the coldest
+   to the hottest replica.
+ - **inverse_temperatures** - the current inverse temperatures of the replicas,
+   decreasing from 1.
+ - **swap_accept_prob** - acceptance probabilities of the swaps between
+   neighbouring replicas which were proposed at the current iteration (0 for the
+   pairs which were not proposed).
+ - **swap_accept_prob_sum** - sums of the acceptance probabilities of the swaps
+   between neighbouring replicas since the last temperature adaptation during
+   warmup, or since the end of warmup.
+ - **num_swap_proposals** - the number of swaps proposed between neighbouring
+   replicas over the same period as `swap_accept_prob_sum`.
+ - **rng_key** - random number generator seed used for the iteration.
+"""
+
+
+def _wrap_tempered_model(model, *args, **kwargs):
+    inverse_temperature = kwargs.pop("_inverse_temperature", 1.0)
+    with scale(scale=inverse_temperature):
+        return model(*args, **kwargs)
+
+
+def _adapt_inverse_temperatures(inverse_temperatures, swap_accept_prob):
+    # The communication barrier between neighbouring replicas is estimated by the
+    # swap rejection rates. The inverse temperatures are moved so that the rejection
+    # rates are equalized, keeping the coldest and the hottest replica fixed.
+    rejection_rate = 1 - swap_accept_prob + jnp.finfo(swap_accept_prob.dtype).eps
+    barrier = jnp.concatenate([jnp.zeros(1), jnp.cumsum(rejection_rate)])
+    grid = jnp.linspace(0.0, barrier[-1], inverse_temperatures.shape[0])
+    return jnp.interp(grid, barrier, inverse_temperatures)
+
+
+class ReplicaExchange(MCMCKernel):
+    """
+    Replica exchange MCMC, also known as parallel tempering [1, 2].
+
+    The inner kernel is run on `num_replicas` replicas of the model, whose log
+    densities are scaled by inverse temperatures :math:`1 = \\beta_0 > \\beta_1 > \\dots`
+    through the :class:`~numpyro.handlers.scale` handler. Hot replicas explore a
+    flattened posterior and move easily between its modes, and neighbouring replicas
+    exchange their positions with a Metropolis-Hastings correction, so that the cold
+    replica, which targets the posterior, can jump between modes. Only the samples
+    of the cold replica are collected.
+
+    Swaps are proposed between the pairs of neighbouring replicas with even indices
+    at even iterations and with odd indices at odd iterations (deterministic
+    even-odd scheme [2]). A swap only exchanges the positions of the replicas, so
+    that the state of the inner kernel, e.g. its adapted step size, stays with its
+    temperature. As the tempered potential energy is proportional to the inverse
+    temperature, the potential energy and its gradient cached by the inner kernel
+    are rescaled instead of being recomputed.
+
+    During warmup, the inverse temperatures are adapted at the end of rounds of
+    doubling lengths, so that the swap rejection rates between neighbouring
+    replicas are equal [2].
+
+    .. note:: The inner kernel must be defined by a model and its state must store
+        the potential energy, such as the states of
+        :class:`~numpyro.infer.hmc.HMC`, :class:`~numpyro.infer.hmc.NUTS` or
+        :class:`~numpyro.infer.barker.BarkerMH`.
+
+    .. note:: With `replica_method="parallel"`, the replicas are distributed over
+        the first `num_replicas` devices. To run on CPU, the number of
+        host devices can be set with :func:`numpyro.set_host_device_count`.
+
+    **References:**
+
+    1. *Parallel Tempering: Theory, Applications, and New Perspectives*,
+       David J. Earl, Michael W. Deem
+    2. *Non-Reversible Parallel Tempering: a Scalable Highly Parallel MCMC Scheme*,
+       Saifuddin Syed, Alexandre Bouchard-Côté, George Deligiannidis, Arnaud Doucet
+
+    :param inner_kernel: An instance of :class:`~numpyro.infer.mcmc.MCMCKernel`
+        used to update each replica.
+    :param int num_replicas: Number of replicas. Defaults to 4.
+    :param inverse_temperatures: Initial inverse temperatures of the replicas, a
+        decreasing array which starts at 1. If provided, `num_replicas` is set to its
+        length. Defaults to a geometric ladder from 1 to `min_inverse_temperature`.
+    :param float min_inverse_temperature: Inverse temperature of the hottest replica
+        for the default ladder. Defaults to 0.01.
+    :param bool adapt_temperatures: A flag to decide if we want to adapt the
+        inverse temperatures during warmup. Defaults to True.
+    :param str replica_method: One of 'vectorized' or 'parallel'. Defaults to
+        'vectorized'.
+
+    **Example**
+
+    .. doctest::
+
+        >>> import jax
+        >>> import jax.numpy as jnp
+        >>> import numpyro
+        >>> import numpyro.distributions as dist
+        >>> from numpyro.infer import MCMC, NUTS, ReplicaExchange
+
+        >>> def model():
+        ...     mixing = dist.Categorical(jnp.ones(2) / 2)
+        ...     component = dist.Normal(jnp.array([-5.0, 5.0]), 0.5)
+        ...     numpyro.sample("x", dist.MixtureSameFamily(mixing, component))
+        >>>
+        >>> kernel = ReplicaExchange(NUTS(model), num_replicas=6)
+        >>> mcmc = MCMC(kernel, num_warmup=500, num_samples=500, progress_bar=False)
+        >>> mcmc.run(jax.random.PRNGKey(0))
+    """
+
+    def __init__(
+        self,
+        inner_kernel,
+        num_replicas=4,
+        *,
+        inverse_temperatures=None,
+        min_inverse_temperature=0.01,
+        adapt_temperatures=True,
+        replica_method="vectorized",
+    ):
+        if getattr(inner_kernel, "model", None) is None:
+            raise ValueError(
+                "ReplicaExchange does not support kernels specified via a potential"
+                " function."
+            )
+        if replica_method not in ("vectorized", "parallel"):
+            raise ValueError(
+                "`replica_method` should be one of 'vectorized' or 'parallel'."
+            )
+        if inverse_temperatures is None:
+            if not (0 < min_inverse_temperature < 1):
+                raise ValueError("`min_inverse_temperature` should be in (0, 1).")
+            inverse_temperatures = min_inverse_temperature ** (
+                jnp.arange(num_replicas) / (num_replicas - 1)
+            )
+        else:
+            inverse_temperatures = jnp.asarray(inverse_temperatures)
+            num_replicas = inverse_temperatures.shape[0]
+            if (
+                inverse_temperatures[0] != 1
+                or jnp.any(jnp.diff(inverse_temperatures) >= 0)
+                or inverse_temperatures[-1] <= 0
+            ):
+                raise ValueError(
+                    "`inverse_temperatures` should be positive, decreasing and"
+                    " start at 1."
+                )
+        if num_replicas < 2:
+            raise ValueError("ReplicaExchange requires at least two replicas.")
+
+        self.inner_kernel = copy.copy(inner_kernel)
+        self.inner_kernel._model = partial(_wrap_tempered_model, inner_kernel.model)
+        self._num_replicas = num_replicas
+        self._inverse_temperatures = inverse_temperatures
+        self._adapt_temperatures = adapt_temperatures
+        self._replica_method = replica_method
+        self._num_warmup = 0
+        self._sample_fn = self._sample
+
+    @property
+    def model(self):
+        return self.inner_kernel._model
+
+    @property
+    def sample_field(self):
+        return "z"
+
+    @property
+    def default_fields(self):
+        return ("z",)
+
+    def get_diagnostics_str(self, state):
+        swap_accept_prob = state.swap_accept_prob_sum / jnp.maximum(
+            state.num_swap_proposals, 1
+        )
+        return "swap acc. prob={}".format(
+            " ".join("{:.2f}".format(p) for p in swap_accept_prob)
+        )
+
+    def postprocess_fn(self, args, kwargs):
+        return self.inner_kernel.postprocess_fn(args, kwargs)
+
+    def _rescale(self, replica_states, ratio):
+        # the tempered potential energy and its gradient are proportional to the
+        # inverse temperature
+        pe = replica_states.potential_energy * ratio
+        replica_states = replica_states._replace(potential_energy=pe)
+        z_grad = getattr(replica_states, "z_grad", None)
+        if z_grad is not None:
+            z_grad = jax.tree.map(
+                lambda g: g * jnp.reshape(ratio, ratio.shape + (1,) * (g.ndim - 1)),
+                z_grad,
+            )
+            replica_states = replica_states._replace(z_grad=z_grad)
+        return replica_states
+
+    def init(
+        self, rng_key, num_warmup, init_params=None, model_args=(), model_kwargs={}
+    ):
+        if (
+            self._replica_method == "parallel"
+            and jax.device_count() < self._num_replicas
+        ):
+            raise ValueError(
+                "`replica_method='parallel'` requires at least `num_replicas`"
+                " devices, but only {} are available.".format(jax.device_count())
+            )
+        self._num_warmup = num_warmup
+        model_kwargs = {} if model_kwargs is None else model_kwargs
+
+        def init_fn(init_params, rng_key):
+            rng_key, *rng_keys = random.split(rng_key, self._num_replicas + 1)
+            replica_states = [
+                self.inner_kernel.init(
+                    key, num_warmup, init_params, model_args, model_kwargs
+                )
+                for key in rng_keys
+            ]
+            if not hasattr(replica_states[0], "potential_energy"):
+                raise ValueError(
+                    "The state of the inner kernel should store the potential energy."
+                )
+            replica_states = jax.tree.map(lambda *xs: jnp.stack(xs), *replica_states)
+            # the replicas are initialized with the untempered model
+            inverse_temperatures = self._inverse_temperatures
+            replica_states = self._rescale(replica_states, inverse_temperatures)
+            z = jax.tree.map(
+                lambda x: x[0], getattr(replica_states, self.inner_kernel.sample_field)
+            )
+            num_pairs = self._num_replicas - 1
+            dtype = inverse_temperatures.dtype
+            return ReplicaExchangeState(
+                jnp.array(0),
+                z,
+                replica_states,
+                inverse_temperatures,
+                jnp.zeros(num_pairs, dtype=dtype),
+                jnp.zeros(num_pairs, dtype=dtype),
+                jnp.zeros(num_pairs, dtype=jnp.result_type(int)),
+                rng_key,
+            )
+
+        if is_prng_key(rng_key):
+            return init_fn(init_params, rng_key)
+        self._sample_fn = vmap(self._sample, in_axes=(0, None, None))
+        return vmap(init_fn)(init_params, rng_key)
+
+    def _sample(self, state, model_args, model_kwargs):
+        model_kwargs = {} if model_kwargs is None else model_kwargs
+        sample_field = self.inner_kernel.sample_field
+        inverse_temperatures = state.inverse_temperatures
+
+        def sample_replica(replica_state, inverse_temperature):
+            kwargs = {**model_kwargs, "_inverse_temperature": inverse_temperature}
+            return self.inner_kernel.sample(replica_state, model_args, kwargs)
+
+        if self._replica_method == "vectorized":
+            sample_fn = vmap(sample_replica)
+        else:
+            devices = np.array(jax.devices()[: self._num_replicas])
+            sample_fn = shard_map(
+                vmap(sample_replica),
+                mesh=Mesh(devices, ("replica",)),
+                in_specs=PartitionSpec("replica"),
+                out_specs=PartitionSpec("replica"),
+                check_rep=False,
+            )
+        replica_states = sample_fn(state.replica_states, inverse_temperatures)
+
+        # swap neighbouring replicas following the deterministic even-odd scheme
+        rng_key, rng_key_swap = random.split(state.rng_key)
+        pe = replica_states.potential_energy
+        untempered_pe = pe / inverse_temperatures
+        log_accept_ratio = (inverse_temperatures[:-1] - inverse_temperatures[1:]) * (
+            untempered_pe[:-1] - untempered_pe[1:]
+        )
+        accept_prob = jnp.minimum(jnp.exp(log_accept_ratio), 1.0)
+        accept_prob = jnp.where(jnp.isnan(accept_prob), 0.0, accept_prob)
+        num_pairs = self._num_replicas - 1
+        proposed = jnp.arange(num_pairs) % 2 == state.i % 2
+        swap = proposed & (random.uniform(rng_key_swap, (num_pairs,)) < accept_prob)
+        no_swap = jnp.zeros(1, dtype=swap.dtype)
+        perm = (
+            jnp.arange(self._num_replicas)
+            + jnp.concatenate([swap, no_swap])
+            - jnp.concatenate([no_swap, swap])
+        )
+        swapped_fields = {
+            name: jax.tree.map(lambda x: x[perm], getattr(replica_states, name))
+            for name in (sample_field, "potential_energy", "z_grad")
+            if getattr(replica_states, name, None) is not None
+        }
+        replica_states = replica_states._replace(**swapped_fields)
+        replica_states = self._rescale(
+            replica_states, inverse_temperatures / inverse_temperatures[perm]
+        )
+
+        swap_accept_prob = jnp.where(proposed, accept_prob, 0.0)
+        swap_accept_prob_sum = state.swap_accept_prob_sum + swap_accept_prob
+        num_swap_proposals = state.num_swap_proposals + proposed
+
+        itr = state.i + 1
+        num_warmup = self._num_warmup
+        if self._adapt_temperatures and num_warmup > 0:
+            # the rounds have doubling lengths and the first round has 16 iterations
+            round_end = (itr < num_warmup) & (itr >= 16) & ((itr & state.i) == 0)
+
+            def adapt_fn(replica_states):
+                new_inverse_temperatures = _adapt_inverse_temperatures(
+                    inverse_temperatures,
+                    swap_accept_prob_sum / jnp.maximum(num_swap_proposals, 1),
+                )
+                replica_states = self._rescale(
+                    replica_states, new_inverse_temperatures / inverse_temperatures
+                )
+                return replica_states, new_inverse_temperatures
+
+            replica_states, inverse_temperatures = cond(
+                round_end,
+                replica_states,
+                adapt_fn,
+                replica_states,
+                lambda replica_states: (replica_states, inverse_temperatures),
+            )
+        else:
+            round_end = jnp.array(False)
+        reset = round_end | (itr == num_warmup)
+        swap_accept_prob_sum = jnp.where(reset, 0.0, swap_accept_prob_sum)
+        num_swap_proposals = jnp.where(reset, 0, num_swap_proposals)
+
+        z = jax.tree.map(lambda x: x[0], getattr(replica_states, sample_field))
+        return ReplicaExchangeState(
+            itr,
+            z,
+            replica_states,
+            inverse_temperatures,
+            swap_accept_prob,
+            swap_accept_prob_sum,
+            num_swap_proposals,
+            rng_key,
+        )
+
+    def sample(self, state, model_args, model_kwargs):
+        """
+        Run the inner kernel on all replicas and propose swaps between neighbouring
+        replicas from the given
+        :data:`~numpyro.infer.replica_exchange.ReplicaExchangeState`.
+
+        :param ReplicaExchangeState state: Represents the current state.
+        :param model_args: Arguments provided to the model.
+        :param model_kwargs: Keyword arguments provided to the model.
+        :return: Next `state` after running replica exchange.
+        """
+        return self._sample_fn(state, model_args, model_kwargs)
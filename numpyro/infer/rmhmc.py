@@ -0,0 +1,463 @@
+# Copyright Contributors to the Pyro project.
+# SPDX-License-Identifier: Apache-2.0
+
+from collections import namedtuple
+from functools import partial
+import math
+
+import jax
+from jax import random, vmap
+from jax.flatten_util import ravel_pytree
+import jax.numpy as jnp
+from jax.scipy.linalg import cho_solve
+
+from numpyro.infer.hmc import HMCState, _get_num_steps
+from numpyro.infer.hmc_util import IntegratorState, warmup_adapter
+from numpyro.infer.initialization import init_to_uniform
+from numpyro.infer.mcmc import MCMCKernel
+from numpyro.infer.util import initialize_model
+from numpyro.util import cond, fori_loop, identity, is_prng_key
+
+# quantities of the Riemannian Hamiltonian which only depend on the position
+_MetricInfo = namedtuple(
+    "_MetricInfo",
+    [
+        "potential_energy",
+        "potential_grad",
+        "metric_cholesky",
+        "logdet_grad",
+        "metric_vjp",
+    ],
+)
+
+
+def _softabs_eigvals(eigvals, alpha):
+    # lambda * coth(alpha * lambda), which is 1 / alpha at lambda = 0
+    x = alpha * eigvals
+    small = jnp.abs(x) < 1e-4
+    safe_x = jnp.where(small, 1.0, x)
+    return jnp.where(small, (1 + x**2 / 3) / alpha, eigvals / jnp.tanh(safe_x))
+
+
+def _softabs_eigvals_grad(eigvals, alpha):
+    x = alpha * eigvals
+    small = jnp.abs(x) < 1e-4
+    safe_x = jnp.where(small, 1.0, x)
+    return jnp.where(
+        small, 2 * x / 3, 1 / jnp.tanh(safe_x) - safe_x / jnp.sinh(safe_x) ** 2
+    )
+
+
+@partial(jax.custom_jvp, nondiff_argnums=(1,))
+def softabs(hessian, alpha):
+    """
+    SoftAbs map of a symmetric matrix, which replaces each eigenvalue
+    :math:`\\lambda` of `hessian` by :math:`\\lambda \\coth(\\alpha \\lambda)`.
+    The result is a positive definite matrix which is close to the absolute value
+    of `hessian` for large :math:`|\\lambda|` and whose eigenvalues are bounded
+    below by :math:`1 / \\alpha`.
+
+    Its derivative is computed in the eigenbasis of `hessian` so that it stays
+    finite for repeated eigenvalues.
+
+    **References:**
+
+    1. *A General Metric for Riemannian Manifold Hamiltonian Monte Carlo*,
+       Michael Betancourt
+
+    :param jax.numpy.ndarray hessian: a symmetric matrix.
+    :param float alpha: a positive parameter which controls the sharpness of the
+        map.
+    :return: the SoftAbs matrix.
+    """
+    eigvals, eigvecs = jnp.linalg.eigh(hessian)
+    return (eigvecs * _softabs_eigvals(eigvals, alpha)) @ eigvecs.T
+
+
+@softabs.defjvp
+def _softabs_jvp(alpha, primals, tangents):
+    (hessian,), (hessian_dot,) = primals, tangents
+    eigvals, eigvecs = jnp.linalg.eigh(hessian)
+    s = _softabs_eigvals(eigvals, alpha)
+    s_grad = _softabs_eigvals_grad(eigvals, alpha)
+    # divided differences of the eigenvalue map (Daleckii-Krein theorem)
+    diff = eigvals[:, None] - eigvals[None, :]
+    scale = jnp.maximum(jnp.abs(eigvals[:, None]), jnp.abs(eigvals[None, :]))
+    eps = jnp.sqrt(jnp.finfo(jnp.result_type(eigvals)).eps)
+    close = jnp.abs(diff) <= eps * jnp.maximum(scale, 1 / alpha)
+    divided_diff = jnp.where(
+        close,
+        (s_grad[:, None] + s_grad[None, :]) / 2,
+        (s[:, None] - s[None, :]) / jnp.where(close, 1.0, diff),
+    )
+    tangent = eigvecs.T @ hessian_dot @ eigvecs
+    tangent = eigvecs @ (divided_diff * tangent) @ eigvecs.T
+    return (eigvecs * s) @ eigvecs.T, tangent
+
+
+class RMHMC(MCMCKernel):
+    """
+    Riemannian manifold Hamiltonian Monte Carlo with the SoftAbs metric [1, 2].
+
+    Instead of a constant mass matrix, the kinetic energy uses the position
+    dependent metric :math:`G(z) = \\mathrm{softabs}(\\nabla^2 U(z))`, where
+    :math:`U` is the potential energy, so that the dynamics adapt to the local
+    curvature of the posterior. This is helpful for posteriors whose scales vary
+    strongly across the space, such as the funnels of hierarchical models, where
+    :class:`~numpyro.infer.hmc.NUTS` needs tiny step sizes and produces divergent
+    or saturated trajectories. The trajectory is simulated with the implicit
+    generalized leapfrog integrator for a fixed trajectory length.
+
+    Each leapfrog step needs the Hessian of the potential energy and its
+    derivative, which are computed with :func:`jax.hessian` and a vector-Jacobian
+    product of the metric. The Jacobian is linearized once per position and
+    reused over the fixed point iterations of the momentum update. The cost per
+    step is cubic in the number of latent dimensions, so this kernel is
+    intended for models of moderate size.
+
+    **References:**
+
+    1. *Riemann manifold Langevin and Hamiltonian Monte Carlo methods*,
+       Mark Girolami and Ben Calderhead
+    2. *A General Metric for Riemannian Manifold Hamiltonian Monte Carlo*,
+       Michael Betancourt
+
+    :param model: Python callable containing Pyro :mod:`~numpyro.primitives`.
+        If model is provided, `potential_fn` will be inferred using the model.
+    :param potential_fn: Python callable that computes the potential energy
+        given input parameters. The input parameters to `potential_fn` can be
+        any python collection type, provided that `init_params` argument to
+        :meth:`init` has the same type.
+    :param float step_size: Determines the size of a single step taken by the
+        generalized leapfrog integrator. If not specified, it will be set to 1.
+    :param bool adapt_step_size: A flag to decide if we want to adapt step_size
+        during warm-up phase using Dual Averaging scheme.
+    :param float target_accept_prob: Target acceptance probability for step size
+        adaptation using Dual Averaging. Defaults to 0.8.
+    :param float trajectory_length: Length of a MCMC trajectory. Defaults to
+        :math:`\\pi / 2`, which is a quarter of the period of the dynamics of a
+        Gaussian posterior under this metric.
+    :param int num_steps: if different than None, fix the number of steps allowed
+        for each iteration.
+    :param int max_num_steps: Maximum number of steps of a trajectory, which is
+        shortened if the step size is smaller than `trajectory_length /
+        max_num_steps`. This bounds the cost of the iterations after the step size
+        adaptation has temporarily shrunk the step size. Defaults to 100.
+    :param float softabs_alpha: The parameter :math:`\\alpha` of the SoftAbs map,
+        see :func:`softabs`. Defaults to 1e6.
+    :param int num_fixed_point_iterations: Number of fixed point iterations to
+        solve each implicit update of the generalized leapfrog integrator.
+        Defaults to 6.
+    :param callable init_strategy: a per-site initialization function.
+        See :ref:`init_strategy` section for available functions.
+
+    **Example**
+
+    .. doctest::
+
+        >>> import jax
+        >>> import jax.numpy as jnp
+        >>> import numpyro
+        >>> import numpyro.distributions as dist
+        >>> from numpyro.infer import MCMC, RMHMC
+
+        >>> def model():
+        ...     v = numpyro.sample("v", dist.Normal(0, 3))
+        ...     numpyro.sample("x", dist.Normal(0, jnp.exp(v / 2)).expand([3]))
+        >>>
+        >>> mcmc = MCMC(RMHMC(model), num_warmup=200, num_samples=200, progress_bar=False)
+        >>> mcmc.run(jax.random.PRNGKey(0))
+    """
+
+    def __init__(
+        self,
+        model=None,
+        potential_fn=None,
+        *,
+        step_size=1.0,
+        adapt_step_size=True,
+        target_accept_prob=0.8,
+        trajectory_length=math.pi / 2,
+        num_steps=None,
+        max_num_steps=100,
+        softabs_alpha=1e6,
+        num_fixed_point_iterations=6,
+        init_strategy=init_to_uniform,
+    ):
+        if not (model is None) ^ (potential_fn is None):
+            raise ValueError("Only one of `model` or `potential_fn` must be specified.")
+        if num_steps is not None:
+            trajectory_length = None
+        self._model = model
+        self._potential_fn = potential_fn
+        self._step_size = float(step_size)
+        self._adapt_step_size = adapt_step_size
+        self._target_accept_prob = target_accept_prob
+        self._trajectory_length = trajectory_length
+        self._num_steps = num_steps
+        self._max_num_steps = max_num_steps
+        self._softabs_alpha = softabs_alpha
+        self._num_fixed_point_iterations = num_fixed_point_iterations
+        self._init_strategy = init_strategy
+        self._max_delta_energy = 1000.0
+        self._potential_fn_gen = None
+        self._postprocess_fn = None
+        self._num_warmup = 0
+        self._sample_fn = self._sample
+
+    @property
+    def model(self):
+        return self._model
+
+    @property
+    def sample_field(self):
+        return "z"
+
+    @property
+    def default_fields(self):
+        return ("z", "diverging")
+
+    def get_diagnostics_str(self, state):
+        return "{} steps of size {:.2e}. acc. prob={:.2f}".format(
+            state.num_steps, state.adapt_state.step_size, state.mean_accept_prob
+        )
+
+    def postprocess_fn(self, args, kwargs):
+        if self._postprocess_fn is None:
+            return identity
+        return self._postprocess_fn(*args, **kwargs)
+
+    def _init_state(self, rng_key, model_args, model_kwargs, init_params):
+        if self._model is not None:
+            (
+                new_params_info,
+                self._potential_fn_gen,
+                self._postprocess_fn,
+                _,
+            ) = initialize_model(
+                rng_key,
+                self._model,
+                dynamic_args=True,
+                init_strategy=self._init_strategy,
+                model_args=model_args,
+                model_kwargs=model_kwargs,
+            )
+            if init_params is None:
+                init_params = new_params_info.z
+        return init_params
+
+    def _get_potential_fn(self, model_args, model_kwargs):
+        if self._potential_fn_gen is not None:
+            return self._potential_fn_gen(*model_args, **model_kwargs)
+        return self._potential_fn
+
+    def _warmup_adapter(self):
+        return warmup_adapter(
+            self._num_warmup,
+            adapt_step_size=self._adapt_step_size,
+            adapt_mass_matrix=False,
+            target_accept_prob=self._target_accept_prob,
+        )
+
+    def _metric(self, potential_fn, x):
+        hessian = jax.hessian(potential_fn)(x)
+        hessian = (hessian + hessian.T) / 2
+        return softabs(hessian, self._softabs_alpha)
+
+    def _metric_info(self, potential_fn, x):
+        potential_energy, potential_grad = jax.value_and_grad(potential_fn)(x)
+        metric, metric_vjp = jax.vjp(partial(self._metric, potential_fn), x)
+        metric_cholesky = jnp.linalg.cholesky(metric)
+        metric_inv = cho_solve((metric_cholesky, True), jnp.identity(x.shape[0]))
+        # gradient of 1/2 log det G(x)
+        (logdet_grad,) = metric_vjp(metric_inv / 2)
+        return _MetricInfo(
+            potential_energy, potential_grad, metric_cholesky, logdet_grad, metric_vjp
+        )
+
+    def _energy(self, info, r):
+        cholesky = info.metric_cholesky
+        v = cho_solve((cholesky, True), r)
+        logdet = 2 * jnp.sum(jnp.log(jnp.diagonal(cholesky)))
+        return info.potential_energy + logdet / 2 + jnp.dot(r, v) / 2
+
+    def _position_grad(self, info, r):
+        # gradient of the Hamiltonian w.r.t. the position for a fixed momentum
+        v = cho_solve((info.metric_cholesky, True), r)
+        (quadratic_grad,) = info.metric_vjp(jnp.outer(v, v) / 2)
+        return info.potential_grad + info.logdet_grad - quadratic_grad
+
+    def _leapfrog(self, potential_fn, step_size, i, x, r):
+        # A step of the generalized leapfrog integrator, where the first two updates
+        # are implicit. Except for the first step, `r` is the half step momentum of
+        # the previous step, whose last update is deferred to here so that the
+        # metric is linearized once per position.
+        info = self._metric_info(potential_fn, x)
+        r = jnp.where(i > 0, r - step_size / 2 * self._position_grad(info, r), r)
+        r_half = fori_loop(
+            0,
+            self._num_fixed_point_iterations,
+            lambda _, r_half: r - step_size / 2 * self._position_grad(info, r_half),
+            r,
+        )
+        v = cho_solve((info.metric_cholesky, True), r_half)
+
+        def position_update(_, x_new):
+            cholesky = jnp.linalg.cholesky(self._metric(potential_fn, x_new))
+            v_new = cho_solve((cholesky, True), r_half)
+            return x + step_size / 2 * (v + v_new)
+
+        x_new = fori_loop(
+            0, self._num_fixed_point_iterations, position_update, x + step_size * v
+        )
+        return x_new, r_half
+
+    def init(
+        self, rng_key, num_warmup, init_params=None, model_args=(), model_kwargs={}
+    ):
+        # non-vectorized
+        if is_prng_key(rng_key):
+            rng_key, rng_key_init_model = random.split(rng_key)
+        # vectorized
+        else:
+            rng_key, rng_key_init_model = jnp.swapaxes(
+                vmap(random.split)(rng_key), 0, 1
+            )
+        init_params = self._init_state(
+            rng_key_init_model, model_args, model_kwargs, init_params
+        )
+        if self._potential_fn and init_params is None:
+            raise ValueError(
+                "Valid value of `init_params` must be provided with `potential_fn`."
+            )
+        self._num_warmup = num_warmup
+
+        def init_fn(init_params, rng_key):
+            z = getattr(init_params, "z", init_params)
+            x, unravel_fn = ravel_pytree(z)
+            potential_fn = self._get_potential_fn(model_args, model_kwargs)
+            potential_energy, z_grad = jax.value_and_grad(potential_fn)(z)
+            rng_key, rng_key_wa = random.split(rng_key)
+            wa_init, _ = self._warmup_adapter()
+            adapt_state = wa_init(
+                IntegratorState(z=x, potential_energy=potential_energy),
+                rng_key_wa,
+                self._step_size,
+                inverse_mass_matrix=jnp.ones(x.shape[0]),
+            )
+            if self._trajectory_length is None:
+                num_steps = self._num_steps
+            else:
+                num_steps = jnp.minimum(
+                    _get_num_steps(adapt_state.step_size, self._trajectory_length),
+                    self._max_num_steps,
+                )
+            zero = jnp.zeros((), dtype=jnp.result_type(float))
+            return HMCState(
+                jnp.array(0),
+                z,
+                z_grad,
+                potential_energy,
+                potential_energy,
+                None,
+                self._trajectory_length,
+                jnp.asarray(num_steps, dtype=jnp.result_type(int)),
+                zero,
+                zero,
+                jnp.array(False),
+                adapt_state,
+                rng_key,
+            )
+
+        if is_prng_key(rng_key):
+            return init_fn(init_params, rng_key)
+        self._sample_fn = vmap(self._sample, in_axes=(0, None, None))
+        return vmap(init_fn)(init_params, rng_key)
+
+    def _sample(self, state, model_args, model_kwargs):
+        potential_fn = self._get_potential_fn(model_args, model_kwargs)
+        x, unravel_fn = ravel_pytree(state.z)
+
+        def flat_potential_fn(x):
+            return potential_fn(unravel_fn(x))
+
+        rng_key, rng_key_momentum, rng_key_transition = random.split(state.rng_key, 3)
+        step_size = state.adapt_state.step_size
+        if self._trajectory_length is None:
+            num_steps = self._num_steps
+        else:
+            num_steps = _get_num_steps(step_size, self._trajectory_length)
+            # makes sure trajectory length is constant, rather than step_size * num_steps
+            step_size = self._trajectory_length / num_steps
+            num_steps = jnp.minimum(num_steps, self._max_num_steps)
+
+        info = self._metric_info(flat_potential_fn, x)
+        eps = random.normal(rng_key_momentum, x.shape, dtype=x.dtype)
+        r = info.metric_cholesky @ eps
+        energy_old = self._energy(info, r)
+
+        x_new, r_half = fori_loop(
+            0,
+            num_steps,
+            lambda i, val: self._leapfrog(flat_potential_fn, step_size, i, *val),
+            (x, r),
+        )
+        info_new = self._metric_info(flat_potential_fn, x_new)
+        r_new = r_half - step_size / 2 * self._position_grad(info_new, r_half)
+        energy_new = self._energy(info_new, r_new)
+        delta_energy = energy_new - energy_old
+        delta_energy = jnp.where(jnp.isnan(delta_energy), jnp.inf, delta_energy)
+        accept_prob = jnp.clip(jnp.exp(-delta_energy), None, 1.0)
+        diverging = delta_energy > self._max_delta_energy
+        transition = random.bernoulli(rng_key_transition, accept_prob)
+        x, potential_energy, z_grad, energy = cond(
+            transition,
+            (x_new, info_new.potential_energy, info_new.potential_grad, energy_new),
+            identity,
+            (x, info.potential_energy, info.potential_grad, energy_old),
+            identity,
+        )
+
+        # not update adapt_state after warmup phase
+        _, wa_update = self._warmup_adapter()
+        z_info = IntegratorState(z=x, potential_energy=potential_energy, z_grad=z_grad)
+        adapt_state = cond(
+            state.i < self._num_warmup,
+            (state.i, accept_prob, z_info, state.adapt_state),
+            lambda args: wa_update(*args),
+            state.adapt_state,
+            identity,
+        )
+
+        itr = state.i + 1
+        n = jnp.where(state.i < self._num_warmup, itr, itr - self._num_warmup)
+        mean_accept_prob = (
+            state.mean_accept_prob + (accept_prob - state.mean_accept_prob) / n
+        )
+        return HMCState(
+            itr,
+            unravel_fn(x),
+            unravel_fn(z_grad),
+            potential_energy,
+            energy,
+            None,
+            state.trajectory_length,
+            jnp.asarray(num_steps, dtype=jnp.result_type(int)),
+            accept_prob,
+            mean_accept_prob,
+            diverging,
+            adapt_state,
+            rng_key,
+        )
+
+    def sample(self, state, model_args, model_kwargs):
+        """
+        Run RMHMC from the given :data:`~numpyro.infer.hmc.HMCState` and return the
+        resulting :data:`~numpyro.infer.hmc.HMCState`.
+
+        :param HMCState state: Represents the current state.
+        :param model_args: Arguments provided to the model.
+        :param model_kwargs: Keyword arguments provided to the model.
+        :return: Next `state` after running RMHMC.
+        """
+        return self._sample_fn(state, model_args, model_kwargs)
@@ -0,0 +1,208 @@
+# Copyright Contributors to the Pyro project.
+# SPDX-License-Identifier: Apache-2.0
+
+from abc import ABC, abstractmethod
+from collections import defaultdict
+import os
+import pickle
+import re
+from threading import Lock
+
+import numpy as np
+
+import jax
+
+__all__ = [
+    "SampleSink",
+    "InMemorySink",
+    "MemmapSink",
+]
+
+
+class SampleSink(ABC):
+    """
+    Defines the interface for a host-side writer which receives the draws collected
+    by :class:`~numpyro.infer.mcmc.MCMC` in fixed-size chunks. Only a buffer of
+    `chunk_size` draws is kept on device during sampling, so device memory does not
+    grow with `num_samples`.
+
+    **Example:**
+
+    .. doctest::
+
+        >>> from jax import random
+        >>> import numpyro
+        >>> import numpyro.distributions as dist
+        >>> from numpyro.infer import MCMC, NUTS
+        >>> from numpyro.infer.sinks import InMemorySink
+
+        >>> def model():
+        ...     numpyro.sample("x", dist.Normal(0, 1))
+
+        >>> sink = InMemorySink(chunk_size=100)
+        >>> mcmc = MCMC(NUTS(model), num_warmup=100, num_samples=1000, sink=sink)
+        >>> mcmc.run(random.PRNGKey(0))
+        >>> mcmc.get_samples()["x"].shape
+        (1000,)
+
+    :param int chunk_size: the number of draws buffered on device before they are
+        flushed to the sink.
+    """
+
+    def __init__(self, chunk_size=100):
+        if not isinstance(chunk_size, int) or chunk_size < 1:
+            raise ValueError("chunk_size must be a positive integer")
+        self.chunk_size = chunk_size
+
+    def open(self, num_chains, num_draws):
+        """
+        Prepare the sink to receive draws. This is called at the beginning of each
+        :meth:`MCMC.run() <numpyro.infer.mcmc.MCMC.run>` and discards draws written
+        by previous runs.
+
+        :param int num_chains: number of chains.
+        :param int num_draws: number of draws per chain which will be written.
+        """
+        self.num_chains = num_chains
+        self.num_draws = num_draws
+
+    @abstractmethod
+    def write(self, chain, start, draws):
+        """
+        Write a chunk of draws of a chain. This is called from a host callback, so
+        chunks of different chains might be written concurrently and chunks of a
+        chain might arrive out of order.
+
+        :param int chain: the chain index.
+        :param int start: the index of the first draw of `draws` within the chain.
+        :param dict draws: a dictionary which maps each collected field to a pytree
+            of :class:`numpy.ndarray` with the draw dimension as leading dimension.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def read(self):
+        """
+        Return the draws written to the sink.
+
+        :return: a dictionary which maps each collected field to a pytree of arrays
+            with shape `num_chains x num_draws x ...`.
+        """
+        raise NotImplementedError
+
+
+class InMemorySink(SampleSink):
+    """
+    A :class:`SampleSink` which keeps the chunks of draws in a list in host memory.
+
+    :param int chunk_size: the number of draws buffered on device before they are
+        flushed to the sink.
+    """
+
+    def __init__(self, chunk_size=100):
+        super().__init__(chunk_size)
+        self._lock = Lock()
+        self.chunks = defaultdict(list)
+
+    def open(self, num_chains, num_draws):
+        super().open(num_chains, num_draws)
+        self.chunks = defaultdict(list)
+
+    def write(self, chain, start, draws):
+        with self._lock:
+            self.chunks[chain].append((start, draws))
+
+    def read(self):
+        chains = []
+        for chain in range(self.num_chains):
+            chunks = [draws for _, draws in sorted(self.chunks[chain], key=_by_start)]
+            chains.append(jax.tree.map(lambda *x: np.concatenate(x), *chunks))
+        return jax.tree.map(lambda *x: np.stack(x), *chains)
+
+
+class MemmapSink(SampleSink):
+    """
+    A :class:`SampleSink` which stores the draws in memory-mapped `.npy` files under
+    the directory `path`, one file per collected site (or field) with shape
+    `num_chains x num_draws x ...`. Draws of each chain are written directly into
+    their slice of the file, so that neither the device nor the host needs to hold
+    the full trace.
+
+    :meth:`read` returns read-only memory-mapped arrays, hence
+    :meth:`MCMC.get_samples() <numpyro.infer.mcmc.MCMC.get_samples>`,
+    :meth:`MCMC.get_extra_fields() <numpyro.infer.mcmc.MCMC.get_extra_fields>`
+    and :meth:`MCMC.print_summary() <numpyro.infer.mcmc.MCMC.print_summary>` load
+    pages from disk lazily. Per-chain views (e.g. ``samples["x"][0]``) and the
+    flattened samples with ``group_by_chain=False`` do not copy data. The store
+    can be reopened later, e.g. in another process, with
+    ``MemmapSink(path).read()``.
+
+    :param str path: the directory in which the `.npy` files are stored.
+    :param int chunk_size: the number of draws buffered on device before they are
+        flushed to the sink.
+    """
+
+    def __init__(self, path, chunk_size=100):
+        super().__init__(chunk_size)
+        self.path = path
+        self._lock = Lock()
+        self._arrays = None
+
+    @property
+    def _index_file(self):
+        return os.path.join(self.path, "index.pkl")
+
+    def open(self, num_chains, num_draws):
+        super().open(num_chains, num_draws)
+        os.makedirs(self.path, exist_ok=True)
+        # remove the files of a previous run
+        if os.path.exists(self._index_file):
+            with open(self._index_file, "rb") as f:
+                _, filenames = pickle.load(f)
+            for filename in filenames:
+                os.remove(os.path.join(self.path, filename))
+            os.remove(self._index_file)
+        self._arrays = None
+
+    def _allocate(self, draws):
+        leaves_with_path, treedef = jax.tree_util.tree_flatten_with_path(draws)
+        filenames = []
+        arrays = []
+        for i, (key_path, x) in enumerate(leaves_with_path):
+            name = re.sub(r"[^\w.-]+", "_", jax.tree_util.keystr(key_path)).strip("_")
+            filename = "{}_{}.npy".format(i, name)
+            filenames.append(filename)
+            arrays.append(
+                np.lib.format.open_memmap(
+                    os.path.join(self.path, filename),
+                    mode="w+",
+                    dtype=x.dtype,
+                    shape=(self.num_chains, self.num_draws) + x.shape[1:],
+                )
+            )
+        with open(self._index_file, "wb") as f:
+            pickle.dump((treedef, filenames), f)
+        self._arrays = arrays
+
+    def write(self, chain, start, draws):
+        with self._lock:
+            if self._arrays is None:
+                self._allocate(draws)
+        for array, x in zip(self._arrays, jax.tree.leaves(draws)):
+            array[chain, start : start + x.shape[0]] = x
+
+    def read(self):
+        if self._arrays is not None:
+            for array in self._arrays:
+                array.flush()
+        with open(self._index_file, "rb") as f:
+            treedef, filenames = pickle.load(f)
+        arrays = [
+            np.load(os.path.join(self.path, filename), mmap_mode="r")
+            for filename in filenames
+        ]
+        return jax.tree.unflatten(treedef, arrays)
+
+
+def _by_start(chunk):
+    return chunk[0]
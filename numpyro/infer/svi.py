@@ -3,20 +3,27 @@
 
 from collections import namedtuple
 from functools import partial
+import operator
+import queue
+import threading
 import warnings
 
+import numpy as np
 import tqdm
 
 import jax
 from jax import jit, lax, random
 from jax.example_libraries import optimizers
+from jax.experimental.shard_map import shard_map
+from jax.flatten_util import ravel_pytree
 import jax.numpy as jnp
+from jax.sharding import Mesh, PartitionSpec
 
 from numpyro.distributions import constraints
 from numpyro.distributions.transforms import biject_to
 from numpyro.handlers import replay, seed, substitute, trace
 from numpyro.infer.util import helpful_support_errors, transform_fn
-from numpyro.optim import _NumPyroOptim, optax_to_numpyro
+from numpyro.optim import Minimize, _NumPyroOptim, _value_and_grad, optax_to_numpyro
 from numpyro.util import find_stack_level
 
 SVIState = namedtuple("SVIState", ["optim_state", "mutable_state", "rng_key"])
@@ -67,6 +74,106 @@ def _make_loss_fn(
     return loss_fn
 
 
+def _is_array(x):
+    return isinstance(x, (np.ndarray, jax.Array))
+
+
+def _partition_args(args, kwargs):
+    # Split model arguments into array leaves, which are inputs of compiled update
+    # functions, and the remaining leaves, which are baked into them.
+    leaves, treedef = jax.tree.flatten((args, kwargs))
+    dynamic_leaves = [x for x in leaves if _is_array(x)]
+    static_leaves = tuple(None if _is_array(x) else (x,) for x in leaves)
+    return dynamic_leaves, (treedef, static_leaves)
+
+
+def _combine_args(dynamic_leaves, static_args):
+    treedef, static_leaves = static_args
+    dynamic_leaves = iter(dynamic_leaves)
+    leaves = [next(dynamic_leaves) if x is None else x[0] for x in static_leaves]
+    return jax.tree.unflatten(treedef, leaves)
+
+
+def _signature(tree):
+    leaves, treedef = jax.tree.flatten(tree)
+    return treedef, tuple(
+        (jnp.shape(x), jnp.result_type(x)) if _is_array(x) else (x,) for x in leaves
+    )
+
+
+def _compiled_fn_key(svi_state, args, kwargs, *options):
+    try:
+        key = (*options, _signature((svi_state, args, kwargs)))
+        hash(key)
+    # If unhashable arguments are provided, proceed without compiled functions
+    except TypeError:
+        return None
+    return key
+
+
+def _stack_minibatches(data_iterator, num_epochs, steps_per_call):
+    # Group consecutive minibatches with the same shapes into slabs of at most
+    # `steps_per_call` minibatches, stacked along a new leading axis. Slabs do not
+    # cross epochs.
+    def stack(batches):
+        return jax.device_put(jax.tree.map(lambda *xs: np.stack(xs), *batches))
+
+    for _ in range(num_epochs):
+        batches, signature = [], None
+        for batch in data_iterator:
+            if not isinstance(batch, tuple):
+                batch = (batch,)
+            batch_signature = jax.tree.structure(batch), jax.tree.map(np.shape, batch)
+            if batches and (
+                batch_signature != signature or len(batches) == steps_per_call
+            ):
+                yield stack(batches)
+                batches = []
+            batches.append(batch)
+            signature = batch_signature
+        if batches:
+            yield stack(batches)
+
+
+def _prefetch(iterator, buffer_size=2):
+    # Consume `iterator` on a background thread, so that the next items are
+    # prepared while the current one is processed.
+    buffer = queue.Queue(maxsize=buffer_size)
+    stop = threading.Event()
+    end = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def producer():
+        try:
+            for item in iterator:
+                if not put((item, None)):
+                    return
+        except Exception as e:
+            put((None, e))
+            return
+        put((end, None))
+
+    threading.Thread(target=producer, daemon=True).start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if error is not None:
+                raise error
+            if item is end:
+                return
+            yield item
+    finally:
+        stop.set()
+
+
 class SVI(object):
     """
     Stochastic Variational Inference given an ELBO loss objective.
@@ -162,6 +269,8 @@ class SVI(object):
                 )
 
             self.optim = optax_to_numpyro(optim)
+        # executables compiled by `compile`, keyed on their input signatures
+        self._compiled_fns = {}
 
     def init(self, rng_key, *args, init_params=None, **kwargs):
         """
@@ -234,6 +343,9 @@ class SVI(object):
                     stacklevel=find_stack_level(),
                 )
 
+        init_loss_state = getattr(self.loss, "init_mutable_state", None)
+        if init_loss_state is not None:
+            mutable_state.update(init_loss_state(guide_trace))
         if not mutable_state:
             mutable_state = None
         self.constrain_fn = partial(transform_fn, inv_transforms)
@@ -323,6 +435,99 @@ class SVI(object):
         )
         return SVIState(optim_state, mutable_state, rng_key), loss_val
 
+    def _get_compiled_fn(self, svi_state, args, kwargs, *options):
+        key = _compiled_fn_key(svi_state, args, kwargs, *options)
+        compiled_fn = self._compiled_fns.get(key) if key is not None else None
+        if compiled_fn is None:
+            return None
+        dynamic_args = _partition_args(args, kwargs)[0]
+        return lambda svi_state, _=None: compiled_fn(svi_state, dynamic_args)
+
+    def compile(
+        self,
+        rng_key,
+        *args,
+        num_steps=None,
+        stable_update=False,
+        forward_mode_differentiation=False,
+        init_state=None,
+        init_params=None,
+        **kwargs,
+    ):
+        """
+        Compile the update step of :meth:`run` ahead of time with
+        ``jax.jit(...).lower(...).compile()``. Subsequent calls of :meth:`run` with
+        the same options and with arguments of the same shapes and dtypes (but
+        possibly different values) use the compiled executable, so they start
+        without compilation delay. Array arguments are inputs of the executable
+        while other arguments (e.g. Python scalars) are treated as constants.
+
+        To also avoid the compilation cost in a new process (e.g. after a worker
+        restart), enable JAX's persistent compilation cache with
+        :func:`numpyro.util.enable_compilation_cache`: the executable is then saved
+        to and loaded from disk.
+
+        **Example:**
+
+        .. code-block:: python
+
+            svi = SVI(model, guide, optimizer, loss=Trace_ELBO())
+            svi.compile(random.PRNGKey(0), data)
+            svi_result = svi.run(random.PRNGKey(0), 2000, data)
+
+        :param jax.random.PRNGKey rng_key: random number generator seed.
+        :param args: arguments to the model / guide
+        :param int num_steps: if not None, compile the whole optimization loop of
+            :meth:`run` with `num_steps` iterations and `progress_bar=False`.
+            Otherwise, compile a single step, which is used by :meth:`run` with
+            `progress_bar=True`.
+        :param bool stable_update: whether to use :meth:`stable_update` to update
+            the state. Defaults to False.
+        :param bool forward_mode_differentiation: whether to use forward-mode differentiation
+            or reverse-mode differentiation. See :meth:`run` for more details.
+        :param SVIState init_state: if not None, the state used to determine the
+            input signature of the compiled function. Otherwise, it is computed by
+            :meth:`init`.
+        :param dict init_params: if not None, initialize :class:`numpyro.param` sites with values from
+            this dictionary instead of using ``init_value`` in :class:`numpyro.param` primitives.
+        :param kwargs: keyword arguments to the model / guide
+        """
+        if num_steps is not None and num_steps < 1:
+            raise ValueError("num_steps must be a positive integer.")
+        if init_state is None:
+            svi_state = self.init(rng_key, *args, init_params=init_params, **kwargs)
+        else:
+            svi_state = init_state
+        options = (num_steps, stable_update, forward_mode_differentiation)
+        key = _compiled_fn_key(svi_state, args, kwargs, *options)
+        if key is None:
+            raise ValueError("Arguments of the model / guide must be hashable.")
+        dynamic_args, static_args = _partition_args(args, kwargs)
+        update = self.stable_update if stable_update else self.update
+
+        def body_fn(svi_state, dynamic_args):
+            args, kwargs = _combine_args(dynamic_args, static_args)
+            return update(
+                svi_state,
+                *args,
+                forward_mode_differentiation=forward_mode_differentiation,
+                **kwargs,
+            )
+
+        if num_steps is None:
+            fn = body_fn
+        else:
+
+            def fn(svi_state, dynamic_args):
+                return lax.scan(
+                    lambda svi_state, _: body_fn(svi_state, dynamic_args),
+                    svi_state,
+                    None,
+                    length=num_steps,
+                )
+
+        self._compiled_fns[key] = jit(fn).lower(svi_state, dynamic_args).compile()
+
     def run(
         self,
         rng_key,
@@ -401,12 +606,21 @@ class SVI(object):
             svi_state = self.init(rng_key, *args, init_params=init_params, **kwargs)
         else:
             svi_state = init_state
+        compiled_fn = self._get_compiled_fn(
+            svi_state,
+            args,
+            kwargs,
+            None if progress_bar else num_steps,
+            stable_update,
+            forward_mode_differentiation,
+        )
         if progress_bar:
+            step_fn = jit(body_fn) if compiled_fn is None else compiled_fn
             losses = []
             with tqdm.trange(1, num_steps + 1) as t:
                 batch = max(num_steps // 20, 1)
                 for i in t:
-                    svi_state, loss = jit(body_fn)(svi_state, None)
+                    svi_state, loss = step_fn(svi_state, None)
                     losses.append(jax.device_get(loss))
                     if i % batch == 0:
                         if stable_update:
@@ -425,6 +639,8 @@ class SVI(object):
                             refresh=False,
                         )
             losses = jnp.stack(losses)
+        elif compiled_fn is not None:
+            svi_state, losses = compiled_fn(svi_state)
         else:
             svi_state, losses = lax.scan(body_fn, svi_state, None, length=num_steps)
 
@@ -432,6 +648,135 @@ class SVI(object):
         # optimizer's state and mutable state.
         return SVIRunResult(self.get_params(svi_state), svi_state, losses)
 
+    def run_epochs(
+        self,
+        rng_key,
+        data_iterator,
+        *args,
+        num_epochs=1,
+        steps_per_call=1,
+        progress_bar=True,
+        stable_update=False,
+        forward_mode_differentiation=False,
+        init_state=None,
+        init_params=None,
+        **kwargs,
+    ):
+        """
+        (EXPERIMENTAL INTERFACE) Run SVI over a stream of minibatches, taking one
+        optimization step per minibatch, then return the optimized parameters and
+        the stacked losses at every step.
+
+        Consecutive minibatches are stacked into slabs of `steps_per_call`
+        minibatches, and the steps over a slab run in a single compiled call with
+        :func:`jax.lax.scan`. This amortizes the overhead of dispatching a compiled
+        step from Python, which dominates the step time of small models. The next
+        slab is stacked and transferred to the device on a background thread while
+        the current one is processed, so the dataset does not need to fit in memory.
+
+        **Example:**
+
+        .. code-block:: python
+
+            def data_loader():
+                for i in range(0, num_data, batch_size):
+                    yield x[i : i + batch_size], y[i : i + batch_size]
+
+            svi = SVI(model, guide, optimizer, loss=Trace_ELBO())
+            svi_result = svi.run_epochs(
+                random.PRNGKey(0), data_loader(), steps_per_call=100
+            )
+
+        .. note:: A minibatch whose shapes differ from those of the previous one
+            (e.g. a smaller last minibatch) starts a new slab, and the steps over a
+            slab of a new shape are compiled again.
+
+        :param jax.random.PRNGKey rng_key: random number generator seed.
+        :param data_iterator: an iterable over minibatches. A minibatch is a tuple
+            of arrays, which are the leading arguments to the model / guide, or a
+            single array, which is the first argument.
+        :param args: remaining arguments to the model / guide, which are the same
+            for all minibatches.
+        :param int num_epochs: number of passes over `data_iterator`, which needs to
+            be re-iterable (e.g. a list, not a generator) if `num_epochs` is larger
+            than 1. Defaults to 1.
+        :param int steps_per_call: the maximum number of steps in a compiled call.
+            Defaults to 1.
+        :param bool progress_bar: Whether to enable progress bar updates. Defaults to
+            ``True``.
+        :param bool stable_update: whether to use :meth:`stable_update` to update
+            the state. Defaults to False.
+        :param bool forward_mode_differentiation: whether to use forward-mode differentiation
+            or reverse-mode differentiation. See :meth:`run` for more details.
+        :param SVIState init_state: if not None, begin SVI from the
+            final state of previous SVI run.
+        :param dict init_params: if not None, initialize :class:`numpyro.param` sites with values from
+            this dictionary instead of using ``init_value`` in :class:`numpyro.param` primitives.
+        :param kwargs: keyword arguments to the model / guide, which are the same for
+            all minibatches.
+        :return: a namedtuple with fields `params` and `losses` where `params`
+            holds the optimized values at :class:`numpyro.param` sites,
+            and `losses` is the collected loss during the process.
+        :rtype: :data:`SVIRunResult`
+        """
+        if steps_per_call < 1:
+            raise ValueError("steps_per_call must be a positive integer.")
+        if num_epochs < 1:
+            raise ValueError("num_epochs must be a positive integer.")
+        if num_epochs > 1 and iter(data_iterator) is data_iterator:
+            raise ValueError(
+                "data_iterator must be re-iterable when num_epochs is larger than 1."
+            )
+        update = self.stable_update if stable_update else self.update
+
+        def body_fn(svi_state, batch):
+            return update(
+                svi_state,
+                *batch,
+                *args,
+                forward_mode_differentiation=forward_mode_differentiation,
+                **kwargs,
+            )
+
+        @jit
+        def call_fn(svi_state, slab):
+            return lax.scan(body_fn, svi_state, slab)
+
+        slabs = _prefetch(_stack_minibatches(data_iterator, num_epochs, steps_per_call))
+        slab = next(slabs, None)
+        if slab is None:
+            raise ValueError("data_iterator does not contain any minibatch.")
+        if init_state is None:
+            batch = jax.tree.map(lambda x: x[0], slab)
+            svi_state = self.init(
+                rng_key, *batch, *args, init_params=init_params, **kwargs
+            )
+        else:
+            svi_state = init_state
+
+        losses = []
+        total = operator.length_hint(data_iterator) * num_epochs or None
+        with tqdm.tqdm(total=total, disable=not progress_bar) as t:
+            while slab is not None:
+                svi_state, slab_losses = call_fn(svi_state, slab)
+                losses.append(slab_losses)
+                if progress_bar:
+                    num_steps = len(slab_losses)
+                    slab_losses = jax.device_get(slab_losses)
+                    if stable_update:
+                        slab_losses = slab_losses[slab_losses == slab_losses]
+                    avg_loss = slab_losses.mean() if slab_losses.size else float("nan")
+                    t.update(num_steps)
+                    t.set_postfix_str(
+                        "avg. loss [{}-{}]: {:.4f}".format(
+                            t.n - num_steps + 1, t.n, avg_loss
+                        ),
+                        refresh=False,
+                    )
+                slab = next(slabs, None)
+        losses = jnp.concatenate(losses)
+        return SVIRunResult(self.get_params(svi_state), svi_state, losses)
+
     def evaluate(self, svi_state, *args, **kwargs):
         """
         Take a single step of SVI (possibly on a batch / minibatch of data).
@@ -455,3 +800,161 @@ class SVI(object):
             **kwargs,
             **self.static_kwargs,
         )
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_compiled_fns"] = {}
+        return state
+
+
+class DataParallelSVI(SVI):
+    """
+    Stochastic Variational Inference where each step is distributed over several
+    devices by splitting the data.
+
+    The positional array arguments of :meth:`update` (e.g. a minibatch of data) are
+    split along their leading axis into one shard per device. Each device computes
+    the ELBO and its gradient on its shard, then the losses and gradients are
+    averaged over the devices and the same optimizer update is applied on all
+    devices, which hold a copy of the parameters. Keyword arguments are not split.
+    On CPU, the number of host devices can be set with
+    :func:`numpyro.set_host_device_count`.
+
+    The average over the shards is an estimate of the ELBO of the whole minibatch
+    if the model scales the log likelihood of a shard by the size of the dataset
+    over the size of the shard, e.g. with
+    ``numpyro.plate("data", num_data, subsample_size=batch.shape[0])``, where
+    ``batch`` is the data passed to the model. Log likelihood terms of a plate
+    without subsampling would be down-weighted by the number of devices.
+
+    **Example:**
+
+    .. code-block:: python
+
+        numpyro.set_host_device_count(4)
+
+        def model(batch):
+            loc = numpyro.sample("loc", dist.Normal(0.0, 10.0))
+            with numpyro.plate("N", num_data, subsample_size=batch.shape[0]):
+                numpyro.sample("obs", dist.Normal(loc, 1.0), obs=batch)
+
+        svi = DataParallelSVI(model, guide, optim.Adam(0.01), Trace_ELBO())
+        svi_state = svi.init(random.PRNGKey(0), batch)
+        svi_state, loss = jax.jit(svi.update)(svi_state, batch)
+
+    :param model: Python callable with Pyro primitives for the model.
+    :param guide: Python callable with Pyro primitives for the guide
+        (recognition network).
+    :param optim: An instance of :class:`~numpyro.optim._NumPyroOptim`, a
+        ``jax.example_libraries.optimizers.Optimizer`` or an Optax
+        ``GradientTransformation``. :class:`~numpyro.optim.Minimize` is not
+        supported.
+    :param loss: ELBO loss, i.e. negative Evidence Lower Bound, to minimize.
+    :param devices: the devices over which the data is split. The leading
+        dimensions of the positional array arguments must be divisible by the
+        number of devices. Defaults to all devices returned by :func:`jax.devices`.
+    :param static_kwargs: static arguments for the model / guide, i.e. arguments
+        that remain constant during fitting.
+    """
+
+    def __init__(self, model, guide, optim, loss, *, devices=None, **static_kwargs):
+        super().__init__(model, guide, optim, loss, **static_kwargs)
+        if isinstance(self.optim, Minimize):
+            raise ValueError("DataParallelSVI does not support the Minimize optimizer.")
+        self.devices = jax.devices() if devices is None else list(devices)
+        self._mesh = Mesh(np.array(self.devices), ("data",))
+
+    def _update(
+        self, svi_state, args, kwargs, stable_update, forward_mode_differentiation
+    ):
+        num_devices = len(self.devices)
+        dynamic_args, static_args = _partition_args(args, {})
+        for x in dynamic_args:
+            if jnp.ndim(x) == 0 or jnp.shape(x)[0] % num_devices != 0:
+                raise ValueError(
+                    "The leading dimensions of the positional array arguments must be"
+                    " divisible by the number of devices ({}).".format(num_devices)
+                )
+
+        def update_fn(svi_state, dynamic_args):
+            args, _ = _combine_args(dynamic_args, static_args)
+            rng_key, rng_key_step = random.split(svi_state.rng_key)
+            loss_fn = _make_loss_fn(
+                self.loss,
+                rng_key_step,
+                self.constrain_fn,
+                self.model,
+                self.guide,
+                args,
+                kwargs,
+                self.static_kwargs,
+                mutable_state=svi_state.mutable_state,
+            )
+            optim_state = svi_state.optim_state
+            params = self.optim.get_params(optim_state)
+            (loss_val, mutable_state), grads = _value_and_grad(
+                loss_fn, params, forward_mode_differentiation
+            )
+            # all-reduce the estimates of the shards
+            loss_val, mutable_state, grads = lax.pmean(
+                (loss_val, mutable_state, grads), "data"
+            )
+            if stable_update:
+                loss_val, optim_state = lax.cond(
+                    jnp.isfinite(loss_val) & jnp.isfinite(ravel_pytree(grads)[0]).all(),
+                    lambda _: (
+                        loss_val,
+                        self.optim.update(grads, optim_state, value=loss_val),
+                    ),
+                    lambda _: (jnp.nan, optim_state),
+                    None,
+                )
+            else:
+                optim_state = self.optim.update(grads, optim_state, value=loss_val)
+            return SVIState(optim_state, mutable_state, rng_key), loss_val
+
+        return shard_map(
+            update_fn,
+            mesh=self._mesh,
+            in_specs=(PartitionSpec(), PartitionSpec("data")),
+            out_specs=PartitionSpec(),
+            check_rep=False,
+        )(svi_state, dynamic_args)
+
+    def update(self, svi_state, *args, forward_mode_differentiation=False, **kwargs):
+        """
+        Take a single step of SVI on a minibatch of data split over the devices,
+        using the optimizer.
+
+        :param svi_state: current state of SVI.
+        :param args: arguments to the model / guide (these can possibly vary during
+            the course of fitting). Array arguments are split along their leading
+            axis over the devices.
+        :param forward_mode_differentiation: boolean flag indicating whether to use forward mode differentiation.
+            Defaults to False.
+        :param kwargs: keyword arguments to the model / guide (these can possibly vary
+            during the course of fitting).
+        :return: tuple of `(svi_state, loss)`.
+        """
+        return self._update(
+            svi_state, args, kwargs, False, forward_mode_differentiation
+        )
+
+    def stable_update(
+        self, svi_state, *args, forward_mode_differentiation=False, **kwargs
+    ):
+        """
+        Similar to :meth:`update` but returns the current state if the
+        the loss or the new state contains invalid values.
+
+        :param svi_state: current state of SVI.
+        :param args: arguments to the model / guide (these can possibly vary during
+            the course of fitting). Array arguments are split along their leading
+            axis over the devices.
+        :param forward_mode_differentiation: boolean flag indicating whether to use forward mode differentiation.
+            Defaults to False.
+        :param kwargs: keyword arguments to the model / guide (these can possibly vary
+            during the course of fitting).
+        :return: tuple of `(svi_state, loss)`.
+        """
+        return self._update(svi_state, args, kwargs, True, forward_mode_differentiation)
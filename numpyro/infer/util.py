@@ -56,6 +56,25 @@ class _substitute_default_key(Messenger):
             msg["value"] = random.PRNGKey(0)
 
 
+class _default_remat(Messenger):
+    """
+    Sets the rematerialization policy of the `scan` primitives which do not specify
+    one, see :func:`~numpyro.contrib.control_flow.scan`.
+    """
+
+    def __init__(self, fn=None, remat=True):
+        self.remat = remat
+        super().__init__(fn)
+
+    def process_message(self, msg):
+        if (
+            msg["type"] == "control_flow"
+            and "remat" in msg["kwargs"]
+            and msg["kwargs"]["remat"] is None
+        ):
+            msg["kwargs"]["remat"] = self.remat
+
+
 def compute_log_probs(
     model,
     model_args: tuple,
@@ -1151,7 +1170,7 @@ def log_likelihood(
 @contextmanager
 def helpful_support_errors(site, raise_warnings=False):
     name = site["name"]
-    support = getattr(site["fn"], "support", None)
+    support = getattr(site.get("fn"), "support", None)
     if isinstance(support, constraints.independent):
         support = support.base_constraint
 
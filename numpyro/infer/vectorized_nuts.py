@@ -0,0 +1,632 @@
+# Copyright Contributors to the Pyro project.
+# SPDX-License-Identifier: Apache-2.0
+
+from collections import namedtuple
+from functools import partial
+
+import jax
+from jax import lax, random, vmap
+from jax.flatten_util import ravel_pytree
+import jax.numpy as jnp
+
+from numpyro.infer.ensemble_util import batch_ravel_pytree
+from numpyro.infer.hmc import momentum_generator
+from numpyro.infer.hmc_util import (
+    IntegratorState,
+    TreeInfo,
+    _build_basetree,
+    _combine_tree,
+    _get_leaf,
+    _is_iterative_turning,
+    _leaf_idx_to_ckpt_idxs,
+    euclidean_kinetic_energy,
+    find_reasonable_step_size,
+    velocity_verlet,
+    warmup_adapter,
+)
+from numpyro.infer.initialization import init_to_uniform
+from numpyro.infer.mcmc import MCMCKernel
+from numpyro.infer.util import initialize_model
+from numpyro.util import cond, identity, is_prng_key
+
+VectorizedNUTSState = namedtuple(
+    "VectorizedNUTSState",
+    [
+        "i",
+        "z",
+        "z_grad",
+        "potential_energy",
+        "energy",
+        "num_steps",
+        "accept_prob",
+        "mean_accept_prob",
+        "diverging",
+        "step_size",
+        "lane_state",
+        "rng_key",
+    ],
+)
+"""
+A :func:`~collections.namedtuple` consisting of the following fields. Except
+``rng_key``, all fields have a leading dimension of size `num_chains`.
+
+ - **i** - iteration of the returned transition.
+ - **z** - Python collection representing values (unconstrained samples from
+   the posterior) at latent sites.
+ - **z_grad** - Gradient of potential energy w.r.t. latent sample sites.
+ - **potential_energy** - Potential energy computed at the given value of ``z``.
+ - **energy** - Sum of potential energy and kinetic energy of the current state.
+ - **num_steps** - Number of steps in the Hamiltonian trajectory (for diagnostics).
+ - **accept_prob** - Acceptance probability of the proposal. Note that ``z``
+   does not correspond to the proposal if it is rejected.
+ - **mean_accept_prob** - Mean acceptance probability until current iteration
+   during warmup adaptation or sampling (for diagnostics).
+ - **diverging** - A boolean value to indicate whether the current trajectory is diverging.
+ - **step_size** - Step size used by the integrator for the trajectory.
+ - **lane_state** - Internal state of the chains, which contains the trajectory
+   that is being built, the adaptation state and the queue of transitions which
+   are not returned yet.
+ - **rng_key** - random number generator seed used for the iteration.
+"""
+
+_Transition = namedtuple(
+    "_Transition",
+    [
+        "z",
+        "z_grad",
+        "potential_energy",
+        "energy",
+        "num_steps",
+        "accept_prob",
+        "diverging",
+        "step_size",
+    ],
+)
+
+_LaneState = namedtuple(
+    "_LaneState",
+    [
+        "z",
+        "potential_energy",
+        "z_grad",
+        "tree",
+        "subtree",
+        "r_ckpts",
+        "r_sum_ckpts",
+        "going_right",
+        "energy_current",
+        "fresh",
+        "num_transitions",
+        "adapt_state",
+        "queue",
+        "queue_start",
+        "queue_size",
+        "rng_key",
+    ],
+)
+
+
+def _init_tree(z, r, potential_energy, z_grad, energy):
+    int_dtype = jnp.result_type(int)
+    return TreeInfo(
+        z,
+        r,
+        z_grad,
+        z,
+        r,
+        z_grad,
+        z,
+        potential_energy,
+        z_grad,
+        energy,
+        depth=jnp.array(0, dtype=int_dtype),
+        weight=jnp.zeros((), dtype=energy.dtype),
+        r_sum=r,
+        turning=jnp.array(False),
+        diverging=jnp.array(False),
+        sum_accept_probs=jnp.zeros((), dtype=energy.dtype),
+        num_proposals=jnp.array(0, dtype=int_dtype),
+    )
+
+
+class VectorizedNUTS(MCMCKernel):
+    """
+    No-U-Turn Sampler for many vectorized chains, which advances all chains one
+    leapfrog step at a time.
+
+    With :class:`~numpyro.infer.hmc.NUTS` and `chain_method="vectorized"`, the
+    trajectories of all chains are built in nested `while_loop`, so that each
+    iteration waits for the longest trajectory among the chains. This kernel
+    instead keeps the state of the trajectory of each chain and runs a single loop
+    where every iteration takes one leapfrog step for each chain. A chain that
+    finishes its trajectory stores the transition in a queue of size
+    `queue_size` and starts its next transition immediately, while a chain with a
+    full queue is masked out. Each MCMC iteration runs the loop until every chain
+    has a transition in its queue and returns the oldest one. Hence, the throughput
+    scales with the average number of leapfrog steps of the chains rather than
+    with the maximum.
+
+    Each chain draws its samples with exactly the NUTS transitions of
+    :class:`~numpyro.infer.hmc.NUTS`, with its own step size and mass matrix
+    adaptation. The differences are that the step size is not searched again with
+    a heuristic at the end of each mass matrix adaptation window, and that the
+    last `queue_size - 1` transitions of each chain at the end of a run are
+    discarded.
+
+    .. note:: This kernel must be used with `num_chains` > 1 and
+        `chain_method="vectorized"` in :class:`~numpyro.infer.mcmc.MCMC`.
+
+    :param model: Python callable containing Pyro :mod:`~numpyro.primitives`.
+        If model is provided, `potential_fn` will be inferred using the model.
+    :param potential_fn: Python callable that computes the potential energy
+        given input parameters. The input parameters to `potential_fn` can be
+        any python collection type, provided that `init_params` argument to
+        :meth:`init` has the same type.
+    :param float step_size: Determines the size of a single step taken by the
+        verlet integrator while computing the trajectory using Hamiltonian
+        dynamics. If not specified, it will be set to 1.
+    :param inverse_mass_matrix: Initial value for inverse mass matrix.
+        This may be adapted during warmup if adapt_mass_matrix = True.
+        If no value is specified, then it is initialized to the identity matrix.
+    :param bool adapt_step_size: A flag to decide if we want to adapt step_size
+        during warm-up phase using Dual Averaging scheme.
+    :param bool adapt_mass_matrix: A flag to decide if we want to adapt mass
+        matrix during warm-up phase using Welford scheme.
+    :param bool dense_mass: Whether the mass matrix is dense or diagonal
+        (defaults to ``dense_mass=False``).
+    :param float target_accept_prob: Target acceptance probability for step size
+        adaptation using Dual Averaging. Defaults to 0.8.
+    :param int max_tree_depth: Max depth of the binary tree created during the
+        doubling scheme of NUTS sampler. Defaults to 10.
+    :param int queue_size: Number of transitions that a chain can compute ahead
+        of the slowest chain. Defaults to 8.
+    :param callable init_strategy: a per-site initialization function.
+        See :ref:`init_strategy` section for available functions.
+    :param bool find_heuristic_step_size: whether or not to use a heuristic function
+        to adjust the step size at the beginning of the warmup phase.
+
+    **Example**
+
+    .. doctest::
+
+        >>> import jax
+        >>> import jax.numpy as jnp
+        >>> import numpyro
+        >>> import numpyro.distributions as dist
+        >>> from numpyro.infer import MCMC, VectorizedNUTS
+
+        >>> def model():
+        ...    x = numpyro.sample("x", dist.Normal().expand([10]))
+        ...    numpyro.sample("obs", dist.Normal(x, 1.0), obs=jnp.ones(10))
+        >>>
+        >>> kernel = VectorizedNUTS(model)
+        >>> mcmc = MCMC(kernel, num_warmup=200, num_samples=100, num_chains=64,
+        ...             chain_method="vectorized", progress_bar=False)
+        >>> mcmc.run(jax.random.PRNGKey(0))
+    """
+
+    def __init__(
+        self,
+        model=None,
+        potential_fn=None,
+        *,
+        step_size=1.0,
+        inverse_mass_matrix=None,
+        adapt_step_size=True,
+        adapt_mass_matrix=True,
+        dense_mass=False,
+        target_accept_prob=0.8,
+        max_tree_depth=10,
+        queue_size=8,
+        init_strategy=init_to_uniform,
+        find_heuristic_step_size=False,
+    ):
+        if not (model is None) ^ (potential_fn is None):
+            raise ValueError("Only one of `model` or `potential_fn` must be specified.")
+        if not isinstance(dense_mass, bool):
+            raise ValueError("VectorizedNUTS only supports a boolean `dense_mass`.")
+        self._model = model
+        self._potential_fn = potential_fn
+        self._step_size = float(step_size)
+        self._inverse_mass_matrix = inverse_mass_matrix
+        self._adapt_step_size = adapt_step_size
+        self._adapt_mass_matrix = adapt_mass_matrix
+        self._dense_mass = dense_mass
+        self._target_accept_prob = target_accept_prob
+        self._max_tree_depth = max_tree_depth
+        self._queue_size = queue_size
+        self._init_strategy = init_strategy
+        self._find_heuristic_step_size = find_heuristic_step_size
+        self._max_delta_energy = 1000.0
+        self._postprocess_fn = None
+        self._unravel_fn = None
+        self._num_warmup = 0
+
+    @property
+    def model(self):
+        return self._model
+
+    @property
+    def sample_field(self):
+        return "z"
+
+    @property
+    def default_fields(self):
+        return ("z", "diverging")
+
+    @property
+    def is_ensemble_kernel(self):
+        return True
+
+    def get_diagnostics_str(self, state):
+        return "{} steps of size {:.2e}. acc. prob={:.2f}".format(
+            state.num_steps[0], state.step_size[0], state.mean_accept_prob[0]
+        )
+
+    def postprocess_fn(self, args, kwargs):
+        if self._postprocess_fn is None:
+            return identity
+        return self._postprocess_fn(*args, **kwargs)
+
+    def _init_state(self, rng_key, model_args, model_kwargs, init_params):
+        if self._model is not None:
+            (
+                new_params_info,
+                potential_fn_gen,
+                self._postprocess_fn,
+                _,
+            ) = initialize_model(
+                rng_key,
+                self._model,
+                dynamic_args=True,
+                init_strategy=self._init_strategy,
+                model_args=model_args,
+                model_kwargs=model_kwargs,
+            )
+            self._potential_fn = potential_fn_gen(*model_args, **model_kwargs)
+            if init_params is None:
+                init_params = new_params_info.z
+        return init_params
+
+    def _flat_potential_fn(self, x):
+        return self._potential_fn(self._unravel_fn(x))
+
+    def _warmup_adapter(self, find_reasonable_step_size=None):
+        return warmup_adapter(
+            self._num_warmup,
+            find_reasonable_step_size=find_reasonable_step_size,
+            adapt_step_size=self._adapt_step_size,
+            adapt_mass_matrix=self._adapt_mass_matrix,
+            dense_mass=self._dense_mass,
+            target_accept_prob=self._target_accept_prob,
+        )
+
+    def init(
+        self, rng_key, num_warmup, init_params=None, model_args=(), model_kwargs={}
+    ):
+        assert not is_prng_key(rng_key), (
+            "VectorizedNUTS only supports chain_method='vectorized' with num_chains > 1."
+        )
+        num_chains = rng_key.shape[0]
+        if init_params is not None:
+            assert all(
+                [param.shape[0] == num_chains for param in jax.tree.leaves(init_params)]
+            ), "The batch dimension of each param must match n_chains"
+        rng_key, rng_key_init_model, rng_key_wa, rng_key_lanes = random.split(
+            rng_key[0], 4
+        )
+        init_params = self._init_state(
+            random.split(rng_key_init_model, num_chains),
+            model_args,
+            model_kwargs,
+            init_params,
+        )
+        if self._potential_fn and init_params is None:
+            raise ValueError(
+                "Valid value of `init_params` must be provided with `potential_fn`."
+            )
+        self._num_warmup = num_warmup
+
+        x, _ = batch_ravel_pytree(init_params)
+        self._unravel_fn = ravel_pytree(jax.tree.map(lambda z: z[0], init_params))[1]
+        potential_energy, z_grad = vmap(jax.value_and_grad(self._flat_potential_fn))(x)
+
+        find_reasonable_ss = None
+        if self._find_heuristic_step_size:
+            find_reasonable_ss = partial(
+                find_reasonable_step_size,
+                self._flat_potential_fn,
+                euclidean_kinetic_energy,
+                momentum_generator,
+            )
+        wa_init, _ = self._warmup_adapter(find_reasonable_ss)
+        adapt_state = vmap(
+            lambda z_info, key: wa_init(
+                z_info,
+                key,
+                self._step_size,
+                inverse_mass_matrix=self._inverse_mass_matrix,
+            )
+        )(
+            IntegratorState(z=x, potential_energy=potential_energy, z_grad=z_grad),
+            random.split(rng_key_wa, num_chains),
+        )
+
+        def init_lane(x, potential_energy, z_grad, adapt_state, rng_key):
+            tree = _init_tree(x, x, potential_energy, z_grad, potential_energy)
+            r_ckpts = jnp.zeros((self._max_tree_depth,) + x.shape, dtype=x.dtype)
+            queue = _Transition(
+                jnp.zeros((self._queue_size,) + x.shape, dtype=x.dtype),
+                jnp.zeros((self._queue_size,) + x.shape, dtype=x.dtype),
+                jnp.zeros(self._queue_size, dtype=potential_energy.dtype),
+                jnp.zeros(self._queue_size, dtype=potential_energy.dtype),
+                jnp.zeros(self._queue_size, dtype=jnp.result_type(int)),
+                jnp.zeros(self._queue_size, dtype=potential_energy.dtype),
+                jnp.zeros(self._queue_size, dtype=bool),
+                jnp.zeros(self._queue_size, dtype=potential_energy.dtype),
+            )
+            zero_int = jnp.array(0, dtype=jnp.result_type(int))
+            return _LaneState(
+                x,
+                potential_energy,
+                z_grad,
+                tree,
+                tree,
+                r_ckpts,
+                r_ckpts,
+                jnp.array(False),
+                potential_energy,
+                jnp.array(True),
+                zero_int,
+                adapt_state,
+                queue,
+                zero_int,
+                zero_int,
+                rng_key,
+            )
+
+        lane_state = vmap(init_lane)(
+            x,
+            potential_energy,
+            z_grad,
+            adapt_state,
+            random.split(rng_key_lanes, num_chains),
+        )
+        zeros = jnp.zeros(num_chains, dtype=potential_energy.dtype)
+        zero_ints = jnp.zeros(num_chains, dtype=jnp.result_type(int))
+        return VectorizedNUTSState(
+            zero_ints,
+            init_params,
+            vmap(self._unravel_fn)(z_grad),
+            potential_energy,
+            potential_energy,
+            zero_ints,
+            zeros,
+            zeros,
+            jnp.zeros(num_chains, dtype=bool),
+            adapt_state.step_size,
+            lane_state,
+            rng_key,
+        )
+
+    def _lane_step(self, lane):
+        """
+        Takes one leapfrog step of the trajectory of a chain and returns the new
+        state of the chain together with a flag which tells whether the trajectory
+        is finished.
+        """
+        _, vv_update = velocity_verlet(
+            self._flat_potential_fn, euclidean_kinetic_energy
+        )
+        kinetic_fn = euclidean_kinetic_energy
+        inverse_mass_matrix = lane.adapt_state.inverse_mass_matrix
+        step_size = lane.adapt_state.step_size
+        (
+            rng_key,
+            key_momentum,
+            key_direction,
+            key_subtree,
+            key_transition,
+            key_next_direction,
+        ) = random.split(lane.rng_key, 6)
+
+        # start a new trajectory from the current position if the previous one is done
+        def start(lane):
+            r = momentum_generator(
+                lane.z, lane.adapt_state.mass_matrix_sqrt, key_momentum
+            )
+            energy = lane.potential_energy + kinetic_fn(inverse_mass_matrix, r)
+            tree = _init_tree(lane.z, r, lane.potential_energy, lane.z_grad, energy)
+            return lane._replace(
+                tree=tree,
+                subtree=tree,
+                going_right=random.bernoulli(key_direction),
+                energy_current=energy,
+                fresh=jnp.array(False),
+            )
+
+        lane = cond(lane.fresh, lane, start, lane, identity)
+        tree, subtree, going_right = lane.tree, lane.subtree, lane.going_right
+
+        # one step of `_iterative_build_subtree`
+        z, r, z_grad = _get_leaf(subtree, going_right)
+        new_leaf = _build_basetree(
+            vv_update,
+            kinetic_fn,
+            z,
+            r,
+            z_grad,
+            inverse_mass_matrix,
+            step_size,
+            going_right,
+            lane.energy_current,
+            self._max_delta_energy,
+        )
+        new_subtree = cond(
+            subtree.num_proposals == 0,
+            new_leaf,
+            identity,
+            (subtree, new_leaf, inverse_mass_matrix, going_right, key_subtree),
+            lambda x: _combine_tree(*x, False),
+        )
+        leaf_idx = subtree.num_proposals
+        ckpt_idx_min, ckpt_idx_max = _leaf_idx_to_ckpt_idxs(leaf_idx)
+        r_ckpts, r_sum_ckpts = cond(
+            leaf_idx % 2 == 0,
+            (lane.r_ckpts, lane.r_sum_ckpts),
+            lambda x: (
+                x[0].at[ckpt_idx_max].set(new_leaf.r_right),
+                x[1].at[ckpt_idx_max].set(new_subtree.r_sum),
+            ),
+            (lane.r_ckpts, lane.r_sum_ckpts),
+            identity,
+        )
+        subtree_turning = _is_iterative_turning(
+            inverse_mass_matrix,
+            new_leaf.r_right,
+            new_subtree.r_sum,
+            r_ckpts,
+            r_sum_ckpts,
+            ckpt_idx_min,
+            ckpt_idx_max,
+        )
+        new_subtree = new_subtree._replace(depth=tree.depth, turning=subtree_turning)
+        subtree_done = (
+            (new_subtree.num_proposals >= 2**tree.depth)
+            | subtree_turning
+            | new_subtree.diverging
+        )
+
+        # when the subtree is done, combine it with the tree as in `_double_tree`
+        new_tree = _combine_tree(
+            tree, new_subtree, inverse_mass_matrix, going_right, key_transition, True
+        )
+        new_tree = jax.tree.map(
+            lambda new, old: jnp.where(subtree_done, new, old), new_tree, tree
+        )
+        tree_done = subtree_done & (
+            (new_tree.depth >= self._max_tree_depth)
+            | new_tree.turning
+            | new_tree.diverging
+        )
+        # start the next subtree
+        new_subtree = jax.tree.map(
+            lambda new, old: jnp.where(subtree_done, new, old),
+            new_tree._replace(num_proposals=jnp.zeros_like(new_tree.num_proposals)),
+            new_subtree,
+        )
+        going_right = jnp.where(
+            subtree_done, random.bernoulli(key_next_direction), going_right
+        )
+
+        # when the tree is done, move to the proposal and push the transition
+        transition = _Transition(
+            new_tree.z_proposal,
+            new_tree.z_proposal_grad,
+            new_tree.z_proposal_pe,
+            new_tree.z_proposal_energy,
+            new_tree.num_proposals,
+            new_tree.sum_accept_probs / new_tree.num_proposals,
+            new_tree.diverging,
+            step_size,
+        )
+        idx = (lane.queue_start + lane.queue_size) % self._queue_size
+        queue = jax.tree.map(
+            lambda q, v: q.at[idx].set(jnp.where(tree_done, v, q[idx])),
+            lane.queue,
+            transition,
+        )
+        lane = _LaneState(
+            jnp.where(tree_done, new_tree.z_proposal, lane.z),
+            jnp.where(tree_done, new_tree.z_proposal_pe, lane.potential_energy),
+            jnp.where(tree_done, new_tree.z_proposal_grad, lane.z_grad),
+            new_tree,
+            new_subtree,
+            r_ckpts,
+            r_sum_ckpts,
+            going_right,
+            lane.energy_current,
+            tree_done,
+            lane.num_transitions + tree_done,
+            lane.adapt_state,
+            queue,
+            lane.queue_start,
+            lane.queue_size + tree_done,
+            rng_key,
+        )
+        return lane, tree_done
+
+    def _adapt(self, lane, tree_done):
+        _, wa_update = self._warmup_adapter()
+        t = lane.num_transitions - 1
+        idx = (lane.queue_start + lane.queue_size - 1) % self._queue_size
+        adapt_state = wa_update(
+            t,
+            lane.queue.accept_prob[idx],
+            IntegratorState(z=lane.z, potential_energy=lane.potential_energy),
+            lane.adapt_state,
+        )
+        adapt_state = jax.tree.map(
+            lambda new, old: jnp.where(tree_done & (t < self._num_warmup), new, old),
+            adapt_state,
+            lane.adapt_state,
+        )
+        return lane._replace(adapt_state=adapt_state)
+
+    def sample(self, state, model_args, model_kwargs):
+        def body_fn(lanes):
+            active = lanes.queue_size < self._queue_size
+            new_lanes, tree_done = vmap(self._lane_step)(lanes)
+            tree_done = tree_done & active
+            if self._num_warmup > 0:
+                # only run the adaptation when some chain has finished its trajectory
+                new_lanes = lax.cond(
+                    jnp.any(
+                        tree_done & (new_lanes.num_transitions <= self._num_warmup)
+                    ),
+                    lambda x: vmap(self._adapt)(*x),
+                    lambda x: x[0],
+                    (new_lanes, tree_done),
+                )
+            return jax.tree.map(
+                lambda new, old: jnp.where(
+                    jnp.reshape(active, active.shape + (1,) * (jnp.ndim(old) - 1)),
+                    new,
+                    old,
+                ),
+                new_lanes,
+                lanes,
+            )
+
+        lanes = lax.while_loop(
+            lambda lanes: jnp.any(lanes.queue_size == 0), body_fn, state.lane_state
+        )
+
+        # pop the oldest transition of each chain
+        transition = vmap(lambda q, idx: jax.tree.map(lambda x: x[idx], q))(
+            lanes.queue, lanes.queue_start
+        )
+        lanes = lanes._replace(
+            queue_start=(lanes.queue_start + 1) % self._queue_size,
+            queue_size=lanes.queue_size - 1,
+        )
+        itr = state.i + 1
+        n = jnp.where(state.i < self._num_warmup, itr, itr - self._num_warmup)
+        mean_accept_prob = (
+            state.mean_accept_prob
+            + (transition.accept_prob - state.mean_accept_prob) / n
+        )
+        return VectorizedNUTSState(
+            itr,
+            vmap(self._unravel_fn)(transition.z),
+            vmap(self._unravel_fn)(transition.z_grad),
+            transition.potential_energy,
+            transition.energy,
+            transition.num_steps,
+            transition.accept_prob,
+            mean_accept_prob,
+            transition.diverging,
+            transition.step_size,
+            lanes,
+            state.rng_key,
+        )
@@ -89,6 +89,40 @@ def set_host_device_count(n: int) -> None:
     )
 
 
+def enable_compilation_cache(
+    cache_dir: Optional[str] = None, min_compile_time_secs: float = 1.0
+) -> None:
+    """
+    Enables JAX's persistent compilation cache, so that XLA executables compiled
+    by inference algorithms (e.g. the sampling loop of :class:`~numpyro.infer.mcmc.MCMC`
+    or the update step of :class:`~numpyro.infer.svi.SVI`) are written to `cache_dir`
+    and loaded from there by later processes instead of being compiled again.
+
+    Cache entries are keyed by JAX on the lowered program, which depends on the model
+    code, the shapes and dtypes of its arguments and the configuration of the
+    kernel or optimizer, together with the versions of JAX and of the backend. A new
+    process running the same program hence only pays for tracing it.
+
+    .. note:: This utility only takes effect for computations compiled after it is
+        called, so it is best called at the beginning of your program.
+
+    :param str cache_dir: the directory to store compiled executables. Defaults to
+        the environment variable `NUMPYRO_COMPILATION_CACHE_DIR` or, if it is not set,
+        to `~/.cache/numpyro/jax`.
+    :param float min_compile_time_secs: only the executables whose compilation takes
+        longer than this number of seconds are cached. Defaults to 1.
+    """
+    if cache_dir is None:
+        cache_dir = os.getenv(
+            "NUMPYRO_COMPILATION_CACHE_DIR",
+            os.path.join(os.path.expanduser("~"), ".cache", "numpyro", "jax"),
+        )
+    jax.config.update("jax_compilation_cache_dir", cache_dir)
+    jax.config.update(
+        "jax_persistent_cache_min_compile_time_secs", min_compile_time_secs
+    )
+
+
 @contextmanager
 def optional(condition: bool, context_manager) -> Generator:
     """
@@ -119,6 +153,35 @@ def maybe_jit(fn: Callable, *args, **kwargs) -> Callable:
         return jit(fn, *args, **kwargs)
 
 
+def maybe_remat(fn: Callable, remat: Any = True, prevent_cse: bool = True) -> Callable:
+    """
+    Optionally wrap `fn` with :func:`jax.checkpoint`, so that its intermediate values
+    are recomputed, rather than stored, when differentiating `fn` in reverse mode.
+
+    :param callable fn: the function to wrap.
+    :param remat: either a boolean, a checkpoint policy such as
+        ``jax.checkpoint_policies.dots_saveable``, or the name of a policy in
+        ``jax.checkpoint_policies`` such as ``"dots_saveable"``. If False or None,
+        `fn` is returned unchanged.
+    :param bool prevent_cse: passed to :func:`jax.checkpoint`.
+    """
+    if remat is None or remat is False or _DISABLE_CONTROL_FLOW_PRIM:
+        return fn
+    if remat is True:
+        policy = None
+    elif isinstance(remat, str):
+        policy = getattr(jax.checkpoint_policies, remat, None)
+        if policy is None:
+            raise ValueError(f"Unknown checkpoint policy `{remat}`.")
+    elif callable(remat):
+        policy = remat
+    else:
+        raise ValueError(
+            "`remat` needs to be a boolean, a checkpoint policy or its name."
+        )
+    return jax.checkpoint(fn, prevent_cse=prevent_cse, policy=policy)
+
+
 def cond(
     pred: bool, true_operand, true_fun: Callable, false_operand, false_fun: Callable
 ) -> Any:
@@ -284,6 +347,9 @@ def fori_collect(
     return_last_val: bool = False,
     collection_size=None,
     thinning=1,
+    sink=None,
+    sink_chunk_size=None,
+    sink_args=(),
     **progbar_opts,
 ):
     """
@@ -311,13 +377,25 @@ def fori_collect(
         specified, the size will be ``(upper - lower) // thinning``. If the
         size is larger than ``(upper - lower) // thinning``, only the top
         ``(upper - lower) // thinning`` entries will be non-zero.
+    :param callable sink: an optional host callable with signature
+        ``sink(chunk, start, num_valid, *sink_args)``. If provided, collected values
+        are buffered on device in chunks of size `sink_chunk_size` and each filled
+        chunk is flushed to `sink` through :func:`jax.experimental.io_callback`,
+        where `start` is the index of the first value in the chunk and only the
+        first `num_valid` entries of `chunk` are meaningful. The device memory used
+        for collection then does not grow with `collection_size`. Note that chunks
+        might arrive out of order, so `sink` should place them using `start`.
+    :param int sink_chunk_size: the number of values buffered on device before being
+        flushed to `sink`. Defaults to `collection_size`.
+    :param tuple sink_args: additional array arguments passed to `sink`.
     :param `**progbar_opts`: optional additional progress bar arguments. A
         `diagnostics_fn` can be supplied which when passed the current value
         from `body_fun` returns a string that is used to update the progress
         bar postfix. Also a `progbar_desc` keyword argument can be supplied
         which is used to label the progress bar.
     :return: collection with the same type as `init_val` with values
-        collected along the leading axis of `np.ndarray` objects.
+        collected along the leading axis of `np.ndarray` objects. If `sink` is
+        provided, only the last flushed chunk is returned.
     """
     assert lower <= upper
     assert thinning >= 1
@@ -325,21 +403,29 @@ def fori_collect(
         (upper - lower) // thinning if collection_size is None else collection_size
     )
     assert collection_size >= (upper - lower) // thinning
+    num_collect = (upper - lower) // thinning
+    buffer_size = collection_size
+    if sink is not None:
+        if sink_chunk_size is not None:
+            assert sink_chunk_size >= 1
+            buffer_size = min(sink_chunk_size, collection_size)
+        buffer_size = max(buffer_size, 1)
     init_val_transformed = transform(init_val)
     start_idx = lower + (upper - lower) % thinning
     num_chains = progbar_opts.pop("num_chains", 1)
 
     @partial(maybe_jit, donate_argnums=2)
-    @cached_by(fori_collect, body_fun, transform)
-    def _body_fn(i, val, collection, start_idx, thinning):
+    @cached_by(fori_collect, body_fun, transform, sink, buffer_size)
+    def _body_fn(i, val, collection, start_idx, thinning, sink_args):
         val = body_fun(val)
         idx = (i - start_idx) // thinning
+        pos = idx if sink is None else idx % buffer_size
 
         def update_fn(collect_array, new_val):
             return cond(
                 idx >= 0,
                 collect_array,
-                lambda x: x.at[idx].set(new_val),
+                lambda x: x.at[pos].set(new_val),
                 collect_array,
                 identity,
             )
@@ -348,11 +434,26 @@ def fori_collect(
             return jax.tree.map(update_fn, collection, transform(val))
 
         collection = update_collection(collection, val)
-        return val, collection, start_idx, thinning
+        if sink is not None:
+            # flush once the last value of a thinning group fills the chunk;
+            # the remaining partial chunk is flushed after the loop
+            flush = (
+                (idx >= 0)
+                & ((i - start_idx) % thinning == thinning - 1)
+                & (pos == buffer_size - 1)
+            )
+            cond(
+                flush,
+                collection,
+                lambda c: io_callback(sink, None, c, idx - pos, pos + 1, *sink_args),
+                None,
+                lambda _: None,
+            )
+        return val, collection, start_idx, thinning, sink_args
 
     def map_fn(x):
         nx = jnp.asarray(x)
-        return jnp.zeros((collection_size, *nx.shape), dtype=nx.dtype) * nx[None, ...]
+        return jnp.zeros((buffer_size, *nx.shape), dtype=nx.dtype) * nx[None, ...]
 
     collection = jax.tree.map(map_fn, init_val_transformed)
 
@@ -363,10 +464,10 @@ def fori_collect(
                 0,
                 upper,
                 lambda i, vals: _body_fn(i, *vals),
-                (init_val, collection, start_idx, thinning),
+                (init_val, collection, start_idx, thinning, sink_args),
             )
 
-        last_val, collection, _, _ = maybe_jit(loop_fn, donate_argnums=0)(collection)
+        last_val, collection, _, _, _ = maybe_jit(loop_fn, donate_argnums=0)(collection)
 
     elif num_chains > 1:
         progress_bar_fori_loop = progress_bar_factory(upper, num_chains)
@@ -377,22 +478,31 @@ def fori_collect(
                 0,
                 upper,
                 _body_fn_pbar,
-                ((init_val, collection, start_idx, thinning), -1),  # -1 for chain id
+                # -1 for chain id
+                ((init_val, collection, start_idx, thinning, sink_args), -1),
             )[0]
 
-        last_val, collection, _, _ = maybe_jit(loop_fn, donate_argnums=0)(collection)
+        last_val, collection, _, _, _ = maybe_jit(loop_fn, donate_argnums=0)(collection)
 
     else:
         diagnostics_fn = progbar_opts.pop("diagnostics_fn", None)
         progbar_desc = progbar_opts.pop("progbar_desc", lambda x: "")
 
-        vals = (init_val, collection, jnp.asarray(start_idx), jnp.asarray(thinning))
+        vals = (
+            init_val,
+            collection,
+            jnp.asarray(start_idx),
+            jnp.asarray(thinning),
+            sink_args,
+        )
 
         if upper == 0:
             # special case, only compiling
-            val, collection, start_idx, thinning = vals
-            _, collection, _, _ = _body_fn(-1, val, collection, start_idx, thinning)
-            vals = (val, collection, start_idx, thinning)
+            val, collection, start_idx, thinning, sink_args = vals
+            _, collection, _, _, _ = _body_fn(
+                -1, val, collection, start_idx, thinning, sink_args
+            )
+            vals = (val, collection, start_idx, thinning, sink_args)
         else:
             with tqdm.trange(upper) as t:
                 for i in t:
@@ -402,7 +512,18 @@ def fori_collect(
                     if diagnostics_fn:
                         t.set_postfix_str(diagnostics_fn(vals[0]), refresh=False)
 
-        last_val, collection, _, _ = vals
+        last_val, collection, _, _, _ = vals
+
+    if sink is not None and num_collect % buffer_size > 0:
+        num_remaining = num_collect % buffer_size
+        io_callback(
+            sink,
+            None,
+            collection,
+            num_collect - num_remaining,
+            num_remaining,
+            *sink_args,
+        )
 
     return (collection, last_val) if return_last_val else collection
 
@@ -439,8 +560,9 @@ def soft_vmap(
     chunk_size = batch_size if chunk_size is None else min(batch_size, chunk_size)
     if chunk_size > 1:
         pad = chunk_size - batch_size % chunk_size if batch_size % chunk_size else 0
+        # pad with copies of the first element, which also works for typed PRNG keys
         xs = jax.tree.map(
-            lambda x: jnp.pad(x, ((0, pad),) + ((0, 0),) * (np.ndim(x) - 1)), xs
+            lambda x: jnp.concatenate([x, x[jnp.zeros(pad, dtype=jnp.int32)]]), xs
         )
         num_chunks = batch_size // chunk_size + int(pad > 0)
         prepend_shape = (-1,) if num_chunks > 1 else ()
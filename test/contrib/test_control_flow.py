@@ -4,11 +4,12 @@
 from numpy.testing import assert_allclose
 import pytest
 
+import jax
 from jax import random
 import jax.numpy as jnp
 
 import numpyro
-from numpyro.contrib.control_flow import cond, scan
+from numpyro.contrib.control_flow import checkpoint, cond, scan
 import numpyro.distributions as dist
 from numpyro.handlers import mask, seed, substitute, trace
 from numpyro.infer import MCMC, NUTS, SVI, Predictive, Trace_ELBO
@@ -288,3 +289,118 @@ def test_scan_mvn():
     with numpyro.handlers.seed(rng_seed=0), numpyro.handlers.trace() as tr:
         model()
     assert tr["val"]["fn"].batch_shape == (4, 5)
+
+
+def _is_rematerialized(jaxpr):
+    # the primitive of `jax.checkpoint` is named `remat2` in older JAX versions
+    return any(name in str(jaxpr) for name in ["checkpoint", "remat"])
+
+
+@pytest.mark.parametrize("policy", [True, "dots_saveable"])
+def test_checkpoint(policy):
+    def model(x, y=None, use_checkpoint=True):
+        def layer(h, scale):
+            w = numpyro.sample("w", dist.Normal(0, scale).expand([3, 3]).to_event(2))
+            b = numpyro.param("b", jnp.full(3, 0.1))
+            h = jnp.tanh(h @ w + b)
+            return numpyro.deterministic("h", h)
+
+        if use_checkpoint:
+            layer = checkpoint(layer, policy=policy)
+        h = layer(x, scale=1.0)
+        s = numpyro.sample("s", dist.HalfNormal(1.0))
+        numpyro.sample("y", dist.Normal(h.sum(-1), s), obs=y)
+
+    x = random.normal(random.PRNGKey(0), (10, 3))
+    y = random.normal(random.PRNGKey(1), (10,))
+    tr = trace(seed(model, 0)).get_trace(x, y)
+    assert {name: site["type"] for name, site in tr.items()} == {
+        "w": "sample",
+        "b": "param",
+        "h": "deterministic",
+        "s": "sample",
+        "y": "sample",
+    }
+    expected_h = jnp.tanh(x @ tr["w"]["value"] + tr["b"]["value"])
+    assert_allclose(tr["h"]["value"], expected_h, rtol=1e-6)
+
+    params = {"w": jnp.ones((3, 3)), "s": 0.5}
+
+    def pe_fn(params, use_checkpoint):
+        return potential_energy(model, (x, y, use_checkpoint), {}, params)
+
+    actual = jax.value_and_grad(pe_fn)(params, True)
+    expected = jax.value_and_grad(pe_fn)(params, False)
+    assert_allclose(actual[0], expected[0], rtol=1e-6)
+    for name in params:
+        assert_allclose(actual[1][name], expected[1][name], rtol=1e-5)
+    assert _is_rematerialized(jax.make_jaxpr(pe_fn, static_argnums=1)(params, True))
+
+    # param sites within the block are substituted by SVI
+    guide = AutoNormal(model)
+    svi = SVI(model, guide, Adam(0.1), Trace_ELBO())
+    svi_result = svi.run(random.PRNGKey(0), 100, x, y, progress_bar=False)
+    assert svi_result.params["b"].shape == (3,)
+    assert not jnp.allclose(svi_result.params["b"], 0.1)
+
+
+def test_checkpoint_decorator():
+    @checkpoint(policy="dots_saveable")
+    def block(x):
+        return numpyro.sample("z", dist.Normal(x, 1.0))
+
+    assert block.__name__ == "block"
+    with seed(rng_seed=0), trace() as tr:
+        z = block(1.0)
+    assert_allclose(tr["z"]["value"], z)
+    # without effect handlers, the block is rematerialized as a function
+    assert_allclose(jax.grad(checkpoint(jnp.sin))(1.0), jnp.cos(1.0), rtol=1e-6)
+
+
+@pytest.mark.parametrize("remat", [True, "dots_saveable", "elbo", "nuts"])
+def test_scan_remat(remat):
+    def gaussian_hmm(y, scan_remat=None):
+        w = numpyro.sample("w", dist.Normal(0.5, 0.1))
+
+        def transition(x_prev, y_curr):
+            x_curr = numpyro.sample("x", dist.Normal(jnp.tanh(w * x_prev), 1.0))
+            numpyro.sample("y", dist.Normal(x_curr, 0.1), obs=y_curr)
+            return x_curr, None
+
+        scan(transition, 0.0, y, remat=scan_remat)
+
+    y = random.normal(random.PRNGKey(0), (20,))
+    scan_remat = None if remat in ("elbo", "nuts") else remat
+    if remat == "nuts":
+        samples = []
+        for kernel_remat in [False, True]:
+            kernel = NUTS(gaussian_hmm, remat=kernel_remat)
+            mcmc = MCMC(kernel, num_warmup=20, num_samples=20, progress_bar=False)
+            mcmc.run(random.PRNGKey(0), y)
+            samples.append(mcmc.get_samples())
+        assert_allclose(samples[0]["x"], samples[1]["x"], rtol=1e-5, atol=1e-5)
+        return
+
+    guide = AutoNormal(gaussian_hmm)
+    with seed(rng_seed=0):
+        guide(y)
+    params = {
+        "w_auto_loc": 0.5,
+        "w_auto_scale": 0.1,
+        "x_auto_loc": jnp.zeros(20),
+        "x_auto_scale": jnp.full(20, 0.1),
+    }
+
+    def loss_fn(params, scan_remat, elbo_remat):
+        elbo = Trace_ELBO(remat=elbo_remat)
+        return elbo.loss(random.PRNGKey(1), params, gaussian_hmm, guide, y, scan_remat)
+
+    elbo_remat = remat == "elbo"
+    actual = jax.value_and_grad(loss_fn)(params, scan_remat, elbo_remat)
+    expected = jax.value_and_grad(loss_fn)(params, None, False)
+    assert_allclose(actual[0], expected[0], rtol=1e-6)
+    for name in params:
+        assert_allclose(actual[1][name], expected[1][name], rtol=1e-5, atol=1e-6)
+    jaxpr = jax.make_jaxpr(loss_fn, static_argnums=(1, 2))
+    assert _is_rematerialized(jaxpr(params, scan_remat, elbo_remat))
+    assert not _is_rematerialized(jaxpr(params, None, False))
@@ -0,0 +1,60 @@
+# Copyright Contributors to the Pyro project.
+# SPDX-License-Identifier: Apache-2.0
+
+import numpy as np
+from numpy.testing import assert_allclose
+import pytest
+
+from jax import vmap
+import jax.numpy as jnp
+import jax.random as random
+
+import numpyro
+import numpyro.distributions as dist
+from numpyro.infer import MCMC, ChEESHMC
+from numpyro.infer.chees import _halton
+
+
+def test_halton():
+    assert_allclose(
+        vmap(_halton)(jnp.arange(1, 8)), [0.5, 0.25, 0.75, 0.125, 0.625, 0.375, 0.875]
+    )
+
+
+def test_gaussian():
+    scales = jnp.logspace(-1, 1, 10)
+
+    def model():
+        numpyro.sample("x", dist.Normal(jnp.arange(10.0), scales))
+
+    mcmc = MCMC(
+        ChEESHMC(model),
+        num_warmup=300,
+        num_samples=200,
+        num_chains=64,
+        chain_method="vectorized",
+        progress_bar=False,
+    )
+    mcmc.run(random.PRNGKey(0), extra_fields=("num_steps", "accept_prob"))
+    samples = mcmc.get_samples(group_by_chain=True)["x"]
+    assert samples.shape == (64, 200, 10)
+    assert_allclose(
+        (jnp.mean(samples, (0, 1)) - jnp.arange(10.0)) / scales, 0.0, atol=0.1
+    )
+    assert_allclose(jnp.std(samples, (0, 1)), scales, rtol=0.1)
+
+    # all chains take the same number of leapfrog steps
+    num_steps = mcmc.get_extra_fields(group_by_chain=True)["num_steps"]
+    assert np.all(num_steps == num_steps[:1])
+    adapt_state = mcmc.last_state.adapt_state
+    assert_allclose(jnp.sqrt(adapt_state.inverse_mass_matrix), scales, rtol=0.3)
+    assert mcmc.last_state.mean_accept_prob > 0.5
+
+
+def test_requires_vectorized_chains():
+    def model():
+        numpyro.sample("x", dist.Normal())
+
+    mcmc = MCMC(ChEESHMC(model), num_warmup=10, num_samples=10, progress_bar=False)
+    with pytest.raises(AssertionError, match="vectorized"):
+        mcmc.run(random.PRNGKey(0))
@@ -7,7 +7,8 @@ import numpy as np
 from numpy.testing import assert_allclose
 import pytest
 
-from jax import hessian, jacrev, random, vmap
+import jax
+from jax import grad, hessian, jacrev, random, vmap
 import jax.numpy as jnp
 from jax.scipy.linalg import cho_factor, cho_solve, inv, solve_triangular
 
@@ -271,6 +272,109 @@ def test_discrete_gibbs_gmm_1d(modified, kernel, inner_kernel, kwargs):
     assert_allclose(jnp.var(samples["c"]), 1.03, atol=0.1)
 
 
+def _gibbs_step(kernel, monkeypatch):
+    # skip the HMC update, so that the returned state is the one produced by the
+    # Gibbs update of the discrete/subsample sites, and record each evaluation of
+    # the potential energy at run time
+    evals = []
+    potential_fn_gen = kernel.inner_kernel._potential_fn_gen
+
+    def counting_potential_fn_gen(*args, **kwargs):
+        potential_fn = potential_fn_gen(*args, **kwargs)
+
+        def fn(z):
+            jax.debug.callback(lambda: evals.append(None))
+            return potential_fn(z)
+
+        return fn
+
+    monkeypatch.setattr(
+        kernel.inner_kernel, "_potential_fn_gen", counting_potential_fn_gen
+    )
+    monkeypatch.setattr(
+        kernel.inner_kernel, "sample", lambda state, model_args, model_kwargs: state
+    )
+
+    def sample(state, model_args, model_kwargs):
+        evals.clear()
+        new_state = kernel.sample(state, model_args, model_kwargs)
+        jax.effects_barrier()
+        return new_state, len(evals)
+
+    return sample, potential_fn_gen
+
+
+def test_discrete_gibbs_reuses_gradient(monkeypatch):
+    def model(probs, locs):
+        c = numpyro.sample("c", dist.Categorical(probs))
+        numpyro.sample("x", dist.Normal(locs[c], 0.5))
+
+    probs = jnp.array([0.15, 0.3, 0.3, 0.25])
+    locs = jnp.array([-2.0, 0.0, 2.0, 4.0])
+    kernel = DiscreteHMCGibbs(NUTS(model), random_walk=True)
+    state = kernel.init(random.PRNGKey(0), 0, None, (probs, locs), {})
+    sample, potential_fn_gen = _gibbs_step(kernel, monkeypatch)
+
+    moves = set()
+    for _ in range(20):
+        new_state, num_evals = sample(state, (probs, locs), {})
+        moved = bool(new_state.z["c"] != state.z["c"])
+        moves.add(moved)
+
+        z_gibbs = {"c": new_state.z["c"]}
+        potential_fn = potential_fn_gen(probs, locs, _gibbs_sites=z_gibbs)
+        z = new_state.hmc_state.z
+        assert_allclose(new_state.hmc_state.potential_energy, potential_fn(z))
+        assert_allclose(new_state.hmc_state.z_grad["x"], grad(potential_fn)(z)["x"])
+        # one evaluation to score the proposal, plus one for the gradient
+        # if the discrete site moved
+        assert num_evals == (2 if moved else 1)
+        state = new_state
+    assert moves == {True, False}
+
+
+@pytest.mark.parametrize("use_proxy", [False, True])
+def test_hmcecs_reuses_gradient(use_proxy, monkeypatch):
+    def model(data):
+        mean = numpyro.sample("mean", dist.Normal().expand((3,)).to_event(1))
+        with numpyro.plate("batch", data.shape[0], dim=-1, subsample_size=10):
+            sub_data = numpyro.subsample(data, 1)
+            # a Gaussian likelihood would make the Taylor proxy exact, so that every
+            # subsample proposal is accepted
+            numpyro.sample("obs", dist.StudentT(3.0, mean, 1).to_event(), obs=sub_data)
+
+    true_loc = jnp.array([0.3, 0.1, 0.9])
+    data = true_loc + dist.Normal(jnp.zeros(3), jnp.ones(3)).sample(
+        random.PRNGKey(1), (100,)
+    )
+    proxy = HMCECS.taylor_proxy({"mean": true_loc}) if use_proxy else None
+    kernel = HMCECS(NUTS(model), num_blocks=5, proxy=proxy)
+    state = kernel.init(random.PRNGKey(0), 0, None, (data,), {})
+    sample, potential_fn_gen = _gibbs_step(kernel, monkeypatch)
+
+    accepts = set()
+    for _ in range(20):
+        new_state, num_evals = sample(state, (data,), {})
+        accepts.add(bool(jnp.any(new_state.z["batch"] != state.z["batch"])))
+
+        potential_fn = potential_fn_gen(
+            data,
+            _gibbs_sites={"batch": new_state.z["batch"]},
+            _gibbs_state=new_state.gibbs_state,
+        )
+        z = new_state.hmc_state.z
+        assert_allclose(
+            new_state.hmc_state.potential_energy, potential_fn(z), rtol=1e-5
+        )
+        assert_allclose(
+            new_state.hmc_state.z_grad["mean"], grad(potential_fn)(z)["mean"], rtol=1e-5
+        )
+        # an accepted proposal reuses the forward pass that scored it
+        assert num_evals == 1
+        state = new_state
+    assert accepts == {True, False}
+
+
 def test_enum_subsample_smoke():
     def model(data):
         x = numpyro.sample("x", dist.Bernoulli(0.5), infer={"enumerate": "parallel"})
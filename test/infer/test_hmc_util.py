@@ -18,15 +18,22 @@ from numpyro.infer.hmc_util import (
     AdaptWindow,
     _is_iterative_turning,
     _leaf_idx_to_ckpt_idxs,
+    _low_rank_matvec,
+    _low_rank_sqrt_matvec,
     build_adaptation_schedule,
     build_tree,
     consensus,
     dual_averaging,
     find_reasonable_step_size,
+    low_rank_covariance,
+    minimal_error_three_stage,
+    minimal_error_two_stage,
+    omelyan,
     parametric_draws,
     velocity_verlet,
     warmup_adapter,
     welford_covariance,
+    yoshida,
 )
 from numpyro.util import control_flow_prims_disabled, fori_loop, optional
 
@@ -89,6 +96,59 @@ def test_welford_covariance(jitted, diagonal, regularize):
             )
 
 
+@pytest.mark.parametrize("regularize", [True, False])
+def test_welford_covariance_batched_blocks(regularize):
+    np.random.seed(0)
+    num_blocks, block_size = 4, 3
+    a = np.random.randn(num_blocks, block_size, block_size)
+    x = np.random.randn(2000, num_blocks, 1, block_size) @ a
+    x = x.squeeze(-2)
+    wc_init, wc_update, wc_final = welford_covariance(diagonal=False)
+
+    def get_cov(x, size):
+        wc_state = wc_init(size)
+        wc_state = fori_loop(0, 2000, lambda i, val: wc_update(x[i], val), wc_state)
+        return wc_final(wc_state, regularize=regularize)
+
+    # a batch of dense blocks agrees with estimating each block separately
+    actual = jit(get_cov, static_argnums=1)(x, (num_blocks, block_size, block_size))
+    expected = jax.vmap(get_cov, (1, None))(x, block_size)
+    assert actual[0].shape == (num_blocks, block_size, block_size)
+    for actual_i, expected_i in zip(actual, expected):
+        assert_allclose(actual_i, expected_i, rtol=1e-4, atol=1e-5)
+
+
+@pytest.mark.parametrize("regularize", [True, False])
+def test_low_rank_covariance(regularize):
+    np.random.seed(0)
+    dim, rank = 20, 2
+    scale = np.exp(np.random.randn(dim))
+    w = np.sign(np.random.randn(dim, rank)) * 2
+    target_cov = scale[:, None] * (np.eye(dim) + w @ w.T) * scale
+    x = np.random.multivariate_normal(np.ones(dim), target_cov, size=(4000,))
+
+    @jit
+    def get_cov(x):
+        lr_init, lr_update, lr_final = low_rank_covariance(rank)
+        lr_state = lr_init(dim)
+        lr_state = fori_loop(0, 4000, lambda i, val: lr_update(x[i], val), lr_state)
+        return lr_final(lr_state, regularize=regularize)
+
+    cov, cov_inv, _ = get_cov(x)
+    eye = jnp.eye(dim)
+    dense_cov = jax.vmap(lambda v: _low_rank_matvec(cov, v))(eye)
+    dense_cov_inv = jax.vmap(lambda v: _low_rank_matvec(cov_inv, v))(eye)
+    cov_sqrt = jax.vmap(lambda v: _low_rank_sqrt_matvec(cov, v), out_axes=1)(eye)
+    assert_allclose(dense_cov @ dense_cov_inv, eye, atol=1e-4)
+    assert_allclose(cov_sqrt @ cov_sqrt.T, dense_cov, rtol=1e-4)
+    # the target covariance is exactly of the form diagonal plus rank 2
+    assert_allclose(np.diag(dense_cov), np.diag(target_cov), rtol=0.1)
+    std = np.sqrt(np.diag(target_cov))
+    assert_allclose(
+        dense_cov / np.outer(std, std), target_cov / np.outer(std, std), atol=0.1
+    )
+
+
 ########################################
 # verlocity_verlet Test
 ########################################
@@ -191,11 +251,21 @@ class QuarticOscillator(object):
         return 0.25 * jnp.power(q["x"], 4.0)
 
 
+@pytest.mark.parametrize(
+    "integrator",
+    [
+        velocity_verlet,
+        minimal_error_two_stage,
+        minimal_error_three_stage,
+        omelyan,
+        yoshida,
+    ],
+)
 @pytest.mark.parametrize("jitted", [True, False])
 @pytest.mark.parametrize("example", TEST_EXAMPLES, ids=EXAMPLE_IDS)
-def test_velocity_verlet(jitted, example):
+def test_velocity_verlet(jitted, example, integrator):
     def get_final_state(model, step_size, num_steps, q_i, p_i):
-        vv_init, vv_update = velocity_verlet(model.potential_fn, model.kinetic_fn)
+        vv_init, vv_update = integrator(model.potential_fn, model.kinetic_fn)
         vv_state = vv_init(q_i, p_i)
         q_f, p_f, _, _ = fori_loop(
             0, num_steps, lambda i, val: vv_update(step_size, args.m_inv, val), vv_state
@@ -0,0 +1,69 @@
+# Copyright Contributors to the Pyro project.
+# SPDX-License-Identifier: Apache-2.0
+
+import numpy as np
+from numpy.testing import assert_allclose
+import pytest
+
+from jax import random
+import jax.numpy as jnp
+
+import numpyro
+import numpyro.distributions as dist
+from numpyro.infer import MCLMC, MCMC
+
+
+@pytest.mark.parametrize("adapt_mass_matrix", [False, True])
+def test_gaussian(adapt_mass_matrix):
+    dim = 20
+    scale = jnp.exp(jnp.linspace(-0.5, 0.5, dim))
+
+    def model():
+        numpyro.sample("x", dist.Normal(0.0, scale))
+
+    kernel = MCLMC(model, adapt_mass_matrix=adapt_mass_matrix)
+    mcmc = MCMC(
+        kernel, num_warmup=2000, num_samples=10000, thinning=5, progress_bar=False
+    )
+    mcmc.run(random.PRNGKey(0), extra_fields=("diverging",))
+    samples = mcmc.get_samples()["x"]
+    assert samples.shape == (2000, dim)
+    assert not mcmc.get_extra_fields()["diverging"].any()
+    assert_allclose(samples.mean(0) / scale, 0.0, atol=0.2)
+    assert_allclose(samples.std(0) / scale, 1.0, rtol=0.15)
+
+    adapt_state = mcmc.last_state.adapt_state
+    assert adapt_state.step_size != np.sqrt(dim) / 4
+    if adapt_mass_matrix:
+        assert_allclose(adapt_state.inverse_mass_matrix, scale**2, rtol=0.5)
+        assert_allclose(adapt_state.L, np.sqrt(dim), rtol=0.1)
+    else:
+        assert_allclose(adapt_state.inverse_mass_matrix, 1.0)
+        assert_allclose(adapt_state.L, np.linalg.norm(scale), rtol=0.3)
+
+
+def test_num_chains():
+    def model():
+        numpyro.sample("x", dist.Normal(jnp.arange(3.0), 1.0))
+
+    mcmc = MCMC(
+        MCLMC(model),
+        num_warmup=200,
+        num_samples=100,
+        num_chains=2,
+        chain_method="vectorized",
+        progress_bar=False,
+    )
+    mcmc.run(random.PRNGKey(1))
+    samples = mcmc.get_samples(group_by_chain=True)["x"]
+    assert samples.shape == (2, 100, 3)
+    assert not np.allclose(samples[0], samples[1])
+
+
+def test_scalar_latent_raises():
+    def model():
+        numpyro.sample("x", dist.Normal())
+
+    mcmc = MCMC(MCLMC(model), num_warmup=10, num_samples=10, progress_bar=False)
+    with pytest.raises(ValueError, match="at least two"):
+        mcmc.run(random.PRNGKey(0))
@@ -15,12 +15,20 @@ import jax.numpy as jnp
 from jax.scipy.special import logit
 
 import numpyro
+from numpyro.diagnostics import split_gelman_rubin
 import numpyro.distributions as dist
 from numpyro.distributions.transforms import AffineTransform
 from numpyro.infer import AIES, ESS, HMC, MCMC, NUTS, SA, BarkerMH, init_to_value
 from numpyro.infer.hmc import hmc
+from numpyro.infer.hmc_util import (
+    minimal_error_three_stage,
+    minimal_error_two_stage,
+    omelyan,
+    yoshida,
+)
 from numpyro.infer.reparam import TransformReparam
 from numpyro.infer.sa import _get_proposal_loc_and_scale, _numpy_delete
+from numpyro.infer.sinks import InMemorySink, MemmapSink
 from numpyro.infer.util import initialize_model
 from numpyro.util import fori_collect, is_prng_key
 
@@ -309,6 +317,41 @@ def test_dirichlet_categorical_x64(kernel_cls, dense_mass):
         assert samples["p_latent"].dtype == jnp.float64
 
 
+@pytest.mark.parametrize("kernel_cls", [HMC, NUTS])
+def test_low_rank_mass(kernel_cls):
+    dim = 50
+    w = random.normal(random.PRNGKey(1), (dim, 2))
+    true_cov = 0.1 * jnp.eye(dim) + w @ w.T
+
+    def model():
+        numpyro.sample(
+            "x", dist.MultivariateNormal(jnp.zeros(dim), covariance_matrix=true_cov)
+        )
+
+    num_steps = {}
+    for dense_mass in [False, "low_rank:2"]:
+        if kernel_cls is HMC:
+            kernel = HMC(model, trajectory_length=2.0, dense_mass=dense_mass)
+        else:
+            kernel = NUTS(model, dense_mass=dense_mass, find_heuristic_step_size=True)
+        mcmc = MCMC(kernel, num_warmup=1000, num_samples=1000, progress_bar=False)
+        mcmc.run(random.PRNGKey(0), extra_fields=("num_steps",))
+        num_steps[dense_mass] = jnp.mean(mcmc.get_extra_fields()["num_steps"])
+
+    inverse_mass_matrix = mcmc.last_state.adapt_state.inverse_mass_matrix
+    assert inverse_mass_matrix.eigenvectors.shape == (dim, 2)
+    samples = mcmc.get_samples()["x"]
+    scale = jnp.sqrt(jnp.diag(true_cov))
+    assert_allclose(jnp.mean(samples, 0) / scale, 0.0, atol=0.3)
+    assert_allclose(jnp.std(samples, 0) / scale, 1.0, atol=0.2)
+    assert num_steps["low_rank:2"] < 0.5 * num_steps[False]
+
+
+def test_low_rank_mass_invalid():
+    with pytest.raises(ValueError, match="low_rank"):
+        NUTS(potential_fn=lambda x: jnp.sum(x**2), dense_mass="low_rank:0")
+
+
 @pytest.mark.parametrize("kernel_cls", [HMC, NUTS, BarkerMH])
 @pytest.mark.parametrize("rho", [-0.7, 0.8])
 def test_dense_mass(kernel_cls, rho):
@@ -741,6 +784,92 @@ def test_functional_beta_bernoulli_x64(algo):
         assert samples["p_latent"].dtype == jnp.float64
 
 
+@pytest.mark.parametrize(
+    "integrator", [minimal_error_two_stage, minimal_error_three_stage, omelyan, yoshida]
+)
+@pytest.mark.parametrize("kernel_cls", [HMC, NUTS])
+def test_integrator(kernel_cls, integrator):
+    true_std = jnp.array([0.5, 1.0, 2.0])
+
+    def model():
+        numpyro.sample("x", dist.Normal(1.0, true_std))
+
+    kwargs = {"trajectory_length": 4.0} if kernel_cls is HMC else {}
+    kernel = kernel_cls(model, integrator=integrator, **kwargs)
+    mcmc = MCMC(kernel, num_warmup=500, num_samples=2000, progress_bar=False)
+    mcmc.run(random.PRNGKey(0), extra_fields=("diverging",))
+    samples = mcmc.get_samples()["x"]
+    assert not mcmc.get_extra_fields()["diverging"].any()
+    assert_allclose(samples.mean(0), 1.0, atol=0.2)
+    assert_allclose(samples.std(0), true_std, rtol=0.15)
+
+
+def _correlated_normal_model():
+    cov = jnp.array([[1.0, 0.99], [0.99, 1.0]])
+    numpyro.sample("x", dist.MultivariateNormal(jnp.zeros(2), cov))
+
+
+def test_nuts_tree_depth_quantile():
+    kernel = NUTS(_correlated_normal_model, tree_depth_quantile=0.5)
+    mcmc = MCMC(kernel, num_warmup=500, num_samples=500, progress_bar=False)
+    mcmc.run(
+        random.PRNGKey(0),
+        extra_fields=(
+            "num_steps",
+            "tree_depth_state.depth",
+            "tree_depth_state.capped",
+        ),
+    )
+    depth_counts = device_get(mcmc.last_state.tree_depth_state.depth_counts)
+    assert depth_counts.sum() == 250
+    cdf = np.cumsum(depth_counts) / depth_counts.sum()
+    expected_max_depth = np.argmax(cdf >= 0.5)
+    assert mcmc.last_state.tree_depth_state.max_tree_depth == expected_max_depth
+    assert expected_max_depth < 10
+
+    extra_fields = mcmc.get_extra_fields()
+    depth = extra_fields["tree_depth_state.depth"]
+    capped = extra_fields["tree_depth_state.capped"]
+    assert depth.max() <= expected_max_depth
+    assert capped.any()
+    assert (depth[capped] == expected_max_depth).all()
+    assert_allclose(depth, np.log2(extra_fields["num_steps"]).astype(int) + 1, atol=0)
+
+
+def test_nuts_num_steps_budget():
+    num_samples, budget = 500, 7
+    kernel = NUTS(_correlated_normal_model, num_steps_budget=budget)
+    mcmc = MCMC(kernel, num_warmup=500, num_samples=num_samples, progress_bar=False)
+    mcmc.run(random.PRNGKey(0), extra_fields=("num_steps", "tree_depth_state.capped"))
+    num_steps = mcmc.get_extra_fields()["num_steps"]
+    assert num_steps.sum() <= budget * num_samples
+    assert mcmc.get_extra_fields()["tree_depth_state.capped"].any()
+    assert_allclose(mcmc.get_samples()["x"].std(0), 1.0, rtol=0.3)
+
+    mcmc.warmup(random.PRNGKey(1), collect_warmup=True, extra_fields=("num_steps",))
+    assert mcmc.get_extra_fields()["num_steps"].max() > 2**3 - 1
+
+
+@pytest.mark.parametrize("find_heuristic_step_size", [False, True])
+def test_init_kernel_reuses_potential_energy(find_heuristic_step_size):
+    num_calls = 0
+
+    def potential_fn(z):
+        nonlocal num_calls
+        num_calls += 1
+        return 0.5 * jnp.sum(z**2)
+
+    init_kernel, _ = hmc(potential_fn, algo="NUTS")
+    hmc_state = init_kernel(
+        jnp.ones(3), num_warmup=10, find_heuristic_step_size=find_heuristic_step_size
+    )
+    assert_allclose(hmc_state.potential_energy, 1.5)
+    assert_allclose(hmc_state.z_grad, jnp.ones(3))
+    # one evaluation at the initial point, plus one trace of the body of the
+    # step size search loop
+    assert num_calls == (2 if find_heuristic_step_size else 1)
+
+
 @pytest.mark.parametrize("algo", ["HMC", "NUTS"])
 @pytest.mark.parametrize("map_fn", [vmap, pmap])
 @pytest.mark.skipif(
@@ -871,7 +1000,7 @@ def test_compile_warmup_run(num_chains, chain_method, progress_bar):
     mcmc.run(rng_key)
     expected_samples = mcmc.get_samples()["x"]
 
-    mcmc._compile(rng_key)
+    mcmc.compile(rng_key)
     # no delay after compiling
     mcmc.warmup(rng_key)
     mcmc.run(mcmc.last_state.rng_key)
@@ -1021,6 +1150,45 @@ def test_structured_mass():
     assert_allclose(inverse_mass_matrix[("z",)], z_var, atol=0.5, rtol=0.5)
 
 
+def test_block_structured_mass():
+    scale_tril = jnp.array([[1.0, 0.0, 0.0], [0.9, 0.3, 0.0], [0.5, 0.2, 0.1]])
+    scales = jnp.array([1.0, 3.0, 0.1, 10.0])
+
+    def model():
+        with numpyro.plate("groups", 4):
+            numpyro.sample(
+                "x",
+                dist.MultivariateNormal(
+                    jnp.zeros(3), scale_tril=scales[:, None, None] * scale_tril
+                ),
+            )
+            numpyro.sample("y", dist.Normal(0, scales))
+        numpyro.sample("z", dist.Normal(0, 1))
+
+    kernel = NUTS(model, dense_mass=[("x", "y", ...)])
+    mcmc = MCMC(kernel, num_warmup=1000, num_samples=1000, progress_bar=False)
+    mcmc.run(random.PRNGKey(0), extra_fields=("num_steps",))
+    inverse_mass_matrix = mcmc.last_state.adapt_state.inverse_mass_matrix
+    assert set(inverse_mass_matrix) == {("x", "y", ...), ("z",)}
+    block_cov = scale_tril @ scale_tril.T
+    expected_cov = jnp.zeros((4, 4)).at[:3, :3].set(block_cov).at[3, 3].set(1.0)
+    actual_cov = inverse_mass_matrix[("x", "y", ...)]
+    assert actual_cov.shape == (4, 4, 4)
+    assert_allclose(
+        actual_cov / scales[:, None, None] ** 2,
+        jnp.broadcast_to(expected_cov, (4, 4, 4)),
+        atol=0.3,
+    )
+    samples = mcmc.get_samples()
+    assert_allclose(
+        jnp.std(samples["x"], 0) / scales[:, None],
+        jnp.broadcast_to(jnp.sqrt(jnp.diag(block_cov)), (4, 3)),
+        rtol=0.15,
+    )
+    # each block is whitened by its own dense mass matrix
+    assert jnp.mean(mcmc.get_extra_fields()["num_steps"]) < 15
+
+
 @pytest.mark.parametrize(
     "dense_mass, expected_shapes",
     [
@@ -1033,6 +1201,7 @@ def test_structured_mass():
             [("z",), ("w",), ("y",)],
             {("w",): (10, 10), ("x",): (1,), ("y",): (4, 4), ("z",): (1, 1)},
         ),
+        ([("w", ...)], {("w", ...): (2, 5, 5), ("x", "y", "z"): (6,)}),
     ],
 )
 def test_structured_mass_smoke(dense_mass, expected_shapes):
@@ -1255,3 +1424,286 @@ def test_empty_summary():
     mcmc.run(random.PRNGKey(0))
 
     mcmc.print_summary()
+
+
+@pytest.mark.parametrize("chain_method", ["sequential", "vectorized"])
+@pytest.mark.parametrize("thinning", [1, 3])
+@pytest.mark.parametrize("progress_bar", [False, True])
+def test_sink(chain_method, thinning, progress_bar):
+    def model():
+        numpyro.sample("x", dist.Normal(0, 1).expand([3]))
+
+    kwargs = dict(
+        num_warmup=20,
+        num_samples=47,
+        num_chains=2,
+        thinning=thinning,
+        chain_method=chain_method,
+        progress_bar=progress_bar,
+    )
+    mcmc = MCMC(NUTS(model), **kwargs)
+    mcmc.run(random.PRNGKey(0), extra_fields=("num_steps",))
+    sink = InMemorySink(chunk_size=5)
+    sink_mcmc = MCMC(NUTS(model), sink=sink, **kwargs)
+    sink_mcmc.run(random.PRNGKey(0), extra_fields=("num_steps",))
+
+    expected = mcmc.get_samples(group_by_chain=True)["x"]
+    actual = sink_mcmc.get_samples(group_by_chain=True)["x"]
+    assert isinstance(actual, np.ndarray)
+    assert actual.shape == (2, 47 // thinning, 3)
+    assert_allclose(actual, expected, rtol=1e-5, atol=1e-6)
+    assert_allclose(
+        sink_mcmc.get_extra_fields()["num_steps"], mcmc.get_extra_fields()["num_steps"]
+    )
+
+
+def test_memmap_sink(tmp_path):
+    def model():
+        numpyro.sample("x", dist.Normal(0, 1).expand([3]))
+        numpyro.sample("y", dist.HalfNormal(1))
+
+    kwargs = dict(num_warmup=20, num_samples=30, num_chains=2, progress_bar=False)
+    mcmc = MCMC(NUTS(model), chain_method="vectorized", **kwargs)
+    mcmc.run(random.PRNGKey(0), extra_fields=("diverging",))
+    sink = MemmapSink(str(tmp_path), chunk_size=7)
+    sink_mcmc = MCMC(NUTS(model), chain_method="vectorized", sink=sink, **kwargs)
+    sink_mcmc.run(random.PRNGKey(0), extra_fields=("diverging",))
+
+    samples = sink_mcmc.get_samples(group_by_chain=True)
+    assert isinstance(samples["x"], np.memmap)
+    assert_allclose(samples["x"], mcmc.get_samples(group_by_chain=True)["x"], rtol=1e-5)
+    flat_samples = sink_mcmc.get_samples()
+    assert flat_samples["y"].shape == (60,)
+    assert np.shares_memory(flat_samples["y"], samples["y"])
+    assert_allclose(
+        sink_mcmc.get_extra_fields()["diverging"], mcmc.get_extra_fields()["diverging"]
+    )
+    sink_mcmc.print_summary()
+
+    reopened = MemmapSink(str(tmp_path)).read()
+    assert_allclose(reopened["z"]["x"], samples["x"])
+    assert set(reopened) == {"z", "diverging"}
+
+
+def test_transfer_states_to_host():
+    def model():
+        numpyro.sample("x", dist.Normal(0, 1))
+
+    mcmc = MCMC(
+        NUTS(model),
+        num_warmup=10,
+        num_samples=10,
+        num_chains=2,
+        chain_method="sequential",
+    )
+    mcmc.run(random.PRNGKey(0))
+    mcmc.transfer_states_to_host()
+    samples = mcmc.get_samples(group_by_chain=True)["x"]
+    flat_samples = mcmc.get_samples()["x"]
+    assert isinstance(flat_samples, np.ndarray)
+    assert flat_samples.shape == (20,)
+    assert np.shares_memory(samples, flat_samples)
+
+
+@pytest.mark.parametrize("num_chains", [1, 2])
+def test_run_chunked(num_chains, tmp_path):
+    def model():
+        numpyro.sample("x", dist.Normal(0, 1).expand([2]))
+
+    kwargs = dict(
+        num_warmup=20,
+        num_samples=30,
+        num_chains=num_chains,
+        chain_method="vectorized",
+        progress_bar=False,
+    )
+    mcmc = MCMC(NUTS(model), **kwargs)
+    mcmc.run(random.PRNGKey(0), extra_fields=("num_steps",))
+    expected = mcmc.get_samples(group_by_chain=True)["x"]
+
+    chunked_mcmc = MCMC(NUTS(model), **kwargs)
+    chunked_mcmc.run_chunked(
+        random.PRNGKey(0),
+        num_chunks=3,
+        checkpoint_dir=str(tmp_path),
+        extra_fields=("num_steps",),
+    )
+    assert_allclose(chunked_mcmc.get_samples(group_by_chain=True)["x"], expected)
+    assert_allclose(
+        chunked_mcmc.get_extra_fields()["num_steps"],
+        mcmc.get_extra_fields()["num_steps"],
+    )
+
+    # simulate a preemption during the last chunk
+    os.remove(os.path.join(str(tmp_path), "chunk_2.pkl"))
+    resumed_mcmc = MCMC(NUTS(model), **kwargs)
+    resumed_mcmc.run_chunked(
+        random.PRNGKey(1),
+        num_chunks=3,
+        checkpoint_dir=str(tmp_path),
+        extra_fields=("num_steps",),
+    )
+    assert_allclose(resumed_mcmc.get_samples(group_by_chain=True)["x"], expected)
+    assert_allclose(
+        resumed_mcmc.last_state.z["x"], chunked_mcmc.last_state.z["x"], rtol=1e-6
+    )
+
+    with pytest.raises(ValueError, match="num_samples // num_chunks"):
+        resumed_mcmc.run_chunked(
+            random.PRNGKey(1), num_chunks=5, checkpoint_dir=str(tmp_path)
+        )
+
+
+@pytest.mark.parametrize("sink_cls", [InMemorySink, MemmapSink])
+def test_run_chunked_sink(sink_cls, tmp_path):
+    def model():
+        numpyro.sample("x", dist.Normal(0, 1).expand([2]))
+
+    kwargs = dict(num_warmup=20, num_samples=100, progress_bar=False)
+    mcmc = MCMC(NUTS(model), **kwargs)
+    mcmc.run(random.PRNGKey(0))
+    expected = mcmc.get_samples(group_by_chain=True)["x"]
+
+    sink_path = str(tmp_path / "sink")
+    if sink_cls is MemmapSink:
+        sink = MemmapSink(sink_path, chunk_size=10)
+    else:
+        sink = InMemorySink(chunk_size=10)
+    checkpoint_dir = str(tmp_path / "checkpoint")
+    sink_mcmc = MCMC(NUTS(model), sink=sink, **kwargs)
+    sink_mcmc.run_chunked(
+        random.PRNGKey(0), num_chunks=4, checkpoint_dir=checkpoint_dir
+    )
+    samples = sink_mcmc.get_samples(group_by_chain=True)["x"]
+    assert samples.shape == (1, 100, 2)
+    assert_allclose(samples, expected, rtol=1e-6)
+    if sink_cls is MemmapSink:
+        assert isinstance(samples, np.memmap)
+        # the draws of all segments are stored on disk
+        assert_allclose(MemmapSink(sink_path).read()["z"]["x"], expected, rtol=1e-6)
+
+    # resuming restores the draws of the completed segments into the sink
+    os.remove(os.path.join(checkpoint_dir, "chunk_3.pkl"))
+    resumed_mcmc = MCMC(NUTS(model), sink=sink, **kwargs)
+    resumed_mcmc.run_chunked(
+        random.PRNGKey(1), num_chunks=4, checkpoint_dir=checkpoint_dir
+    )
+    assert_allclose(
+        resumed_mcmc.get_samples(group_by_chain=True)["x"], expected, rtol=1e-6
+    )
+    assert resumed_mcmc.sink is sink
+
+
+def test_online_diagnostics():
+    def model():
+        numpyro.sample("x", dist.Normal(0, 1).expand([3]))
+
+    mcmc = MCMC(
+        NUTS(model),
+        num_warmup=50,
+        num_samples=64,
+        num_chains=2,
+        chain_method="vectorized",
+        online_diagnostics=True,
+        progress_bar=False,
+    )
+    mcmc.run(random.PRNGKey(0))
+    stats = mcmc.get_online_diagnostics()["x"]
+    samples = mcmc.get_samples(group_by_chain=True)["x"]
+    assert_allclose(stats["r_hat"], split_gelman_rubin(samples), rtol=1e-4)
+    assert_allclose(stats["mean"], samples.reshape(-1, 3).mean(0), rtol=1e-4, atol=1e-5)
+
+    # early stopping at chunk boundaries
+    mcmc = MCMC(
+        NUTS(model),
+        num_warmup=50,
+        num_samples=640,
+        num_chains=2,
+        chain_method="vectorized",
+        online_diagnostics=True,
+        progress_bar=False,
+    )
+    mcmc.run_chunked(
+        random.PRNGKey(1), num_chunks=10, target_r_hat=1.1, target_n_eff=100
+    )
+    assert mcmc.get_samples(group_by_chain=True)["x"].shape[1] < 640
+
+    mcmc = MCMC(NUTS(model), num_warmup=10, num_samples=10, progress_bar=False)
+    with pytest.raises(ValueError, match="online_diagnostics"):
+        mcmc.run_chunked(random.PRNGKey(1), num_chunks=2, target_r_hat=1.1)
+
+
+def test_cache():
+    def model(data):
+        loc = numpyro.sample("loc", dist.Normal(0, 1))
+        numpyro.sample("obs", dist.Normal(loc, 1), obs=data)
+
+    data = np.random.normal(size=10)
+    mcmc = MCMC(
+        NUTS(model),
+        num_warmup=10,
+        num_samples=10,
+        progress_bar=False,
+        cache_size=2,
+        hash_model_args=True,
+    )
+    mcmc.run(random.PRNGKey(0), jnp.array(data))
+    samples = mcmc.get_samples()
+    # a fresh copy of the same data hits the cache
+    mcmc.run(random.PRNGKey(0), jnp.array(data))
+    assert mcmc.cache_info()["fns"].hits > 0
+    assert len(mcmc._cache) == 1
+    assert_allclose(mcmc.get_samples()["loc"], samples["loc"])
+
+    for i in range(3):
+        mcmc.run(random.PRNGKey(0), jnp.array(data + i + 1))
+    info = mcmc.cache_info()["fns"]
+    assert info.maxsize == 2 and info.currsize == 2
+
+    mcmc.clear_cache()
+    assert mcmc.cache_info()["fns"] == (0, 0, 2, 0)
+    assert mcmc.cache_info()["init_state"].currsize == 0
+
+
+@pytest.mark.parametrize("num_chains", [1, 2])
+def test_profile(num_chains):
+    def model():
+        numpyro.sample("x", dist.Normal(0, 1).expand([3]))
+        numpyro.deterministic("y", jnp.zeros(2))
+
+    kwargs = dict(
+        num_warmup=20,
+        num_samples=50,
+        num_chains=num_chains,
+        chain_method="vectorized",
+        progress_bar=False,
+    )
+    mcmc = MCMC(NUTS(model), **kwargs)
+    mcmc.run(random.PRNGKey(0), extra_fields=("num_steps",))
+    expected = mcmc.get_samples()
+
+    mcmc = MCMC(NUTS(model), profile=True, **kwargs)
+    mcmc.run(random.PRNGKey(0), extra_fields=("num_steps",))
+    assert_allclose(mcmc.get_samples()["x"], expected["x"])
+    profile = mcmc.get_profile()
+    assert set(profile) == {"warmup", "sample"}
+    warmup, sample = profile["warmup"], profile["sample"]
+    assert warmup["num_iterations"] == 20
+    assert sample["num_iterations"] == 50
+    assert warmup["wall_time"] > 0 and sample["wall_time"] > 0
+    assert warmup["compile_time"] >= 0
+    num_steps = mcmc.get_extra_fields()["num_steps"]
+    assert sample["num_grad_evals"] == num_steps.sum()
+    assert sample["grad_evals_per_second"] > 0
+    assert sample["tree_depth_histogram"].shape == (11,)
+    assert sample["tree_depth_histogram"].sum() == 50 * num_chains
+    assert warmup["tree_depth_histogram"].sum() == 20 * num_chains
+    assert sample["n_eff"] > 0
+    assert_allclose(
+        sample["leapfrog_steps_per_ess"], sample["num_grad_evals"] / sample["n_eff"]
+    )
+
+    mcmc = MCMC(NUTS(model), num_warmup=10, num_samples=10, progress_bar=False)
+    mcmc.run(random.PRNGKey(0))
+    with pytest.raises(ValueError, match="profile"):
+        mcmc.get_profile()
@@ -0,0 +1,108 @@
+# Copyright Contributors to the Pyro project.
+# SPDX-License-Identifier: Apache-2.0
+
+import numpy as np
+from numpy.testing import assert_allclose
+import pytest
+
+from jax import random
+import jax.numpy as jnp
+
+import numpyro
+import numpyro.distributions as dist
+from numpyro.infer import MCMC, NUTS, Pathfinder
+from numpyro.infer.pathfinder import _inverse_hessian_factors, _update_diagonal
+
+
+def test_inverse_hessian_factors():
+    # the compact representation agrees with the two-loop recursion of L-BFGS
+    dim, history_size = 5, 3
+    rng = np.random.default_rng(0)
+    A = rng.normal(size=(dim, dim))
+    hessian = A @ A.T + np.eye(dim)
+    S = rng.normal(size=(history_size, dim))
+    Y = S @ hessian
+    alpha = np.ones(dim)
+    for s, y in zip(S, Y):
+        alpha = _update_diagonal(alpha, s, y)
+    alpha = np.asarray(alpha)
+
+    H = np.diag(alpha)
+    for s, y in zip(S, Y):
+        rho = 1 / (y @ s)
+        V = np.eye(dim) - rho * np.outer(y, s)
+        H = V.T @ H @ V + rho * np.outer(s, s)
+
+    mask = jnp.array([False, True, True, True])
+    beta, gamma = _inverse_hessian_factors(
+        alpha,
+        jnp.concatenate([jnp.zeros((1, dim)), S]),
+        jnp.concatenate([jnp.zeros((1, dim)), Y]),
+        mask,
+    )
+    assert_allclose(np.diag(alpha) + beta @ gamma @ beta.T, H, rtol=1e-4, atol=1e-4)
+
+
+@pytest.mark.parametrize("num_paths", [1, 3])
+def test_gaussian(num_paths):
+    cov = jnp.array([[1.0, 0.9, 0.0], [0.9, 1.0, 0.0], [0.0, 0.0, 4.0]])
+    loc = jnp.array([1.0, -1.0, 2.0])
+
+    def model():
+        numpyro.sample("x", dist.MultivariateNormal(loc, cov))
+
+    pathfinder = Pathfinder(model, num_paths=num_paths, num_draws=5000)
+    result = pathfinder.run(random.PRNGKey(0))
+    assert result.z["x"].shape == (5000, 3)
+    assert result.elbo.shape == (num_paths,)
+    assert np.all(result.num_iterations > 0)
+    # the posterior is in the family of the approximation
+    assert_allclose(result.elbo, 0.0, atol=0.2)
+    assert_allclose(jnp.mean(result.z["x"], 0), loc, atol=0.1)
+    assert_allclose(jnp.cov(result.z["x"].T), cov, atol=0.2)
+    assert_allclose(pathfinder.get_inverse_mass_matrix(dense_mass=True), cov, atol=0.2)
+
+
+def test_nuts_initialization():
+    def model(data):
+        loc = numpyro.sample("loc", dist.Normal(0.0, 10.0))
+        scale = numpyro.sample("scale", dist.LogNormal(0.0, 1.0))
+        with numpyro.plate("N", data.shape[0]):
+            numpyro.sample("obs", dist.Normal(loc, scale), obs=data)
+
+    data = 3.0 + 2.0 * random.normal(random.PRNGKey(0), (1000,))
+    pathfinder = Pathfinder(model)
+    pathfinder.run(random.PRNGKey(1), data)
+    samples = pathfinder.get_samples()
+    assert_allclose(jnp.mean(samples["loc"]), 3.0, atol=0.2)
+    assert_allclose(jnp.mean(samples["scale"]), 2.0, atol=0.2)
+
+    inverse_mass_matrix = pathfinder.get_inverse_mass_matrix()
+    assert inverse_mass_matrix.shape == (2,)
+    kernel = NUTS(
+        model,
+        init_strategy=pathfinder.get_init_strategy(),
+        inverse_mass_matrix=inverse_mass_matrix,
+    )
+    mcmc = MCMC(kernel, num_warmup=100, num_samples=500, progress_bar=False)
+    mcmc.run(random.PRNGKey(2), data)
+    assert_allclose(jnp.mean(mcmc.get_samples()["loc"]), 3.0, atol=0.2)
+
+    mcmc = MCMC(
+        NUTS(model, inverse_mass_matrix=inverse_mass_matrix),
+        num_warmup=100,
+        num_samples=500,
+        num_chains=2,
+        chain_method="sequential",
+        progress_bar=False,
+    )
+    mcmc.run(random.PRNGKey(2), data, init_params=pathfinder.get_init_params(2))
+    assert_allclose(jnp.mean(mcmc.get_samples()["scale"]), 2.0, atol=0.2)
+
+
+def test_run_required():
+    def model():
+        numpyro.sample("x", dist.Normal())
+
+    with pytest.raises(ValueError, match="run Pathfinder"):
+        Pathfinder(model).get_samples()
@@ -0,0 +1,126 @@
+# Copyright Contributors to the Pyro project.
+# SPDX-License-Identifier: Apache-2.0
+
+import numpy as np
+from numpy.testing import assert_allclose
+import pytest
+
+import jax
+from jax import random
+import jax.numpy as jnp
+
+import numpyro
+import numpyro.distributions as dist
+from numpyro.infer import MCMC, NUTS, BarkerMH, ReplicaExchange
+from numpyro.infer.replica_exchange import _adapt_inverse_temperatures
+
+
+def bimodal_model():
+    mixing = dist.Categorical(jnp.ones(2) / 2)
+    component = dist.Normal(jnp.array([-5.0, 5.0]), 0.5)
+    numpyro.sample("x", dist.MixtureSameFamily(mixing, component))
+
+
+@pytest.mark.parametrize("kernel_cls", [NUTS, BarkerMH])
+def test_bimodal(kernel_cls):
+    mcmc = MCMC(
+        kernel_cls(bimodal_model), num_warmup=500, num_samples=2000, progress_bar=False
+    )
+    mcmc.run(random.PRNGKey(0))
+    x = mcmc.get_samples()["x"]
+    # the untempered sampler is stuck in one mode
+    assert (x > 0).all() or (x < 0).all()
+
+    kernel = ReplicaExchange(kernel_cls(bimodal_model), num_replicas=6)
+    mcmc = MCMC(kernel, num_warmup=500, num_samples=2000, progress_bar=False)
+    mcmc.run(random.PRNGKey(0), extra_fields=("swap_accept_prob",))
+    x = mcmc.get_samples()["x"]
+    assert x.shape == (2000,)
+    assert_allclose((x > 0).mean(), 0.5, atol=0.15)
+    assert_allclose(jnp.abs(x).mean(), 5.0, rtol=0.05)
+    swap_accept_prob = mcmc.get_extra_fields()["swap_accept_prob"]
+    assert swap_accept_prob.shape == (2000, 5)
+    # swaps are proposed alternately between even and odd pairs
+    assert (swap_accept_prob[::2, 1::2] == 0).all()
+    assert (swap_accept_prob[1::2, ::2] == 0).all()
+
+
+def test_constrained_site():
+    # the log Jacobian of the transform is tempered along with the log density
+    def model():
+        numpyro.sample("x", dist.LogNormal(0.0, 0.5))
+
+    kernel = ReplicaExchange(NUTS(model), num_replicas=3)
+    mcmc = MCMC(kernel, num_warmup=500, num_samples=5000, progress_bar=False)
+    mcmc.run(random.PRNGKey(1))
+    x = mcmc.get_samples()["x"]
+    assert (x > 0).all()
+    assert_allclose(jnp.log(x).mean(), 0.0, atol=0.05)
+    assert_allclose(jnp.log(x).std(), 0.5, rtol=0.05)
+
+
+def test_adapt_inverse_temperatures():
+    inverse_temperatures = 0.01 ** (jnp.arange(5) / 4)
+    swap_accept_prob = jnp.array([0.9, 0.9, 0.1, 0.9])
+    new_inverse_temperatures = _adapt_inverse_temperatures(
+        inverse_temperatures, swap_accept_prob
+    )
+    assert_allclose(new_inverse_temperatures[0], 1.0)
+    assert_allclose(new_inverse_temperatures[-1], 0.01)
+    assert (jnp.diff(new_inverse_temperatures) < 0).all()
+    # more replicas are placed around the pair with a low swap acceptance
+    gaps = -jnp.diff(jnp.log(new_inverse_temperatures))
+    assert gaps[1:3].sum() < -jnp.diff(jnp.log(inverse_temperatures))[2] * 2
+
+    kernel = ReplicaExchange(NUTS(bimodal_model), num_replicas=5)
+    mcmc = MCMC(kernel, num_warmup=300, num_samples=100, progress_bar=False)
+    mcmc.run(random.PRNGKey(2))
+    state = mcmc.last_state
+    assert_allclose(state.inverse_temperatures[0], 1.0)
+    assert_allclose(state.inverse_temperatures[-1], 0.01, rtol=1e-5)
+    assert (jnp.diff(state.inverse_temperatures) < 0).all()
+    assert not np.allclose(state.inverse_temperatures, kernel._inverse_temperatures)
+    # the cached potential energies match the adapted temperatures
+    pe = jax.vmap(
+        lambda z, beta: kernel.inner_kernel._potential_fn_gen(
+            _inverse_temperature=beta
+        )(z)
+    )(state.replica_states.z, state.inverse_temperatures)
+    assert_allclose(state.replica_states.potential_energy, pe, rtol=1e-5)
+
+
+def test_num_chains():
+    kernel = ReplicaExchange(NUTS(bimodal_model), num_replicas=4)
+    mcmc = MCMC(
+        kernel,
+        num_warmup=100,
+        num_samples=100,
+        num_chains=2,
+        chain_method="vectorized",
+        progress_bar=False,
+    )
+    mcmc.run(random.PRNGKey(3))
+    assert mcmc.get_samples(group_by_chain=True)["x"].shape == (2, 100)
+    assert mcmc.last_state.inverse_temperatures.shape == (2, 4)
+
+
+@pytest.mark.skipif(jax.device_count() < 4, reason="requires at least 4 devices")
+def test_parallel_replicas():
+    kernel = ReplicaExchange(
+        NUTS(bimodal_model), num_replicas=4, replica_method="parallel"
+    )
+    mcmc = MCMC(kernel, num_warmup=500, num_samples=2000, progress_bar=False)
+    mcmc.run(random.PRNGKey(0))
+    x = mcmc.get_samples()["x"]
+    assert_allclose((x > 0).mean(), 0.5, atol=0.15)
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError, match="potential function"):
+        ReplicaExchange(NUTS(potential_fn=lambda z: (z**2).sum()))
+    with pytest.raises(ValueError, match="start at 1"):
+        ReplicaExchange(NUTS(bimodal_model), inverse_temperatures=[1.0, 0.5, 0.7])
+    with pytest.raises(ValueError, match="at least two replicas"):
+        ReplicaExchange(NUTS(bimodal_model), inverse_temperatures=[1.0])
+    with pytest.raises(ValueError, match="replica_method"):
+        ReplicaExchange(NUTS(bimodal_model), replica_method="sequential")
@@ -0,0 +1,87 @@
+# Copyright Contributors to the Pyro project.
+# SPDX-License-Identifier: Apache-2.0
+
+import numpy as np
+from numpy.testing import assert_allclose
+import pytest
+
+import jax
+from jax import random
+import jax.numpy as jnp
+
+import numpyro
+import numpyro.distributions as dist
+from numpyro.infer import MCMC, RMHMC
+from numpyro.infer.rmhmc import softabs
+
+
+def _softabs_numpy(hessian, alpha):
+    eigvals, eigvecs = np.linalg.eigh(hessian)
+    return (eigvecs * (eigvals / np.tanh(alpha * eigvals))) @ eigvecs.T
+
+
+@pytest.mark.parametrize("repeated", [False, True])
+def test_softabs_jvp(repeated):
+    rng = np.random.default_rng(0)
+    if repeated:
+        hessian = np.diag([2.0, 2.0, -1.0, 1e-3])
+    else:
+        a = rng.normal(size=(4, 4))
+        hessian = a + a.T
+    tangent = rng.normal(size=(4, 4))
+    tangent = tangent + tangent.T
+    alpha = 2.0
+
+    value, jvp = jax.jvp(lambda h: softabs(h, alpha), (hessian,), (tangent,))
+    assert_allclose(value, _softabs_numpy(hessian, alpha), rtol=1e-5, atol=1e-5)
+    eps = 1e-3
+    expected_jvp = (
+        _softabs_numpy(hessian + eps * tangent, alpha)
+        - _softabs_numpy(hessian - eps * tangent, alpha)
+    ) / (2 * eps)
+    assert_allclose(jvp, expected_jvp, rtol=1e-3, atol=1e-3)
+
+
+def test_gaussian():
+    cov = jnp.array([[1.0, 0.95, 0.0], [0.95, 1.0, 0.0], [0.0, 0.0, 100.0]])
+
+    def model():
+        numpyro.sample("x", dist.MultivariateNormal(jnp.zeros(3), cov))
+
+    mcmc = MCMC(RMHMC(model), num_warmup=200, num_samples=1000, progress_bar=False)
+    mcmc.run(random.PRNGKey(0))
+    samples = mcmc.get_samples()["x"]
+    std = jnp.sqrt(jnp.diag(cov))
+    assert_allclose(jnp.mean(samples, 0) / std, 0.0, atol=0.15)
+    assert_allclose(jnp.std(samples, 0) / std, 1.0, rtol=0.15)
+    assert_allclose(jnp.corrcoef(samples.T), cov / jnp.outer(std, std), atol=0.1)
+
+
+def test_funnel():
+    def model():
+        v = numpyro.sample("v", dist.Normal(0, 3))
+        numpyro.sample("x", dist.Normal(0, jnp.exp(v / 2)).expand([5]))
+
+    mcmc = MCMC(RMHMC(model), num_warmup=500, num_samples=1000, progress_bar=False)
+    mcmc.run(random.PRNGKey(2), extra_fields=("diverging",))
+    v = mcmc.get_samples()["v"]
+    # the neck of the funnel is explored
+    assert jnp.min(v) < -6
+    assert_allclose(jnp.std(v), 3.0, rtol=0.25)
+    assert jnp.mean(mcmc.get_extra_fields()["diverging"]) < 0.05
+
+
+def test_num_chains():
+    def model():
+        numpyro.sample("x", dist.Normal().expand([2]))
+
+    mcmc = MCMC(
+        RMHMC(model),
+        num_warmup=50,
+        num_samples=50,
+        num_chains=2,
+        chain_method="vectorized",
+        progress_bar=False,
+    )
+    mcmc.run(random.PRNGKey(0))
+    assert mcmc.get_samples(group_by_chain=True)["x"].shape == (2, 50, 2)
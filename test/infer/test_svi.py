@@ -20,12 +20,13 @@ from numpyro.distributions.transforms import AffineTransform, SigmoidTransform
 from numpyro.handlers import substitute
 from numpyro.infer import (
     SVI,
+    DataParallelSVI,
     RenyiELBO,
     Trace_ELBO,
     TraceGraph_ELBO,
     TraceMeanField_ELBO,
 )
-from numpyro.infer.elbo import _apply_vmap
+from numpyro.infer.elbo import _apply_vmap, chunked_vmap
 from numpyro.primitives import mutable as numpyro_mutable
 from numpyro.util import fori_loop
 
@@ -282,6 +283,144 @@ def test_run(vectorize_particles, progress_bar):
     )
 
 
+@pytest.mark.parametrize("progress_bar", [True, False])
+def test_compile(progress_bar):
+    def model(data, scale):
+        loc = numpyro.sample("loc", dist.Normal(0.0, 1.0))
+        with numpyro.plate("N", len(data)):
+            numpyro.sample("obs", dist.Normal(loc, scale), obs=data)
+
+    def guide(data, scale):
+        loc_q = numpyro.param("loc_q", 0.0)
+        numpyro.sample("loc", dist.Delta(loc_q))
+
+    data = jnp.arange(10.0)
+    svi = SVI(model, guide, optim.Adam(0.05), Trace_ELBO())
+    expected = svi.run(
+        random.PRNGKey(1), 100, data, scale=2.0, progress_bar=progress_bar
+    )
+
+    num_steps = None if progress_bar else 100
+    svi.compile(random.PRNGKey(0), data, scale=2.0, num_steps=num_steps)
+    assert len(svi._compiled_fns) == 1
+    # the executable is reused for new data of the same shape
+    new_data = data + 0
+    actual = svi.run(
+        random.PRNGKey(1), 100, new_data, scale=2.0, progress_bar=progress_bar
+    )
+    options = (num_steps, False, False)
+    state = actual.state
+    assert svi._get_compiled_fn(state, (new_data,), {"scale": 2.0}, *options)
+    assert_allclose(actual.losses, expected.losses, rtol=1e-5)
+    assert_allclose(actual.params["loc_q"], expected.params["loc_q"], rtol=1e-5)
+    # a different static argument is not served by the executable
+    assert not svi._get_compiled_fn(state, (data,), {"scale": 1.0}, *options)
+
+
+@pytest.mark.parametrize("progress_bar", [True, False])
+@pytest.mark.parametrize("steps_per_call", [1, 3])
+def test_run_epochs(steps_per_call, progress_bar):
+    def model(x, y, scale):
+        w = numpyro.sample("w", dist.Normal(0.0, 1.0))
+        with numpyro.plate("N", 35, subsample_size=x.shape[0]):
+            numpyro.sample("obs", dist.Normal(w * x, scale), obs=y)
+
+    def guide(x, y, scale):
+        w_loc = numpyro.param("w_loc", 0.0)
+        numpyro.sample("w", dist.Normal(w_loc, 0.1))
+
+    x = np.linspace(-1.0, 1.0, 35)
+    y = 2.0 * x
+    # the last minibatch is smaller
+    batches = [(x[i : i + 10], y[i : i + 10]) for i in range(0, 35, 10)]
+    svi = SVI(model, guide, optim.Adam(0.05), Trace_ELBO())
+    svi_result = svi.run_epochs(
+        random.PRNGKey(1),
+        batches,
+        num_epochs=2,
+        steps_per_call=steps_per_call,
+        progress_bar=progress_bar,
+        scale=1.0,
+    )
+    assert svi_result.losses.shape == (8,)
+
+    svi_state = svi.init(random.PRNGKey(1), *batches[0], scale=1.0)
+    losses = []
+    for batch in batches * 2:
+        svi_state, loss = svi.update(svi_state, *batch, scale=1.0)
+        losses.append(loss)
+    assert_allclose(svi_result.losses, jnp.stack(losses), rtol=1e-5)
+    assert_allclose(
+        svi_result.params["w_loc"], svi.get_params(svi_state)["w_loc"], rtol=1e-5
+    )
+
+
+def test_run_epochs_errors():
+    def model(x):
+        numpyro.sample("x", dist.Normal(numpyro.param("loc", 0.0)), obs=x)
+
+    def guide(x):
+        pass
+
+    def data_loader():
+        yield np.zeros(2)
+        raise RuntimeError("corrupted minibatch")
+
+    svi = SVI(model, guide, optim.Adam(0.05), Trace_ELBO())
+    with pytest.raises(RuntimeError, match="corrupted minibatch"):
+        svi.run_epochs(random.PRNGKey(0), data_loader(), progress_bar=False)
+    with pytest.raises(ValueError, match="re-iterable"):
+        svi.run_epochs(random.PRNGKey(0), iter([np.zeros(2)]), num_epochs=2)
+
+
+@pytest.mark.parametrize("stable_update", [False, True])
+@pytest.mark.parametrize("num_devices", [1, 2])
+def test_data_parallel_svi(num_devices, stable_update):
+    if jax.device_count() < num_devices:
+        pytest.skip("requires {} devices".format(num_devices))
+
+    def model(x, y):
+        w = numpyro.sample("w", dist.Normal(0.0, 1.0))
+        with numpyro.plate("N", 100, subsample_size=x.shape[0]):
+            numpyro.sample("obs", dist.Normal(w * x, 1.0), obs=y)
+
+    def guide(x, y):
+        w_loc = numpyro.param("w_loc", 0.0)
+        w_scale = numpyro.param("w_scale", 1.0, constraint=constraints.positive)
+        numpyro.sample("w", dist.Normal(w_loc, w_scale))
+
+    x = random.normal(random.PRNGKey(0), (8,))
+    y = 2 * x + random.normal(random.PRNGKey(1), (8,))
+    svi = SVI(model, guide, optim.Adam(0.05), Trace_ELBO())
+    dp_svi = DataParallelSVI(
+        model,
+        guide,
+        optim.Adam(0.05),
+        Trace_ELBO(),
+        devices=jax.devices()[:num_devices],
+    )
+    update = svi.stable_update if stable_update else svi.update
+    dp_update = jit(dp_svi.stable_update if stable_update else dp_svi.update)
+    svi_state = svi.init(random.PRNGKey(2), x, y)
+    dp_svi_state = dp_svi.init(random.PRNGKey(2), x, y)
+    for _ in range(5):
+        svi_state, loss = update(svi_state, x, y)
+        dp_svi_state, dp_loss = dp_update(dp_svi_state, x, y)
+        # the ELBO of the minibatch is the average of the ELBOs of the shards
+        assert_allclose(dp_loss, loss, rtol=1e-5)
+    assert_allclose(
+        dp_svi.get_params(dp_svi_state)["w_loc"],
+        svi.get_params(svi_state)["w_loc"],
+        rtol=1e-5,
+    )
+
+    svi_result = dp_svi.run(random.PRNGKey(2), 5, x, y, progress_bar=False)
+    assert svi_result.losses.shape == (5,)
+    bad_x = x[:7] if num_devices > 1 else x[0]
+    with pytest.raises(ValueError, match="divisible"):
+        dp_svi.update(dp_svi_state, bad_x, y[:7])
+
+
 def test_jitted_update_fn():
     data = jnp.array([1.0] * 8 + [0.0] * 2)
 
@@ -546,6 +685,103 @@ def test_mutable_state(stable_update, num_particles, elbo):
     assert_allclose(mutable_state["x1p"], 1.0, atol=0.2)
 
 
+@pytest.mark.parametrize(
+    "elbo",
+    [
+        Trace_ELBO,
+        TraceMeanField_ELBO,
+        partial(RenyiELBO, alpha=0.5),
+        TraceGraph_ELBO,
+    ],
+)
+@pytest.mark.parametrize(
+    "chunk_size, memory_budget", [(1, None), (3, None), (8, None), (None, 512)]
+)
+def test_chunked_vmap(elbo, chunk_size, memory_budget):
+    data = jnp.arange(5.0)
+
+    def model():
+        loc = numpyro.sample("loc", dist.Normal(0, 1))
+        with numpyro.plate("N", 5):
+            numpyro.sample("obs", dist.Normal(loc, 1), obs=data)
+
+    def guide():
+        loc = numpyro.param("guide_loc", 0.5)
+        scale = numpyro.param("guide_scale", 0.8, constraint=constraints.positive)
+        numpyro.sample("loc", dist.Normal(loc, scale))
+
+    params = {"guide_loc": 0.5, "guide_scale": 0.8}
+
+    def loss_fn(vectorize_particles):
+        loss = elbo(num_particles=8, vectorize_particles=vectorize_particles)
+        return jax.jit(
+            jax.value_and_grad(
+                lambda params: loss.loss(random.PRNGKey(0), params, model, guide)
+            )
+        )
+
+    expected_loss, expected_grads = loss_fn(True)(params)
+    actual_loss, actual_grads = loss_fn(chunked_vmap(chunk_size, memory_budget))(params)
+    assert_allclose(actual_loss, expected_loss, rtol=1e-5)
+    assert_equal(actual_grads, expected_grads, prec=1e-5)
+
+
+def test_chunked_vmap_memory_budget_scan(monkeypatch):
+    data = jnp.linspace(-1.0, 1.0, 100)
+    num_steps = 50
+    # bytes of the `outer` product computed at each step of the scan
+    step_nbytes = data.shape[0] ** 2 * data.dtype.itemsize
+
+    def model():
+        loc = numpyro.sample("loc", dist.Normal(0, 1))
+
+        def body_fn(total, _):
+            return total + jnp.mean(jnp.tanh(jnp.outer(data, data) * loc)), None
+
+        total, _ = lax.scan(body_fn, 0.0, None, length=num_steps)
+        numpyro.factor("f", -(total**2))
+
+    def guide():
+        loc = numpyro.param("guide_loc", 0.5)
+        numpyro.sample("loc", dist.Normal(loc, 0.1))
+
+    chunk_sizes = []
+
+    def soft_vmap(fn, xs, batch_ndims=1, chunk_size=None):
+        chunk_sizes.append(chunk_size)
+        return numpyro.util.soft_vmap(fn, xs, batch_ndims, chunk_size)
+
+    monkeypatch.setattr(numpyro.infer.elbo, "soft_vmap", soft_vmap)
+    memory_budget = 4 * num_steps * step_nbytes
+    loss = Trace_ELBO(
+        num_particles=16, vectorize_particles=chunked_vmap(memory_budget=memory_budget)
+    )
+    actual = jax.value_and_grad(
+        lambda params: loss.loss(random.PRNGKey(0), params, model, guide)
+    )({"guide_loc": 0.5})
+    expected = jax.value_and_grad(
+        lambda params: Trace_ELBO(num_particles=16).loss(
+            random.PRNGKey(0), params, model, guide
+        )
+    )({"guide_loc": 0.5})
+    assert_allclose(actual[0], expected[0], rtol=1e-5)
+    assert_allclose(actual[1]["guide_loc"], expected[1]["guide_loc"], rtol=1e-5)
+
+    # the values computed at every step of the scan are accounted for
+    (chunk_size,) = chunk_sizes
+    assert 1 <= chunk_size <= 4
+    assert chunk_size * num_steps * step_nbytes <= memory_budget
+
+
+def test_chunked_vmap_invalid_arguments():
+    with pytest.raises(ValueError, match="Exactly one"):
+        chunked_vmap()
+    with pytest.raises(ValueError, match="Exactly one"):
+        chunked_vmap(2, memory_budget=1024)
+    with pytest.raises(ValueError, match="positive"):
+        chunked_vmap(0)
+
+
 def test_tracegraph_normal_normal():
     # normal-normal; known covariance
     lam0 = jnp.array([0.1, 0.1])  # precision of prior
@@ -646,6 +882,91 @@ def test_tracegraph_beta_bernoulli():
     assert_allclose(beta_error, 0, atol=0.04)
 
 
+def _bernoulli_mixture(baseline=None):
+    data = jnp.array([3.2, -0.4, 0.1, 2.7, 3.5, 0.3, -1.1, 2.9])
+
+    def model():
+        with numpyro.plate("data", len(data)):
+            z = numpyro.sample("z", dist.Bernoulli(0.3))
+            numpyro.sample("obs", dist.Normal(3.0 * z, 1.0), obs=data)
+
+    def guide():
+        logits = numpyro.param("logits", jnp.zeros(len(data)))
+        infer = {}
+        if baseline == "avg":
+            infer = {"baseline": {"use_decaying_avg_baseline": True}}
+        elif baseline == "value":
+            b = numpyro.param("baseline", jnp.zeros(len(data)))
+            infer = {"baseline": {"baseline_value": b}}
+        with numpyro.plate("data", len(data)):
+            numpyro.sample("z", dist.Bernoulli(logits=logits), infer=infer)
+
+    return model, guide
+
+
+def _tracegraph_grads(elbo, model, guide, params, num_samples=500):
+    def grad_fn(rng_key):
+        return jax.grad(
+            lambda logits: elbo.loss(
+                rng_key, {**params, "logits": logits}, model, guide
+            )
+        )(params["logits"])
+
+    return jax.vmap(grad_fn)(random.split(random.PRNGKey(0), num_samples))
+
+
+def test_tracegraph_leave_one_out_baseline():
+    model, guide = _bernoulli_mixture()
+    params = {"logits": jnp.linspace(-1.0, 1.0, 8)}
+    grads = _tracegraph_grads(TraceGraph_ELBO(num_particles=8), model, guide, params)
+    loo_elbo = TraceGraph_ELBO(num_particles=8, leave_one_out_baseline=True)
+    loo_grads = _tracegraph_grads(loo_elbo, model, guide, params)
+    # the baseline does not bias the gradient but reduces its variance
+    assert_allclose(loo_grads.mean(0), grads.mean(0), atol=0.1)
+    assert loo_grads.var(0).sum() < 0.5 * grads.var(0).sum()
+
+
+@pytest.mark.parametrize("baseline", ["avg", "value"])
+def test_tracegraph_baseline(baseline):
+    model, guide = _bernoulli_mixture(baseline)
+    elbo = TraceGraph_ELBO()
+    svi = SVI(model, guide, optim.Adam(0.05), elbo)
+    svi_result = svi.run(random.PRNGKey(1), 500, progress_bar=False)
+    params = svi.get_params(svi_result.state)
+    if baseline == "avg":
+        baseline_value = svi_result.state.mutable_state["z_baseline_avg"]
+        params.update(svi_result.state.mutable_state)
+    else:
+        baseline_value = params["baseline"]
+    assert baseline_value.shape == (8,)
+    assert (baseline_value != 0).all()
+
+    # the baseline does not change the value of the loss
+    no_baseline_model, no_baseline_guide = _bernoulli_mixture()
+    rng_key = random.PRNGKey(2)
+    assert_allclose(
+        elbo.loss(rng_key, params, model, guide),
+        elbo.loss(rng_key, params, no_baseline_model, no_baseline_guide),
+        rtol=1e-6,
+    )
+    params["logits"] = jnp.linspace(-1.0, 1.0, 8)
+    grads = _tracegraph_grads(elbo, no_baseline_model, no_baseline_guide, params)
+    baseline_grads = _tracegraph_grads(elbo, model, guide, params)
+    assert_allclose(baseline_grads.mean(0), grads.mean(0), atol=0.1)
+    assert baseline_grads.var(0).sum() < 0.5 * grads.var(0).sum()
+
+
+def test_tracegraph_invalid_baseline():
+    def model():
+        numpyro.sample("z", dist.Bernoulli(0.3))
+
+    def guide():
+        numpyro.sample("z", dist.Bernoulli(0.5), infer={"baseline": {"beta": 0.9}})
+
+    with pytest.raises(ValueError, match="Unknown baseline options"):
+        TraceGraph_ELBO().loss(random.PRNGKey(0), {}, model, guide)
+
+
 def test_tracegraph_gamma_exponential():
     # exponential-gamma model
     # gamma prior hyperparameter
@@ -0,0 +1,101 @@
+# Copyright Contributors to the Pyro project.
+# SPDX-License-Identifier: Apache-2.0
+
+import numpy as np
+from numpy.testing import assert_allclose
+import pytest
+
+from jax import random
+import jax.numpy as jnp
+
+import numpyro
+import numpyro.distributions as dist
+from numpyro.infer import MCMC, VectorizedNUTS
+
+
+@pytest.mark.parametrize("dense_mass", [False, True])
+def test_gaussian(dense_mass):
+    loc = jnp.array([0.0, 1.0, 2.0])
+    scale = jnp.array([0.1, 1.0, 10.0])
+
+    def model():
+        numpyro.sample("x", dist.Normal(loc, scale))
+
+    kernel = VectorizedNUTS(model, dense_mass=dense_mass)
+    mcmc = MCMC(
+        kernel,
+        num_warmup=500,
+        num_samples=500,
+        num_chains=16,
+        chain_method="vectorized",
+        progress_bar=False,
+    )
+    mcmc.run(random.PRNGKey(0), extra_fields=("num_steps", "accept_prob"))
+    samples = mcmc.get_samples()["x"]
+    assert samples.shape == (8000, 3)
+    assert_allclose(jnp.mean(samples, 0) / scale, loc / scale, atol=0.1)
+    assert_allclose(jnp.std(samples, 0) / scale, 1.0, atol=0.1)
+
+    extra_fields = mcmc.get_extra_fields(group_by_chain=True)
+    assert extra_fields["num_steps"].shape == (16, 500)
+    assert 0.7 < jnp.mean(extra_fields["accept_prob"]) < 0.95
+    assert not np.any(mcmc.get_extra_fields()["diverging"])
+
+
+def test_chains_proceed_independently():
+    def model():
+        numpyro.sample("x", dist.StudentT(3.0).expand([5]))
+
+    mcmc = MCMC(
+        VectorizedNUTS(model, queue_size=4),
+        num_warmup=100,
+        num_samples=100,
+        num_chains=8,
+        chain_method="vectorized",
+        progress_bar=False,
+    )
+    mcmc.run(random.PRNGKey(1))
+    lanes = mcmc.last_state.lane_state
+    # every chain has returned 200 transitions and some chains have computed
+    # transitions ahead of the slowest chain
+    assert np.all(lanes.num_transitions - lanes.queue_size == 200)
+    assert np.all(lanes.queue_size < 4)
+    assert np.any(lanes.queue_size > 0)
+
+
+def test_mean_accept_prob():
+    def model():
+        numpyro.sample("x", dist.Normal().expand([3]))
+
+    num_warmup, num_samples = 20, 50
+    mcmc = MCMC(
+        VectorizedNUTS(model),
+        num_warmup=num_warmup,
+        num_samples=num_samples,
+        num_chains=4,
+        chain_method="vectorized",
+        progress_bar=False,
+    )
+    mcmc.run(random.PRNGKey(0), extra_fields=("i", "accept_prob", "mean_accept_prob"))
+    extra_fields = mcmc.get_extra_fields(group_by_chain=True)
+    assert_allclose(
+        extra_fields["i"],
+        np.broadcast_to(
+            np.arange(num_warmup + 1, num_warmup + num_samples + 1), (4, num_samples)
+        ),
+    )
+    # the running mean only covers the post-warmup transitions
+    assert_allclose(
+        extra_fields["mean_accept_prob"][:, -1],
+        jnp.mean(extra_fields["accept_prob"], axis=1),
+        rtol=1e-5,
+    )
+
+
+def test_requires_vectorized_chains():
+    def model():
+        numpyro.sample("x", dist.Normal())
+
+    mcmc = MCMC(VectorizedNUTS(model), num_warmup=10, num_samples=10)
+    with pytest.raises(AssertionError, match="vectorized"):
+        mcmc.run(random.PRNGKey(0))
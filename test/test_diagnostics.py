@@ -6,6 +6,10 @@ from numpy.testing import assert_, assert_allclose
 import pytest
 from scipy.fftpack import next_fast_len
 
+import jax
+from jax import lax
+import jax.numpy as jnp
+
 from numpyro.diagnostics import (
     _fft_next_fast_len,
     autocorrelation,
@@ -14,6 +18,8 @@ from numpyro.diagnostics import (
     gelman_rubin,
     hpdi,
     split_gelman_rubin,
+    streaming_diagnostics,
+    summary,
 )
 
 
@@ -45,6 +51,46 @@ def test_shape(statistics, input_shape, output_shape):
             assert_allclose(statistics(x[..., i]), y[..., i])
 
 
+@pytest.mark.parametrize(
+    "statistics",
+    [
+        autocorrelation,
+        autocovariance,
+        hpdi,
+        gelman_rubin,
+        split_gelman_rubin,
+        effective_sample_size,
+    ],
+)
+def test_jax_array(statistics):
+    x = np.random.normal(size=(4, 10, 3)).cumsum(1)
+    expected = statistics(x)
+    actual = jax.jit(statistics)(jnp.asarray(x))
+    assert isinstance(actual, jax.Array)
+    assert_allclose(actual, expected, rtol=1e-4, atol=1e-5)
+
+    # vmap over the sample dimension
+    actual = jax.vmap(statistics, in_axes=-1, out_axes=-1)(jnp.asarray(x))
+    assert_allclose(actual, expected, rtol=1e-4, atol=1e-5)
+
+
+def test_summary_jax_array():
+    samples = {
+        "x": np.random.normal(size=(2, 50, 3)),
+        "y": np.random.normal(size=(2, 50)),
+    }
+    expected = summary(samples)
+    actual = summary({"x": jnp.asarray(samples["x"]), "y": samples["y"]})
+    assert isinstance(actual["x"]["mean"], jax.Array)
+    assert not isinstance(actual["y"]["mean"], jax.Array)
+    for name in samples:
+        assert list(actual[name]) == list(expected[name])
+        for stat in expected[name]:
+            assert_allclose(
+                actual[name][stat], expected[name][stat], rtol=1e-4, atol=1e-5
+            )
+
+
 @pytest.mark.parametrize("target", [433, 124, 25, 300, 1, 3, 7])
 def test_fft_next_fast_len(target):
     assert _fft_next_fast_len(target) == next_fast_len(target)
@@ -106,3 +152,26 @@ def test_split_gelman_rubin_agree_with_gelman_rubin():
 def test_effective_sample_size():
     x = np.arange(1000.0).reshape(100, 10)
     assert_allclose(effective_sample_size(x, bias=False), 52.64, atol=0.01)
+
+
+@pytest.mark.parametrize("num_draws", [64, 100])
+def test_streaming_diagnostics(num_draws):
+    x = np.random.normal(size=(4, num_draws, 3))
+    x[0] += 0.5
+    init_fn, update_fn, final_fn = streaming_diagnostics(num_batches=8)
+
+    def run_chain(x):
+        state = init_fn({"x": x[0]})
+        return lax.scan(lambda state, x: (update_fn({"x": x}, state), None), state, x)[
+            0
+        ]
+
+    stats = final_fn(jax.vmap(run_chain)(jnp.asarray(x)))["x"]
+    # only complete batches are used: 8 batches of size 8 or 6 batches of size 16
+    x = x[:, :64] if num_draws == 64 else x[:, :96]
+    assert_allclose(stats["mean"], x.reshape(-1, 3).mean(0), rtol=1e-5, atol=1e-6)
+    assert_allclose(stats["std"], x.reshape(-1, 3).std(0, ddof=1), rtol=1e-5)
+    if num_draws == 64:
+        assert_allclose(stats["r_hat"], split_gelman_rubin(x), rtol=1e-5)
+    assert_(np.all(stats["r_hat"] > 1))
+    assert_(np.all(stats["n_eff"] > 0))
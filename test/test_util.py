@@ -12,7 +12,13 @@ import jax.numpy as jnp
 
 import numpyro
 import numpyro.distributions as dist
-from numpyro.util import check_model_guide_match, fori_collect, format_shapes, soft_vmap
+from numpyro.util import (
+    check_model_guide_match,
+    fori_collect,
+    format_shapes,
+    maybe_remat,
+    soft_vmap,
+)
 
 
 def test_fori_collect_thinning():
@@ -107,6 +113,29 @@ def test_soft_vmap(batch_shape, chunk_size):
     assert_allclose(ys["b"], ~xs["b"])
 
 
+def test_soft_vmap_prng_keys():
+    keys = random.split(random.key(0), 7)
+    ys = soft_vmap(lambda key: random.normal(key), keys, chunk_size=3)
+    assert_allclose(ys, jax.vmap(lambda key: random.normal(key))(keys))
+
+
+@pytest.mark.parametrize(
+    "remat", [False, True, "dots_saveable", jax.checkpoint_policies.nothing_saveable]
+)
+def test_maybe_remat(remat):
+    fn = maybe_remat(jnp.sin, remat)
+    if remat is False:
+        assert fn is jnp.sin
+    assert_allclose(jax.grad(fn)(1.0), jnp.cos(1.0), rtol=1e-6)
+
+
+def test_maybe_remat_invalid_policy():
+    with pytest.raises(ValueError, match="Unknown checkpoint policy"):
+        maybe_remat(jnp.sin, "foo")
+    with pytest.raises(ValueError, match="checkpoint policy or its name"):
+        maybe_remat(jnp.sin, 1.0)
+
+
 def test_format_shapes():
     data = jnp.arange(100)
 